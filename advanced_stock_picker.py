@@ -7,6 +7,8 @@ Advanced Stock Picker Strategy, Support custom configure.
 
 import os
 import sys
+import json
+import argparse
 import logging
 import pandas as pd
 from typing import Dict, Tuple, Union
@@ -16,10 +18,15 @@ from datetime import datetime, date
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from base_stock_picker import BaseStockPicker
+from utils.instrumentation import StageMetrics, format_stage_metrics
+from utils.profiling import enable_profiling, profiled
+from utils.run_history import RunHistoryStore
+from utils.telemetry import TELEMETRY
 from config import (
     MARKET_CAP_CONFIG, PRICE_CONFIG, TURNOVER_CONFIG, GAIN_CONFIG,
     VOLUME_RATIO_CONFIG, MARKET_CONFIG, SELECTION_CONFIG, OUTPUT_CONFIG,
-    MARKET_ENVIRONMENT_ADJUSTMENTS
+    MARKET_ENVIRONMENT_ADJUSTMENTS, WALK_FORWARD_CONFIG, INSTRUMENTATION_CONFIG, TELEMETRY_CONFIG,
+    AUCTION_CAPTURE_CONFIG
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -27,18 +34,24 @@ logger = logging.getLogger(__name__)
 
 os.makedirs('/tmp/itrading', exist_ok=True)
 
+# 计入竞价得分的集合竞价因子
+AUCTION_SCORE_FIELDS = ('竞价涨幅', '竞价量比', '委托不平衡', '竞价涨幅变化')
+
 
 class AdvancedStockPicker(BaseStockPicker):
     """高级股票选择器，支持动态参数调整和多种选股模式"""
 
-    def __init__(self, market_mode: str = 'normal'):
+    def __init__(self, market_mode: str = 'normal', config_overrides: Dict = None):
         """
         初始化高级股票选择器
 
         Args:
             market_mode: 市场模式 ('normal', 'bull_market', 'bear_market', 'volatile_market')
+            config_overrides: 覆盖配置文件中的参数（回测/参数扫描用），
+                例如 {'min_gain': 2, 'adjustments': {'bull_market': {'max_gain': 9}}}
         """
         self.market_mode = market_mode
+        self.config_overrides = config_overrides or {}
 
         # 根据市场模式调整参数
         config = self._get_adjusted_config(market_mode)
@@ -47,6 +60,43 @@ class AdvancedStockPicker(BaseStockPicker):
 
         logger.info(f"初始化高级选股器，市场模式: {market_mode}")
 
+    def set_config_overrides(self, config_overrides: Dict = None):
+        """
+        设置参数覆盖并按当前市场模式重新计算参数
+
+        Args:
+            config_overrides: 参数覆盖，格式同 __init__
+        """
+        self.config_overrides = config_overrides or {}
+        for key, value in self._get_adjusted_config(self.market_mode).items():
+            setattr(self, key, value)
+
+    def load_parameter_schedule(self, path: str = WALK_FORWARD_CONFIG['schedule_path'],
+                                trade_date: str = None) -> Union[Dict, None]:
+        """
+        加载滚动优化生成的参数时间表，应用交易日所在时段的各市场模式参数调整
+
+        Args:
+            path: 参数时间表JSON文件（walk_forward_optimizer.py 生成）
+            trade_date: 交易日 YYYYMMDD，默认今天
+
+        Returns:
+            生效的时间表条目，没有生效条目时返回None（保持当前参数）
+        """
+        trade_date = trade_date or datetime.now().strftime('%Y%m%d')
+        with open(path, 'r', encoding='utf-8') as f:
+            schedule = json.load(f)
+
+        entries = [entry for entry in schedule.get('entries', []) if entry['effective_from'] <= trade_date]
+        if not entries:
+            logger.warning(f"参数时间表 {path} 中没有 {trade_date} 生效的条目")
+            return None
+
+        entry = max(entries, key=lambda e: e['effective_from'])
+        self.set_config_overrides({**self.config_overrides, 'adjustments': entry['adjustments']})
+        logger.info(f"应用参数时间表 {entry['effective_from']} 起生效的参数调整: {entry['adjustments']}")
+        return entry
+
     def _get_adjusted_config(self, market_mode: str) -> Dict:
         """
         根据市场模式获取调整后的配置
@@ -57,6 +107,9 @@ class AdvancedStockPicker(BaseStockPicker):
         Returns:
             调整后的配置字典
         """
+        overrides = dict(self.config_overrides)
+        adjustment_overrides = overrides.pop('adjustments', {})
+
         # 基础配置
         config = {
             **MARKET_CAP_CONFIG,
@@ -64,12 +117,13 @@ class AdvancedStockPicker(BaseStockPicker):
             **TURNOVER_CONFIG,
             **GAIN_CONFIG,
             **VOLUME_RATIO_CONFIG,
-            **MARKET_CONFIG
+            **MARKET_CONFIG,
+            **overrides
         }
 
-        # 根据市场模式调整参数
-        if market_mode in MARKET_ENVIRONMENT_ADJUSTMENTS:
-            adjustments = MARKET_ENVIRONMENT_ADJUSTMENTS[market_mode]
+        # 根据市场模式调整参数（参数覆盖中也可以为normal模式指定调整）
+        adjustments = {**MARKET_ENVIRONMENT_ADJUSTMENTS.get(market_mode, {}), **adjustment_overrides.get(market_mode, {})}
+        if adjustments:
             config.update(adjustments)
             logger.info(f"应用 {market_mode} 模式参数调整: {adjustments}")
 
@@ -230,6 +284,57 @@ class AdvancedStockPicker(BaseStockPicker):
 
         return df
 
+    def apply_auction_score(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        把竞价得分按 AUCTION_CAPTURE_CONFIG['score_weight'] 计入综合得分
+
+        竞价得分为竞价涨幅、竞价量比、委托不平衡、竞价涨幅变化在候选股票中的百分位排名均值，
+        缺少竞价因子的股票记0.5；没有竞价因子列时原样返回
+
+        Args:
+            df: 已计算综合得分的DataFrame
+
+        Returns:
+            调整综合得分后的DataFrame
+        """
+        weight = AUCTION_CAPTURE_CONFIG['score_weight']
+        columns = [col for col in AUCTION_SCORE_FIELDS if col in df.columns and df[col].notna().any()]
+        if weight <= 0 or not columns or df.empty:
+            return df
+
+        df = df.copy()
+        df['竞价得分'] = df[columns].apply(pd.to_numeric, errors='coerce').rank(pct=True).mean(axis=1).fillna(0.5)
+        df['综合得分'] = df['综合得分'] * (1 - weight) + df['竞价得分'] * weight
+        return df
+
+    def apply_intraday_momentum(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        把盘中动量得分按 momentum_weight 计入综合得分
+
+        盘中动量得分为快照缓冲区时间窗口内价格变化（%）和成交量加速在候选股票中的百分位排名均值，
+        缓冲区中没有该股票时记0.5；缓冲区未启用或窗口内不足3个快照时原样返回
+
+        Args:
+            df: 已计算综合得分的DataFrame
+
+        Returns:
+            调整综合得分后的DataFrame
+        """
+        buffer = self.snapshot_buffer
+        if buffer is None or self.momentum_weight <= 0 or df.empty or '代码' not in df.columns \
+                or buffer.snapshots_within(self.trend_window_seconds) < 3:
+            return df
+
+        momentum = pd.DataFrame({
+            '价格变化': buffer.change('最新', self.trend_window_seconds, pct=True),
+            '成交量加速': buffer.acceleration('成交量', self.trend_window_seconds),
+        }).reindex(df['代码'].astype(str))
+
+        df = df.copy()
+        df['盘中动量得分'] = momentum.rank(pct=True).mean(axis=1).fillna(0.5).to_numpy()
+        df['综合得分'] = df['综合得分'] * (1 - self.momentum_weight) + df['盘中动量得分'] * self.momentum_weight
+        return df
+
     def enhanced_ranking(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         增强版排序算法
@@ -243,6 +348,12 @@ class AdvancedStockPicker(BaseStockPicker):
         # 先计算基础综合得分
         df = self._calculate_composite_score(df)
 
+        # 有集合竞价因子时计入竞价得分
+        df = self.apply_auction_score(df)
+
+        # 启用了盘中快照缓冲区时用窗口内的价格/成交量变化确认动量
+        df = self.apply_intraday_momentum(df)
+
         # 计算风险评分
         df = self.calculate_risk_score(df)
 
@@ -254,10 +365,12 @@ class AdvancedStockPicker(BaseStockPicker):
 
         return df
 
+    @profiled('select_stocks_advanced')
     def select_stocks_advanced(self,
         trade_date: Union[str, date, datetime] = None,
         max_stocks: int = None,
-        auto_adjust_mode: bool = True) -> Tuple[pd.DataFrame, Dict]:
+        auto_adjust_mode: bool = True,
+        market_data: pd.DataFrame = None) -> Tuple[pd.DataFrame, Dict]:
         """
         执行高级选股流程
 
@@ -265,6 +378,7 @@ class AdvancedStockPicker(BaseStockPicker):
             trade_date: 交易日期，可以是字符串、日期对象或时间戳
             max_stocks: 最大选择股票数量
             auto_adjust_mode: 是否自动调整市场模式
+            market_data: 已获取的市场数据（如回测时的本地历史快照），提供时不再请求数据源
 
         Returns:
             (选中的股票DataFrame, 选股统计信息)
@@ -273,13 +387,21 @@ class AdvancedStockPicker(BaseStockPicker):
             max_stocks = SELECTION_CONFIG['max_stocks']
 
         logger.info("开始执行高级选股流程...")
+        metrics = StageMetrics(**INSTRUMENTATION_CONFIG)
 
         # 1. 获取市场数据
-        market_data = self.get_market_data(trade_date=trade_date)
+        upstream = None
+        if market_data is None:
+            with TELEMETRY.collect() as upstream:
+                market_data = metrics.call('market_data', self.get_market_data, trade_date=trade_date)
+        market_source = market_data.attrs.get('source')
+        self.record_snapshot(market_data)
+        market_data = metrics.call('auction_factors', self.attach_auction_factors, market_data,
+                                   trade_date or datetime.now())
 
         # 2. 自动分析市场环境（如果启用）
         if auto_adjust_mode:
-            recommended_mode = self.analyze_market_environment(market_data)
+            recommended_mode = metrics.call('market_mode', self.analyze_market_environment, market_data)
             if recommended_mode != self.market_mode:
                 logger.info(f"自动调整市场模式: {self.market_mode} -> {recommended_mode}")
                 # 重新初始化参数
@@ -289,43 +411,53 @@ class AdvancedStockPicker(BaseStockPicker):
                 self.market_mode = recommended_mode
 
         # 3. 检查市场环境
-        is_good_market, up_ratio = self.check_market_environment(market_data)
+        is_good_market, up_ratio = metrics.call('market_environment', self.check_market_environment, market_data)
 
         stats = {
             'total_stocks': len(market_data),
             'up_ratio': up_ratio,
             'is_good_market': is_good_market,
             'market_mode': self.market_mode,
+            'market_data_source': market_source,
             'selection_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
+        if self.snapshot_buffer is not None:
+            stats['up_ratio_trend'] = self.get_up_ratio_trend()
+        if upstream is not None:
+            stats['upstream'] = upstream.summary()
 
         # 如果市场环境不佳，返回空结果 (但允许预开盘筛选)
         if not is_good_market and up_ratio != 0.5:
             logger.warning("市场环境不佳，不进行选股")
+            stats['stage_metrics'] = metrics.as_dict()
             return pd.DataFrame(), stats
 
         # 4. 过滤风险股票
-        filtered_data = self.filter_risk_stocks(market_data)
+        filtered_data = metrics.call('risk_filter', self.filter_risk_stocks, market_data)
         stats['after_risk_filter'] = len(filtered_data)
 
         # 5. 应用技术面过滤
-        technical_filtered = self.apply_technical_filter(filtered_data)
+        technical_filtered = metrics.call('technical_filter', self.apply_technical_filter, filtered_data)
         stats['after_technical_filter'] = len(technical_filtered)
 
         # 6. 应用选股标准
-        selected_stocks = self.apply_selection_criteria(technical_filtered)
+        selected_stocks = metrics.call('selection_criteria', self.apply_selection_criteria, technical_filtered)
         stats['after_criteria_filter'] = len(selected_stocks)
 
         # 7. 应用行业过滤
-        industry_filtered = self.apply_industry_filter(selected_stocks)
+        industry_filtered = metrics.call('industry_filter', self.apply_industry_filter, selected_stocks)
         stats['after_industry_filter'] = len(industry_filtered)
 
-        # 8. 增强版排序
-        ranked_stocks = self.enhanced_ranking(industry_filtered)
+        # 8. 增强版排序（没有候选股票时跳过，空DataFrame缺少评分所需的列）
+        if not industry_filtered.empty:
+            ranked_stocks = metrics.call('ranking', self.enhanced_ranking, industry_filtered)
+        else:
+            ranked_stocks = industry_filtered
 
         # 9. 限制数量
         final_stocks = ranked_stocks.head(max_stocks)
         stats['final_selection'] = len(final_stocks)
+        stats['stage_metrics'] = metrics.as_dict()
 
         logger.info(f"高级选股完成，最终选出 {len(final_stocks)} 只股票")
 
@@ -365,6 +497,11 @@ class AdvancedStockPicker(BaseStockPicker):
         print(f"  选股标准过滤后: {stats['after_criteria_filter']} 只")
         print(f"  行业过滤后: {stats['after_industry_filter']} 只")
         print(f"  最终选中: {stats['final_selection']} 只")
+        if stats.get('stage_metrics'):
+            print("\n⏱️ 各阶段耗时:")
+            print(format_stage_metrics(stats['stage_metrics']))
+        if stats.get('profile'):
+            print(f"\n🔬 性能剖析: {stats['profile']['summary']}")
 
         if len(selected_stocks) > 0:
             if is_pre_market:
@@ -446,15 +583,24 @@ class AdvancedStockPicker(BaseStockPicker):
 
 def main():
     """主函数 - 演示高级选股流程"""
+    parser = argparse.ArgumentParser(description='高级早盘量化选股')
+    parser.add_argument('--profile', action='store_true', help='剖析本次选股，结果写入 PROFILING_CONFIG 的 output_dir')
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
+
     print("🎯 启动高级早盘量化选股系统...")
 
     # 创建高级股票选择器实例
     picker = AdvancedStockPicker(market_mode='normal')
+    if os.path.exists(WALK_FORWARD_CONFIG['schedule_path']):
+        picker.load_parameter_schedule()
 
     # 执行选股
     try:
+        trade_date = datetime.now().strftime('%Y%m%d')
         selected_stocks, stats = picker.select_stocks_advanced(
-            trade_date=datetime.now().strftime('%Y%m%d'),
+            trade_date=trade_date,
             max_stocks=8,
             auto_adjust_mode=True
         )
@@ -464,32 +610,15 @@ def main():
 
         # 保存结果（如果配置为保存）
         if OUTPUT_CONFIG['save_to_file'] and len(selected_stocks) > 0:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"/tmp/itrading/advanced_selected_stocks_{timestamp}.csv"
-
-            # 选择要保存的列
-            save_columns = OUTPUT_CONFIG['display_columns']
-            if '综合得分' in selected_stocks.columns:
-                save_columns.append('综合得分')
-            if '风险评分' in selected_stocks.columns:
-                save_columns.append('风险评分')
-            if '风险调整得分' in selected_stocks.columns:
-                save_columns.append('风险调整得分')
-
-            # 创建保存用的数据副本，并格式化得分列为2位小数
-            save_data = selected_stocks[save_columns].copy()
-            
-            # 格式化得分列为2位小数
-            score_columns = ['综合得分', '风险评分', '风险调整得分']
-            for col in score_columns:
-                if col in save_data.columns:
-                    save_data[col] = save_data[col].apply(lambda x: f"{x:.2f}" if pd.notna(x) else x)
-
-            save_data.to_csv(filename, index=False, encoding='utf-8-sig')
-            print(f"\n💾 选股结果已保存至: {filename}")
+            run_id = RunHistoryStore().record_run(selected_stocks, stats, source='advanced_picker',
+                                                  trade_date=trade_date)
+            print(f"\n💾 选股结果已保存至运行历史: run_id={run_id}")
     except Exception as e:
         logger.error(f"选股过程中发生错误: {e}")
         print(f"❌ 选股失败: {e}")
+    finally:
+        if TELEMETRY_CONFIG['textfile_path']:
+            TELEMETRY.write_textfile(TELEMETRY_CONFIG['textfile_path'])
 
 
 if __name__ == "__main__":
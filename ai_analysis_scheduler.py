@@ -0,0 +1,162 @@
+"""
+AI分析预算调度
+AI Analysis Budget Scheduler
+
+每只股票的AI分析（analyze_stock + Gemini投资建议）耗时长、消耗token。
+调度器按选股得分（不含AI部分）决定分析顺序，并在时间和token预算内分析：
+- 即使 AI 得分为满分也不可能进入前 top_k 的股票直接跳过
+- 其余股票按不含AI的得分从高到低分析，预算不足时停止提交，超时未完成的结果丢弃
+- 每次分析都拿到预算的截止时间（utils/deadline.py），Gemini 请求以剩余时间为超时，
+  超过预算后不再等待的分析也会在截止时间结束，不会在后台继续消耗token
+"""
+
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config import AI_SCHEDULER_CONFIG
+from utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+def unreachable_top_k(pre_ai_scores: Sequence[float], top_k: int, ai_points: float) -> np.ndarray:
+    """
+    即使AI得分为满分也进不了前 top_k 的股票
+
+    最终得分 = 不含AI的得分 + AI标准化得分(0-1) × ai_points。若至少有 top_k 只其他股票
+    不含AI的得分就严格高于某只股票的最好情况（不含AI的得分 + ai_points），无论AI结果如何它都不会进入前 top_k。
+
+    Args:
+        pre_ai_scores: 每只股票不含AI的得分
+        top_k: 最终保留的股票数
+        ai_points: AI得分最多能增加的分数
+
+    Returns:
+        np.ndarray: 布尔数组，True 表示可以跳过AI分析
+    """
+    scores = np.asarray(pre_ai_scores, dtype=float)
+    descending = -np.sort(scores)[::-1]
+    # 严格高于最好情况的股票数：-b_j < -(b_i + ai_points)
+    higher = np.searchsorted(descending, -(scores + ai_points), side='left')
+    return higher >= top_k
+
+
+class AIAnalysisScheduler:
+    """在时间和token预算内按优先级调度AI分析"""
+
+    def __init__(self,
+                 time_budget: float = AI_SCHEDULER_CONFIG['time_budget'],
+                 token_budget: int = AI_SCHEDULER_CONFIG['token_budget'],
+                 tokens_per_stock: int = AI_SCHEDULER_CONFIG['tokens_per_stock'],
+                 max_workers: int = AI_SCHEDULER_CONFIG['max_workers']):
+        """
+        初始化调度器
+
+        Args:
+            time_budget: 全部AI分析的墙钟时间预算（秒），None 表示不限
+            token_budget: token预算，None 表示不限
+            tokens_per_stock: 单只股票分析的token估计，分析结果带 tokens 时以实际值为准
+            max_workers: 同时进行AI分析的股票数
+        """
+        self.time_budget = time_budget
+        self.token_budget = token_budget
+        self.tokens_per_stock = tokens_per_stock
+        self.max_workers = max_workers
+
+    def plan(self, codes: Sequence[str], pre_ai_scores: Sequence[float],
+             top_k: int, ai_points: float) -> Tuple[List[str], List[str]]:
+        """
+        分析顺序
+
+        Returns:
+            Tuple[List[str], List[str]]: (按不含AI的得分从高到低需要分析的股票, 可以跳过的股票)
+        """
+        scores = np.asarray(pre_ai_scores, dtype=float)
+        skip = unreachable_top_k(scores, top_k, ai_points)
+        order = np.argsort(-scores, kind='stable')
+        return [codes[i] for i in order if not skip[i]], [codes[i] for i in order if skip[i]]
+
+    def run(self, codes: Sequence[str], analyze: Callable[[str, Deadline], Dict],
+            deadline: Deadline = None) -> Tuple[Dict[str, Dict], Dict]:
+        """
+        按顺序在预算内执行AI分析
+
+        同时最多 max_workers 只股票在分析；提交下一只前检查剩余时间是否够一次分析（按已完成分析的平均耗时估计）
+        以及token预算扣除已完成分析的用量和进行中分析的估计用量后是否还够一只股票。
+        超过时间预算仍未完成的分析不再等待，其估计用量仍计入 tokens。
+
+        Args:
+            codes: 按优先级排序的股票代码
+            analyze: 单只股票的分析函数 analyze(code, deadline)，deadline 为时间预算的截止时间（应作为
+                Gemini 请求超时），返回包含 ai_score、ai_analysis（可选 tokens）的字典
+            deadline: 时间预算的截止时间（如运行截止时间的子截止时间），默认从现在起 time_budget 秒
+
+        Returns:
+            Tuple[Dict[str, Dict], Dict]: (股票代码 -> 分析结果, 调度报告)
+        """
+        started = time.perf_counter()
+        deadline = deadline or Deadline(self.time_budget)
+        queue = list(codes)
+        results: Dict[str, Dict] = {}
+        report = {'analyzed': [], 'failed': [], 'skipped_budget': [], 'timed_out': [], 'tokens': 0}
+        durations: List[float] = []
+        in_flight = {}
+        spent_tokens = 0  # 已完成（含失败）分析的用量
+
+        def committed_tokens() -> int:
+            return spent_tokens + len(in_flight) * self.tokens_per_stock
+
+        def affordable() -> bool:
+            if self.token_budget is not None and committed_tokens() + self.tokens_per_stock > self.token_budget:
+                return False
+            expected = float(np.mean(durations)) if durations else 0.0
+            return deadline.remaining() > expected
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while queue or in_flight:
+                while queue and len(in_flight) < self.max_workers:
+                    if not affordable():
+                        report['skipped_budget'] += queue
+                        queue = []
+                        break
+                    code = queue.pop(0)
+                    in_flight[executor.submit(analyze, code, deadline)] = (code, time.perf_counter())
+                if not in_flight:
+                    break
+
+                timeout = None if deadline.unlimited else deadline.remaining()
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    report['timed_out'] += [code for code, _ in in_flight.values()]
+                    report['skipped_budget'] += queue
+                    break
+
+                for future in done:
+                    code, submitted = in_flight.pop(future)
+                    durations.append(time.perf_counter() - submitted)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"股票 {code} AI分析失败: {e}")
+                        report['failed'].append(code)
+                        spent_tokens += self.tokens_per_stock
+                        continue
+                    tokens = result.get('tokens')
+                    spent_tokens += self.tokens_per_stock if tokens is None else tokens
+                    results[code] = result
+                    report['analyzed'].append(code)
+        finally:
+            # 未完成的分析在截止时间结束（请求超时），不在此等待
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        report['tokens'] = committed_tokens()
+        report['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+        logger.info(f"AI分析调度完成: 分析 {len(report['analyzed'])} 只, 失败 {len(report['failed'])} 只, "
+                    f"预算不足跳过 {len(report['skipped_budget'])} 只, 超时 {len(report['timed_out'])} 只, "
+                    f"用时 {report['elapsed_seconds']}s")
+        return results, report
@@ -2,27 +2,25 @@
 AI增强股票分析，集成了**25项财务指标分析**、**综合新闻情绪分析**>、**技术指标计算**和**AI深度解读**.
 """
 
-import os
 import logging
 import pandas as pd
 import math
 from datetime import datetime, timedelta
 
-import akshare as ak
-import tushare as ts
-from google import genai
-from dotenv import load_dotenv
+from config import DEADLINE_CONFIG, INSTRUMENTATION_CONFIG
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.instrumentation import StageMetrics
+from utils.clients import LazyModule, gemini_client, tushare_pro
+from utils.profiling import profiled
+from utils.telemetry import call_upstream, record_fallback
 import warnings
 warnings.filterwarnings('ignore')
 
-load_dotenv(os.path.expanduser('~/apps/iagent/.env'), verbose=True)
-os.environ.pop('GOOGLE_API_KEY', None) # Default use GOOGLE_API_KEY, remove it in
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# 首次使用时才导入；Gemini 和 Tushare Pro 客户端见 utils/clients.py，首次调用时创建并共享
+ak = LazyModule('akshare')
+types = LazyModule('google.genai.types')
+
 MODEL='gemini-2.5-pro-preview-06-05'
-CLIENT = genai.Client(api_key=GEMINI_API_KEY)
-TUSHARE_TOKEN = os.getenv("TUSHARE_TOKEN")
-ts.set_token(TUSHARE_TOKEN)
-PRO = ts.pro_api()
 
 YEAR=datetime.now().year
 quarter_days = f'{YEAR}0331, {YEAR}0630, {YEAR}0930, {YEAR}1231'
@@ -39,6 +37,7 @@ logging.basicConfig(
         logging.StreamHandler()  # 只保留命令行输出
     ]
 )
+logger = logging.getLogger(__name__)
 
 class AIStockAnalyzer:
     """AI增强股票分析器 - 基于Google Gemini"""
@@ -83,7 +82,8 @@ class AIStockAnalyzer:
 
             self.logger.debug(f"正在获取 {stock_code} 的历史数据 (过去{days}天)...")
 
-            stock_data = ak.stock_zh_a_hist(
+            stock_data = call_upstream(
+                'akshare', 'stock_zh_a_hist', ak.stock_zh_a_hist,
                 symbol=stock_code,
                 period="daily",
                 start_date=start_date,
@@ -216,7 +216,7 @@ class AIStockAnalyzer:
             # 1. 基本信息
             try:
                 self.logger.debug("正在获取股票基本信息...")
-                stock_info = ak.stock_individual_info_em(symbol=stock_code)
+                stock_info = call_upstream('akshare', 'stock_individual_info_em', ak.stock_individual_info_em, symbol=stock_code)
                 info_dict = dict(zip(stock_info['item'], stock_info['value']))
                 fundamental_data['basic_info'] = info_dict
                 self.logger.debug("✓ 股票基本信息获取成功")
@@ -232,7 +232,7 @@ class AIStockAnalyzer:
                 # 获取主要财务数据
                 try:
                     # 利润表数据
-                    income_statement = ak.stock_financial_abstract_ths(symbol=stock_code, indicator="按报告期")
+                    income_statement = call_upstream('akshare', 'stock_financial_abstract_ths', ak.stock_financial_abstract_ths, symbol=stock_code, indicator="按报告期")
                     if not income_statement.empty:
                         latest_income = income_statement.iloc[0].to_dict()
                         financial_indicators.update(latest_income)
@@ -242,7 +242,7 @@ class AIStockAnalyzer:
 
                 # 获取财务分析指标
                 try:
-                    balance_sheet = ak.stock_financial_analysis_indicator(symbol=stock_code, start_year=f'{datetime.now().year}')
+                    balance_sheet = call_upstream('akshare', 'stock_financial_analysis_indicator', ak.stock_financial_analysis_indicator, symbol=stock_code, start_year=f'{datetime.now().year}')
                     if not balance_sheet.empty:
                         latest_balance = balance_sheet.iloc[-1].to_dict()
                         financial_indicators.update(latest_balance)
@@ -253,14 +253,14 @@ class AIStockAnalyzer:
                 # 获取现金流量表
                 try:
                     """
-                    cash_flow = ak.stock_cash_flow_sheet_by_report_em(symbol=stock_code)
+                    cash_flow = call_upstream('akshare', 'stock_cash_flow_sheet_by_report_em', ak.stock_cash_flow_sheet_by_report_em, symbol=stock_code)
                     if not cash_flow.empty:
                         latest_cash = cash_flow.iloc[-1].to_dict()
                         financial_indicators.update(latest_cash)
                     """
                     ts_code = self._get_ts_code(stock_code)
                     self.logger.debug(f"使用Tushare Pro获取 {ts_code} 的现金流量表...")
-                    cash_flow = PRO.cashflow(ts_code=ts_code, start_date=f'{YEAR-1}0101', end_date=f'{YEAR}1231')
+                    cash_flow = call_upstream('tushare', 'cashflow', tushare_pro(required=True).cashflow, ts_code=ts_code, start_date=f'{YEAR-1}0101', end_date=f'{YEAR}1231')
                     if not cash_flow.empty:
                         latest_cf = cash_flow.iloc[0].to_dict()
 
@@ -298,7 +298,7 @@ class AIStockAnalyzer:
             # 3. 估值指标
             try:
                 self.logger.debug("正在获取估值指标...")
-                valuation_data = ak.stock_a_indicator_lg(symbol=stock_code)
+                valuation_data = call_upstream('akshare', 'stock_a_indicator_lg', ak.stock_a_indicator_lg, symbol=stock_code)
                 if not valuation_data.empty:
                     latest_valuation = valuation_data.iloc[-1].to_dict()
                     # 清理估值数据中的NaN值
@@ -321,7 +321,7 @@ class AIStockAnalyzer:
                 self.logger.debug("正在获取业绩预告...")
                 #performance_forecast = ak.stock_yjyg_em(f'{quarter_start_date}')
                 ts_code = self._get_ts_code(stock_code)
-                performance_forecast = PRO.forecast(ts_code=ts_code, start_date=f'{YEAR}0101', end_date=f'{YEAR}1231')
+                performance_forecast = call_upstream('tushare', 'forecast', tushare_pro(required=True).forecast, ts_code=ts_code, start_date=f'{YEAR}0101', end_date=f'{YEAR}1231')
                 if not performance_forecast.empty:
                     fundamental_data['performance_forecast'] = performance_forecast.head(10).to_dict('records')
                 else:
@@ -335,7 +335,7 @@ class AIStockAnalyzer:
             try:
                 self.logger.debug("正在获取分红配股信息...")
                 #dividend_info = ak.stock_fhpg_em(symbol=stock_code)
-                dividend_info = PRO.dividend(ts_code=f'{ts_code}')
+                dividend_info = call_upstream('tushare', 'dividend', tushare_pro(required=True).dividend, ts_code=f'{ts_code}')
                 if not dividend_info.empty:
                     fundamental_data['dividend_info'] = dividend_info.head(10).to_dict('records')
                 else:
@@ -464,7 +464,7 @@ class AIStockAnalyzer:
 
             # 获取行业信息
             try:
-                industry_info = ak.stock_board_industry_name_em()
+                industry_info = call_upstream('akshare', 'stock_board_industry_name_em', ak.stock_board_industry_name_em)
                 """
                 stock_industry = industry_info[industry_info.iloc[:, 0].astype(str).str.contains(stock_code, na=False)]
                 if not stock_industry.empty:
@@ -479,7 +479,7 @@ class AIStockAnalyzer:
 
             # 获取行业排名
             try:
-                industry_rank = ak.stock_rank_lxsz_ths()
+                industry_rank = call_upstream('akshare', 'stock_rank_lxsz_ths', ak.stock_rank_lxsz_ths)
                 if not industry_rank.empty:
                     stock_rank = industry_rank[industry_rank.iloc[:, 1].astype(str).str.contains(stock_code, na=False)]
                     if not stock_rank.empty:
@@ -517,7 +517,7 @@ class AIStockAnalyzer:
             # 1. 公司新闻
             try:
                 self.logger.debug("正在获取公司新闻...")
-                company_news = ak.stock_news_em(symbol=stock_code)
+                company_news = call_upstream('akshare', 'stock_news_em', ak.stock_news_em, symbol=stock_code)
                 if not company_news.empty:
                     processed_news = []
                     for _, row in company_news.head(50).iterrows():  # 增加获取数量
@@ -539,7 +539,7 @@ class AIStockAnalyzer:
             # 2. 公司公告
             try:
                 self.logger.debug("正在获取公司公告...")
-                announcements = ak.stock_zh_a_disclosure_report_cninfo(symbol=stock_code, start_date="20250401", end_date="20250704")
+                announcements = call_upstream('akshare', 'stock_zh_a_disclosure_report_cninfo', ak.stock_zh_a_disclosure_report_cninfo, symbol=stock_code, start_date="20250401", end_date="20250704")
                 if not announcements.empty:
                     processed_announcements = []
                     for _, row in announcements.head(30).iterrows():  # 增加获取数量
@@ -561,7 +561,7 @@ class AIStockAnalyzer:
             # 3. 研究报告
             try:
                 self.logger.debug("正在获取研究报告...")
-                research_reports = ak.stock_research_report_em(symbol=stock_code)
+                research_reports = call_upstream('akshare', 'stock_research_report_em', ak.stock_research_report_em, symbol=stock_code)
                 if not research_reports.empty:
                     processed_reports = []
                     for _, row in research_reports.head(20).iterrows():  # 增加获取数量
@@ -583,7 +583,7 @@ class AIStockAnalyzer:
             # 4. 行业新闻
             try:
                 self.logger.debug("正在获取行业新闻...")
-                industry_news = ak.stock_news_main_cx().head(200)
+                industry_news = call_upstream('akshare', 'stock_news_main_cx', ak.stock_news_main_cx).head(200)
                 if not industry_news.empty:
                     processed_news = []
                     for _, row in industry_news.head(50).iterrows():
@@ -1060,7 +1060,7 @@ class AIStockAnalyzer:
         """获取股票名称"""
         try:
             try:
-                stock_info = ak.stock_individual_info_em(symbol=stock_code)
+                stock_info = call_upstream('akshare', 'stock_individual_info_em', ak.stock_individual_info_em, symbol=stock_code)
                 if not stock_info.empty:
                     info_dict = dict(zip(stock_info['item'], stock_info['value']))
                     stock_name = info_dict.get('股票简称', stock_code)
@@ -1377,8 +1377,15 @@ class AIStockAnalyzer:
 
         return formatted if formatted else "无有效数据"
 
-    def generate_ai_analysis(self, analysis_data):
-        """生成AI分析报告 - 基于Google Gemini"""
+    def generate_ai_analysis(self, analysis_data, timeout=None, degraded=None):
+        """
+        生成AI分析报告 - 基于Google Gemini
+
+        timeout 为Gemini调用的时间预算（秒），不足 DEADLINE_CONFIG['min_ai_seconds'] 时直接使用高级规则分析；
+        降级为规则分析时在 degraded 列表中记录 'gemini'
+        """
+        if degraded is None:
+            degraded = []
         try:
             self.logger.debug("🤖 开始AI深度分析...")
 
@@ -1396,28 +1403,40 @@ class AIStockAnalyzer:
                 fundamental_data, sentiment_analysis, price_info
             )
 
+            if timeout is not None and timeout < DEADLINE_CONFIG['min_ai_seconds']:
+                self.logger.warning(f"⚠️ 剩余时间 {timeout:.1f}s 不足以调用AI，使用高级分析模式")
+                degraded.append('gemini')
+                record_fallback('gemini', 'generate_content', 'rule_based')
+                return self._advanced_rule_based_analysis(analysis_data)
+
             # 调用Gemini API
-            ai_response = self._call_gemini_api(prompt)
+            ai_response = self._call_gemini_api(prompt, timeout=timeout)
 
             if ai_response:
                 self.logger.debug("✅ AI深度分析完成")
                 return ai_response
             else:
                 self.logger.warning("⚠️ AI API不可用，使用高级分析模式")
+                degraded.append('gemini')
+                record_fallback('gemini', 'generate_content', 'rule_based')
                 return self._advanced_rule_based_analysis(analysis_data)
 
         except Exception as e:
             self.logger.error(f"AI分析失败: {e}")
+            degraded.append('gemini')
+            record_fallback('gemini', 'generate_content', 'rule_based')
             return self._advanced_rule_based_analysis(analysis_data)
 
-    def _call_gemini_api(self, prompt):
-        """调用Google Gemini API"""
+    def _call_gemini_api(self, prompt, timeout=None):
+        """调用Google Gemini API，timeout（秒）到期时取消请求"""
         try:
             self.logger.debug(f"正在调用Google Gemini {MODEL} 进行深度分析...")
             
-            response = CLIENT.models.generate_content(
+            response = call_upstream(
+                'gemini', 'generate_content', gemini_client().models.generate_content,
                 model=MODEL,
                 contents=prompt,
+                config=gemini_request_config(timeout),
             )
             
             if response and response.text:
@@ -1521,33 +1540,64 @@ class AIStockAnalyzer:
             self.logger.error(f"高级规则分析失败: {e}")
             return "分析系统暂时不可用，请稍后重试。"
 
-    def analyze_stock(self, stock_code):
-        """分析股票的主方法"""
+    @profiled('analyze_stock')
+    def analyze_stock(self, stock_code, deadline: Deadline = None):
+        """
+        分析股票的主方法
+
+        deadline 为本只股票分析的截止时间，股票名称、价格、财务指标和新闻各取其中一部分
+        （DEADLINE_CONFIG['stage_budgets']，并为Gemini预留 min_ai_seconds）：价格数据超时抛出 DeadlineExceeded；
+        股票名称、财务指标和新闻超时使用空数据继续，AI解读时间不足时改用高级规则分析。
+        降级的部分记录在报告的 degraded 列表中。
+        """
+        deadline = deadline or Deadline()
+        degraded = []
+        metrics = StageMetrics(**INSTRUMENTATION_CONFIG)
         try:
             self.logger.debug(f"开始增强版股票分析: {stock_code}")
 
             # 获取股票名称
-            stock_name = self.get_stock_name(stock_code)
+            try:
+                stock_name = metrics.call('stock_name', self.get_stock_name, stock_code,
+                                          runner=stage_deadline(deadline, 'stock_name').run)
+            except DeadlineExceeded:
+                stock_name = stock_code
+                degraded.append('stock_name')
 
             # 1. 获取价格数据和技术分析
             self.logger.debug("正在进行技术分析...")
-            price_data = self.get_stock_data(stock_code)
+            price_data = metrics.call('get_stock_data', self.get_stock_data, stock_code,
+                                      runner=stage_deadline(deadline, 'get_stock_data').run)
             if price_data.empty:
                 raise ValueError(f"无法获取股票 {stock_code} 的价格数据")
 
             price_info = self.get_price_info(price_data)
-            technical_analysis = self.calculate_technical_indicators(price_data)
+            technical_analysis = metrics.call('technical_indicators', self.calculate_technical_indicators, price_data)
             technical_score = self.calculate_technical_score(technical_analysis)
 
             # 2. 获取25项财务指标和综合基本面分析
             self.logger.debug("正在进行25项财务指标分析...")
-            fundamental_data = self.get_comprehensive_fundamental_data(stock_code)
+            try:
+                fundamental_data = metrics.call('fundamentals', self.get_comprehensive_fundamental_data, stock_code,
+                                                runner=stage_deadline(deadline, 'fundamentals').run)
+            except DeadlineExceeded:
+                fundamental_data = {}
+                degraded.append('fundamental_data')
             fundamental_score = self.calculate_fundamental_score(fundamental_data)
 
             # 3. 获取综合新闻数据和高级情绪分析
             self.logger.debug("正在进行综合新闻和情绪分析...")
-            comprehensive_news_data = self.get_comprehensive_news_data(stock_code, days=30)
-            sentiment_analysis = self.calculate_advanced_sentiment_analysis(comprehensive_news_data)
+            try:
+                comprehensive_news_data = metrics.call('news', self.get_comprehensive_news_data, stock_code, days=30,
+                                                       runner=stage_deadline(deadline, 'news').run)
+            except DeadlineExceeded:
+                comprehensive_news_data = {
+                    'company_news': [], 'announcements': [], 'research_reports': [], 'industry_news': [],
+                    'market_sentiment': {}, 'news_summary': {'total_news_count': 0}
+                }
+                degraded.append('news')
+            sentiment_analysis = metrics.call('sentiment', self.calculate_advanced_sentiment_analysis,
+                                              comprehensive_news_data)
             sentiment_score = self.calculate_sentiment_score(sentiment_analysis)
 
             # 合并新闻数据到情绪分析结果中，方便AI分析使用
@@ -1569,7 +1619,7 @@ class AIStockAnalyzer:
             recommendation = self.generate_recommendation(scores)
 
             # 6. AI增强分析
-            ai_analysis = self.generate_ai_analysis({
+            ai_analysis = metrics.call('gemini', self.generate_ai_analysis, {
                 'stock_code': stock_code,
                 'stock_name': stock_name,
                 'price_info': price_info,
@@ -1577,7 +1627,7 @@ class AIStockAnalyzer:
                 'fundamental_data': fundamental_data,
                 'sentiment_analysis': sentiment_analysis,
                 'scores': scores
-            })
+            }, timeout=None if deadline.unlimited else deadline.remaining(), degraded=degraded)
 
             # 7. 生成最终报告
             report = {
@@ -1593,6 +1643,8 @@ class AIStockAnalyzer:
                 'analysis_weights': self.analysis_weights,
                 'recommendation': recommendation,
                 'ai_analysis': ai_analysis,
+                'degraded': degraded,
+                'stage_metrics': metrics.as_dict(),
                 'data_quality': {
                     'financial_indicators_count': len(fundamental_data.get('financial_indicators', {})),
                     'total_news_count': sentiment_analysis.get('total_analyzed', 0),
@@ -1612,39 +1664,95 @@ class AIStockAnalyzer:
             raise
 
 
-def stock_analyzer(stocks: list) -> tuple:
+def stage_deadline(deadline: Deadline, stage: str) -> Deadline:
+    """单只股票分析中某个数据步骤的截止时间，见 DEADLINE_CONFIG['stage_budgets']；不限时仍不限"""
+    if deadline.unlimited:
+        return deadline
+    fraction, cap = DEADLINE_CONFIG['stage_budgets'][stage]
+    reserve = DEADLINE_CONFIG['min_ai_seconds']
+    if deadline.remaining() <= reserve:  # 已来不及调用Gemini，不必为其预留
+        reserve = 0.0
+    return deadline.child(fraction=fraction, reserve=reserve, cap=cap)
+
+
+def gemini_request_config(timeout=None):
+    """Gemini请求配置：timeout（秒）为请求超时，None 表示不限"""
+    if timeout is None:
+        return None
+    return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=max(int(timeout * 1000), 1)))
+
+
+def analyze_stock_with_advice(analyzer: AIStockAnalyzer, stock_code: str, deadline: Deadline = None) -> dict:
+    """
+    分析单只股票，并让AI根据深度分析给出一两句投资建议和买入/卖出/持有结论
+
+    时间不足或调用失败时不再请求投资建议，直接使用深度分析（或规则分析）的内容，并在 degraded 中记录 'gemini_advice'
+    """
+    deadline = deadline or Deadline()
+    logger.info(f"开始分析股票 {stock_code}")
+    report = analyzer.analyze_stock(stock_code, deadline=deadline)
+    degraded = list(report.get('degraded', []))
+    metrics = StageMetrics(**INSTRUMENTATION_CONFIG)
+    metrics.merge(report.get('stage_metrics', {}))
+    ai_analysis = report['ai_analysis']
+    timeout = None if deadline.unlimited else deadline.remaining()
+    if 'gemini' in degraded or (timeout is not None and timeout < DEADLINE_CONFIG['min_ai_seconds']):
+        degraded.append('gemini_advice')
+    else:
+        prompt = f'According to the results of this AI deep analysis: provide investment advice (in one or two sentences) and conclusion: sell, buy, or hold:\n\n{report["ai_analysis"]}'
+        try:
+            response = metrics.call(
+                'gemini_advice',
+                call_upstream, 'gemini', 'generate_content', gemini_client().models.generate_content,
+                model=MODEL,
+                contents=prompt,
+                config=gemini_request_config(timeout),
+            )
+            ai_analysis = response.text
+            logger.debug(f"Gemini投资建议 {stock_code}: {response.text}")
+        except Exception as e:
+            logger.error(f"Gemini投资建议调用失败 {stock_code}: {e}")
+            degraded.append('gemini_advice')
+            record_fallback('gemini', 'generate_content', 'analysis_text')
+    return {
+        'stock_code': stock_code,
+        'stock_name': report['stock_name'],
+        'current_price': report['price_info']['current_price'],
+        'price_change': report['price_info']['price_change'],
+        'volume_ratio': report['price_info']['volume_ratio'],
+        'volatility': report['price_info']['volatility'],
+        'technical_analysis': report['technical_analysis'],
+        'fundamental_data': report['fundamental_data'],
+        'comprehensive_news_data': report['comprehensive_news_data'],
+        'sentiment_analysis': report['sentiment_analysis'],
+        'scores': report['scores'],
+        'ai_score': report['scores']['comprehensive'],
+        'recommendation': report['recommendation'],
+        'ai_analysis': ai_analysis,
+        'degraded': degraded,
+        'stage_metrics': metrics.as_dict()
+    }
+
+
+def stock_analyzer(stocks: list, deadline: Deadline = None) -> tuple:
     """获取股票分析器实例并分析股票列表,返回分析结果
     e.g:['000001', '600036', '300019', '000525']
+    每只股票的预算为剩余时间平均分给尚未分析的股票，一只股票的慢调用不会占用后面股票的时间；
+    到截止时间仍未开始或价格数据超时的股票不在结果中
     """
-    lst = []
+    deadline = deadline or Deadline()
     analyzer = AIStockAnalyzer()
-    for stock_code in stocks:
-        print(f"\n=== Analysis {stock_code} ")
-        report = analyzer.analyze_stock(stock_code)
-        prompt = f'According to the results of this AI deep analysis: provide investment advice (in one or two sentences) and conclusion: sell, buy, or hold:\n\n{report["ai_analysis"]}'
-        response = CLIENT.models.generate_content(
-            model=MODEL,
-            contents=prompt,
-        )
-        print(response.text)
-        dct = {
-            'stock_code': stock_code,
-            'stock_name': report['stock_name'],
-            'current_price': report['price_info']['current_price'],
-            'price_change': report['price_info']['price_change'],
-            'volume_ratio': report['price_info']['volume_ratio'],
-            'volatility': report['price_info']['volatility'],
-            'technical_analysis': report['technical_analysis'],
-            'fundamental_data': report['fundamental_data'],
-            'comprehensive_news_data': report['comprehensive_news_data'],
-            'sentiment_analysis': report['sentiment_analysis'],
-            'scores': report['scores'],
-            'ai_score': report['scores']['comprehensive'],
-            'recommendation': report['recommendation'],
-            'ai_analysis': response.text
-        }
-        lst.append(dct)
-    return lst
+    results = []
+    for i, stock_code in enumerate(stocks):
+        if deadline.expired():
+            logger.warning(f"已到截止时间，跳过AI分析: {stock_code}")
+            continue
+        try:
+            stock_deadline = deadline.child(fraction=1 / (len(stocks) - i))
+            results.append(analyze_stock_with_advice(analyzer, stock_code, deadline=stock_deadline))
+        except DeadlineExceeded as e:
+            logger.warning(f"股票 {stock_code} 分析超时，跳过: {e}")
+    return results
 
 if __name__ == "__main__":
     lst = stock_analyzer(['600519', '000006'])
@@ -0,0 +1,306 @@
+"""
+历史回测
+Historical Backtester
+
+用本地保存的历史全市场快照逐日重放 select_stocks_advanced，按交易日并行（进程池），
+再用收盘价面板向量化计算选中股票的次日/N日远期收益。
+首次回测某个区间时通过 prepare() 把缺失的交易日数据拉取到本地，之后的回测不再请求API。
+
+说明：历史快照为当日收盘后的日线数据，因此回测假设以选股日收盘价买入、N个交易日后收盘价卖出。
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_stock_picker import AdvancedStockPicker
+from config import BACKTEST_CONFIG
+from utils import util
+from utils.data_store import LocalDataStore, DEFAULT_STORE_DIR
+from utils.trading_calendar import trading_calendar
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 本地历史快照数据集名称
+MARKET_DATA_DATASET = 'market_data'
+
+# 选股结果中保留的列
+PICK_COLUMNS = ['代码', '名称', '最新价', '涨幅', '换手率', '量比', '流通市值', '市盈率', '综合得分', '风险调整得分']
+
+# 每个工作进程复用一个选股器实例
+_WORKER_PICKER = None
+
+
+def trading_days(start: str, end: str) -> List[str]:
+    """区间内（含首尾）的全部交易日"""
+    return trading_calendar().range(start, end)
+
+
+def forward_returns(close_panel: pd.DataFrame, horizons: Sequence[int]) -> Dict[int, pd.DataFrame]:
+    """
+    根据收盘价面板计算N日远期收益
+
+    Args:
+        close_panel: 收盘价面板（交易日 × 股票代码）
+        horizons: 持有交易日数
+
+    Returns:
+        {N: 远期收益面板}，停牌或数据缺失处为NaN
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {n: close_panel.shift(-n) / close_panel - 1 for n in horizons}
+
+
+def max_drawdown(returns: pd.Series) -> float:
+    """按日收益序列计算最大回撤（负数）"""
+    if returns.empty:
+        return 0.0
+    equity = (1 + returns.fillna(0)).cumprod()
+    return float((equity / equity.cummax() - 1).min())
+
+
+def _select_day(task: Dict) -> Tuple[str, pd.DataFrame, Dict]:
+    """工作进程中执行某个交易日的选股"""
+    global _WORKER_PICKER
+    if _WORKER_PICKER is None:
+        _WORKER_PICKER = AdvancedStockPicker(market_mode=task['market_mode'])
+    picker = _WORKER_PICKER
+
+    # 每个交易日从相同的初始参数开始，避免自动调整的市场模式在日期之间串联
+    picker.market_mode = task['market_mode']
+    picker.set_config_overrides(task.get('overrides'))
+
+    # 竞价因子等经 data_store 读取的数据来自回测的存储，不混入默认存储中的生产数据
+    picker.data_store = LocalDataStore(task['store_dir'])
+    picker.set_auction_factors(None)
+
+    trade_date = task['trade_date']
+    market_data = picker.data_store.load(MARKET_DATA_DATASET, trade_date)
+    if market_data is None or market_data.empty:
+        return trade_date, pd.DataFrame(), {'missing_data': True}
+
+    # 日线收盘数据对应完整的交易时段，按开盘后的行情处理，应用完整的量价选股条件
+    if '最新价' not in market_data.columns and '最新' in market_data.columns:
+        market_data = market_data.rename(columns={'最新': '最新价'})
+
+    selected, stats = picker.select_stocks_advanced(
+        trade_date=trade_date,
+        max_stocks=task['max_stocks'],
+        auto_adjust_mode=task['auto_adjust_mode'],
+        market_data=market_data,
+    )
+    if not selected.empty:
+        selected = selected[[col for col in PICK_COLUMNS if col in selected.columns]].copy()
+        selected.insert(0, '交易日', trade_date)
+        selected['排名'] = np.arange(1, len(selected) + 1)
+    return trade_date, selected, stats
+
+
+class Backtester:
+    """基于本地历史快照的选股回测引擎"""
+
+    def __init__(self,
+                 market_mode: str = 'normal',
+                 max_stocks: int = BACKTEST_CONFIG['max_stocks'],
+                 horizons: Sequence[int] = BACKTEST_CONFIG['horizons'],
+                 auto_adjust_mode: bool = True,
+                 workers: int = BACKTEST_CONFIG['workers'],
+                 store: LocalDataStore = None):
+        """
+        初始化回测引擎
+
+        Args:
+            market_mode: 每个交易日的初始市场模式
+            max_stocks: 每日最多选股数量
+            horizons: 计算远期收益的持有交易日数
+            auto_adjust_mode: 是否按每日市场环境自动调整市场模式
+            workers: 并行进程数，None为CPU核数，1为在当前进程内串行执行
+            store: 本地历史快照存储
+        """
+        self.market_mode = market_mode
+        self.max_stocks = max_stocks
+        self.horizons = sorted(horizons)
+        self.auto_adjust_mode = auto_adjust_mode
+        self.workers = workers
+        self.store = store or LocalDataStore(DEFAULT_STORE_DIR)
+
+    def prepare(self, start: str, end: str, picker: AdvancedStockPicker = None) -> int:
+        """
+        把回测区间（含计算远期收益所需的后续交易日）缺失的历史快照拉取到本地
+
+        Returns:
+            新拉取的交易日数量
+        """
+        days = trading_days(start, end)
+        extra = days[-1] if days else util.convert_trade_date(end)
+        for _ in range(max(self.horizons)):
+            extra = util.next_trading_day(extra)
+            days.append(extra)
+
+        missing = [day for day in days if not self.store.has(MARKET_DATA_DATASET, day)]
+        if not missing:
+            return 0
+
+        picker = picker or AdvancedStockPicker(market_mode=self.market_mode)
+        fetched = 0
+        for day in missing:
+            try:
+                df = picker.get_market_date_tushare(day)
+            except Exception as e:
+                logger.error(f"获取 {day} 历史数据失败: {e}")
+                continue
+            if not df.empty:
+                self.store.save(MARKET_DATA_DATASET, day, df)
+                fetched += 1
+        logger.info(f"已拉取 {fetched}/{len(missing)} 个交易日的历史快照到本地")
+        return fetched
+
+    def close_panel(self, days: Sequence[str]) -> pd.DataFrame:
+        """从本地快照构建收盘价面板（交易日 × 股票代码）"""
+        closes = {}
+        for day in days:
+            df = self.store.load(MARKET_DATA_DATASET, day)
+            if df is None or df.empty:
+                continue
+            price_col = '最新' if '最新' in df.columns else '最新价'
+            series = pd.to_numeric(df[price_col], errors='coerce')
+            series.index = df['代码'].astype(str)
+            closes[day] = series[~series.index.duplicated()]
+        return pd.DataFrame(closes).T.sort_index()
+
+    def _run_selection(self, days: Sequence[str], overrides: Dict = None) -> List[Tuple[str, pd.DataFrame, Dict]]:
+        tasks = [{
+            'trade_date': day,
+            'store_dir': self.store.root_dir,
+            'market_mode': self.market_mode,
+            'max_stocks': self.max_stocks,
+            'auto_adjust_mode': self.auto_adjust_mode,
+            'overrides': overrides or {},
+        } for day in days]
+
+        if self.workers == 1:
+            return [_select_day(task) for task in tasks]
+
+        chunksize = max(1, len(tasks) // (4 * (self.workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(_select_day, tasks, chunksize=chunksize))
+
+    def run(self, start: str, end: str, overrides: Dict = None) -> Tuple[pd.DataFrame, Dict]:
+        """
+        执行回测
+
+        Args:
+            start: 开始日期
+            end: 结束日期
+            overrides: 覆盖选股器参数，例如 {'min_gain': 2}，格式同 AdvancedStockPicker 的 config_overrides
+
+        Returns:
+            (每日选股及远期收益DataFrame, 回测汇总统计)
+        """
+        started = time.perf_counter()
+        days = trading_days(start, end)
+        if not days:
+            raise ValueError(f"{start} - {end} 区间内没有交易日")
+
+        # 远期收益需要区间之后的交易日收盘价
+        panel_days = list(days)
+        for _ in range(max(self.horizons)):
+            panel_days.append(util.next_trading_day(panel_days[-1]))
+
+        results = self._run_selection(days, overrides)
+        picks = [selected for _, selected, _ in results if not selected.empty]
+        picks = pd.concat(picks, ignore_index=True) if picks else pd.DataFrame(columns=['交易日', '代码', '排名'])
+        modes = pd.Series([stats.get('market_mode') for _, _, stats in results], index=days)
+
+        # 向量化查表：选股日所在行 × 股票所在列
+        closes = self.close_panel(panel_days)
+        returns = forward_returns(closes, self.horizons)
+        rows = closes.index.get_indexer(picks['交易日'])
+        cols = closes.columns.get_indexer(picks['代码'].astype(str))
+        found = (rows >= 0) & (cols >= 0)
+        for n, panel in returns.items():
+            values = np.full(len(picks), np.nan)
+            values[found] = panel.to_numpy()[rows[found], cols[found]]
+            picks[f'{n}日收益'] = values
+
+        summary = self.summarize(picks, days)
+        summary['missing_days'] = [day for day, _, stats in results if stats.get('missing_data')]
+        summary['market_modes'] = modes.value_counts().to_dict()
+        summary['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+        logger.info(f"回测完成: {len(days)} 个交易日, {len(picks)} 次选股, 用时 {summary['elapsed_seconds']}s")
+        return picks, summary
+
+    def summarize(self, picks: pd.DataFrame, days: Sequence[str]) -> Dict:
+        """按持有期汇总命中率、平均收益，并按等权日收益计算累计收益和最大回撤"""
+        summary = {
+            'start': days[0],
+            'end': days[-1],
+            'trade_days': len(days),
+            'days_with_picks': int(picks['交易日'].nunique()) if not picks.empty else 0,
+            'total_picks': len(picks),
+            'horizons': {},
+        }
+        for n in self.horizons:
+            column = picks[f'{n}日收益'].dropna() if f'{n}日收益' in picks.columns else pd.Series(dtype=float)
+            summary['horizons'][n] = {
+                'picks': len(column),
+                'mean_return': float(column.mean()) if len(column) else 0.0,
+                'median_return': float(column.median()) if len(column) else 0.0,
+                'hit_rate': float((column > 0).mean()) if len(column) else 0.0,
+            }
+
+        # 次日收益的等权组合，没有选股的交易日收益为0
+        first = self.horizons[0]
+        if not picks.empty:
+            daily = picks.groupby('交易日')[f'{first}日收益'].mean().reindex(list(days)).fillna(0)
+        else:
+            daily = pd.Series(0.0, index=list(days))
+        summary['daily_returns'] = daily
+        summary['cumulative_return'] = float((1 + daily).prod() - 1)
+        summary['max_drawdown'] = max_drawdown(daily)
+        return summary
+
+
+def main():
+    """主函数 - 回测历史区间的选股表现"""
+    parser = argparse.ArgumentParser(description='选股策略历史回测')
+    parser.add_argument('--start', required=True, help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYYMMDD')
+    parser.add_argument('--market-mode', default='normal', help='初始市场模式')
+    parser.add_argument('--max-stocks', type=int, default=BACKTEST_CONFIG['max_stocks'], help='每日最多选股数量')
+    parser.add_argument('--workers', type=int, default=BACKTEST_CONFIG['workers'], help='并行进程数')
+    parser.add_argument('--no-prepare', action='store_true', help='不拉取缺失的历史数据，只使用本地快照')
+    args = parser.parse_args()
+
+    backtester = Backtester(market_mode=args.market_mode, max_stocks=args.max_stocks, workers=args.workers)
+    if not args.no_prepare:
+        backtester.prepare(args.start, args.end)
+    picks, summary = backtester.run(args.start, args.end)
+
+    print("\n" + "="*70)
+    print(f"📈 回测结果 {summary['start']} - {summary['end']}")
+    print("="*70)
+    print(f"交易日: {summary['trade_days']}  有选股的交易日: {summary['days_with_picks']}  选股次数: {summary['total_picks']}")
+    for n, item in summary['horizons'].items():
+        print(f"  {n}日: 平均收益 {item['mean_return']:.2%}  中位数 {item['median_return']:.2%}  命中率 {item['hit_rate']:.2%}")
+    print(f"等权组合累计收益: {summary['cumulative_return']:.2%}  最大回撤: {summary['max_drawdown']:.2%}")
+    print(f"用时: {summary['elapsed_seconds']}s")
+
+    os.makedirs(BACKTEST_CONFIG['output_dir'], exist_ok=True)
+    output_file = os.path.join(BACKTEST_CONFIG['output_dir'], f"backtest_{summary['start']}_{summary['end']}.csv")
+    picks.to_csv(output_file, index=False, encoding='utf-8-sig')
+    print(f"💾 每日选股明细已保存至: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
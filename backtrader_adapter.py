@@ -0,0 +1,320 @@
+"""
+Backtrader 回测适配器
+Backtrader Adapter
+
+把每日选股结果转换为 backtrader 策略：选股日的下一交易日开盘买入，按持有天数、止损、止盈卖出。
+行情来自本地历史快照（LocalDataStore 的 market_data 数据集），先整理为 (交易日 × 股票) 的OHLCV数组，
+再通过预加载的数组数据源逐根K线填充，避免逐行访问pandas。
+回测结束后输出 pyfolio 兼容的日收益序列（以及持仓和成交记录）。
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+import backtrader as bt
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backtester import Backtester, MARKET_DATA_DATASET, max_drawdown, trading_days
+from config import BACKTRADER_CONFIG, BACKTEST_CONFIG
+from utils import util
+from utils.data_store import LocalDataStore, DEFAULT_STORE_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 本地快照中的OHLCV列
+OHLCV_COLUMNS = {'open': '今开', 'high': '最高', 'low': '最低', 'close': '最新', 'volume': '成交量'}
+
+# 作为策略时钟的交易日历数据源名称
+CALENDAR_NAME = '_calendar'
+
+
+class ArrayFeed(bt.feeds.DataBase):
+    """由预先整理好的numpy数组驱动的日线数据源"""
+
+    params = (
+        ('datetimes', None),   # backtrader 日期数值（bt.date2num）
+        ('opens', None),
+        ('highs', None),
+        ('lows', None),
+        ('closes', None),
+        ('volumes', None),
+    )
+
+    def start(self):
+        super().start()
+        self._index = -1
+
+    def _load(self):
+        self._index += 1
+        if self._index >= len(self.p.datetimes):
+            return False
+        i = self._index
+        self.lines.datetime[0] = self.p.datetimes[i]
+        self.lines.open[0] = self.p.opens[i]
+        self.lines.high[0] = self.p.highs[i]
+        self.lines.low[0] = self.p.lows[i]
+        self.lines.close[0] = self.p.closes[i]
+        self.lines.volume[0] = self.p.volumes[i]
+        self.lines.openinterest[0] = 0.0
+        return True
+
+
+class AShareCommission(bt.CommInfoBase):
+    """A股交易费用：双向佣金（有最低佣金）+ 卖出印花税"""
+
+    params = (
+        ('commission', BACKTRADER_CONFIG['commission']),
+        ('min_commission', BACKTRADER_CONFIG['min_commission']),
+        ('stamp_duty', BACKTRADER_CONFIG['stamp_duty']),
+        ('stocklike', True),
+        ('commtype', bt.CommInfoBase.COMM_PERC),
+        ('percabs', True),
+    )
+
+    def _getcommission(self, size, price, pseudoexec):
+        value = abs(size) * price
+        fee = max(value * self.p.commission, self.p.min_commission)
+        if size < 0:
+            fee += value * self.p.stamp_duty
+        return fee
+
+
+class PickerStrategy(bt.Strategy):
+    """按每日选股结果交易：选股日之后的第一个开盘买入，持有到期或触发止损/止盈后卖出"""
+
+    params = (
+        ('picks', None),              # {date: [代码, ...]}，按排名排序
+        ('max_positions', BACKTEST_CONFIG['max_stocks']),
+        ('holding_days', BACKTRADER_CONFIG['holding_days']),
+        ('stop_loss', BACKTRADER_CONFIG['stop_loss']),
+        ('take_profit', BACKTRADER_CONFIG['take_profit']),
+        ('lot_size', 100),            # A股每手股数
+        ('cash_reserve', BACKTRADER_CONFIG['cash_reserve']),  # 预留资金比例，覆盖开盘跳空和交易费用
+    )
+
+    def __init__(self):
+        self.calendar = self.getdatabyname(CALENDAR_NAME)
+        self.stocks = {data._name: data for data in self.datas if data._name != CALENDAR_NAME}
+        self.entries: Dict[str, Dict] = {}
+        self.pending = set()
+        self.trade_count = 0
+
+    def notify_order(self, order):
+        name = order.data._name
+        if order.status in (order.Completed, order.Canceled, order.Margin, order.Rejected):
+            self.pending.discard(name)
+        if order.status != order.Completed:
+            return
+        if order.isbuy():
+            self.entries[name] = {'price': order.executed.price, 'bar': len(order.data)}
+            self.trade_count += 1
+        else:
+            self.entries.pop(name, None)
+
+    def _has_bar_today(self, data) -> bool:
+        return len(data) > 0 and data.datetime.date(0) == self.calendar.datetime.date(0)
+
+    def next(self):
+        today = self.calendar.datetime.date(0)
+
+        # 卖出：持有到期、止损、止盈（当日收盘判断，下一交易日开盘成交）
+        for name, entry in list(self.entries.items()):
+            data = self.stocks[name]
+            if name in self.pending or not self._has_bar_today(data):
+                continue
+            change = data.close[0] / entry['price'] - 1
+            held = len(data) - entry['bar']
+            if held >= self.p.holding_days or \
+                    (self.p.stop_loss and change <= -self.p.stop_loss) or \
+                    (self.p.take_profit and change >= self.p.take_profit):
+                self.close(data=data)
+                self.pending.add(name)
+
+        # 买入：当日选出的股票，按整手等额分配
+        codes = self.p.picks.get(today, [])
+        if not codes:
+            return
+        slot_value = self.broker.getvalue() * (1 - self.p.cash_reserve) / self.p.max_positions
+        open_slots = self.p.max_positions - len(self.entries) - len(self.pending)
+        for code in codes:
+            if open_slots <= 0:
+                break
+            data = self.stocks.get(code)
+            if data is None or code in self.entries or code in self.pending or not self._has_bar_today(data):
+                continue
+            size = int(slot_value / data.close[0] / self.p.lot_size) * self.p.lot_size
+            if size <= 0:
+                continue
+            self.buy(data=data, size=size)
+            self.pending.add(code)
+            open_slots -= 1
+
+
+def load_bars(store: LocalDataStore, days: Sequence[str], codes: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    从本地快照整理OHLCV数组
+
+    Returns:
+        {'open'|'high'|'low'|'close'|'volume': (交易日 × 股票) 数组}
+    """
+    codes = pd.Index([str(code) for code in codes])
+    bars = {field: np.full((len(days), len(codes)), np.nan) for field in OHLCV_COLUMNS}
+    for i, day in enumerate(days):
+        df = store.load(MARKET_DATA_DATASET, day)
+        if df is None or df.empty:
+            continue
+        columns = codes.get_indexer(df['代码'].astype(str))
+        found = columns >= 0
+        for field, column in OHLCV_COLUMNS.items():
+            source = column if column in df.columns else ('最新价' if field == 'close' else None)
+            if source is None or source not in df.columns:
+                continue
+            bars[field][i, columns[found]] = pd.to_numeric(df[source], errors='coerce').to_numpy()[found]
+
+    # 缺失的开高低价用收盘价代替，缺失成交量记为0
+    for field in ('open', 'high', 'low'):
+        bars[field] = np.where(np.isnan(bars[field]), bars['close'], bars[field])
+    bars['volume'] = np.nan_to_num(bars['volume'])
+    return bars
+
+
+class BacktraderAdapter:
+    """把选股结果和本地行情组装为 backtrader 回测"""
+
+    def __init__(self,
+                 store: LocalDataStore = None,
+                 cash: float = BACKTRADER_CONFIG['cash'],
+                 max_positions: int = BACKTEST_CONFIG['max_stocks'],
+                 holding_days: int = BACKTRADER_CONFIG['holding_days'],
+                 stop_loss: float = BACKTRADER_CONFIG['stop_loss'],
+                 take_profit: float = BACKTRADER_CONFIG['take_profit']):
+        """
+        初始化适配器
+
+        Args:
+            store: 本地历史快照存储
+            cash: 初始资金
+            max_positions: 最大同时持仓数量（等额分配资金）
+            holding_days: 持有交易日数
+            stop_loss: 止损比例，None不止损
+            take_profit: 止盈比例，None不止盈
+        """
+        self.store = store or LocalDataStore(DEFAULT_STORE_DIR)
+        self.cash = cash
+        self.max_positions = max_positions
+        self.holding_days = holding_days
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+
+    def build_cerebro(self, picks: pd.DataFrame, days: List[str]) -> bt.Cerebro:
+        """创建加载好数据源、策略和分析器的 Cerebro"""
+        codes = sorted(picks['代码'].astype(str).unique())
+        bars = load_bars(self.store, days, codes)
+        datetimes = np.array([bt.date2num(datetime.strptime(day, '%Y%m%d')) for day in days])
+
+        cerebro = bt.Cerebro(stdstats=False)
+        ones = np.ones(len(days))
+        cerebro.adddata(ArrayFeed(datetimes=datetimes, opens=ones, highs=ones, lows=ones, closes=ones,
+                                  volumes=np.zeros(len(days))), name=CALENDAR_NAME)
+        for j, code in enumerate(codes):
+            valid = ~np.isnan(bars['close'][:, j])  # 停牌日没有K线
+            if not valid.any():
+                continue
+            cerebro.adddata(ArrayFeed(
+                datetimes=datetimes[valid],
+                opens=bars['open'][valid, j], highs=bars['high'][valid, j], lows=bars['low'][valid, j],
+                closes=bars['close'][valid, j], volumes=bars['volume'][valid, j],
+            ), name=code)
+
+        schedule = {}
+        for day, group in picks.sort_values(['交易日', '排名'] if '排名' in picks.columns else ['交易日']).groupby('交易日'):
+            schedule[datetime.strptime(str(day), '%Y%m%d').date()] = list(group['代码'].astype(str))
+
+        cerebro.addstrategy(PickerStrategy, picks=schedule, max_positions=self.max_positions,
+                            holding_days=self.holding_days, stop_loss=self.stop_loss, take_profit=self.take_profit)
+        cerebro.broker.setcash(self.cash)
+        cerebro.broker.addcommissioninfo(AShareCommission())
+        cerebro.addanalyzer(bt.analyzers.PyFolio, _name='pyfolio')
+        return cerebro
+
+    def run(self, picks: pd.DataFrame, start: str = None, end: str = None) -> Tuple[pd.Series, Dict]:
+        """
+        执行回测
+
+        Args:
+            picks: 每日选股结果，至少包含 交易日、代码 列（可选 排名），例如 Backtester.run 的输出
+            start: 开始日期，默认第一个选股日
+            end: 结束日期，默认最后一个选股日之后 holding_days+1 个交易日
+
+        Returns:
+            (pyfolio兼容的日收益序列, 汇总统计)；汇总中包含 positions、transactions 供 pyfolio 使用
+        """
+        started = time.perf_counter()
+        if picks.empty:
+            raise ValueError("选股结果为空，无法回测")
+        start = start or str(picks['交易日'].min())
+        if end is None:
+            end = str(picks['交易日'].max())
+            for _ in range(self.holding_days + 1):
+                end = util.next_trading_day(end)
+        days = trading_days(start, end)
+
+        cerebro = self.build_cerebro(picks, days)
+        strategy = cerebro.run()[0]
+        returns, positions, transactions, _ = strategy.analyzers.pyfolio.get_pf_items()
+
+        summary = {
+            'start': days[0],
+            'end': days[-1],
+            'symbols': len(cerebro.datas) - 1,
+            'trades': strategy.trade_count,
+            'final_value': cerebro.broker.getvalue(),
+            'total_return': cerebro.broker.getvalue() / self.cash - 1,
+            'max_drawdown': max_drawdown(returns),
+            'positions': positions,
+            'transactions': transactions,
+            'elapsed_seconds': round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"backtrader回测完成: {summary['symbols']} 只股票, {summary['trades']} 笔买入, "
+                    f"收益 {summary['total_return']:.2%}, 用时 {summary['elapsed_seconds']}s")
+        return returns, summary
+
+
+def main():
+    """主函数 - 重放选股并用 backtrader 回测"""
+    parser = argparse.ArgumentParser(description='backtrader 选股策略回测')
+    parser.add_argument('--start', required=True, help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYYMMDD')
+    parser.add_argument('--cash', type=float, default=BACKTRADER_CONFIG['cash'], help='初始资金')
+    parser.add_argument('--holding-days', type=int, default=BACKTRADER_CONFIG['holding_days'], help='持有交易日数')
+    parser.add_argument('--workers', type=int, default=BACKTEST_CONFIG['workers'], help='重放选股的并行进程数')
+    args = parser.parse_args()
+
+    backtester = Backtester(workers=args.workers)
+    backtester.prepare(args.start, args.end)
+    picks, _ = backtester.run(args.start, args.end)
+
+    adapter = BacktraderAdapter(store=backtester.store, cash=args.cash, holding_days=args.holding_days)
+    returns, summary = adapter.run(picks)
+
+    print(f"\n📈 backtrader回测 {summary['start']} - {summary['end']}")
+    print(f"股票数: {summary['symbols']}  买入笔数: {summary['trades']}")
+    print(f"期末资产: {summary['final_value']:,.2f}  总收益: {summary['total_return']:.2%}  最大回撤: {summary['max_drawdown']:.2%}")
+
+    os.makedirs(BACKTEST_CONFIG['output_dir'], exist_ok=True)
+    output_file = os.path.join(BACKTEST_CONFIG['output_dir'], f"backtrader_returns_{summary['start']}_{summary['end']}.csv")
+    returns.to_csv(output_file, header=['return'])
+    print(f"💾 日收益序列已保存至: {output_file}（可用 pyfolio.create_returns_tear_sheet 分析）")
+
+
+if __name__ == "__main__":
+    main()
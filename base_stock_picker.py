@@ -11,14 +11,22 @@ import pandas as pd
 from typing import Dict, Tuple
 import datetime
 from datetime import time
-from dotenv import load_dotenv
-
-# 导入数据源
-import qstock as qs
-import tushare as ts
-import akshare as ak
 
 from utils import util
+from utils.data_store import LocalDataStore
+from utils.snapshot_buffer import SnapshotRingBuffer
+from utils.shared_snapshot import SharedSnapshotReader, SharedSnapshotWriter
+from utils.clients import LazyModule, tushare_pro
+from utils.telemetry import call_upstream, record_fallback
+from utils.trading_calendar import trading_calendar
+from config import DEADLINE_CONFIG, SHARED_SNAPSHOT_CONFIG, SNAPSHOT_BUFFER_CONFIG
+
+# 导入数据源（首次使用时才导入）
+qs = LazyModule('qstock')
+ak = LazyModule('akshare')
+
+# ts_pro 未单独赋值时使用共享的 Tushare Pro 客户端
+_SHARED_CLIENT = object()
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +34,18 @@ logger = logging.getLogger(__name__)
 
 os.makedirs('/tmp/itrading', exist_ok=True)
 
+# Tushare daily_basic 全市场每日指标字段（circ_mv/total_mv 单位为万元）
+DAILY_BASIC_FIELDS = 'ts_code,trade_date,circ_mv,total_mv,pe_ttm,turnover_rate_f,volume_ratio'
+
+# call_auction_capture 按交易日保存竞价因子的本地数据集
+AUCTION_FACTORS_DATASET = 'auction_factors'
+
+def _with_source(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    """在行情DataFrame的 attrs['source'] 中记录数据来源"""
+    df.attrs['source'] = source
+    return df
+
+
 class BaseStockPicker:
     """基础股票选择器类"""
     
@@ -69,29 +89,178 @@ class BaseStockPicker:
         self.max_volume_ratio = max_volume_ratio
         self.market_threshold = market_threshold
         
+        # 本地数据存储（缓存每日全市场指标等批量数据）
+        self.data_store = LocalDataStore()
+
+        # 盘中行情快照环形缓冲区（常驻进程中通过 enable_snapshot_buffer 启用）
+        self.snapshot_buffer = None
+        self.snapshot_buffer_capacity = 0
+        self.trend_window_seconds = 300
+        self.momentum_weight = SNAPSHOT_BUFFER_CONFIG['momentum_weight']
+
+        # 共享行情快照：同机多个进程共用一次实时行情获取
+        self.shared_snapshot_reader = None
+        self.shared_snapshot_writer = None
+        if SHARED_SNAPSHOT_CONFIG['enabled']:
+            self.shared_snapshot_reader = SharedSnapshotReader(SHARED_SNAPSHOT_CONFIG['path'])
+            self.shared_snapshot_writer = SharedSnapshotWriter(SHARED_SNAPSHOT_CONFIG['path'])
+        self.shared_snapshot_max_age = SHARED_SNAPSHOT_CONFIG['max_age_seconds']
+
+        # 集合竞价因子（由 call_auction_capture 在9:25写入，或从本地数据集 auction_factors 读取）
+        self.auction_factors = None
+        self.auction_factors_date = None
+
         # 初始化数据源
         self._init_data_sources()
     
     def _init_data_sources(self):
-        """初始化数据源"""
+        """初始化数据源：Tushare Pro 客户端在首次使用 self.ts_pro 时创建，进程内共享（utils/clients.py）"""
+        self._ts_pro = _SHARED_CLIENT
+
+    @property
+    def ts_pro(self):
+        """Tushare Pro 客户端，没有 TUSHARE_TOKEN 时为 None；可以赋值替换（如测试用的假客户端）"""
+        if self._ts_pro is not _SHARED_CLIENT:
+            return self._ts_pro
         try:
-            # 加载环境变量
-            load_dotenv(os.path.expanduser('~/apps/iagent/.env'), verbose=True)
-            
-            # 初始化Tushare
-            tushare_token = os.getenv("TUSHARE_TOKEN")
-            if tushare_token:
-                ts.set_token(tushare_token)
-                self.ts_pro = ts.pro_api()
-                logger.info("Tushare API initialized successfully")
-            else:
-                logger.warning("TUSHARE_TOKEN not found, using alternative data sources")
-                self.ts_pro = None
-                
+            return tushare_pro()
         except Exception as e:
             logger.error(f"Failed to initialize data sources: {e}")
-            self.ts_pro = None
+            return None
+
+    @ts_pro.setter
+    def ts_pro(self, client):
+        self._ts_pro = client
+
+    def enable_snapshot_buffer(self, capacity: int = 240, trend_window_seconds: float = 300,
+                               momentum_weight: float = SNAPSHOT_BUFFER_CONFIG['momentum_weight']):
+        """
+        启用盘中行情快照环形缓冲区，之后每次 record_snapshot 都会写入缓冲区
+        
+        Args:
+            capacity: 保存的快照个数
+            trend_window_seconds: 趋势类指标的时间窗口（秒）
+            momentum_weight: 排序时盘中动量得分计入综合得分的权重
+        """
+        self.snapshot_buffer_capacity = capacity
+        self.trend_window_seconds = trend_window_seconds
+        self.momentum_weight = momentum_weight
+        self.snapshot_buffer = None  # 首个快照到达时按其股票全集分配内存
+
+    def record_snapshot(self, df: pd.DataFrame, timestamp: datetime.datetime = None):
+        """
+        将行情快照写入环形缓冲区（未启用缓冲区时不做任何事）
+        
+        Args:
+            df: 全市场行情DataFrame
+            timestamp: 快照时间，默认当前时间
+        """
+        if self.snapshot_buffer_capacity <= 0 or df.empty or '代码' not in df.columns:
+            return
+        if self.snapshot_buffer is None:
+            self.snapshot_buffer = SnapshotRingBuffer(df['代码'].astype(str), capacity=self.snapshot_buffer_capacity)
+            logger.info(f"行情快照缓冲区已分配: {len(self.snapshot_buffer.codes)} 只股票, "
+                        f"{self.snapshot_buffer_capacity} 个快照, {self.snapshot_buffer.nbytes / 1e6:.1f}MB")
+        self.snapshot_buffer.append(df, timestamp)
+
+    def set_auction_factors(self, factors: pd.DataFrame, trade_date: str = None):
+        """
+        设置集合竞价因子，之后获取的行情会合并这些因子列
         
+        Args:
+            factors: 按代码索引的竞价因子DataFrame
+            trade_date: 因子所属交易日，None 表示适用于任何交易日
+        """
+        self.auction_factors = factors
+        self.auction_factors_date = trade_date
+
+    def load_auction_factors(self, trade_date: str | datetime.date | datetime.datetime) -> pd.DataFrame | None:
+        """
+        trade_date 的集合竞价因子：进程内已设置的同日因子，否则读取 call_auction_capture 保存到
+        本地数据集 auction_factors 的因子，都没有时返回 None
+        """
+        trade_date = util.convert_trade_date(trade_date)
+        if self.auction_factors is not None and self.auction_factors_date in (None, trade_date):
+            return self.auction_factors
+        factors = self.data_store.load(AUCTION_FACTORS_DATASET, trade_date) if trade_date else None
+        if factors is not None:
+            self.set_auction_factors(factors, trade_date)
+        return factors
+
+    def attach_auction_factors(self, df: pd.DataFrame, trade_date=None) -> pd.DataFrame:
+        """
+        按代码把集合竞价因子合并到行情DataFrame，没有竞价因子时原样返回
+
+        Args:
+            df: 行情DataFrame
+            trade_date: 交易日期，提供时使用该交易日的竞价因子（见 load_auction_factors）
+        """
+        auction_factors = self.load_auction_factors(trade_date) if trade_date is not None else self.auction_factors
+        if auction_factors is None or auction_factors.empty or df.empty or '代码' not in df.columns:
+            return df
+        df = df.drop(columns=[col for col in auction_factors.columns if col in df.columns])
+        factors = auction_factors.reindex(df['代码'].astype(str))
+        for col in factors.columns:
+            df[col] = factors[col].to_numpy()
+        return df
+
+    def _read_shared_snapshot(self, trade_date: str) -> pd.DataFrame | None:
+        """读取其他进程刚发布的同一交易日行情快照，没有或已过期时返回None"""
+        if self.shared_snapshot_reader is None:
+            return None
+        try:
+            return self.shared_snapshot_reader.read(trade_date=trade_date, max_age=self.shared_snapshot_max_age)
+        except Exception as e:
+            logger.warning(f"读取共享行情快照失败: {e}")
+            return None
+
+    def _publish_shared_snapshot(self, df: pd.DataFrame, trade_date: str) -> pd.DataFrame:
+        """把实时获取的行情发布为共享快照，返回原DataFrame"""
+        if self.shared_snapshot_writer is not None and not df.empty:
+            try:
+                sequence = self.shared_snapshot_writer.publish(df, trade_date=trade_date)
+                logger.info(f"已发布共享行情快照 #{sequence}")
+            except Exception as e:
+                logger.warning(f"发布共享行情快照失败: {e}")
+        return df
+
+    def get_cached_market_data(self, trade_date: str | datetime.date | datetime.datetime,
+                               max_age: int = DEADLINE_CONFIG['cached_market_max_age']) -> Tuple[pd.DataFrame, str]:
+        """
+        数据源超时时的备用行情：同一交易日的共享快照（不限新旧）-> 本地最近的历史快照（最多早 max_age 个交易日）
+
+        Args:
+            trade_date: 交易日期
+            max_age: 本地历史快照最多早于 trade_date 的交易日数，0 表示只用同一交易日的快照
+
+        Returns:
+            (行情DataFrame, 数据来源)，都没有时为 (空DataFrame, 'none')
+        """
+        trade_date = util.convert_trade_date(trade_date)
+        if self.shared_snapshot_reader is not None:
+            try:
+                df = self.shared_snapshot_reader.read(trade_date=trade_date)
+                if df is not None and not df.empty:
+                    return df, 'shared_snapshot'
+            except Exception as e:
+                logger.warning(f"读取共享行情快照失败: {e}")
+
+        oldest = trading_calendar().previous(trade_date, max_age) if max_age > 0 else trade_date
+        keys = [key for key in self.data_store.keys('market_data') if (oldest or trade_date) <= key <= trade_date]
+        if keys:
+            df = self.data_store.load('market_data', keys[-1])
+            if df is not None and not df.empty:
+                return df, f"local_store:{keys[-1]}"
+
+        logger.warning(f"🔄 没有 {oldest}-{trade_date} 的缓存行情")
+        return pd.DataFrame(), 'none'
+
+    def get_up_ratio_trend(self) -> float:
+        """最近时间窗口内上涨家数占比的变化，缓冲区不足两个快照时返回0"""
+        if self.snapshot_buffer is None or len(self.snapshot_buffer) < 2:
+            return 0.0
+        return self.snapshot_buffer.up_ratio_trend(self.trend_window_seconds)
+
     def get_market_date_tushare(self, trade_date: str | datetime.date | datetime.datetime) -> pd.DataFrame:
         """
         Get market data by trade date using Tushare Pro API.
@@ -112,38 +281,46 @@ class BaseStockPicker:
             raise ValueError("无效的交易日期格式")
         
         # 获取当日股票列表和基本信息
-        stock_basic = self.ts_pro.stock_basic(
+        stock_basic = call_upstream(
+            'tushare', 'stock_basic', self.ts_pro.stock_basic,
             exchange='', 
             list_status='L', 
             fields='ts_code,symbol,name,area,industry,market'
         )
         
         # 获取当日行情数据
-        daily_data = self.ts_pro.daily(
+        is_today = trade_date == datetime.datetime.now().strftime('%Y%m%d')
+        daily_data = call_upstream(
+            'tushare', 'daily', self.ts_pro.daily,
             trade_date=trade_date,
             fields='ts_code,trade_date,close,open,high,low,pre_close,change,pct_chg,vol,amount,turnover_rate'
         )
-        if trade_date != datetime.datetime.now().strftime('%Y%m%d'):
-            return daily_data
-        
-        if daily_data.empty:
+        data_date = trade_date
+
+        if daily_data.empty and is_today:
             logger.info("当日无交易数据，获取最近交易日数据...")
-            last_trade_date = util.last_trading_day(trade_date)
-            daily_data = self.ts_pro.daily(
-                trade_date=last_trade_date,
+            data_date = util.last_trading_day(trade_date)
+            daily_data = call_upstream(
+                'tushare', 'daily', self.ts_pro.daily,
+                trade_date=data_date,
                 fields='ts_code,trade_date,close,open,high,low,pre_close,change,pct_chg,vol,amount,turnover_rate'
             )
             
         # 合并基本信息和行情数据
         df = pd.merge(stock_basic, daily_data, on='ts_code', how='inner')
             
-        # 获取实时数据（如果可用）
-        # 获取资金流向数据作为量比的替代
-        moneyflow = self.ts_pro.moneyflow(
-            trade_date=trade_date,
-            fields='ts_code,buy_sm_vol,sell_sm_vol'
-        )
-        df = pd.merge(df, moneyflow, on='ts_code', how='left')
+        if is_today:
+            # 获取实时数据（如果可用）
+            # 获取资金流向数据作为量比的替代
+            moneyflow = call_upstream(
+                'tushare', 'moneyflow', self.ts_pro.moneyflow,
+                trade_date=trade_date,
+                fields='ts_code,buy_sm_vol,sell_sm_vol'
+            )
+            df = pd.merge(df, moneyflow, on='ts_code', how='left')
+
+        # 按代码合并全市场每日指标（真实流通市值、总市值、PE、量比）
+        df = self._join_daily_basic(df, data_date)
     
         # 标准化列名以匹配现有格式
         df = self._standardize_tushare_columns(df)
@@ -151,6 +328,79 @@ class BaseStockPicker:
         logger.info(f"✅ Tushare Pro API成功获取到 {len(df)} 只股票数据")
         return df
 
+    def get_daily_basic_tushare(self, trade_date: str | datetime.date | datetime.datetime) -> pd.DataFrame:
+        """
+        获取某交易日全市场每日指标（Tushare daily_basic）
+        
+        每个交易日只发起一次批量请求，结果缓存在本地存储中，
+        历史日期再次选股时直接读取本地数据。
+        
+        Args:
+            trade_date: 交易日期，可以是字符串、日期对象或时间戳
+            
+        Returns:
+            包含 ts_code, circ_mv, total_mv, pe_ttm, turnover_rate_f, volume_ratio 的DataFrame
+        """
+        if not self.ts_pro:
+            return pd.DataFrame()
+
+        trade_date = util.convert_trade_date(trade_date)
+        if not trade_date:
+            raise ValueError("无效的交易日期格式")
+
+        try:
+            return self.data_store.get_or_fetch(
+                'daily_basic', trade_date,
+                lambda: call_upstream('tushare', 'daily_basic', self.ts_pro.daily_basic,
+                                      trade_date=trade_date, fields=DAILY_BASIC_FIELDS)
+            )
+        except Exception as e:
+            logger.error(f"获取 {trade_date} 每日指标失败: {e}")
+            return pd.DataFrame()
+
+    def _join_daily_basic(self, df: pd.DataFrame, trade_date: str) -> pd.DataFrame:
+        """
+        按ts_code合并每日指标，换算为标准列（流通市值、总市值、市盈率、量比）
+        
+        当日指标尚未发布时（盘中），退回使用上一交易日的市值和PE，
+        量比、自由流通换手率等当日指标保持缺失而不使用昨日数值。
+        
+        Args:
+            df: 含ts_code列的行情数据
+            trade_date: 行情数据对应的交易日期
+            
+        Returns:
+            合并后的DataFrame
+        """
+        if df.empty or 'ts_code' not in df.columns:
+            return df
+
+        daily_basic = self.get_daily_basic_tushare(trade_date)
+        same_day = True
+        if daily_basic.empty:
+            last_trade_date = util.last_trading_day(trade_date)
+            if last_trade_date:
+                logger.info(f"{trade_date} 每日指标未发布，使用 {last_trade_date} 的市值和PE")
+                daily_basic = self.get_daily_basic_tushare(last_trade_date)
+                same_day = False
+
+        if daily_basic.empty:
+            logger.warning("每日指标不可用，市值和PE将使用估算值")
+            return df
+
+        basic = pd.DataFrame({'ts_code': daily_basic['ts_code']})
+        # circ_mv/total_mv 单位为万元，换算为元
+        basic['流通市值'] = pd.to_numeric(daily_basic['circ_mv'], errors='coerce') * 1e4
+        basic['总市值'] = pd.to_numeric(daily_basic['total_mv'], errors='coerce') * 1e4
+        basic['市盈率'] = pd.to_numeric(daily_basic['pe_ttm'], errors='coerce')
+        if same_day:
+            basic['量比'] = pd.to_numeric(daily_basic['volume_ratio'], errors='coerce')
+            basic['换手率(自由流通)'] = pd.to_numeric(daily_basic['turnover_rate_f'], errors='coerce')
+
+        df = pd.merge(df, basic.drop_duplicates('ts_code'), on='ts_code', how='left')
+        logger.info(f"✅ 已合并每日指标 {len(basic)} 条")
+        return df
+
 
     def get_market_data(self, trade_date: str | datetime.date | datetime.datetime) -> pd.DataFrame:
         """
@@ -162,13 +412,14 @@ class BaseStockPicker:
             trade_date: 交易日期，可以是字符串、日期对象或时间戳
 
         Returns:
-            包含股票数据的DataFrame
+            包含股票数据的DataFrame，attrs['source'] 为数据来源（shared_snapshot、qstock、akshare、tushare，
+            所有数据源都不可用时为 mock）
         """
 
         trade_date = util.convert_trade_date(trade_date)
         if trade_date < datetime.datetime.now().strftime('%Y%m%d'):
             logger.info(f"获取 {trade_date} 的市场数据 by tushare API and return.")
-            return self.get_market_data_tushare(trade_date)
+            return _with_source(self.get_market_date_tushare(trade_date), 'tushare')
         
 
         if time(9, 30) <= datetime.datetime.now().time() <= time(11, 30) or \
@@ -179,36 +430,48 @@ class BaseStockPicker:
               time(15, 0) <= datetime.datetime.now().time() <= time(16, 30):
             logger.warning("pre-market(8:00 - before 9:30) or post-market(after 15:00 - 16:30) will init or sync stock data, APIs will connect close error.")
 
-         
+        if time(9, 15) <= datetime.datetime.now().time() < time(9, 25):
+            logger.info("集合竞价阶段，最新价为虚拟撮合价，成交量为虚拟匹配量")
+
+        # 其他进程刚获取过同一交易日的行情时直接复用共享快照
+        df = self._read_shared_snapshot(trade_date)
+        if df is not None:
+            logger.info(f"✅ 复用共享行情快照 #{self.shared_snapshot_reader.sequence}: {len(df)} 只股票")
+            return _with_source(df, 'shared_snapshot')
+
         # 第1优先级：使用Qstock API
         try:
             logger.info("第1优先级：尝试使用Qstock API获取市场数据...")
-            df = qs.market_realtime()
+            df = call_upstream('qstock', 'market_realtime', qs.market_realtime)
             logger.info(f"✅ Qstock API成功获取到 {len(df)} 只股票的实时数据")
-            return df
+            return _with_source(self._publish_shared_snapshot(df, trade_date), 'qstock')
         except Exception as e2:
             logger.error(f"❌ Qstock API失败: {e2}")
+            record_fallback('qstock', 'market_realtime', 'akshare')
             
         # 第2优先级：使用Akshare API
         try:
             logger.info("第2优先级：尝试使用Akshare API获取市场数据...")
-            df = ak.stock_zh_a_spot() # stock_zh_a_spot_em() cause connect closed error.
+            df = call_upstream('akshare', 'stock_zh_a_spot', ak.stock_zh_a_spot) # stock_zh_a_spot_em() cause connect closed error.
             logger.info(f"✅ Akshare API成功获取到 {len(df)} 只股票数据")
             
             # 标准化akshare的列名以匹配格式
             df = self._standardize_akshare_columns(df)
-            return df
+            return _with_source(self._publish_shared_snapshot(df, trade_date), 'akshare')
         except Exception as e:
             logger.error(f"❌ Akshare API失败: {e}")
+            record_fallback('akshare', 'stock_zh_a_spot', 'tushare')
 
         try:
             logger.info("第3优先级：尝试使用Tushare API获取市场数据...")
-            return self.get_market_date_tushare(trade_date)
+            return _with_source(self._publish_shared_snapshot(self.get_market_date_tushare(trade_date), trade_date),
+                                'tushare')
         except Exception as e:
             logger.error(f"❌ Tushare Pro API失败: {e}")
+            record_fallback('tushare', 'daily', 'mock')
             # 最后备用：生成模拟数据用于演示/测试
             logger.warning("🔄 所有API数据源不可用，使用模拟数据进行演示/测试")
-            return self._generate_mock_data()
+            return _with_source(self._generate_mock_data(), 'mock')
             
     
     def _generate_mock_data(self) -> pd.DataFrame:
@@ -227,7 +490,7 @@ class BaseStockPicker:
             ['000858', '五粮液', 165.30, 168.20, 170.00, 164.50, 166.80, 1.2, 1.5, 22.1, 500000, 8.41e9, 163.45, 6.5e11, 6.2e11],
             ['600036', '招商银行', 45.80, 46.20, 46.50, 45.60, 45.95, 0.8, 1.1, 9.2, 300000, 1.38e9, 45.75, 1.8e12, 1.7e12],
             ['600519', '贵州茅台', 1680.50, 1705.30, 1720.00, 1675.20, 1690.80, 0.3, 2.1, 35.8, 100000, 1.71e10, 1672.40, 2.1e12, 2.0e12],
-            ['000858', '比亚迪', 280.40, 285.60, 290.00, 278.50, 282.30, 2.5, 1.8, 18.6, 600000, 1.71e9, 277.80, 8.2e11, 7.8e11],
+            ['002594', '比亚迪', 280.40, 285.60, 290.00, 278.50, 282.30, 2.5, 1.8, 18.6, 600000, 1.71e9, 277.80, 8.2e11, 7.8e11],
             ['002415', '海康威视', 35.60, 36.20, 36.80, 35.40, 35.85, 1.5, 1.3, 15.2, 400000, 1.45e9, 35.45, 3.4e11, 3.2e11],
             ['300059', '东方财富', 18.90, 19.20, 19.50, 18.70, 19.10, 3.2, 2.1, 28.5, 2000000, 3.84e9, 18.75, 2.9e11, 2.8e11],
             ['600050', '中国联通', 5.80, 5.90, 6.00, 5.75, 5.85, 2.8, 1.4, 18.9, 1500000, 8.85e8, 5.75, 1.8e11, 1.7e11],
@@ -302,6 +565,8 @@ class BaseStockPicker:
             is_good_market = up_ratio > self.market_threshold
             
             logger.info(f"市场上涨家数占比: {up_ratio:.2%}")
+            if self.snapshot_buffer is not None and len(self.snapshot_buffer) >= 2:
+                logger.info(f"近{self.trend_window_seconds / 60:.0f}分钟上涨占比变化: {self.get_up_ratio_trend():+.2%}")
             if is_good_market:
                 logger.info("市场环境良好，适合选股")
             else:
@@ -809,8 +1074,10 @@ class BaseStockPicker:
             'turnover_rate': '换手率'
         }
         
-        # 重命名列
+        # 重命名列（同时存在ts_code和symbol时保留symbol，避免出现重复的代码列）
         df_clean = df.copy()
+        if 'ts_code' in df_clean.columns and 'symbol' in df_clean.columns:
+            df_clean = df_clean.drop(columns=['ts_code'])
         for old_col, new_col in tushare_column_mapping.items():
             if old_col in df_clean.columns:
                 df_clean = df_clean.rename(columns={old_col: new_col})
@@ -823,6 +1090,14 @@ class BaseStockPicker:
         if '涨幅' in df_clean.columns:
             df_clean['涨幅'] = pd.to_numeric(df_clean['涨幅'], errors='coerce')
         
+        # 自由流通换手率补充缺失的换手率
+        if '换手率(自由流通)' in df_clean.columns:
+            if '换手率' in df_clean.columns:
+                df_clean['换手率'] = pd.to_numeric(df_clean['换手率'], errors='coerce').fillna(df_clean['换手率(自由流通)'])
+            else:
+                df_clean['换手率'] = df_clean['换手率(自由流通)']
+        
+        # 以下为每日指标缺失时的估算值
         # 估算市盈率（简化计算）
         if '最新' in df_clean.columns and '市盈率' not in df_clean.columns:
             df_clean['市盈率'] = 15.0  # 使用平均市盈率
@@ -830,10 +1105,13 @@ class BaseStockPicker:
         # 估算量比（简化处理）
         if '量比' not in df_clean.columns:
             df_clean['量比'] = 1.0
+        else:
+            df_clean['量比'] = pd.to_numeric(df_clean['量比'], errors='coerce').fillna(1.0)
         
         # 估算总市值和流通市值（需要获取股本数据，这里简化处理）
         if '总市值' not in df_clean.columns and '最新' in df_clean.columns:
             df_clean['总市值'] = 1e10  # 简化为100亿
+        if '流通市值' not in df_clean.columns and '最新' in df_clean.columns:
             df_clean['流通市值'] = 8e9  # 简化为80亿
         
         return df_clean
@@ -0,0 +1,289 @@
+"""
+选股/分析性能基准
+Benchmark Suite
+
+在 utils/synthetic_market 生成的合成全市场数据（1千-2万只股票）上测量选股和分析的热点函数：
+filter_risk_stocks、apply_selection_criteria（收盘后/盘中两条路径）、enhanced_ranking、
+calculate_technical_indicators（多日K线面板，逐只股票）、新闻情绪打分和交易日历查询。
+
+每项重复执行取最优和中位耗时，连同 git 提交号写入SQLite结果表；与同一台机器上其他提交的最近一次结果比较，
+中位耗时变慢超过阈值即报告为性能回退。
+
+    python benchmark.py                       # 默认规模，保存并与上一个提交比较
+    python benchmark.py --sizes 1000 --repeat 3 --only filter_risk_stocks
+    python benchmark.py --fail-on-regression  # 有回退时返回非0，可用于CI
+    python benchmark.py --cassette /tmp/morning.cassette --trade-date 20250708 --only pick_and_analyze_stocks.replay
+
+--cassette 指定 utils/cassette.py 录制的磁带时，增加完整统一选股AI分析流程的基准：所有上游调用（行情、
+K线、新闻、Gemini）离线回放，不需要网络和API key；--replay-latency 按录制时的耗时等待，测量包含网络等待的端到端耗时。
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import platform
+import subprocess
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_stock_picker import AdvancedStockPicker
+from ai_stock_analyzer import AIStockAnalyzer
+from config import BENCHMARK_CONFIG
+from unify_stock_pick_ai_analyzer import UnifiedStockPickAIAnalyzer
+from utils import util
+from utils.cassette import use_cassette
+from utils.synthetic_market import generate_bar_panel, generate_news, generate_universe
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ['name', 'size', 'repeat', 'best_ms', 'median_ms', 'rows_in', 'rows_out']
+
+
+def current_commit(repo_dir: str = None) -> Tuple[str, bool]:
+    """当前 git 提交号及工作区是否有未提交的修改，不在git仓库中时返回 ('unknown', False)"""
+    repo_dir = repo_dir or os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def _rows(value) -> Optional[int]:
+    if isinstance(value, (pd.DataFrame, pd.Series, list)):
+        return len(value)
+    return None
+
+
+def time_call(fn: Callable, repeat: int) -> Tuple[List[float], object]:
+    """执行 repeat 次，返回每次耗时（毫秒）和最后一次的结果"""
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+class BenchmarkSuite:
+    """合成数据上的性能基准"""
+
+    def __init__(self,
+                 sizes: Sequence[int] = BENCHMARK_CONFIG['sizes'],
+                 repeat: int = BENCHMARK_CONFIG['repeat'],
+                 bar_stocks: int = BENCHMARK_CONFIG['bar_stocks'],
+                 bar_days: int = BENCHMARK_CONFIG['bar_days'],
+                 news_items: int = BENCHMARK_CONFIG['news_items'],
+                 seed: int = 0,
+                 cassette: str = None,
+                 trade_date: str = None,
+                 replay_latency: bool = False):
+        """
+        初始化基准
+
+        Args:
+            sizes: 全市场快照的股票数量（每个规模分别测量横截面函数）
+            repeat: 每项重复次数
+            bar_stocks: 技术指标基准的股票数（逐只计算，耗时与股票数成正比）
+            bar_days: 每只股票的K线天数
+            news_items: 情绪打分的新闻条数
+            seed: 随机种子
+            cassette: 录制的上游调用磁带，指定时增加完整流程的回放基准
+            trade_date: 回放流程的交易日期（应与录制时一致），默认为今天
+            replay_latency: 回放时按录制的耗时等待
+        """
+        self.sizes = list(sizes)
+        self.repeat = repeat
+        self.bar_stocks = bar_stocks
+        self.bar_days = bar_days
+        self.news_items = news_items
+        self.seed = seed
+        self.cassette = cassette
+        self.trade_date = trade_date
+        self.replay_latency = replay_latency
+        self.picker = AdvancedStockPicker()
+        self.analyzer = AIStockAnalyzer()
+
+    def cases(self) -> Iterator[Tuple[str, int, Callable, int]]:
+        """依次生成 (名称, 规模, 无参函数, 输入行数)，数据在此准备，不计入耗时"""
+        for size in self.sizes:
+            universe = generate_universe(size, seed=self.seed)
+            intraday = universe.rename(columns={'最新': '最新价'})  # 盘中行情走完整的量价筛选
+            yield 'filter_risk_stocks', size, lambda df=universe: self.picker.filter_risk_stocks(df), size
+            yield 'apply_selection_criteria', size, lambda df=universe: self.picker.apply_selection_criteria(df), size
+            yield ('apply_selection_criteria.intraday', size,
+                   lambda df=intraday: self.picker.apply_selection_criteria(df), size)
+
+            # 排序在整个风险过滤后的市场上测量（实际选股后只剩几十只，测不出规模效应）
+            candidates = self.picker.filter_risk_stocks(universe).dropna(subset=['量比', '换手率', '涨幅', '市盈率'])
+            yield ('enhanced_ranking', size, lambda df=candidates: self.picker.enhanced_ranking(df),
+                   len(candidates))
+
+        codes = generate_universe(self.bar_stocks, seed=self.seed)['代码']
+        panel = generate_bar_panel(codes, days=self.bar_days, seed=self.seed)
+        bars = [group.reset_index(drop=True) for _, group in panel.groupby('code', sort=False)]
+        yield ('calculate_technical_indicators', self.bar_stocks,
+               lambda: [self.analyzer.calculate_technical_indicators(data) for data in bars], len(panel))
+
+        news = generate_news(self.news_items, seed=self.seed)
+        yield ('calculate_advanced_sentiment_analysis', self.news_items,
+               lambda: self.analyzer.calculate_advanced_sentiment_analysis(news), self.news_items)
+
+        # 回测中逐日查询前后交易日
+        dates = pd.date_range('20200101', '20251231').strftime('%Y%m%d').tolist()
+        yield 'util.next_trading_day', len(dates), lambda: [util.next_trading_day(day) for day in dates], len(dates)
+
+        if self.cassette:
+            yield 'pick_and_analyze_stocks.replay', 0, self.replay_pipeline, None
+
+    def replay_pipeline(self) -> pd.DataFrame:
+        """在磁带回放下执行一次完整的统一选股AI分析（每次重新开始回放，分析器在回放中创建）"""
+        with use_cassette(self.cassette, 'replay', emulate_latency=self.replay_latency):
+            enhanced_stocks, _ = UnifiedStockPickAIAnalyzer().pick_and_analyze_stocks(trade_date=self.trade_date)
+        return enhanced_stocks
+
+    def run(self, only: Sequence[str] = None) -> pd.DataFrame:
+        """
+        执行基准
+
+        Args:
+            only: 只执行这些名称的基准，默认全部
+
+        Returns:
+            每项一行：name/size/repeat/best_ms/median_ms/rows_in/rows_out
+        """
+        rows = []
+        for name, size, fn, rows_in in self.cases():
+            if only and name not in only:
+                continue
+            timings, result = time_call(fn, self.repeat)
+            rows.append({'name': name, 'size': size, 'repeat': self.repeat, 'best_ms': min(timings),
+                         'median_ms': float(np.median(timings)), 'rows_in': rows_in, 'rows_out': _rows(result)})
+            logger.info(f"{name} [{size}]: 中位 {rows[-1]['median_ms']:.2f}ms, 最优 {rows[-1]['best_ms']:.2f}ms")
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+class BenchmarkResultStore:
+    """基准结果表（SQLite），每个提交、每项基准一行"""
+
+    def __init__(self, db_path: str = BENCHMARK_CONFIG['db_path']):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS benchmark_results (
+                    commit_id TEXT NOT NULL,
+                    dirty INTEGER NOT NULL,
+                    machine TEXT NOT NULL,
+                    python TEXT,
+                    created_at TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    repeat INTEGER,
+                    best_ms REAL,
+                    median_ms REAL,
+                    rows_in INTEGER,
+                    rows_out INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_benchmark_case ON benchmark_results (machine, name, size, created_at)")
+
+    def insert(self, results: pd.DataFrame, commit: str, dirty: bool = False, machine: str = None):
+        """写入一次基准结果"""
+        machine = machine or platform.node()
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        rows = [(commit, int(dirty), machine, platform.python_version(), created_at, r.name, int(r.size), int(r.repeat),
+                 float(r.best_ms), float(r.median_ms), None if pd.isna(r.rows_in) else int(r.rows_in),
+                 None if pd.isna(r.rows_out) else int(r.rows_out))
+                for r in results.itertuples(index=False)]
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("INSERT INTO benchmark_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def history(self, name: str = None, size: int = None, machine: str = None) -> pd.DataFrame:
+        """按时间顺序查询历史结果"""
+        sql, args = "SELECT * FROM benchmark_results WHERE machine = ?", [machine or platform.node()]
+        if name:
+            sql += " AND name = ?"
+            args.append(name)
+        if size:
+            sql += " AND size = ?"
+            args.append(size)
+        with sqlite3.connect(self.db_path) as conn:
+            return pd.read_sql_query(sql + " ORDER BY created_at", conn, params=args)
+
+    def baseline(self, exclude_commit: str, machine: str = None) -> pd.DataFrame:
+        """同一台机器上其他提交的最近一次结果（每项基准一行），作为比较基线"""
+        history = self.history(machine=machine)
+        history = history[history['commit_id'] != exclude_commit]
+        return history.groupby(['name', 'size'], as_index=False).last()
+
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame,
+            threshold: float = BENCHMARK_CONFIG['regression_threshold'],
+            min_delta_ms: float = BENCHMARK_CONFIG['min_regression_ms']) -> pd.DataFrame:
+    """
+    与基线比较中位耗时
+
+    Returns:
+        results 增加 baseline_commit/baseline_ms/change 列和 regression 标记；
+        变慢比例超过 threshold 且绝对值超过 min_delta_ms（排除计时噪声）时为回退
+    """
+    merged = results.merge(baseline[['name', 'size', 'commit_id', 'median_ms']].rename(
+        columns={'commit_id': 'baseline_commit', 'median_ms': 'baseline_ms'}), on=['name', 'size'], how='left')
+    merged['change'] = merged['median_ms'] / merged['baseline_ms'] - 1
+    merged['regression'] = ((merged['change'] > threshold)
+                            & (merged['median_ms'] - merged['baseline_ms'] > min_delta_ms)).fillna(False)
+    return merged
+
+
+def main():
+    """主函数 - 执行基准并与上一个提交比较"""
+    parser = argparse.ArgumentParser(description='选股/分析性能基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_CONFIG['sizes'], help='全市场股票数量')
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_CONFIG['repeat'], help='每项重复次数')
+    parser.add_argument('--only', nargs='+', default=None, help='只执行这些基准')
+    parser.add_argument('--cassette', default=None, help='回放此磁带，增加完整流程基准')
+    parser.add_argument('--trade-date', default=None, help='回放流程的交易日期，格式YYYYMMDD')
+    parser.add_argument('--replay-latency', action='store_true', help='回放时按录制的耗时等待')
+    parser.add_argument('--no-save', action='store_true', help='不写入结果表')
+    parser.add_argument('--fail-on-regression', action='store_true', help='有性能回退时返回非0')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)  # 屏蔽选股过程中的逐步日志
+    results = BenchmarkSuite(sizes=args.sizes, repeat=args.repeat, cassette=args.cassette,
+                             trade_date=args.trade_date, replay_latency=args.replay_latency).run(only=args.only)
+
+    store = BenchmarkResultStore()
+    commit, dirty = current_commit()
+    report = compare(results, store.baseline(exclude_commit=commit))
+    print(f"📏 提交 {commit}{' (有未提交修改)' if dirty else ''}")
+    print(report[['name', 'size', 'best_ms', 'median_ms', 'baseline_ms', 'change', 'rows_out']]
+          .to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+    if not args.no_save:
+        store.insert(results, commit, dirty)
+        print(f"💾 结果已保存至: {store.db_path}")
+
+    regressions = report[report['regression']]
+    if not regressions.empty:
+        for r in regressions.itertuples():
+            print(f"⚠️ 性能回退: {r.name} [{r.size}] {r.baseline_ms:.2f}ms -> {r.median_ms:.2f}ms "
+                  f"({r.change:+.0%}, 基线 {r.baseline_commit})")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
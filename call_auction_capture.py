@@ -0,0 +1,214 @@
+"""
+集合竞价采集
+Call-Auction Capture
+
+在开盘集合竞价阶段（默认 9:15-9:25）按固定间隔采样全市场竞价快照，保存到定长的时间序列数组中，
+9:25 撮合完成时向量化计算竞价因子（竞价涨幅、竞价量比、委托不平衡、竞价涨幅变化），
+挂到选股器上，并按交易日保存到本地数据集 auction_factors。之后同一交易日任何进程中的
+select_stocks_advanced 都会合并这些因子列，并在排序时计入竞价得分（见 AdvancedStockPicker.apply_auction_score）。
+"""
+
+import os
+import sys
+import time as time_module
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_stock_picker import AdvancedStockPicker
+from base_stock_picker import AUCTION_FACTORS_DATASET
+from config import AUCTION_CAPTURE_CONFIG
+from utils import util
+from utils.snapshot_buffer import SnapshotRingBuffer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 竞价阶段保存的字段：最新为虚拟撮合价，成交量为虚拟匹配量
+AUCTION_FIELDS = ('最新', '昨收', '成交量', '买一量', '卖一量', '委比')
+
+# 输出的竞价因子列
+AUCTION_FACTOR_COLUMNS = ['竞价涨幅', '竞价量比', '委托不平衡', '竞价涨幅变化']
+
+
+def _parse_time(value: str):
+    """解析 'HH:MM' 格式的时间"""
+    return datetime.strptime(value, '%H:%M').time()
+
+
+class CallAuctionCapture:
+    """集合竞价快照采集与竞价因子计算"""
+
+    def __init__(self,
+                 picker: AdvancedStockPicker = None,
+                 poll_interval: float = AUCTION_CAPTURE_CONFIG['poll_interval'],
+                 start_time: str = AUCTION_CAPTURE_CONFIG['start_time'],
+                 end_time: str = AUCTION_CAPTURE_CONFIG['end_time'],
+                 capacity: int = AUCTION_CAPTURE_CONFIG['capacity'],
+                 drift_window_seconds: float = AUCTION_CAPTURE_CONFIG['drift_window_seconds']):
+        """
+        初始化竞价采集
+
+        Args:
+            picker: 选股器实例，用于获取行情并接收竞价因子
+            poll_interval: 采样间隔（秒）
+            start_time: 开始采样时间 'HH:MM'
+            end_time: 结束采样时间 'HH:MM'
+            capacity: 最多保存的竞价快照个数
+            drift_window_seconds: 竞价涨幅变化的时间窗口（秒），默认覆盖9:20之后不可撤单阶段
+        """
+        self.picker = picker or AdvancedStockPicker(market_mode='normal')
+        self.poll_interval = poll_interval
+        self.start_time = _parse_time(start_time)
+        self.end_time = _parse_time(end_time)
+        self.capacity = capacity
+        self.drift_window_seconds = drift_window_seconds
+
+        self.buffer: Optional[SnapshotRingBuffer] = None
+        self.reference_volume: Optional[pd.Series] = None
+        self.factors: pd.DataFrame = pd.DataFrame()
+
+    def set_reference_volume(self, volume: pd.Series):
+        """设置计算竞价量比的参考成交量（按代码索引，通常为上一交易日成交量）"""
+        volume = pd.to_numeric(volume, errors='coerce')
+        volume.index = volume.index.astype(str)
+        self.reference_volume = volume
+
+    def load_reference_volume(self, trade_date=None):
+        """从上一交易日行情加载参考成交量"""
+        ref_date = util.last_trading_day(util.convert_trade_date(trade_date or datetime.now()))
+        df = self.picker.get_market_data(trade_date=ref_date)
+        if df.empty or '成交量' not in df.columns:
+            logger.warning(f"无法获取 {ref_date} 的成交量，竞价量比将为空")
+            return
+        self.set_reference_volume(df.set_index(df['代码'].astype(str))['成交量'])
+
+    def record(self, df: pd.DataFrame, timestamp: datetime = None):
+        """
+        写入一个竞价快照
+
+        Args:
+            df: 全市场竞价行情DataFrame
+            timestamp: 快照时间，默认当前时间
+        """
+        if df is None or df.empty or '代码' not in df.columns:
+            logger.warning("竞价快照为空，跳过")
+            return
+        if self.buffer is None:
+            # 竞价因子只需要比率，float32 足够且内存减半
+            self.buffer = SnapshotRingBuffer(df['代码'].astype(str), fields=AUCTION_FIELDS,
+                                             capacity=self.capacity, dtype=np.float32)
+            logger.info(f"竞价快照存储已分配: {len(self.buffer.codes)} 只股票, "
+                        f"{self.capacity} 个快照, {self.buffer.nbytes / 1e6:.1f}MB")
+        self.buffer.append(df, timestamp)
+
+    def compute_factors(self) -> pd.DataFrame:
+        """
+        基于已采集的竞价快照向量化计算竞价因子
+
+        Returns:
+            按代码索引的竞价因子DataFrame
+        """
+        if self.buffer is None or len(self.buffer) == 0:
+            return pd.DataFrame(columns=AUCTION_FACTOR_COLUMNS)
+
+        buffer = self.buffer
+        latest = {field: buffer.last(field, 1)[0].astype(np.float64) for field in AUCTION_FIELDS}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 竞价涨幅：虚拟撮合价相对昨收
+            prev_close = latest['昨收']
+            gap = np.where(prev_close > 0, (latest['最新'] - prev_close) / prev_close * 100, np.nan)
+
+            # 竞价量比：虚拟匹配量相对参考成交量
+            if self.reference_volume is not None:
+                reference = self.reference_volume.reindex(buffer.codes).to_numpy(dtype=np.float64)
+                volume_ratio = np.where(reference > 0, latest['成交量'] / reference, np.nan)
+            else:
+                volume_ratio = np.full(len(buffer.codes), np.nan)
+
+            # 委托不平衡：优先用买一量/卖一量，缺失时用委比
+            bid, ask = latest['买一量'], latest['卖一量']
+            total = bid + ask
+            imbalance = np.where(total > 0, (bid - ask) / total, latest['委比'] / 100)
+
+            # 竞价涨幅变化：窗口内虚拟撮合价的变化
+            drift_price = buffer.last('最新', max(buffer.snapshots_within(self.drift_window_seconds), 1)).astype(np.float64)
+            drift = np.where(prev_close > 0, (drift_price[-1] - drift_price[0]) / prev_close * 100, np.nan)
+
+        self.factors = pd.DataFrame({
+            '竞价涨幅': gap,
+            '竞价量比': volume_ratio,
+            '委托不平衡': imbalance,
+            '竞价涨幅变化': drift,
+        }, index=buffer.codes)
+        return self.factors
+
+    def publish_factors(self, trade_date=None) -> pd.DataFrame:
+        """
+        计算竞价因子，挂到选股器上并保存到选股器的本地数据存储（数据集 auction_factors，键为交易日）
+
+        Args:
+            trade_date: 竞价所属交易日，默认今天
+        """
+        trade_date = util.convert_trade_date(trade_date or datetime.now())
+        factors = self.compute_factors()
+        self.picker.set_auction_factors(factors, trade_date)
+        if not factors.empty:
+            path = self.picker.data_store.save(AUCTION_FACTORS_DATASET, trade_date, factors)
+            logger.info(f"竞价因子已保存: {path}")
+        logger.info(f"竞价因子已就绪: {len(factors)} 只股票")
+        return factors
+
+    def run(self) -> pd.DataFrame:
+        """在竞价时间窗口内循环采样，结束时计算竞价因子"""
+        logger.info(f"集合竞价采集启动: {self.start_time.strftime('%H:%M')}-{self.end_time.strftime('%H:%M')}, "
+                    f"间隔 {self.poll_interval}s")
+
+        if self.reference_volume is None:
+            try:
+                self.load_reference_volume()
+            except Exception as e:
+                logger.error(f"加载参考成交量失败: {e}")
+
+        while datetime.now().time() < self.start_time:
+            time_module.sleep(min(self.poll_interval, 1.0))
+
+        # 撮合时刻（end_time）之后的快照不再是竞价数据
+        while datetime.now().time() < self.end_time:
+            started = time_module.monotonic()
+            try:
+                self.record(self.picker.get_market_data(trade_date=datetime.now()))
+            except Exception as e:
+                logger.error(f"竞价快照采集失败: {e}")
+
+            elapsed = time_module.monotonic() - started
+            time_module.sleep(max(0.0, self.poll_interval - elapsed))
+
+        logger.info(f"集合竞价采集结束，共 {len(self.buffer) if self.buffer else 0} 个快照")
+        return self.publish_factors()
+
+
+def main():
+    """主函数 - 采集集合竞价，保存并输出竞价因子"""
+    parser = argparse.ArgumentParser(description='集合竞价采集')
+    parser.add_argument('--interval', type=float, default=AUCTION_CAPTURE_CONFIG['poll_interval'], help='采样间隔（秒）')
+    parser.add_argument('--start', default=AUCTION_CAPTURE_CONFIG['start_time'], help='开始时间 HH:MM')
+    parser.add_argument('--end', default=AUCTION_CAPTURE_CONFIG['end_time'], help='结束时间 HH:MM')
+    parser.add_argument('--top', type=int, default=20, help='显示竞价涨幅前N只股票')
+    args = parser.parse_args()
+
+    capture = CallAuctionCapture(poll_interval=args.interval, start_time=args.start, end_time=args.end)
+    factors = capture.run()
+    if not factors.empty:
+        print(factors.sort_values('竞价涨幅', ascending=False).head(args.top).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -104,3 +104,195 @@ OUTPUT_CONFIG = {
         '换手率', '量比', '流通市值'
     ]
 }
+
+# 盘中滚动选股守护进程配置
+INTRADAY_DAEMON_CONFIG = {
+    'poll_interval': 5,         # 行情轮询间隔（秒）
+    'start_time': '09:25',      # 开始轮询时间
+    'end_time': '09:45',        # 结束轮询时间
+    'max_stocks': 8,            # 每次滚动选股数量
+}
+
+# 盘中行情快照环形缓冲区配置
+SNAPSHOT_BUFFER_CONFIG = {
+    'capacity': 240,              # 保存的快照个数（5秒间隔约20分钟）
+    'trend_window_seconds': 300,  # 计算上涨占比趋势、价格/成交量加速的时间窗口（秒）
+    'momentum_weight': 0.2,       # 盘中动量得分（窗口内价格变化和成交量加速）计入综合得分的权重
+}
+
+# 开盘前预热（预筛选候选池）配置
+WARM_START_CONFIG = {
+    'output_dir': '/tmp/itrading/warm_start',  # 预热文件目录
+    'price_margin': 0.1,        # 价格边界放宽比例（覆盖开盘涨跌停范围），市值边界不放宽
+}
+
+# 共享行情快照（内存映射文件，多进程共用一次行情获取）配置，默认关闭
+SHARED_SNAPSHOT_CONFIG = {
+    'enabled': False,           # 同机多个选股进程需要共用行情时开启
+    'path': '/tmp/itrading/shared/market_snapshot.bin',  # 共享快照文件
+    'max_age_seconds': 5,       # 快照在该秒数内视为最新，直接复用不再请求API
+}
+
+# 集合竞价采集配置
+AUCTION_CAPTURE_CONFIG = {
+    'poll_interval': 5,         # 采样间隔（秒）
+    'start_time': '09:15',      # 竞价开始
+    'end_time': '09:25',        # 竞价撮合
+    'capacity': 150,            # 最多保存的竞价快照个数（10分钟/5秒=120）
+    'drift_window_seconds': 300,  # 竞价涨幅变化窗口，覆盖9:20之后不可撤单阶段
+    'score_weight': 0.2,        # 竞价得分计入综合得分的权重（0 表示只合并因子列，不参与排序）
+}
+
+# 历史回测配置
+BACKTEST_CONFIG = {
+    'horizons': [1, 3, 5],      # 远期收益的持有交易日数
+    'max_stocks': 8,            # 每日最多选股数量
+    'workers': None,            # 并行进程数，None为CPU核数
+    'output_dir': '/tmp/itrading/backtest',
+}
+
+# 参数扫描配置（网格中的键与 config_overrides 一致，模式调整用 'adjustments.<模式>.<参数>'）
+SWEEP_CONFIG = {
+    'db_path': '/tmp/itrading/backtest/sweep.db',  # 扫描结果SQLite表
+    'batch_size': 20,           # 每个任务评估的参数组合数
+    'param_space': {
+        'min_market_cap': [2e9, 3e9, 5e9],
+        'min_price': [3, 5],
+        'min_turnover': [2, 3, 5],
+        'min_gain': [0.5, 1, 2],
+        'max_gain': [5, 7, 9],
+        'min_volume_ratio': [1.2, 1.5, 2],
+        'adjustments.bull_market.max_gain': [8, 10],
+    },
+}
+
+# 滚动（walk-forward）参数优化配置
+WALK_FORWARD_CONFIG = {
+    'train_days': 120,          # 样本内窗口交易日数
+    'test_days': 20,            # 样本外窗口交易日数（窗口滚动步长）
+    'objective': 'mean_return', # 优化目标: mean_return / hit_rate / cumulative_return
+    'min_picks': 10,            # 样本内选股数不足时保留默认参数
+    'schedule_path': '/tmp/itrading/backtest/parameter_schedule.json',  # 参数时间表
+    'param_space': {            # 每个市场模式分别优化的阈值
+        'min_gain': [0.5, 1, 2, 3],
+        'max_gain': [5, 7, 9],
+        'min_turnover': [2, 3, 5],
+        'min_volume_ratio': [1.2, 1.5, 2],
+    },
+}
+
+# 个股研报事件选股配置（东方财富研报接口）
+RESEARCH_REPORT_CONFIG = {
+    'api_url': 'http://reportapi.eastmoney.com/report/list',
+    'page_size': 100,           # 每页研报数
+    'max_workers': 4,           # 并发抓取页数上限
+    'timeout': 10,              # 单页请求超时（秒）
+    'retries': 2,               # 单页失败重试次数
+    'window_days': 30,          # 个股研报数统计窗口（自然日）
+    'rating': '买入',           # 选取的研报评级
+    'db_path': '/tmp/itrading/research_reports.db',  # 研报增量存储
+}
+
+# 流式选股AI分析配置
+ANALYSIS_STREAM_CONFIG = {
+    'max_workers': 3,           # 同时进行AI分析的股票数
+    'cancel_poll_seconds': 0.2, # 传入取消事件时，等待分析结果期间检查取消的间隔（秒）
+}
+
+# 选股/分析阶段性能统计配置（结果写入 stats['stage_metrics']）
+INSTRUMENTATION_CONFIG = {
+    'enabled': True,            # 每个阶段只多几次计时调用，可在生产环境常开
+    'memory': 'rss',            # 'rss'（进程峰值内存增长，开销极小）、'tracemalloc'（精确但明显变慢）或 None
+}
+
+# 上游数据源监控配置（utils/telemetry.py，Prometheus文本格式，无需外部采集服务）
+TELEMETRY_CONFIG = {
+    'textfile_path': '/tmp/itrading/metrics/itrading.prom',  # 每次运行结束后写入的指标文件，None 表示不写
+    'http_port': None,          # 常驻进程（盘中滚动选股）提供 /metrics 的端口，None 表示不启动
+}
+
+# 按需性能剖析配置（utils/profiling.py，命令行 --profile 或环境变量 ITRADING_PROFILE=1 启用，默认关闭）
+PROFILING_CONFIG = {
+    'output_dir': '/tmp/itrading/profiles',  # 每次运行的 .prof 和热点函数汇总 .txt
+    'top_n': 30,                # 汇总中列出的函数和内存分配位置数
+    'allocations': True,        # 同时用 tracemalloc 统计内存分配（明显变慢，只影响剖析的运行）
+}
+
+# 性能基准配置（benchmark.py，合成数据见 utils/synthetic_market.py）
+BENCHMARK_CONFIG = {
+    'db_path': '/tmp/itrading/benchmark.db',  # 基准结果SQLite表，按提交号保存
+    'sizes': [1000, 5000, 20000],   # 全市场快照的股票数量
+    'repeat': 5,                # 每项重复次数，取中位耗时比较
+    'bar_stocks': 200,          # 技术指标基准的股票数
+    'bar_days': 120,            # 每只股票的K线天数
+    'news_items': 500,          # 情绪打分的新闻条数
+    'regression_threshold': 0.2,  # 中位耗时变慢超过20%视为性能回退
+    'min_regression_ms': 1.0,   # 且至少慢1毫秒（排除计时噪声）
+}
+
+# 流水线截止时间配置
+DEADLINE_CONFIG = {
+    'finish_by': '09:45',       # 早盘选股AI分析必须完成的时间
+    'market_data_fraction': 0.3,  # 获取行情最多占用剩余时间的比例，超时使用缓存行情
+    'reserve_seconds': 10,      # 为计算最终得分、保存结果预留的秒数
+    'min_ai_seconds': 15,       # 剩余时间少于该秒数时不再调用Gemini，使用规则分析
+    'cached_market_max_age': 1,  # 行情超时时可用的本地历史快照最多早于交易日的交易日数，更早的不用
+    # 单只股票分析各数据步骤的预算 (比例, 上限秒)：先为Gemini预留 min_ai_seconds，再取本只股票剩余时间的比例
+    'stage_budgets': {
+        'stock_name': (0.1, 10),
+        'get_stock_data': (0.3, 30),
+        'fundamentals': (0.4, 60),
+        'news': (0.5, 60),
+    },
+}
+
+# AI分析预算调度配置
+AI_SCHEDULER_CONFIG = {
+    'time_budget': 300,         # 全部AI分析的墙钟时间预算（秒），None 表示不限
+    'token_budget': 200000,     # token预算，None 表示不限
+    'tokens_per_stock': 15000,  # 单只股票分析（深度分析+投资建议）的token估计
+    'max_workers': 3,           # 同时进行AI分析的股票数
+    'candidate_multiplier': 3,  # 候选股票数 = 最终选股数 × 倍数
+}
+
+# 组合权重配置（统一选股AI分析器的可选步骤）
+PORTFOLIO_CONFIG = {
+    'enabled': False,           # 是否为最终选股分配组合权重
+    'method': 'min_variance',   # 优化方法: min_variance / max_sharpe
+    'lookback_days': 120,       # 估计协方差的交易日数
+    'max_weight': 0.25,         # 单只股票权重上限
+    'min_history': 20,          # 有效收益率少于该天数的股票不参与配置
+    'risk_free_rate': 0.0,      # 日无风险利率（最大夏普用）
+}
+
+# 止损止盈规则模拟配置
+EXIT_RULE_CONFIG = {
+    'atr_period': 14,           # ATR计算周期（K线数）
+    'max_holding': 10,          # 规则未指定时的最长持有K线数
+    'rules': [                  # 默认对比的规则
+        {'name': '固定止损5%/止盈10%', 'stop': 0.05, 'target': 0.10},
+        {'name': '固定止损3%/止盈6%', 'stop': 0.03, 'target': 0.06},
+        {'name': 'ATR止损2倍/止盈3倍', 'atr_stop': 2, 'atr_target': 3},
+        {'name': '移动止损8%', 'trailing': 0.08},
+        {'name': '止损5%+移动止损5%', 'stop': 0.05, 'trailing': 0.05},
+        {'name': '持有3日', 'max_holding': 3},
+    ],
+    'grid': {                   # --grid 时的规则网格
+        'stop': [None, 0.03, 0.05, 0.08],
+        'target': [None, 0.06, 0.10, 0.15],
+        'trailing': [None, 0.05, 0.08],
+        'max_holding': [5, 10],
+    },
+}
+
+# backtrader 回测配置
+BACKTRADER_CONFIG = {
+    'cash': 1e6,                # 初始资金
+    'commission': 0.0003,       # 佣金费率（双向）
+    'min_commission': 5,        # 最低佣金（元）
+    'stamp_duty': 0.001,        # 印花税（卖出）
+    'holding_days': 3,          # 持有交易日数
+    'stop_loss': 0.05,          # 止损比例
+    'take_profit': 0.10,        # 止盈比例
+    'cash_reserve': 0.02,       # 预留资金比例（开盘跳空和交易费用）
+}
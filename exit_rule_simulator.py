@@ -0,0 +1,298 @@
+"""
+止损止盈规则模拟
+Exit Rule Simulator
+
+在历史K线（日线或分钟线）上评估选股后的止损/止盈规则：固定比例、ATR倍数、移动止损和最长持有期，
+输出每条规则下每笔交易的卖出时间、卖出原因和收益，以及按规则汇总的表现。
+
+所有规则和所有持仓一次性向量化计算：先把每笔交易买入后的K线整理为 (持仓 × K线) 的路径，
+再按 (规则 × 持仓 × K线) 广播计算止损/止盈价位和触发位置，对比一年选股上的几十条规则只需不到一秒。
+撮合假设：买入K线开盘价买入；遵守T+1，买入当天的K线不能卖出；开盘跳空越过价位时按开盘价成交，
+同一根K线内止损和止盈都触及时按止损处理（保守）。
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backtester import trading_days
+from backtrader_adapter import load_bars
+from config import BACKTRADER_CONFIG, EXIT_RULE_CONFIG
+from parameter_sweep import grid
+from utils import util
+from utils.data_store import LocalDataStore, DEFAULT_STORE_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 规则参数（缺省或None表示不启用）
+RULE_KEYS = ('stop', 'target', 'atr_stop', 'atr_target', 'trailing', 'max_holding')
+EXIT_REASONS = np.array(['stop', 'trailing', 'target', 'time', 'no_entry'])
+
+
+def rule_grid(space: Dict[str, Sequence], max_holding: int = None) -> List[Dict]:
+    """
+    规则参数网格，例如 {'stop': [0.03, 0.05], 'trailing': [None, 0.08]}
+
+    Returns:
+        规则列表，名称由启用的参数生成
+    """
+    rules = []
+    for params in grid(space):
+        params = {key: value for key, value in params.items() if value is not None}
+        if max_holding and 'max_holding' not in params:
+            params['max_holding'] = max_holding
+        params['name'] = ' '.join(f"{key}={value}" for key, value in params.items())
+        rules.append(params)
+    return rules
+
+
+def average_true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """
+    每根K线之前 period 根K线的平均真实波幅（不含当前K线，买入时已知）
+
+    Returns:
+        与输入同形状 (K线 × 股票) 的数组，历史不足时为NaN
+    """
+    previous_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    valid = ~np.isnan(true_range)
+    # 前缀和：cumulative[i] 为前 i 根K线之和，第 i 根K线之前 period 根之和为 cumulative[i] - cumulative[i - period]
+    cumulative = np.vstack([np.zeros((1, close.shape[1])), np.cumsum(np.where(valid, true_range, 0), axis=0)])
+    counts = np.vstack([np.zeros((1, close.shape[1])), np.cumsum(valid, axis=0)])
+    atr = np.full(close.shape, np.nan)
+    window_count = counts[period:-1] - counts[:-period - 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr[period:] = np.where(window_count >= period, (cumulative[period:-1] - cumulative[:-period - 1]) / window_count, np.nan)
+    return atr
+
+
+class ExitRuleSimulator:
+    """向量化的止损止盈规则模拟"""
+
+    def __init__(self,
+                 rules: List[Dict] = None,
+                 atr_period: int = EXIT_RULE_CONFIG['atr_period'],
+                 commission: float = BACKTRADER_CONFIG['commission'],
+                 stamp_duty: float = BACKTRADER_CONFIG['stamp_duty']):
+        """
+        初始化规则模拟
+
+        Args:
+            rules: 规则列表，每条规则为字典：name、stop（固定止损比例）、target（固定止盈比例）、
+                atr_stop/atr_target（买入价 ∓/± ATR倍数）、trailing（自最高价回撤比例）、max_holding（最长持有K线数）
+            atr_period: ATR计算周期（K线数）
+            commission: 佣金费率（双向）
+            stamp_duty: 印花税（卖出）
+        """
+        self.rules = rules or EXIT_RULE_CONFIG['rules']
+        self.atr_period = atr_period
+        self.commission = commission
+        self.stamp_duty = stamp_duty
+        self.names = [rule.get('name') or f"rule_{i}" for i, rule in enumerate(self.rules)]
+
+    def _rule_arrays(self) -> Dict[str, np.ndarray]:
+        """规则参数整理为 (规则 × 1 × 1) 数组，未启用的为NaN"""
+        arrays = {}
+        for key in RULE_KEYS:
+            values = [rule.get(key) for rule in self.rules]
+            arrays[key] = np.array([np.nan if v is None else v for v in values], dtype=float)[:, None, None]
+        if np.isnan(arrays['max_holding']).any():
+            arrays['max_holding'] = np.where(np.isnan(arrays['max_holding']), EXIT_RULE_CONFIG['max_holding'],
+                                             arrays['max_holding'])
+        return arrays
+
+    def simulate(self, bars: Dict[str, np.ndarray], timestamps: Sequence, codes: Sequence[str],
+                 entries: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        在K线数组上模拟全部规则
+
+        Args:
+            bars: {'open'|'high'|'low'|'close': (K线 × 股票) 数组}
+            timestamps: 每根K线的时间（日线为交易日 YYYYMMDD，分钟线为时间戳）
+            codes: 数组列对应的股票代码
+            entries: 买入记录，包含 代码 和 买入时间（买入K线的时间）
+
+        Returns:
+            (逐笔交易, 规则汇总)
+        """
+        started = time.perf_counter()
+        rules = self._rule_arrays()
+        horizon = int(np.nanmax(rules['max_holding'])) + 1
+        labels = np.array([str(t) for t in timestamps])
+        timestamps = pd.DatetimeIndex(pd.to_datetime(labels))
+        bar_dates = timestamps.normalize().to_numpy()
+        num_bars = len(timestamps)
+
+        # 每笔交易的买入K线和股票列
+        column = pd.Index([str(c) for c in codes]).get_indexer(entries['代码'].astype(str))
+        entry_time = pd.DatetimeIndex(pd.to_datetime(entries['买入时间'].astype(str)))
+        start = timestamps.get_indexer(entry_time)
+        valid = (column >= 0) & (start >= 0)
+        column, start = np.where(valid, column, 0), np.where(valid, start, 0)
+
+        # (持仓 × K线) 路径，停牌或缺失的K线用前一收盘价填充
+        index = start[:, None] + np.arange(horizon)[None, :]
+        available = index < num_bars
+        index = np.minimum(index, num_bars - 1)
+        path = {field: np.where(available, bars[field][index, column[:, None]], np.nan)
+                for field in ('open', 'high', 'low', 'close')}
+        close = pd.DataFrame(path['close'].T).ffill().to_numpy().T
+        for field in ('open', 'high', 'low'):
+            path[field] = np.where(np.isnan(path[field]), close, path[field])
+        path['close'] = close
+        available &= ~np.isnan(close)
+
+        entry_price = path['open'][:, 0]
+        valid &= ~np.isnan(entry_price)
+        atr = average_true_range(bars['high'], bars['low'], bars['close'], self.atr_period)[start, column]
+        sellable = available & (bar_dates[index] > bar_dates[start][:, None])  # T+1
+
+        # (规则 × 持仓 × K线) 的止损止盈价位
+        entry = entry_price[None, :, None]
+        with np.errstate(invalid='ignore'):
+            fixed_stop = np.fmax(entry * (1 - rules['stop']), entry - rules['atr_stop'] * atr[None, :, None])
+            target = np.fmin(entry * (1 + rules['target']), entry + rules['atr_target'] * atr[None, :, None])
+            # 移动止损：截至上一根K线的最高价（含买入价）回撤
+            running_high = np.fmax.accumulate(np.fmax(path['high'], entry_price[:, None]), axis=1)
+            prior_high = np.concatenate([entry_price[:, None], running_high[:, :-1]], axis=1)
+            trailing_stop = prior_high[None] * (1 - rules['trailing'])
+            stop = np.fmax(fixed_stop, trailing_stop)
+
+            bars_held = np.arange(horizon)[None, None, :]
+            open_, high, low = (path[f][None] for f in ('open', 'high', 'low'))
+            in_window = sellable[None] & (bars_held <= rules['max_holding'])
+            stop_hit = in_window & (low <= stop)
+            target_hit = in_window & (high >= target)
+
+        hit = stop_hit | target_hit
+        any_hit = hit.any(axis=2)
+        first = np.argmax(hit, axis=2)
+
+        # 未触发时在最长持有期内最后一根可卖出K线收盘卖出；持有期都在买入当天时顺延到第一根可卖出K线，
+        # 没有可卖出K线（数据结束）时按最后一根K线计
+        last_allowed = np.where(in_window, bars_held, -1).max(axis=2)
+        first_sellable = np.where(sellable.any(axis=1), np.argmax(sellable, axis=1),
+                                  np.where(available, np.arange(horizon), 0).max(axis=1))[None, :]
+        time_exit = np.where(last_allowed >= 0, last_allowed, first_sellable)
+        exit_bar = np.where(any_hit, first, time_exit)
+
+        take = lambda array: np.take_along_axis(np.broadcast_to(array, stop_hit.shape), exit_bar[:, :, None], axis=2)[:, :, 0]
+        open_at, stop_at, target_at = take(open_), take(stop), take(target)
+        stopped, targeted = take(stop_hit), take(target_hit)
+        gap_up = targeted & (open_at >= target_at)
+        is_stop = any_hit & stopped & ~gap_up
+        is_target = any_hit & ~is_stop
+        exit_price = np.select([is_stop, is_target], [np.fmin(open_at, stop_at), np.fmax(open_at, target_at)],
+                               default=take(path['close'][None]))
+        trailing_at, fixed_at = take(trailing_stop), take(fixed_stop)
+        by_trailing = is_stop & ~np.isnan(trailing_at) & (np.isnan(fixed_at) | (trailing_at >= fixed_at))
+        no_entry = np.broadcast_to(~valid[None], exit_bar.shape)
+        reason = np.select([no_entry, by_trailing, is_stop, is_target], [4, 1, 0, 2], default=3)
+
+        returns = exit_price * (1 - self.commission - self.stamp_duty) / (entry_price[None] * (1 + self.commission)) - 1
+        returns = np.where(valid[None], returns, np.nan)
+
+        trades = self._trades(entries, labels, index, exit_bar, exit_price, reason, returns, valid)
+        summary = self._summary(trades)
+        logger.info(f"止损止盈模拟完成: {len(self.rules)} 条规则 × {len(entries)} 笔交易, "
+                    f"用时 {(time.perf_counter() - started) * 1000:.0f}ms")
+        return trades, summary
+
+    def _trades(self, entries, labels, index, exit_bar, exit_price, reason, returns, valid) -> pd.DataFrame:
+        """逐笔交易明细（规则 × 持仓）"""
+        num_rules, num_entries = exit_bar.shape
+        exit_index = np.take_along_axis(np.broadcast_to(index, (num_rules,) + index.shape),
+                                        exit_bar[:, :, None], axis=2)[:, :, 0]
+        trades = pd.DataFrame({
+            '规则': np.repeat(self.names, num_entries),
+            '代码': np.tile(entries['代码'].astype(str).to_numpy(), num_rules),
+            '买入时间': np.tile(entries['买入时间'].astype(str).to_numpy(), num_rules),
+            '卖出时间': np.where(np.tile(valid, num_rules), labels[exit_index.ravel()], None),
+            '持有K线数': np.where(valid[None], exit_bar, 0).ravel(),
+            '卖出价': exit_price.ravel(),
+            '卖出原因': EXIT_REASONS[reason.ravel()],
+            '收益率': returns.ravel(),
+        })
+        for column in entries.columns.difference(['代码', '买入时间']):
+            trades[column] = np.tile(entries[column].to_numpy(), num_rules)
+        return trades
+
+    def _summary(self, trades: pd.DataFrame) -> pd.DataFrame:
+        """按规则汇总：交易数、胜率、平均/累计收益、平均持有K线数和各卖出原因占比"""
+        traded = trades[trades['卖出原因'] != 'no_entry']
+        grouped = traded.groupby('规则', sort=False)
+        summary = pd.DataFrame({
+            '交易数': grouped.size(),
+            '胜率': grouped['收益率'].apply(lambda r: (r > 0).mean()),
+            '平均收益': grouped['收益率'].mean(),
+            '收益中位数': grouped['收益率'].median(),
+            '最差收益': grouped['收益率'].min(),
+            '平均持有K线数': grouped['持有K线数'].mean(),
+        })
+        reasons = pd.crosstab(traded['规则'], traded['卖出原因'], normalize='index')
+        for name in EXIT_REASONS[:4]:
+            summary[f'{name}占比'] = reasons[name] if name in reasons.columns else 0.0
+        return summary.reindex(self.names).sort_values('平均收益', ascending=False).reset_index()
+
+    def simulate_daily(self, picks: pd.DataFrame, store: LocalDataStore = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        在本地日线快照上模拟：选股日的下一交易日开盘买入
+
+        Args:
+            picks: 每日选股结果（Backtester.run 的输出，包含 交易日 和 代码）
+            store: 本地历史快照存储
+        """
+        store = store or LocalDataStore(DEFAULT_STORE_DIR)
+        picks = picks.assign(代码=picks['代码'].astype(str), 交易日=picks['交易日'].astype(str))
+        entry_days = {day: util.next_trading_day(day) for day in picks['交易日'].unique()}
+        horizon = int(max(rule.get('max_holding') or EXIT_RULE_CONFIG['max_holding'] for rule in self.rules)) + 1
+
+        # 买入前留出ATR周期，最后一个买入日之后留出最长持有期
+        first_day = min(entry_days.values())
+        last_day = max(entry_days.values())
+        days = trading_days(first_day, last_day)
+        for _ in range(horizon):
+            days.append(util.next_trading_day(days[-1]))
+        for _ in range(self.atr_period + 1):
+            days.insert(0, util.last_trading_day(days[0]))
+
+        codes = sorted(picks['代码'].unique())
+        bars = load_bars(store, days, codes)
+        entries = picks[['交易日', '代码']].assign(买入时间=picks['交易日'].map(entry_days))
+        return self.simulate(bars, days, codes, entries)
+
+
+def main():
+    """主函数 - 对比止损止盈规则"""
+    from backtester import Backtester
+
+    parser = argparse.ArgumentParser(description='止损止盈规则对比')
+    parser.add_argument('--start', required=True, help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYYMMDD')
+    parser.add_argument('--grid', action='store_true', help='使用 EXIT_RULE_CONFIG 中的规则网格')
+    args = parser.parse_args()
+
+    picks, _ = Backtester().run(args.start, args.end)
+    rules = rule_grid(EXIT_RULE_CONFIG['grid']) if args.grid else None
+    simulator = ExitRuleSimulator(rules)
+    trades, summary = simulator.simulate_daily(picks)
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+    output = f"/tmp/itrading/backtest/exit_rules_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    trades.to_csv(output, index=False, encoding='utf-8-sig')
+    print(f"💾 逐笔交易已保存至: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+盘中滚动选股守护进程
+Intraday Re-selection Daemon
+
+在开盘阶段（默认 9:25-9:45）按固定间隔轮询行情，复用同一个选股器实例和上一次的行情快照，
+只对输入发生变化的股票重新执行过滤，并把选股结果的新增/移除作为事件推送出来。
+"""
+
+import os
+import sys
+import time as time_module
+import logging
+import argparse
+import pandas as pd
+from datetime import datetime, time
+from typing import Callable, Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_stock_picker import AdvancedStockPicker
+from config import INTRADAY_DAEMON_CONFIG, SNAPSHOT_BUFFER_CONFIG, TELEMETRY_CONFIG
+from utils.telemetry import TELEMETRY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 影响过滤和评分的输入列，只有这些列变化时才需要重新计算该股票
+INPUT_COLUMNS = [
+    '名称', '最新', '最新价', '昨收', '涨幅', '涨跌幅',
+    '换手率', '量比', '市盈率', '市盈率-动态', '流通市值'
+]
+
+# 选股阈值参数，市场模式切换导致这些参数变化时需要全量重算
+THRESHOLD_ATTRIBUTES = [
+    'min_market_cap', 'max_market_cap', 'min_price', 'max_price',
+    'min_turnover', 'max_turnover', 'min_gain', 'max_gain',
+    'min_volume_ratio', 'max_volume_ratio'
+]
+
+
+def _parse_time(value: str) -> time:
+    """解析 'HH:MM' 格式的时间"""
+    return datetime.strptime(value, '%H:%M').time()
+
+
+class IntradayReselectionDaemon:
+    """盘中滚动选股守护进程，基于行情快照差分增量更新选股结果"""
+
+    def __init__(self,
+                 picker: AdvancedStockPicker = None,
+                 poll_interval: float = INTRADAY_DAEMON_CONFIG['poll_interval'],
+                 start_time: str = INTRADAY_DAEMON_CONFIG['start_time'],
+                 end_time: str = INTRADAY_DAEMON_CONFIG['end_time'],
+                 max_stocks: int = INTRADAY_DAEMON_CONFIG['max_stocks'],
+                 auto_adjust_mode: bool = True,
+                 on_event: Callable[[Dict], None] = None):
+        """
+        初始化守护进程
+
+        Args:
+            picker: 复用的高级选股器实例，默认新建normal模式选股器
+            poll_interval: 轮询间隔（秒）
+            start_time: 开始轮询时间 'HH:MM'
+            end_time: 结束轮询时间 'HH:MM'
+            max_stocks: 每次选出的最大股票数量
+            auto_adjust_mode: 是否根据市场环境自动调整市场模式
+            on_event: 选股变动事件回调，参数为事件字典
+        """
+        self.picker = picker or AdvancedStockPicker(market_mode='normal')
+        self.poll_interval = poll_interval
+        self.start_time = _parse_time(start_time)
+        self.end_time = _parse_time(end_time)
+        self.max_stocks = max_stocks
+        self.auto_adjust_mode = auto_adjust_mode
+        self.on_event = on_event
+
+        # 保存最近的行情快照，供市场环境判断和选股阶段查询价格/成交量加速等指标
+        self.picker.enable_snapshot_buffer(**SNAPSHOT_BUFFER_CONFIG)
+
+        # 上一次的行情快照（按代码索引）、通过逐行过滤的股票以及当前选股结果
+        self._snapshot: Optional[pd.DataFrame] = None
+        self._passed: pd.DataFrame = pd.DataFrame()
+        self._thresholds: Dict = {}
+        self.selection: pd.DataFrame = pd.DataFrame()
+        self.tick_count = 0
+
+    def _current_thresholds(self) -> Dict:
+        return {attr: getattr(self.picker, attr) for attr in THRESHOLD_ATTRIBUTES}
+
+    def _changed_codes(self, snapshot: pd.DataFrame) -> pd.Index:
+        """
+        找出相对上一次快照新增或输入列发生变化的股票代码
+
+        Args:
+            snapshot: 按代码索引的当前快照
+
+        Returns:
+            需要重新计算的股票代码
+        """
+        if self._snapshot is None:
+            return snapshot.index
+
+        columns = [col for col in INPUT_COLUMNS if col in snapshot.columns and col in self._snapshot.columns]
+        new_codes = snapshot.index.difference(self._snapshot.index)
+        common = snapshot.index.intersection(self._snapshot.index)
+
+        current = snapshot.loc[common, columns]
+        previous = self._snapshot.loc[common, columns]
+        # NaN与NaN视为未变化
+        differs = (current != previous) & ~(current.isna() & previous.isna())
+        changed = common[differs.any(axis=1).to_numpy()]
+
+        return new_codes.append(changed)
+
+    def _filter_rows(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """对部分股票执行逐行过滤：风险过滤 -> 技术面过滤 -> 选股标准"""
+        if rows.empty:
+            return rows
+        filtered = self.picker.filter_risk_stocks(rows)
+        filtered = self.picker.apply_technical_filter(filtered)
+        filtered = self.picker.apply_selection_criteria(filtered)
+        return self.picker.apply_industry_filter(filtered)
+
+    def tick(self, market_data: pd.DataFrame) -> Dict:
+        """
+        处理一次行情快照
+
+        Args:
+            market_data: 当前全市场行情DataFrame
+
+        Returns:
+            本次处理结果：新增/移除事件、变化行数、当前选股结果
+        """
+        self.tick_count += 1
+        result = {
+            'tick': self.tick_count,
+            'time': datetime.now().strftime('%H:%M:%S'),
+            'changed_rows': 0,
+            'events': [],
+            'selection': self.selection,
+        }
+
+        if market_data is None or market_data.empty or '代码' not in market_data.columns:
+            logger.warning("行情快照为空，跳过本次处理")
+            return result
+
+        snapshot = market_data.copy()
+        snapshot['代码'] = snapshot['代码'].astype(str)
+        snapshot = snapshot.drop_duplicates(subset='代码', keep='last').set_index('代码', drop=False)
+        snapshot.index.name = None
+        self.picker.record_snapshot(snapshot)
+
+        # 市场环境和模式判断基于全市场，计算本身是向量化的
+        if self.auto_adjust_mode:
+            recommended_mode = self.picker.analyze_market_environment(snapshot)
+            if recommended_mode != self.picker.market_mode:
+                logger.info(f"自动调整市场模式: {self.picker.market_mode} -> {recommended_mode}")
+                for key, value in self.picker._get_adjusted_config(recommended_mode).items():
+                    setattr(self.picker, key, value)
+                self.picker.market_mode = recommended_mode
+
+        is_good_market, up_ratio = self.picker.check_market_environment(snapshot)
+        result['up_ratio'] = up_ratio
+        result['up_ratio_trend'] = self.picker.get_up_ratio_trend()
+        result['is_good_market'] = is_good_market
+
+        # 阈值变化时缓存的过滤结果失效，需要全量重算
+        thresholds = self._current_thresholds()
+        if thresholds != self._thresholds:
+            self._snapshot = None
+            self._passed = pd.DataFrame()
+            self._thresholds = thresholds
+
+        changed = self._changed_codes(snapshot)
+        result['changed_rows'] = len(changed)
+
+        # 移除已不在行情中的股票和本次发生变化的股票，再加入变化股票中通过过滤的部分
+        if not self._passed.empty:
+            keep = self._passed.index.isin(snapshot.index) & ~self._passed.index.isin(changed)
+            self._passed = self._passed[keep]
+        recomputed = self._filter_rows(snapshot.loc[changed])
+        if not recomputed.empty:
+            self._passed = pd.concat([self._passed, recomputed]) if not self._passed.empty else recomputed
+        self._snapshot = snapshot
+
+        # 归一化得分依赖于整个候选集合，因此对（规模很小的）候选集合重新排序
+        if not is_good_market and up_ratio != 0.5:
+            selection = pd.DataFrame()
+        elif self._passed.empty:
+            selection = pd.DataFrame()
+        else:
+            selection = self.picker.enhanced_ranking(self._passed).head(self.max_stocks)
+
+        result['events'] = self._diff_selection(self.selection, selection)
+        self.selection = selection
+        result['selection'] = selection
+
+        for event in result['events']:
+            self._emit(event)
+
+        logger.info(f"第{self.tick_count}次轮询: 变化 {len(changed)} 只，候选 {len(self._passed)} 只，"
+                    f"选中 {len(selection)} 只，事件 {len(result['events'])} 个")
+        return result
+
+    def _diff_selection(self, previous: pd.DataFrame, current: pd.DataFrame) -> List[Dict]:
+        """比较前后两次选股结果，生成新增和移除事件"""
+        previous_codes = list(previous['代码']) if not previous.empty else []
+        current_codes = list(current['代码']) if not current.empty else []
+        event_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        events = []
+
+        for rank, (_, row) in enumerate(current.iterrows(), 1):
+            if row['代码'] not in previous_codes:
+                events.append({
+                    'type': 'added',
+                    'code': row['代码'],
+                    'name': row.get('名称', ''),
+                    'rank': rank,
+                    'score': float(row.get('风险调整得分', row.get('综合得分', 0.0))),
+                    'time': event_time,
+                })
+
+        for _, row in (previous.iterrows() if not previous.empty else []):
+            if row['代码'] not in current_codes:
+                events.append({
+                    'type': 'removed',
+                    'code': row['代码'],
+                    'name': row.get('名称', ''),
+                    'rank': None,
+                    'score': None,
+                    'time': event_time,
+                })
+
+        return events
+
+    def _emit(self, event: Dict):
+        """推送选股变动事件"""
+        if event['type'] == 'added':
+            logger.info(f"➕ 新增 {event['code']} {event['name']} 排名:{event['rank']} 得分:{event['score']:.3f}")
+        else:
+            logger.info(f"➖ 移除 {event['code']} {event['name']}")
+
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                logger.error(f"事件回调失败: {e}")
+
+    def run(self):
+        """在轮询时间窗口内循环获取行情并滚动选股"""
+        logger.info(f"盘中滚动选股启动: {self.start_time.strftime('%H:%M')}-{self.end_time.strftime('%H:%M')}, "
+                    f"间隔 {self.poll_interval}s")
+
+        # 等待到开始时间
+        while datetime.now().time() < self.start_time:
+            time_module.sleep(min(self.poll_interval, 1.0))
+
+        while datetime.now().time() <= self.end_time:
+            started = time_module.monotonic()
+            try:
+                market_data = self.picker.get_market_data(trade_date=datetime.now())
+                self.tick(market_data)
+            except Exception as e:
+                logger.error(f"滚动选股失败: {e}")
+
+            elapsed = time_module.monotonic() - started
+            time_module.sleep(max(0.0, self.poll_interval - elapsed))
+
+        logger.info(f"盘中滚动选股结束，共轮询 {self.tick_count} 次")
+        return self.selection
+
+
+def main():
+    """主函数 - 启动盘中滚动选股"""
+    parser = argparse.ArgumentParser(description='盘中滚动选股守护进程')
+    parser.add_argument('--interval', type=float, default=INTRADAY_DAEMON_CONFIG['poll_interval'], help='轮询间隔（秒）')
+    parser.add_argument('--start', default=INTRADAY_DAEMON_CONFIG['start_time'], help='开始时间 HH:MM')
+    parser.add_argument('--end', default=INTRADAY_DAEMON_CONFIG['end_time'], help='结束时间 HH:MM')
+    parser.add_argument('--max-stocks', type=int, default=INTRADAY_DAEMON_CONFIG['max_stocks'], help='最大选股数量')
+    parser.add_argument('--market-mode', default='normal', help='初始市场模式')
+    parser.add_argument('--metrics-port', type=int, default=TELEMETRY_CONFIG['http_port'],
+                        help='提供数据源监控指标 /metrics 的端口')
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        TELEMETRY.serve(args.metrics_port)
+
+    daemon = IntradayReselectionDaemon(
+        picker=AdvancedStockPicker(market_mode=args.market_mode),
+        poll_interval=args.interval,
+        start_time=args.start,
+        end_time=args.end,
+        max_stocks=args.max_stocks,
+    )
+    selection = daemon.run()
+    if TELEMETRY_CONFIG['textfile_path']:
+        TELEMETRY.write_textfile(TELEMETRY_CONFIG['textfile_path'])
+    if not selection.empty:
+        print(selection[['代码', '名称']].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
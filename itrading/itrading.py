@@ -3,6 +3,8 @@ iTrading - 早盘量化选股系统
 基于Reflex框架的Web应用界面
 """
 
+import asyncio
+import threading
 import reflex as rx
 from typing import List, Dict, Any
 from datetime import datetime
@@ -12,6 +14,34 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv(os.path.expanduser('~/apps/iagent/.env'), verbose=True)
 
+
+# 各会话正在进行的分析的取消事件（按 client_token），由分析线程在等待AI结果时检查
+_CANCEL_EVENTS: Dict[str, threading.Event] = {}
+
+
+def _first_value(stock: Dict[str, Any], columns: List[str], default=0.0):
+    """按顺序取第一个有值的列（qstock和akshare的列名不同）"""
+    for column in columns:
+        value = stock.get(column)
+        if value is not None and value == value:
+            return value
+    return default
+
+
+def stock_card_data(stock: Dict[str, Any]) -> Dict[str, Any]:
+    """把统一分析器的一行结果转换为前端股票卡片数据"""
+    return {
+        "code": str(stock.get("代码", "")),
+        "name": str(stock.get("名称", "")),
+        "score": round(float(stock.get("final_score", 0)), 1),
+        "price": float(_first_value(stock, ["最新价", "最新", "昨收"])),
+        "change_pct": float(_first_value(stock, ["涨跌幅", "涨幅"])),
+        "volume": float(_first_value(stock, ["成交量"])),
+        "analysis": stock.get("ai_analysis") or "",
+        "status": stock.get("ai_status", "done"),
+    }
+
+
 class State(rx.State):
     """应用状态管理"""
     
@@ -22,46 +52,74 @@ class State(rx.State):
     
     # 分析结果
     analysis_result: str = ""
+    progress: str = ""
+    cancel_requested: bool = False
     
     # 筛选条件
     min_score: float = 7.0
     max_stocks: int = 10
     
-    def load_stock_data(self):
-        """加载股票数据"""
-        self.is_loading = True
-        yield
+    @rx.event(background=True)
+    async def load_stock_data(self):
+        """后台选股并进行AI分析，每完成一只股票就刷新股票卡片"""
+        async with self:
+            if self.is_loading:
+                return
+            self.is_loading = True
+            self.cancel_requested = False
+            self.stocks_data = []
+            self.analysis_result = ""
+            self.progress = "正在选股..."
+            max_stocks, min_score = self.max_stocks, self.min_score
+            token = self.router.session.client_token
+        cancel = _CANCEL_EVENTS[token] = threading.Event()
         
+        stream = None
         try:
-            # 这里可以集成你现有的股票选择器
             from unify_stock_pick_ai_analyzer import UnifiedStockPickAIAnalyzer
             
             analyzer = UnifiedStockPickAIAnalyzer()
-            # 获取推荐股票
-            recommendations = analyzer.get_stock_recommendations(
-                min_score=self.min_score,
-                max_count=self.max_stocks
-            )
-            
-            # 转换为前端显示格式
-            self.stocks_data = [
-                {
-                    "code": stock.get("ts_code", ""),
-                    "name": stock.get("name", ""),
-                    "score": stock.get("score", 0),
-                    "price": stock.get("close", 0),
-                    "change_pct": stock.get("pct_chg", 0),
-                    "volume": stock.get("vol", 0),
-                    "analysis": stock.get("ai_analysis", "")
-                }
-                for stock in recommendations
-            ]
-            
+            stream = analyzer.stream_pick_and_analyze(max_stocks=max_stocks, cancel=cancel)
+            while True:
+                # 选股和AI分析是阻塞调用，放到线程中执行，页面保持响应
+                item = await asyncio.to_thread(next, stream, None)
+                if item is None:
+                    if cancel.is_set():
+                        async with self:
+                            self.analysis_result = "分析已取消"
+                    break
+                stocks, stats = item
+                async with self:
+                    if self.cancel_requested:
+                        self.analysis_result = "分析已取消"
+                        break
+                    self.stocks_data = [
+                        stock_card_data(stock) for stock in stocks.to_dict('records')
+                        if stock.get('final_score', 0) >= min_score
+                    ]
+                    if 'analyzed_count' in stats:
+                        self.progress = f"AI分析进度: {stats['analyzed_count']}/{stats['final_stocks_count']}"
+                    else:
+                        self.progress = "未选出股票"
         except Exception as e:
-            self.analysis_result = f"数据加载失败: {str(e)}"
-        
-        self.is_loading = False
-        yield
+            async with self:
+                self.analysis_result = f"数据加载失败: {str(e)}"
+        finally:
+            if stream is not None:
+                # 取消尚未开始的AI分析
+                await asyncio.to_thread(stream.close)
+            _CANCEL_EVENTS.pop(token, None)
+            async with self:
+                self.is_loading = False
+    
+    def cancel_analysis(self):
+        """取消正在进行的分析：通知分析线程停止等待并取消尚未开始的AI分析"""
+        if self.is_loading:
+            self.cancel_requested = True
+            self.progress = "正在取消..."
+            cancel = _CANCEL_EVENTS.get(self.router.session.client_token)
+            if cancel is not None:
+                cancel.set()
     
     def update_min_score(self, value: str):
         """更新最小评分"""
@@ -122,13 +180,25 @@ def control_panel() -> rx.Component:
             ),
             spacing="2",
         ),
-        rx.button(
-            "开始分析",
-            on_click=State.load_stock_data,
-            loading=State.is_loading,
-            size="3",
-            color_scheme="blue",
+        rx.hstack(
+            rx.button(
+                "开始分析",
+                on_click=State.load_stock_data,
+                loading=State.is_loading,
+                size="3",
+                color_scheme="blue",
+            ),
+            rx.button(
+                "取消",
+                on_click=State.cancel_analysis,
+                disabled=~State.is_loading,
+                size="3",
+                color_scheme="gray",
+            ),
+            spacing="2",
         ),
+        rx.text(State.progress, color="gray.500"),
+        rx.text(State.analysis_result, color="red.500"),
         spacing="4",
         padding="1rem",
         border="1px solid #e2e8f0",
@@ -153,7 +223,11 @@ def stock_card(stock: Dict[str, Any]) -> rx.Component:
                 rx.text(f"成交量: {stock['volume']:,.0f}"),
                 spacing="4",
             ),
-            rx.text(stock['analysis'], font_size="sm", color="gray.600"),
+            rx.cond(
+                stock['status'] == "pending",
+                rx.hstack(rx.spinner(size="1"), rx.text("AI分析中...", font_size="sm", color="gray.500")),
+                rx.text(stock['analysis'], font_size="sm", color="gray.600"),
+            ),
             rx.checkbox(
                 "选择",
                 name=stock['code'],
@@ -169,13 +243,17 @@ def stock_card(stock: Dict[str, Any]) -> rx.Component:
 def stocks_list() -> rx.Component:
     """股票列表"""
     return rx.vstack(
-        rx.heading("推荐股票", size="5"),
+        rx.hstack(
+            rx.heading("推荐股票", size="5"),
+            rx.cond(State.is_loading, rx.spinner(size="3")),
+            spacing="2",
+        ),
         rx.cond(
-            State.is_loading,
-            rx.spinner(size="3"),
+            State.stocks_data.length() > 0,
+            rx.foreach(State.stocks_data, stock_card),
             rx.cond(
-                State.stocks_data.length() > 0,
-                rx.foreach(State.stocks_data, stock_card),
+                State.is_loading,
+                rx.text("正在选股...", color="gray.500"),
                 rx.text("暂无数据，请点击'开始分析'按钮", color="gray.500"),
             ),
         ),
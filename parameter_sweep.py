@@ -0,0 +1,531 @@
+"""
+选股参数扫描
+Parameter Sweep
+
+在历史数据上评估网格或随机抽样的选股参数组合（MARKET_CAP_CONFIG、PRICE_CONFIG、TURNOVER_CONFIG、
+GAIN_CONFIG、VOLUME_RATIO_CONFIG、MARKET_ENVIRONMENT_ADJUSTMENTS），结果写入SQLite表以便查询比较。
+
+历史快照只在主进程中加载一次，整理为 (交易日 × 股票 × 字段) 的面板放入共享内存，工作进程直接映射。
+每个参数组合的选股过程（风险过滤、技术面过滤、选股标准、综合得分、竞价得分、风险评分、排序取前N）
+按与 AdvancedStockPicker 相同的规则在整个面板上向量化计算，单个组合只需毫秒级。
+竞价得分使用本地存储中当日的 auction_factors（与回测中的选股器相同）；盘中动量只在启用快照缓冲区的
+盘中选股中计入，回测和扫描的选股器都不启用。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import logging
+import argparse
+import itertools
+import warnings
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_stock_picker import AUCTION_SCORE_FIELDS, AdvancedStockPicker
+from backtester import MARKET_DATA_DATASET, forward_returns, max_drawdown, trading_days
+from base_stock_picker import AUCTION_FACTORS_DATASET
+from config import AUCTION_CAPTURE_CONFIG, BACKTEST_CONFIG, MARKET_ENVIRONMENT_ADJUSTMENTS, SWEEP_CONFIG
+from utils import util
+from utils.data_store import LocalDataStore, DEFAULT_STORE_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 面板字段
+PANEL_FIELDS = ('最新价', '涨幅', '换手率', '量比', '流通市值', '市盈率')
+MODES = ['normal'] + list(MARKET_ENVIRONMENT_ADJUSTMENTS.keys())
+
+# 工作进程中映射的共享面板
+_PANEL: Dict[str, np.ndarray] = {}
+_PANEL_SHM: List[shared_memory.SharedMemory] = []
+_PANEL_META: Dict = {}
+_WORKER_PICKER = None
+
+
+def expand_params(flat: Dict) -> Dict:
+    """
+    把扁平参数转换为 AdvancedStockPicker 的 config_overrides 格式
+
+    'adjustments.bull_market.max_gain': 9 -> {'adjustments': {'bull_market': {'max_gain': 9}}}
+    """
+    overrides = {}
+    for key, value in flat.items():
+        parts = key.split('.')
+        target = overrides
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value.item() if isinstance(value, np.generic) else value
+    return overrides
+
+
+def grid(space: Dict[str, Sequence]) -> List[Dict]:
+    """参数网格的全部组合"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def random_sample(space: Dict[str, Sequence], n: int, seed: int = None) -> List[Dict]:
+    """
+    随机抽样参数组合
+
+    Args:
+        space: 参数空间，值为候选列表或 (最小值, 最大值) 元组（均匀抽样）
+        n: 抽样数量
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        params = {}
+        for key, candidates in space.items():
+            if isinstance(candidates, tuple) and len(candidates) == 2:
+                params[key] = round(rng.uniform(*candidates), 4)
+            else:
+                params[key] = rng.choice(list(candidates))
+        samples.append(params)
+    return samples
+
+
+def build_panel(store: LocalDataStore, days: Sequence[str], horizons: Sequence[int],
+                picker: AdvancedStockPicker = None) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """
+    从本地历史快照构建回测面板
+
+    Args:
+        store: 本地历史快照存储
+        days: 选股交易日
+        horizons: 远期收益持有期
+        picker: 用于风险过滤和市场环境判断的选股器
+
+    Returns:
+        (数组字典, 元数据)；数组包括 values (日×股×字段)、auction (日×股×竞价因子，没有因子时为NaN)、
+        tradable (风险过滤后可选)、up_ratio、mode (市场模式序号) 和每个持有期的远期收益 fwd_N
+    """
+    picker = picker or AdvancedStockPicker()
+    panel_days = list(days)
+    for _ in range(max(horizons)):
+        panel_days.append(util.next_trading_day(panel_days[-1]))
+
+    frames = {}
+    for day in panel_days:
+        df = store.load(MARKET_DATA_DATASET, day)
+        if df is not None and not df.empty:
+            df = df.rename(columns={'最新': '最新价'}) if '最新价' not in df.columns else df
+            df = df.assign(代码=df['代码'].astype(str)).drop_duplicates(subset='代码', keep='last')
+            frames[day] = df
+
+    codes = pd.Index(sorted(set().union(*(df['代码'] for df in frames.values())))) if frames else pd.Index([])
+    values = np.full((len(days), len(codes), len(PANEL_FIELDS)), np.nan)
+    auction = np.full((len(days), len(codes), len(AUCTION_SCORE_FIELDS)), np.nan)
+    tradable = np.zeros((len(days), len(codes)), dtype=bool)
+    up_ratio = np.zeros(len(days))
+    mode = np.zeros(len(days), dtype=np.int64)
+    closes = np.full((len(panel_days), len(codes)), np.nan)
+
+    day_index = {day: i for i, day in enumerate(days)}
+    for day, df in frames.items():
+        columns = codes.get_indexer(df['代码'])
+        closes[panel_days.index(day), columns] = pd.to_numeric(df['最新价'], errors='coerce').to_numpy()
+        if day not in day_index:
+            continue
+        i = day_index[day]
+        for j, field in enumerate(PANEL_FIELDS):
+            if field in df.columns:
+                values[i, columns, j] = pd.to_numeric(df[field], errors='coerce').to_numpy()
+        factors = store.load(AUCTION_FACTORS_DATASET, day)
+        if factors is not None and not factors.empty:
+            factors = factors.set_axis(factors.index.astype(str)).reindex(codes)
+            for j, field in enumerate(AUCTION_SCORE_FIELDS):
+                if field in factors.columns:
+                    auction[i, :, j] = pd.to_numeric(factors[field], errors='coerce').to_numpy()
+        tradable[i, codes.get_indexer(picker.filter_risk_stocks(df)['代码'])] = True
+        _, up_ratio[i] = picker.check_market_environment(df)
+        mode[i] = MODES.index(picker.analyze_market_environment(df))
+
+    arrays = {'values': values, 'auction': auction, 'tradable': tradable, 'up_ratio': up_ratio, 'mode': mode}
+    for n, panel in forward_returns(pd.DataFrame(closes, index=panel_days, columns=codes), horizons).items():
+        arrays[f'fwd_{n}'] = panel.loc[list(days)].to_numpy()
+    meta = {'days': list(days), 'codes': list(codes), 'horizons': list(horizons)}
+    return arrays, meta
+
+
+class SharedPanel:
+    """把面板数组放入共享内存，工作进程按名称映射而不复制"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(spec: Dict) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+        """按规格映射共享内存中的数组（只读视图）"""
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            blocks.append(block)
+        return arrays, blocks
+
+    def close(self):
+        """释放共享内存"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def attach_panel(spec: Dict, meta: Dict):
+    """工作进程初始化：映射共享面板（可作为进程池的 initializer）"""
+    global _PANEL, _PANEL_SHM, _PANEL_META
+    _PANEL, _PANEL_SHM = SharedPanel.attach(spec)
+    _PANEL_META = meta
+
+
+def attached_panel() -> Tuple[Dict[str, np.ndarray], Dict]:
+    """当前进程已映射的共享面板 (数组字典, 元数据)，见 attach_panel"""
+    return _PANEL, _PANEL_META
+
+
+def detach_panel():
+    """释放当前进程对共享面板的映射"""
+    _PANEL.clear()
+    for block in _PANEL_SHM:
+        block.close()
+    _PANEL_SHM.clear()
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    """按交易日（行）在候选股票中做min-max标准化，最大值等于最小值时为NaN"""
+    low = np.nanmin(values, axis=1, keepdims=True)
+    high = np.nanmax(values, axis=1, keepdims=True)
+    return (values - low) / (high - low)
+
+
+def _pe_score(pe: np.ndarray) -> np.ndarray:
+    """市盈率评分（与 _calculate_composite_score 未开盘分支一致）"""
+    return np.select(
+        [np.isnan(pe) | (pe <= 0), (pe >= 15) & (pe <= 25),
+         ((pe >= 10) & (pe < 15)) | ((pe > 25) & (pe <= 35)),
+         ((pe >= 5) & (pe < 10)) | ((pe > 35) & (pe <= 50))],
+        [0.0, 1.0, 0.8, 0.6], default=0.3)
+
+
+def select_mask(panel: Dict[str, np.ndarray], mode_configs: Dict[str, Dict], max_stocks: int,
+                auto_adjust_mode: bool = True) -> np.ndarray:
+    """
+    在整个面板上向量化执行选股，规则与 AdvancedStockPicker.select_stocks_advanced 一致
+
+    Args:
+        panel: 面板数组
+        mode_configs: 各市场模式下的完整参数
+        max_stocks: 每日最多选股数量
+        auto_adjust_mode: 是否按每日市场环境切换市场模式
+
+    Returns:
+        (交易日 × 股票) 的选中标记
+    """
+    values = panel['values']
+    num_days = values.shape[0]
+    price, gain, turnover, volume_ratio, market_cap, pe = (values[:, :, j] for j in range(len(PANEL_FIELDS)))
+
+    # 每个交易日适用的参数
+    day_modes = panel['mode'] if auto_adjust_mode else np.zeros(num_days, dtype=np.int64)
+    def threshold(key: str) -> np.ndarray:
+        return np.array([mode_configs[MODES[m]][key] for m in day_modes])[:, None]
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        # 市场环境：上涨占比不足的交易日不选股（上涨占比恰为0.5视为开盘前，仍然选股）
+        up_ratio = panel['up_ratio']
+        good_day = (up_ratio > threshold('market_threshold')[:, 0]) | (up_ratio == 0.5)
+
+        # 与 apply_selection_criteria 一致：缺失的换手率/涨幅按0、量比按1填充
+        turnover_filled = np.where(np.isnan(turnover), 0.0, turnover)
+        gain_filled = np.where(np.isnan(gain), 0.0, gain)
+        volume_ratio_filled = np.where(np.isnan(volume_ratio), 1.0, volume_ratio)
+        has_gain = ~np.isnan(gain).all(axis=1, keepdims=True)
+        passed = (
+            panel['tradable'] & good_day[:, None] &
+            (~has_gain | (gain < 9.5)) &
+            (market_cap >= threshold('min_market_cap')) & (market_cap <= threshold('max_market_cap')) &
+            (price >= threshold('min_price')) & (price <= threshold('max_price')) &
+            (pe > 0) &
+            (turnover_filled >= threshold('min_turnover')) & (turnover_filled <= threshold('max_turnover')) &
+            (gain_filled >= threshold('min_gain')) & (gain_filled <= threshold('max_gain')) &
+            (volume_ratio_filled >= threshold('min_volume_ratio')) & (volume_ratio_filled <= threshold('max_volume_ratio'))
+        )
+
+        def among_passed(array: np.ndarray) -> np.ndarray:
+            return np.where(passed, array, np.nan)
+
+        # 综合得分：有量比数据时按量比/换手率/涨幅，否则按市值/市盈率
+        vr, to, gn, cap = (among_passed(a) for a in (volume_ratio_filled, turnover_filled, gain_filled, market_cap))
+        def normalized(array: np.ndarray) -> np.ndarray:
+            result = _minmax(array)
+            constant = (np.nanmax(array, axis=1, keepdims=True) <= np.nanmin(array, axis=1, keepdims=True))
+            return np.where(constant, 0.5, result)
+
+        trading_score = normalized(vr) * 0.4 + normalized(to) * 0.3 + normalized(gn) * 0.3
+        fundamental_score = normalized(-cap) * 0.6 + _pe_score(pe) * 0.4
+        has_trading_data = (passed & (volume_ratio_filled != 1.0)).any(axis=1, keepdims=True)
+        composite = np.where(has_trading_data, trading_score, fundamental_score)
+
+        # 竞价得分（与 apply_auction_score 一致）：当日候选股票有竞价因子时，按各因子百分位排名的均值
+        # （缺失记0.5）以 score_weight 计入综合得分
+        weight = AUCTION_CAPTURE_CONFIG['score_weight']
+        if weight > 0 and 'auction' in panel:
+            ranks = np.stack([pd.DataFrame(among_passed(panel['auction'][:, :, k])).rank(axis=1, pct=True).to_numpy()
+                              for k in range(panel['auction'].shape[2])])
+            auction_score = np.nanmean(ranks, axis=0)
+            auction_score = np.where(np.isnan(auction_score), 0.5, auction_score)
+            has_auction = ~np.isnan(ranks).all(axis=(0, 2))
+            composite = np.where(has_auction[:, None], composite * (1 - weight) + auction_score * weight, composite)
+
+        # 风险评分与风险调整得分
+        pe_passed = among_passed(pe)
+        valuation = (pe_passed - np.nanmedian(pe_passed, axis=1, keepdims=True)) / np.nanstd(pe_passed, axis=1, ddof=1, keepdims=True)
+        risk = to / 20 * 0.4 + np.clip(valuation, 0, 1) * 0.3 + (1 - _minmax(cap)) * 0.3
+        score = composite * (1 - risk)
+
+    # 每日取风险调整得分前N：得分为NaN的候选排在有效得分之后，未通过的股票排在最后
+    sort_key = np.where(passed, np.where(np.isnan(score), -np.finfo(np.float64).max, score), -np.inf)
+    top = np.argsort(-sort_key, axis=1, kind='stable')[:, :max_stocks]
+    rows = np.arange(num_days)[:, None]
+    selected = np.zeros_like(passed)
+    selected[rows, top] = passed[rows, top]
+    return selected
+
+
+def evaluate(panel: Dict[str, np.ndarray], mode_configs: Dict[str, Dict], horizons: Sequence[int],
+             max_stocks: int, auto_adjust_mode: bool = True) -> Dict:
+    """评估一个参数组合：各持有期命中率、平均收益，以及首个持有期等权组合的累计收益和最大回撤"""
+    selected = select_mask(panel, mode_configs, max_stocks, auto_adjust_mode)
+    metrics = {
+        'total_picks': int(selected.sum()),
+        'days_with_picks': int(selected.any(axis=1).sum()),
+        'horizons': {},
+    }
+    daily = None
+    for n in horizons:
+        returns = np.where(selected, panel[f'fwd_{n}'], np.nan)
+        picked = returns[~np.isnan(returns)]
+        metrics['horizons'][n] = {
+            'mean_return': float(picked.mean()) if picked.size else 0.0,
+            'hit_rate': float((picked > 0).mean()) if picked.size else 0.0,
+        }
+        if daily is None:
+            counts = (~np.isnan(returns)).sum(axis=1)
+            daily = np.where(counts > 0, np.nansum(returns, axis=1) / np.maximum(counts, 1), 0.0)
+    daily = pd.Series(daily)
+    metrics['cumulative_return'] = float((1 + daily).prod() - 1)
+    metrics['max_drawdown'] = max_drawdown(daily)
+    return metrics
+
+
+def mode_configs_for(overrides: Dict) -> Dict[str, Dict]:
+    """给定参数覆盖下各市场模式的完整参数（每个进程复用一个选股器计算）"""
+    global _WORKER_PICKER
+    if _WORKER_PICKER is None:
+        _WORKER_PICKER = AdvancedStockPicker()
+    _WORKER_PICKER.config_overrides = overrides
+    return {mode: _WORKER_PICKER._get_adjusted_config(mode) for mode in MODES}
+
+
+def _evaluate_batch(task: Tuple[List[Dict], int, bool]) -> List[Dict]:
+    """工作进程中评估一批参数组合"""
+    batch, max_stocks, auto_adjust_mode = task
+    results = []
+    for params in batch:
+        mode_configs = mode_configs_for(expand_params(params))
+        panel, meta = attached_panel()
+        metrics = evaluate(panel, mode_configs, meta['horizons'], max_stocks, auto_adjust_mode)
+        results.append({'params': params, **metrics})
+    return results
+
+
+class SweepResultStore:
+    """参数扫描结果表（SQLite）"""
+
+    def __init__(self, db_path: str = SWEEP_CONFIG['db_path']):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sweep_results (
+                    run_id TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    start_date TEXT,
+                    end_date TEXT,
+                    horizon INTEGER,
+                    total_picks INTEGER,
+                    days_with_picks INTEGER,
+                    hit_rate REAL,
+                    mean_return REAL,
+                    cumulative_return REAL,
+                    max_drawdown REAL,
+                    metrics TEXT,
+                    created_at TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sweep_run ON sweep_results (run_id)")
+
+    def insert(self, run_id: str, start: str, end: str, results: List[Dict]):
+        """写入一批评估结果，主要指标取首个持有期"""
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = []
+        for result in results:
+            horizon = min(result['horizons'])
+            primary = result['horizons'][horizon]
+            rows.append((
+                run_id, json.dumps(result['params'], ensure_ascii=False, sort_keys=True), start, end, horizon,
+                result['total_picks'], result['days_with_picks'], primary['hit_rate'], primary['mean_return'],
+                result['cumulative_return'], result['max_drawdown'],
+                json.dumps(result['horizons']), created_at,
+            ))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("INSERT INTO sweep_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def query(self, run_id: str = None, order_by: str = 'mean_return', limit: int = None) -> pd.DataFrame:
+        """
+        查询扫描结果
+
+        Args:
+            run_id: 扫描批次，默认全部
+            order_by: 排序指标（降序）
+            limit: 返回条数
+        """
+        if order_by not in ('hit_rate', 'mean_return', 'cumulative_return', 'max_drawdown', 'total_picks'):
+            raise ValueError(f"不支持的排序指标: {order_by}")
+        sql = "SELECT * FROM sweep_results"
+        args = []
+        if run_id:
+            sql += " WHERE run_id = ?"
+            args.append(run_id)
+        sql += f" ORDER BY {order_by} DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with sqlite3.connect(self.db_path) as conn:
+            return pd.read_sql_query(sql, conn, params=args)
+
+
+class ParameterSweep:
+    """基于共享内存面板的并行参数扫描"""
+
+    def __init__(self,
+                 store: LocalDataStore = None,
+                 result_store: SweepResultStore = None,
+                 horizons: Sequence[int] = BACKTEST_CONFIG['horizons'],
+                 max_stocks: int = BACKTEST_CONFIG['max_stocks'],
+                 auto_adjust_mode: bool = True,
+                 workers: int = BACKTEST_CONFIG['workers'],
+                 batch_size: int = SWEEP_CONFIG['batch_size']):
+        """
+        初始化参数扫描
+
+        Args:
+            store: 本地历史快照存储
+            result_store: 扫描结果表
+            horizons: 远期收益持有期，首个持有期为主要指标
+            max_stocks: 每日最多选股数量
+            auto_adjust_mode: 是否按每日市场环境切换市场模式
+            workers: 并行进程数，None为CPU核数，1为在当前进程内串行执行
+            batch_size: 每个任务评估的参数组合数
+        """
+        self.store = store or LocalDataStore(DEFAULT_STORE_DIR)
+        self.result_store = result_store or SweepResultStore()
+        self.horizons = list(horizons)
+        self.max_stocks = max_stocks
+        self.auto_adjust_mode = auto_adjust_mode
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def run(self, start: str, end: str, param_sets: List[Dict], run_id: str = None) -> pd.DataFrame:
+        """
+        评估参数组合并写入结果表
+
+        Args:
+            start: 开始日期
+            end: 结束日期
+            param_sets: 参数组合列表（扁平键，模式调整用 'adjustments.<模式>.<参数>'）
+            run_id: 扫描批次标识，默认按时间生成
+
+        Returns:
+            本批次结果（按首个持有期平均收益降序）
+        """
+        run_id = run_id or datetime.now().strftime('sweep_%Y%m%d_%H%M%S')
+        started = time.perf_counter()
+        days = trading_days(start, end)
+        if not days:
+            raise ValueError(f"{start} - {end} 区间内没有交易日")
+
+        arrays, meta = build_panel(self.store, days, self.horizons)
+        logger.info(f"面板已构建: {len(days)} 个交易日 × {len(meta['codes'])} 只股票, "
+                    f"{sum(a.nbytes for a in arrays.values()) / 1e6:.1f}MB")
+
+        batches = [param_sets[i:i + self.batch_size] for i in range(0, len(param_sets), self.batch_size)]
+        tasks = [(batch, self.max_stocks, self.auto_adjust_mode) for batch in batches]
+
+        shared = SharedPanel(arrays)
+        try:
+            if self.workers == 1:
+                attach_panel(shared.spec, meta)
+                for task in tasks:
+                    self.result_store.insert(run_id, days[0], days[-1], _evaluate_batch(task))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=attach_panel,
+                                         initargs=(shared.spec, meta)) as executor:
+                    for results in executor.map(_evaluate_batch, tasks):
+                        self.result_store.insert(run_id, days[0], days[-1], results)
+        finally:
+            detach_panel()
+            shared.close()
+
+        logger.info(f"参数扫描完成: {len(param_sets)} 组参数, 用时 {time.perf_counter() - started:.1f}s, 批次 {run_id}")
+        return self.result_store.query(run_id)
+
+
+def main():
+    """主函数 - 执行参数扫描"""
+    parser = argparse.ArgumentParser(description='选股参数并行扫描')
+    parser.add_argument('--start', required=True, help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYYMMDD')
+    parser.add_argument('--random', type=int, default=0, help='随机抽样数量，0表示完整网格')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--workers', type=int, default=BACKTEST_CONFIG['workers'], help='并行进程数')
+    parser.add_argument('--run-id', default=None, help='扫描批次标识')
+    parser.add_argument('--top', type=int, default=20, help='显示前N组参数')
+    args = parser.parse_args()
+
+    space = SWEEP_CONFIG['param_space']
+    param_sets = random_sample(space, args.random, args.seed) if args.random else grid(space)
+    print(f"🔍 共 {len(param_sets)} 组参数待评估")
+
+    sweep = ParameterSweep(workers=args.workers)
+    results = sweep.run(args.start, args.end, param_sets, run_id=args.run_id)
+    columns = ['params', 'total_picks', 'hit_rate', 'mean_return', 'cumulative_return', 'max_drawdown']
+    print(results[columns].head(args.top).to_string(index=False))
+    print(f"💾 结果已保存至: {sweep.result_store.db_path} (run_id={results['run_id'].iloc[0] if not results.empty else ''})")
+
+
+if __name__ == "__main__":
+    main()
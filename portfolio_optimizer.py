@@ -0,0 +1,434 @@
+"""
+马科维茨投资组合构建
+Markowitz Portfolio Optimizer
+
+为最终选出的股票分配权重（docs/3_investment_portfolio.md：组合内股票相关性越低越能对冲系统性风险）。
+
+收益率来自本地历史快照：全部股票的日收益率保存在滚动窗口中，新交易日到达时只写入一行；
+候选股票的协方差按 Ledoit-Wolf 方法向常数方差目标收缩，并按 (候选股票, 窗口版本) 缓存。
+最小方差和最大夏普权重在单只股票权重上限约束下用主动集法精确求解二次规划，
+不依赖scipy，50-200只候选股票毫秒级完成。
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backtester import MARKET_DATA_DATASET, trading_days
+from config import PORTFOLIO_CONFIG
+from utils.data_store import LocalDataStore, DEFAULT_STORE_DIR
+from utils.trading_calendar import trading_calendar
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METHODS = ('min_variance', 'max_sharpe')
+
+
+def ledoit_wolf(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Ledoit-Wolf 收缩协方差（收缩目标为平均方差 × 单位阵）
+
+    Args:
+        returns: (交易日 × 股票) 收益率，不含NaN
+
+    Returns:
+        (协方差矩阵, 收缩强度)
+    """
+    num_days, num_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / num_days
+    target = np.trace(sample) / num_assets
+    distance = np.sum(sample ** 2) - 2 * target * np.trace(sample) + target ** 2 * num_assets  # ||S - μI||²
+    squared = centered ** 2
+    variance = (np.sum(squared.T @ squared) / num_days - np.sum(sample ** 2)) / num_days
+    shrinkage = float(min(variance, distance) / distance) if distance > 0 else 1.0
+    covariance = (1 - shrinkage) * sample
+    covariance[np.diag_indices(num_assets)] += shrinkage * target
+    return covariance, shrinkage
+
+
+def project_capped_simplex(values: np.ndarray, cap: float, tau: float = None) -> Tuple[np.ndarray, float]:
+    """
+    欧氏投影到 {w: Σw = 1, 0 <= w <= cap}
+
+    投影为 clip(v - τ, 0, cap)，τ 由分段线性方程 Σclip(v - τ, 0, cap) = 1 确定；
+    用牛顿迭代求解（可用上一次的 τ 热启动），在括号区间内以二分兜底
+
+    Returns:
+        (投影结果, τ)
+    """
+    low, high = values.min() - cap, values.max()
+    tau = (low + high) / 2 if tau is None or not low <= tau <= high else tau
+    for _ in range(100):
+        weights = np.clip(values - tau, 0, cap)
+        excess = weights.sum() - 1
+        if abs(excess) < 1e-12:
+            break
+        if excess > 0:
+            low = tau
+        else:
+            high = tau
+        free = np.count_nonzero((values - tau > 0) & (values - tau < cap))
+        step = tau + excess / free if free else (low + high) / 2
+        tau = step if low < step < high else (low + high) / 2
+    return np.clip(values - tau, 0, cap), tau
+
+
+def _solve_free(quadratic: np.ndarray, linear: np.ndarray, cap: float,
+                lower: np.ndarray, upper: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    固定 lower 处为0、upper 处为上限，在其余变量上解等式约束的KKT方程组
+
+    Returns:
+        (权重, 各变量的乘子 g - ν)；自由变量的乘子为0
+    """
+    free = ~(lower | upper)
+    weights = np.where(upper, cap, 0.0)
+    num_free = int(free.sum())
+    if num_free == 0:
+        # 没有自由变量时 ν 只受乘子符号约束：取 [max g_U, min g_L] 的中点
+        gradient = quadratic @ weights - linear
+        high = gradient[lower].min() if lower.any() else gradient[upper].max()
+        low = gradient[upper].max() if upper.any() else high
+        return weights, gradient - (low + high) / 2
+    # [Q_FF  -1] [w_F]   [c_F - Q_FU·cap]
+    # [1'     0] [ ν ] = [1 - Σw_U       ]
+    system = np.zeros((num_free + 1, num_free + 1))
+    system[:num_free, :num_free] = quadratic[np.ix_(free, free)]
+    system[:num_free, -1] = -1
+    system[-1, :num_free] = 1
+    rhs = np.append(linear[free] - quadratic[np.ix_(free, upper)] @ weights[upper], 1 - weights.sum())
+    solution = np.linalg.solve(system, rhs)
+    weights[free] = solution[:-1]
+    multipliers = quadratic @ weights - linear - solution[-1]
+    multipliers[free] = 0.0
+    return weights, multipliers
+
+
+def _primal_active_set(quadratic: np.ndarray, linear: np.ndarray, cap: float, weights: np.ndarray) -> np.ndarray:
+    """从可行点出发的原始主动集法，每次迭代加入一个阻挡约束或移出一个乘子符号错误的约束"""
+    lower, upper = weights <= 0, weights >= cap
+    weights = np.where(lower, 0.0, np.where(upper, cap, weights))
+    for _ in range(10 * len(linear) + 10):
+        candidate, multipliers = _solve_free(quadratic, linear, cap, lower, upper)
+        direction = candidate - weights
+        free = ~(lower | upper)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            limits = np.where(free & (direction < -1e-15), -weights / direction,
+                              np.where(free & (direction > 1e-15), (cap - weights) / direction, np.inf))
+        blocking = int(np.argmin(limits))
+        if limits[blocking] < 1:
+            weights = weights + limits[blocking] * direction
+            if direction[blocking] < 0:
+                lower[blocking], weights[blocking] = True, 0.0
+            else:
+                upper[blocking], weights[blocking] = True, cap
+            continue
+        weights = candidate
+        violation = np.where(lower, -multipliers, 0.0) + np.where(upper, multipliers, 0.0)
+        worst = int(np.argmax(violation))
+        if violation[worst] <= 1e-14:
+            return weights
+        lower[worst] = upper[worst] = False
+    logger.warning("主动集法达到最大迭代次数")
+    return weights
+
+
+def solve_capped_qp(quadratic: np.ndarray, linear: np.ndarray, cap: float,
+                    start: np.ndarray = None, max_iter: int = 30) -> np.ndarray:
+    """
+    求解 min ½w'Qw - c'w，约束 Σw = 1、0 <= w <= cap（Q 正定）
+
+    先用原始-对偶主动集法按原始可行性和乘子符号整体更新主动集，通常几次迭代即可精确收敛；
+    出现循环时把当前迭代点投影为可行点，再用单调收敛的原始主动集法完成求解
+
+    Args:
+        start: 相近问题的解，用其中处于0和上限的变量作为初始主动集
+    """
+    num_assets = len(linear)
+    if start is None:
+        lower = np.zeros(num_assets, dtype=bool)
+        upper = np.zeros(num_assets, dtype=bool)
+    else:
+        lower, upper = start <= 1e-12, start >= cap - 1e-12
+    weights = np.full(num_assets, 1.0 / num_assets)
+    for _ in range(max_iter):
+        weights, multipliers = _solve_free(quadratic, linear, cap, lower, upper)
+        free = ~(lower | upper)
+        new_lower = np.where(free, weights < 0, lower & (multipliers > 0))
+        new_upper = np.where(free, weights > cap, upper & (multipliers < 0))
+        if (new_lower == lower).all() and (new_upper == upper).all():
+            return weights
+        lower, upper = new_lower, new_upper
+        if not (~(lower | upper)).any():
+            break
+    return _primal_active_set(quadratic, linear, cap, project_capped_simplex(weights, cap)[0])
+
+
+def feasible_cap(num_assets: int, max_weight: float) -> float:
+    """股票数 × 权重上限不足100%时放宽到等权"""
+    return max(max_weight, 1.0 / num_assets)
+
+
+def min_variance_weights(covariance: np.ndarray, max_weight: float = 1.0) -> np.ndarray:
+    """带权重上限的最小方差组合"""
+    cap = feasible_cap(len(covariance), max_weight)
+    return solve_capped_qp(covariance, np.zeros(len(covariance)), cap)
+
+
+def max_sharpe_weights(covariance: np.ndarray, mean: np.ndarray, max_weight: float = 1.0,
+                       risk_free_rate: float = 0.0, max_iter: int = 50) -> np.ndarray:
+    """
+    带权重上限的最大夏普组合
+
+    夏普比率在约束集上的最优解满足风险厌恶系数 γ = 超额收益 / 方差 时均值-方差问题
+    max (μ-r)'w - γ/2·w'Σw 的最优性条件，因此交替更新 γ 和均值-方差最优组合直到 γ 不变；
+    所有股票的预期收益都不超过无风险利率时退化为最小方差组合
+    """
+    excess = mean - risk_free_rate
+    weights = min_variance_weights(covariance, max_weight)
+    if not (excess > 0).any():
+        return weights
+
+    cap = feasible_cap(len(covariance), max_weight)
+    sharpe = lambda w: excess @ w / np.sqrt(w @ covariance @ w)
+    best, best_sharpe = weights, sharpe(weights)
+    gamma = max(excess @ weights, excess.max() * cap) / (weights @ covariance @ weights)
+    for _ in range(max_iter):
+        weights = solve_capped_qp(gamma * covariance, excess, cap, start=weights)
+        if sharpe(weights) > best_sharpe:
+            best, best_sharpe = weights, sharpe(weights)
+        updated = max(excess @ weights, 1e-12) / (weights @ covariance @ weights)
+        if abs(updated - gamma) <= 1e-9 * gamma:
+            break
+        gamma = updated
+    return best
+
+
+class ReturnWindow:
+    """全部股票最近 lookback 个交易日的日收益率（环形缓冲区），新交易日到达时增量更新"""
+
+    def __init__(self, lookback: int):
+        self.lookback = lookback
+        self.codes = pd.Index([], dtype=object)
+        self.last_day = None
+        self.version = 0
+        self._returns = np.full((lookback, 0), np.nan)
+        self._last_close = np.array([])
+        self._position = 0
+        self._count = 0
+
+    def update(self, day: str, closes: pd.Series):
+        """
+        加入一个交易日的收盘价
+
+        Args:
+            day: 交易日 YYYYMMDD，必须晚于已加入的交易日
+            closes: 以股票代码为索引的收盘价
+        """
+        if self.last_day and day <= self.last_day:
+            raise ValueError(f"交易日 {day} 不晚于窗口最新交易日 {self.last_day}")
+        closes = closes[~closes.index.duplicated()]
+        new_codes = closes.index.difference(self.codes)
+        if len(new_codes):
+            self.codes = self.codes.append(new_codes)
+            self._returns = np.hstack([self._returns, np.full((self.lookback, len(new_codes)), np.nan)])
+            self._last_close = np.concatenate([self._last_close, np.full(len(new_codes), np.nan)])
+
+        close = np.full(len(self.codes), np.nan)
+        close[self.codes.get_indexer(closes.index)] = closes.to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            daily_return = close / self._last_close - 1
+        if self.last_day is not None:
+            self._returns[self._position] = daily_return
+            self._position = (self._position + 1) % self.lookback
+            self._count = min(self._count + 1, self.lookback)
+        self._last_close = np.where(np.isnan(close), self._last_close, close)
+        self.last_day = day
+        self.version += 1
+
+    def returns(self, codes: Sequence[str]) -> np.ndarray:
+        """候选股票的收益率（按时间顺序，交易日 × 股票），不在窗口中的股票为NaN"""
+        order = (np.arange(self._count) + self._position - self._count) % self.lookback
+        columns = self.codes.get_indexer(pd.Index(codes))
+        result = np.full((self._count, len(columns)), np.nan)
+        result[:, columns >= 0] = self._returns[order][:, columns[columns >= 0]]
+        return result
+
+    @staticmethod
+    def load_closes(store: LocalDataStore, day: str) -> pd.Series:
+        """从本地快照读取一个交易日的收盘价"""
+        df = store.load(MARKET_DATA_DATASET, day)
+        if df is None or df.empty:
+            return None
+        price_col = '最新' if '最新' in df.columns else '最新价'
+        closes = pd.to_numeric(df[price_col], errors='coerce')
+        closes.index = df['代码'].astype(str)
+        return closes
+
+
+class PortfolioOptimizer:
+    """最终选股的组合权重优化"""
+
+    def __init__(self,
+                 store: LocalDataStore = None,
+                 method: str = PORTFOLIO_CONFIG['method'],
+                 lookback_days: int = PORTFOLIO_CONFIG['lookback_days'],
+                 max_weight: float = PORTFOLIO_CONFIG['max_weight'],
+                 min_history: int = PORTFOLIO_CONFIG['min_history'],
+                 risk_free_rate: float = PORTFOLIO_CONFIG['risk_free_rate']):
+        """
+        初始化组合优化
+
+        Args:
+            store: 本地历史快照存储
+            method: 优化方法 ('min_variance', 'max_sharpe')
+            lookback_days: 估计协方差的交易日数
+            max_weight: 单只股票权重上限
+            min_history: 有效收益率少于该天数的股票不参与配置
+            risk_free_rate: 日无风险利率（最大夏普用）
+        """
+        if method not in METHODS:
+            raise ValueError(f"不支持的优化方法: {method}")
+        self.store = store or LocalDataStore(DEFAULT_STORE_DIR)
+        self.method = method
+        self.lookback_days = lookback_days
+        self.max_weight = max_weight
+        self.min_history = min_history
+        self.risk_free_rate = risk_free_rate
+        self.window = ReturnWindow(lookback_days)
+        self._cache: Dict[Tuple, Tuple] = {}
+
+    def refresh(self, trade_date: str):
+        """把收益率窗口更新到交易日（已有窗口只加入新的交易日）"""
+        if self.window.last_day == trade_date:
+            return
+        if self.window.last_day is None or trade_date < self.window.last_day:
+            # 多取一个交易日作为首个收益率的基准
+            start = trading_calendar().previous(trade_date, self.lookback_days + 1) or trade_date
+            days = trading_days(start, trade_date)[-(self.lookback_days + 1):]
+            self.window = ReturnWindow(self.lookback_days)
+            self._cache.clear()
+        else:
+            next_day = trading_calendar().next(self.window.last_day)
+            days = trading_days(next_day, trade_date) if next_day else []
+        for day in days:
+            closes = ReturnWindow.load_closes(self.store, day)
+            if closes is not None:
+                self.window.update(day, closes)
+
+    def covariance(self, codes: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, List[str], float]:
+        """
+        候选股票的收缩协方差（按候选股票和窗口版本缓存）
+
+        Returns:
+            (协方差, 平均日收益, 参与配置的股票代码, 收缩强度)；停牌日收益率按0计
+        """
+        key = (tuple(codes), self.window.version)
+        if key not in self._cache:
+            returns = self.window.returns(codes)
+            history = (~np.isnan(returns)).sum(axis=0)
+            eligible = history >= self.min_history
+            returns = np.nan_to_num(returns[:, eligible])
+            used = [code for code, ok in zip(codes, eligible) if ok]
+            if len(used) >= 2:
+                covariance, shrinkage = ledoit_wolf(returns)
+            else:
+                covariance, shrinkage = np.diag(returns.var(axis=0)) if used else np.zeros((0, 0)), 0.0
+            mean = returns.mean(axis=0) if used else np.zeros(0)
+            self._cache = {k: v for k, v in self._cache.items() if k[1] == self.window.version}
+            self._cache[key] = (covariance, mean, used, shrinkage)
+        return self._cache[key]
+
+    def optimize(self, codes: Sequence[str], method: str = None) -> Tuple[pd.Series, Dict]:
+        """
+        计算组合权重
+
+        Args:
+            codes: 候选股票代码
+            method: 优化方法，默认为初始化时的方法
+
+        Returns:
+            (以股票代码为索引的权重, 组合统计)；历史数据不足的股票权重为0
+        """
+        method = method or self.method
+        started = time.perf_counter()
+        codes = [str(code) for code in codes]
+        covariance, mean, used, shrinkage = self.covariance(codes)
+
+        weights = pd.Series(0.0, index=codes)
+        if not used:
+            logger.warning("候选股票的历史数据均不足，按等权配置")
+            weights[:] = 1.0 / len(codes) if codes else 0.0
+        elif len(used) == 1:
+            weights[used[0]] = 1.0
+        elif used:
+            if method == 'max_sharpe':
+                optimal = max_sharpe_weights(covariance, mean, self.max_weight, self.risk_free_rate)
+            else:
+                optimal = min_variance_weights(covariance, self.max_weight)
+            weights[used] = optimal
+
+        optimal = weights[used].to_numpy()
+        volatility = float(np.sqrt(optimal @ covariance @ optimal)) if used else 0.0
+        stats = {
+            'method': method,
+            'candidates': len(codes),
+            'allocated': int((weights > 1e-6).sum()),
+            'excluded': [code for code in codes if code not in used],
+            'shrinkage': round(shrinkage, 4),
+            'expected_daily_return': float(optimal @ mean) if used else 0.0,
+            'expected_daily_volatility': volatility,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+        return weights, stats
+
+    def allocate(self, stocks: pd.DataFrame, trade_date: str, method: str = None) -> Tuple[pd.DataFrame, Dict]:
+        """
+        为选股结果分配组合权重
+
+        Args:
+            stocks: 选股结果（含 代码 列）
+            trade_date: 交易日期 YYYYMMDD
+            method: 优化方法
+
+        Returns:
+            (增加 权重 列的选股结果, 组合统计)
+        """
+        self.refresh(trade_date)
+        weights, stats = self.optimize(stocks['代码'].astype(str).tolist(), method)
+        result = stocks.copy()
+        result['权重'] = weights.to_numpy().round(4)
+        logger.info(f"组合权重计算完成（{stats['method']}）: {stats['allocated']}/{stats['candidates']} 只股票, "
+                    f"预期日波动 {stats['expected_daily_volatility']:.4f}, 用时 {stats['elapsed_ms']}ms")
+        return result, stats
+
+
+def main():
+    """主函数 - 为指定股票计算组合权重"""
+    parser = argparse.ArgumentParser(description='马科维茨组合权重')
+    parser.add_argument('codes', nargs='+', help='股票代码')
+    parser.add_argument('--date', default=datetime.now().strftime('%Y%m%d'), help='交易日期 YYYYMMDD')
+    parser.add_argument('--method', default=PORTFOLIO_CONFIG['method'], choices=METHODS, help='优化方法')
+    parser.add_argument('--max-weight', type=float, default=PORTFOLIO_CONFIG['max_weight'], help='单只股票权重上限')
+    args = parser.parse_args()
+
+    optimizer = PortfolioOptimizer(method=args.method, max_weight=args.max_weight)
+    optimizer.refresh(args.date)
+    weights, stats = optimizer.optimize(args.codes)
+    print(weights.round(4).to_string())
+    print(f"📊 {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+开盘前预热选股
+Pre-market Warm Start
+
+在开盘前（约8:00或前一晚）基于上一交易日收盘数据完成所有与开盘无关的计算：
+风险股票过滤、市值/股价/PE预筛选、各市场模式的阈值，并把候选池写入可内存映射的 .npy 文件。
+开盘拿到行情快照后只需在候选池上应用涨幅、换手率、量比等开盘相关条件。
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Tuple, Union, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_stock_picker import AdvancedStockPicker
+from config import MARKET_ENVIRONMENT_ADJUSTMENTS, SELECTION_CONFIG, WARM_START_CONFIG
+from utils import util
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 候选池文件的记录结构（字段名使用ASCII，保持 .npy 文件格式兼容）
+WARM_START_DTYPE = np.dtype([
+    ('code', 'U10'),
+    ('name', 'U16'),
+    ('prev_close', 'f8'),
+    ('circ_mv', 'f8'),
+    ('total_mv', 'f8'),
+    ('pe', 'f8'),
+    ('prev_volume', 'f8'),
+    ('prev_amount', 'f8'),
+    ('prev_turnover', 'f8'),
+    ('prev_gain', 'f8'),
+])
+
+# 候选池字段对应的上一交易日数据列名（按优先级）
+SOURCE_COLUMNS = {
+    'prev_close': ['最新价', '最新', '昨收'],  # 上一交易日收盘价即开盘日的昨收
+    'circ_mv': ['流通市值'],
+    'total_mv': ['总市值'],
+    'pe': ['市盈率', '市盈率-动态'],
+    'prev_volume': ['成交量'],
+    'prev_amount': ['成交额'],
+    'prev_turnover': ['换手率'],
+    'prev_gain': ['涨幅', '涨跌幅'],
+}
+
+
+def _first_numeric(df: pd.DataFrame, columns) -> np.ndarray:
+    for col in columns:
+        if col in df.columns:
+            return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.full(len(df), np.nan)
+
+
+class PreMarketWarmStart:
+    """开盘前预热：构建候选池文件，开盘时只应用开盘相关条件"""
+
+    def __init__(self, picker: AdvancedStockPicker = None, output_dir: str = WARM_START_CONFIG['output_dir']):
+        """
+        初始化预热器
+
+        Args:
+            picker: 高级选股器实例
+            output_dir: 候选池文件目录
+        """
+        self.picker = picker or AdvancedStockPicker(market_mode='normal')
+        self.output_dir = output_dir
+        self.universe: Optional[np.ndarray] = None
+        self.meta: Dict = {}
+        self._index: Optional[pd.Index] = None
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def paths(self, trade_date: str) -> Tuple[str, str]:
+        """候选池数据文件和元数据文件路径"""
+        base = os.path.join(self.output_dir, f"warm_start_{trade_date}")
+        return f"{base}.npy", f"{base}.json"
+
+    def _write_temp(self, path: str, write) -> str:
+        """在 path 所在目录创建唯一的临时文件并写入，返回临时文件路径"""
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=self.output_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _mode_configs(self) -> Dict[str, Dict]:
+        """各市场模式下的完整阈值配置"""
+        modes = ['normal'] + list(MARKET_ENVIRONMENT_ADJUSTMENTS.keys())
+        return {mode: self.picker._get_adjusted_config(mode) for mode in modes}
+
+    def build(self, trade_date: Union[str, datetime] = None, market_data: pd.DataFrame = None) -> str:
+        """
+        构建开盘日的候选池文件
+
+        Args:
+            trade_date: 开盘日期，默认今天（前一晚构建时传入下一交易日）
+            market_data: 上一交易日收盘后的全市场数据，默认通过选股器获取
+
+        Returns:
+            候选池数据文件路径
+        """
+        trade_date = util.convert_trade_date(trade_date or datetime.now())
+        ref_date = util.last_trading_day(trade_date)
+        logger.info(f"构建 {trade_date} 开盘预热候选池，参考数据日期: {ref_date}")
+
+        if market_data is None:
+            market_data = self.picker.get_market_data(trade_date=ref_date)
+        if market_data.empty:
+            raise ValueError(f"无法获取 {ref_date} 的市场数据，预热失败")
+
+        # 1. 风险股票过滤（ST、新股、退市、非主板等静态标记）
+        filtered = self.picker.filter_risk_stocks(market_data)
+
+        # 2. 按所有市场模式中最宽松的阈值预筛选，价格再放宽开盘可能的涨跌幅
+        mode_configs = self._mode_configs()
+        margin = WARM_START_CONFIG['price_margin']
+        min_cap = min(c['min_market_cap'] for c in mode_configs.values())
+        max_cap = max(c['max_market_cap'] for c in mode_configs.values())
+        min_price = min(c['min_price'] for c in mode_configs.values()) * (1 - margin)
+        max_price = max(c['max_price'] for c in mode_configs.values()) * (1 + margin)
+
+        columns = {name: _first_numeric(filtered, cols) for name, cols in SOURCE_COLUMNS.items()}
+        with np.errstate(invalid='ignore'):
+            keep = (
+                (columns['circ_mv'] >= min_cap) & (columns['circ_mv'] <= max_cap) &
+                (columns['prev_close'] >= min_price) & (columns['prev_close'] <= max_price) &
+                (columns['pe'] > 0)
+            )
+
+        universe = np.zeros(int(keep.sum()), dtype=WARM_START_DTYPE)
+        universe['code'] = filtered['代码'].astype(str).to_numpy()[keep]
+        universe['name'] = filtered['名称'].astype(str).to_numpy()[keep]
+        for name, values in columns.items():
+            universe[name] = values[keep]
+
+        # 3. 写入可内存映射的候选池文件和元数据：都先写临时文件，元数据先于数据替换，
+        #    读取方不会看到半成品，也不会看到新数据配旧元数据
+        data_path, meta_path = self.paths(trade_date)
+        meta = {
+            'trade_date': trade_date,
+            'ref_date': ref_date,
+            'built_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'universe_size': len(market_data),
+            'after_risk_filter': len(filtered),
+            'candidates': len(universe),
+            'price_margin': margin,
+            'mode_configs': mode_configs,
+        }
+        tmp_data = self._write_temp(data_path, lambda f: np.save(f, universe))
+        tmp_meta = self._write_temp(meta_path, lambda f: f.write(
+            json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8')))
+        os.replace(tmp_meta, meta_path)
+        os.replace(tmp_data, data_path)
+
+        logger.info(f"✅ 预热候选池已保存至: {data_path} ({len(universe)}/{len(market_data)} 只)")
+        return data_path
+
+    def load(self, trade_date: Union[str, datetime] = None) -> bool:
+        """
+        以内存映射方式加载候选池
+
+        Args:
+            trade_date: 开盘日期，默认今天
+
+        Returns:
+            是否加载成功
+        """
+        trade_date = util.convert_trade_date(trade_date or datetime.now())
+        data_path, meta_path = self.paths(trade_date)
+        if not os.path.exists(data_path) or not os.path.exists(meta_path):
+            logger.warning(f"未找到 {trade_date} 的预热候选池")
+            return False
+
+        self.universe = np.load(data_path, mmap_mode='r')
+        with open(meta_path, encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self._index = pd.Index(self.universe['code'])
+        logger.info(f"已加载预热候选池: {len(self.universe)} 只 (构建于 {self.meta.get('built_at')})")
+        return True
+
+    def select_at_open(self,
+                       market_data: pd.DataFrame,
+                       max_stocks: int = None,
+                       auto_adjust_mode: bool = True) -> Tuple[pd.DataFrame, Dict]:
+        """
+        开盘后基于候选池选股，只在候选股票上应用开盘相关条件
+
+        Args:
+            market_data: 开盘后的全市场行情快照
+            max_stocks: 最大选择股票数量
+            auto_adjust_mode: 是否自动调整市场模式
+
+        Returns:
+            (选中的股票DataFrame, 选股统计信息)
+        """
+        if self.universe is None:
+            raise ValueError("尚未加载预热候选池，请先调用 load()")
+        if max_stocks is None:
+            max_stocks = SELECTION_CONFIG['max_stocks']
+
+        started = time.perf_counter()
+        picker = self.picker
+
+        # 市场环境判断需要全市场涨幅，计算是向量化的
+        if auto_adjust_mode:
+            recommended_mode = picker.analyze_market_environment(market_data)
+            if recommended_mode != picker.market_mode:
+                logger.info(f"自动调整市场模式: {picker.market_mode} -> {recommended_mode}")
+                config = self.meta.get('mode_configs', {}).get(recommended_mode) or picker._get_adjusted_config(recommended_mode)
+                for key, value in config.items():
+                    setattr(picker, key, value)
+                picker.market_mode = recommended_mode
+
+        is_good_market, up_ratio = picker.check_market_environment(market_data)
+        stats = {
+            'total_stocks': len(market_data),
+            'up_ratio': up_ratio,
+            'is_good_market': is_good_market,
+            'market_mode': picker.market_mode,
+            'warm_start': True,
+            'warm_start_candidates': len(self.universe),
+            'selection_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+        if not is_good_market and up_ratio != 0.5:
+            logger.warning("市场环境不佳，不进行选股")
+            return pd.DataFrame(), stats
+
+        # 只保留候选池中的股票，并补充预热文件中的静态字段
+        positions = self._index.get_indexer(market_data['代码'].astype(str))
+        in_universe = positions >= 0
+        live = market_data[in_universe].copy()
+        static = self.universe[positions[in_universe]]
+        stats['after_risk_filter'] = len(live)
+
+        # 开盘快照缺少市值/PE时用预热值，市值按最新价相对昨收的涨跌等比例调整
+        price = _first_numeric(live, ['最新价', '最新'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where((static['prev_close'] > 0) & ~np.isnan(price), price / static['prev_close'], 1.0)
+        fallback = {
+            '昨收': static['prev_close'],
+            '流通市值': static['circ_mv'] * scale,
+            '总市值': static['total_mv'] * scale,
+            '市盈率': static['pe'],
+        }
+        for name, values in fallback.items():
+            current = _first_numeric(live, [name])
+            live[name] = np.where(np.isnan(current), values, current)
+
+        # 开盘相关条件：技术面过滤、涨幅、换手率、量比（静态条件按实际模式阈值复核）
+        technical_filtered = picker.apply_technical_filter(live)
+        stats['after_technical_filter'] = len(technical_filtered)
+
+        selected_stocks = picker.apply_selection_criteria(technical_filtered)
+        stats['after_criteria_filter'] = len(selected_stocks)
+        stats['after_industry_filter'] = len(selected_stocks)
+
+        final_stocks = picker.enhanced_ranking(selected_stocks).head(max_stocks) if not selected_stocks.empty else selected_stocks
+        stats['final_selection'] = len(final_stocks)
+        stats['time_to_pick_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+        logger.info(f"预热选股完成，最终选出 {len(final_stocks)} 只股票，用时 {stats['time_to_pick_ms']}ms")
+        return final_stocks, stats
+
+
+def main():
+    """主函数 - 构建预热候选池或基于候选池开盘选股"""
+    parser = argparse.ArgumentParser(description='开盘前预热选股')
+    parser.add_argument('action', choices=['build', 'select'], help='build: 开盘前构建候选池; select: 开盘后选股')
+    parser.add_argument('--trade-date', default=None, help='开盘日期 YYYYMMDD，默认今天')
+    parser.add_argument('--max-stocks', type=int, default=SELECTION_CONFIG['max_stocks'], help='最大选股数量')
+    args = parser.parse_args()
+
+    warm_start = PreMarketWarmStart()
+    if args.action == 'build':
+        path = warm_start.build(trade_date=args.trade_date)
+        print(f"💾 预热候选池已保存至: {path}")
+        return
+
+    if not warm_start.load(args.trade_date):
+        print("❌ 未找到预热候选池，请先在开盘前运行 build")
+        return
+    market_data = warm_start.picker.get_market_data(trade_date=datetime.now())
+    selected_stocks, stats = warm_start.select_at_open(market_data, max_stocks=args.max_stocks)
+    warm_start.picker.display_advanced_results(selected_stocks, stats)
+
+
+if __name__ == "__main__":
+    main()
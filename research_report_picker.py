@@ -0,0 +1,356 @@
+"""
+个股研报事件选股
+Research Report Event Picker
+
+选择当天发布的评级为"买入"的个股研报对应的股票，按近一个月个股研报数目降序排列取前N只
+（策略说明见 docs/2_pick_push_webchat.md）。
+
+研报数据来自东方财富研报接口（JSONP分页）：首页确定总页数后，其余页在有界线程池中并发抓取；
+研报按 infoCode 增量写入SQLite，只有完整抓取的日期才推进抓取进度；
+每只股票滚动30日的研报数由内存索引维护，排序时直接查表。
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import pandas as pd
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import RESEARCH_REPORT_CONFIG
+from utils.telemetry import call_upstream
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 研报接口字段 -> 存储列
+REPORT_FIELDS = {
+    'infoCode': 'info_code',
+    'stockCode': 'stock_code',
+    'stockName': 'stock_name',
+    'title': 'title',
+    'orgSName': 'org_name',
+    'emRatingName': 'rating',
+    'lastEmRatingName': 'last_rating',
+    'count': 'month_count',
+    'indvInduName': 'industry',
+    'publishDate': 'publish_date',
+}
+
+
+def parse_jsonp(text: str) -> Dict:
+    """解析 JSONP 响应（datatable123(...)），也兼容纯JSON"""
+    text = text.strip()
+    if not text.startswith('{'):
+        text = text.split('(', 1)[1].rsplit(')', 1)[0]
+    return json.loads(text)
+
+
+def normalize_report(record: Dict) -> Dict:
+    """把接口返回的一条研报转换为存储格式，发布日期统一为 YYYYMMDD"""
+    report = {column: record.get(field) for field, column in REPORT_FIELDS.items()}
+    report['publish_date'] = str(report['publish_date'] or '')[:10].replace('-', '')
+    report['stock_code'] = str(report['stock_code'] or '')
+    report['month_count'] = int(report['month_count'] or 0)
+    if not report['info_code']:
+        # 缺少研报编号时用股票、机构、日期和标题组合
+        report['info_code'] = '|'.join(str(report[k]) for k in ('stock_code', 'org_name', 'publish_date', 'title'))
+    return report
+
+
+class ResearchReportCrawler:
+    """东方财富个股研报分页抓取（有界并发）"""
+
+    def __init__(self,
+                 api_url: str = RESEARCH_REPORT_CONFIG['api_url'],
+                 page_size: int = RESEARCH_REPORT_CONFIG['page_size'],
+                 max_workers: int = RESEARCH_REPORT_CONFIG['max_workers'],
+                 timeout: float = RESEARCH_REPORT_CONFIG['timeout'],
+                 retries: int = RESEARCH_REPORT_CONFIG['retries']):
+        """
+        初始化研报抓取
+
+        Args:
+            api_url: 研报列表接口
+            page_size: 每页研报数
+            max_workers: 并发抓取页数上限
+            timeout: 单页请求超时（秒）
+            retries: 单页失败重试次数
+        """
+        self.api_url = api_url
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+
+    def page_url(self, begin: str, end: str, page_no: int) -> str:
+        """单页请求地址，日期格式 YYYY-MM-DD"""
+        params = {
+            'cb': 'datatable4263982', 'industryCode': '*', 'pageSize': self.page_size, 'industry': '*',
+            'rating': '*', 'ratingChange': '*', 'beginTime': begin, 'endTime': end, 'pageNo': page_no,
+            'fields': '', 'qType': 0, 'orgCode': '', 'code': '*', 'rcode': '', '_': int(time.time() * 1000),
+        }
+        return f"{self.api_url}?{urlencode(params)}"
+
+    def _request_page(self, begin: str, end: str, page_no: int) -> str:
+        with urlopen(self.page_url(begin, end, page_no), timeout=self.timeout) as response:
+            return response.read().decode('utf-8')
+
+    def fetch_page(self, begin: str, end: str, page_no: int) -> Dict:
+        """抓取一页（经 call_upstream 统计，可录制/回放），失败按指数退避重试"""
+        for attempt in range(self.retries + 1):
+            try:
+                return parse_jsonp(call_upstream('eastmoney', 'report_list', self._request_page, begin, end, page_no))
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"研报第 {page_no} 页抓取失败（第 {attempt + 1} 次）: {e}")
+                time.sleep(0.5 * 2 ** attempt)
+
+    def crawl(self, begin: str, end: str) -> List[Dict]:
+        """
+        抓取日期区间内的全部研报
+
+        Args:
+            begin: 起始日期 YYYYMMDD
+            end: 结束日期 YYYYMMDD
+
+        Returns:
+            研报列表（存储格式）；任意一页最终失败时抛出异常
+        """
+        begin, end = (datetime.strptime(d, '%Y%m%d').strftime('%Y-%m-%d') for d in (begin, end))
+        first = self.fetch_page(begin, end, 1)
+        pages = [first]
+        total_pages = int(first.get('TotalPage') or 1)
+        if first.get('data') and total_pages > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages += list(executor.map(lambda page_no: self.fetch_page(begin, end, page_no),
+                                           range(2, total_pages + 1)))
+        reports = [normalize_report(record) for page in pages for record in (page.get('data') or [])]
+        logger.info(f"研报抓取完成: {begin} ~ {end}, {total_pages} 页, {len(reports)} 篇")
+        return reports
+
+
+class ResearchReportStore:
+    """研报增量存储（SQLite，按 infoCode 去重）"""
+
+    def __init__(self, db_path: str = RESEARCH_REPORT_CONFIG['db_path']):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS research_reports (
+                    info_code TEXT PRIMARY KEY,
+                    {', '.join(f'{c} TEXT' for c in REPORT_FIELDS.values() if c != 'info_code')}
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_report_date ON research_reports (publish_date)")
+            conn.execute("CREATE TABLE IF NOT EXISTS crawl_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def insert(self, reports: Iterable[Dict]) -> List[Dict]:
+        """写入研报，返回此前未存储的新研报"""
+        columns = list(REPORT_FIELDS.values())
+        new_reports = []
+        with sqlite3.connect(self.db_path) as conn:
+            for report in reports:
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO research_reports ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [report[c] for c in columns])
+                if cursor.rowcount:
+                    new_reports.append(report)
+        return new_reports
+
+    def reports(self, start: str, end: str) -> pd.DataFrame:
+        """发布日期在 [start, end] 内的研报"""
+        with sqlite3.connect(self.db_path) as conn:
+            df = pd.read_sql_query(
+                "SELECT * FROM research_reports WHERE publish_date BETWEEN ? AND ? ORDER BY publish_date, info_code",
+                conn, params=[start, end])
+        df['month_count'] = pd.to_numeric(df['month_count'], errors='coerce').fillna(0).astype(int)
+        return df
+
+    def get_state(self, key: str) -> str:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT value FROM crawl_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("INSERT OR REPLACE INTO crawl_state VALUES (?, ?)", (key, value))
+
+
+class ReportCountIndex:
+    """每只股票滚动窗口内的研报数，窗口为 (截止日 - window_days, 截止日]"""
+
+    def __init__(self, window_days: int = RESEARCH_REPORT_CONFIG['window_days']):
+        self.window_days = window_days
+        self.as_of = None
+        self._daily: Dict[str, Counter] = {}
+        self._totals: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _cutoff(self) -> str:
+        return (datetime.strptime(self.as_of, '%Y%m%d') - timedelta(days=self.window_days)).strftime('%Y%m%d')
+
+    def add(self, stock_code: str, publish_date: str):
+        """加入一篇研报（超出窗口的忽略）"""
+        with self._lock:
+            if self.as_of and not (self._cutoff() < publish_date <= self.as_of):
+                return
+            self._daily.setdefault(publish_date, Counter())[stock_code] += 1
+            self._totals[stock_code] += 1
+
+    def advance(self, as_of: str):
+        """窗口向前滚动到新的截止日，移出过期日期的计数"""
+        with self._lock:
+            if self.as_of and as_of < self.as_of:
+                raise ValueError(f"滚动索引不能回退: {as_of} < {self.as_of}")
+            self.as_of = as_of
+            cutoff = self._cutoff()
+            for day in [day for day in self._daily if day <= cutoff]:
+                self._totals -= self._daily.pop(day)
+
+    def count(self, stock_code: str) -> int:
+        return self._totals.get(stock_code, 0)
+
+
+class ResearchReportPicker:
+    """个股研报事件选股"""
+
+    def __init__(self,
+                 store: ResearchReportStore = None,
+                 crawler: ResearchReportCrawler = None,
+                 window_days: int = RESEARCH_REPORT_CONFIG['window_days'],
+                 rating: str = RESEARCH_REPORT_CONFIG['rating']):
+        """
+        初始化研报选股
+
+        Args:
+            store: 研报增量存储
+            crawler: 研报抓取
+            window_days: 个股研报数统计窗口（自然日）
+            rating: 选取的研报评级
+        """
+        self.store = store or ResearchReportStore()
+        self.crawler = crawler or ResearchReportCrawler()
+        self.window_days = window_days
+        self.rating = rating
+        self.index = ReportCountIndex(window_days)
+
+    def _window_start(self, trade_date: str) -> str:
+        return (datetime.strptime(trade_date, '%Y%m%d') - timedelta(days=self.window_days - 1)).strftime('%Y%m%d')
+
+    def _rebuild_index(self, trade_date: str):
+        """从存储中重建截止到交易日的滚动索引"""
+        self.index = ReportCountIndex(self.window_days)
+        self.index.advance(trade_date)
+        for row in self.store.reports(self._window_start(trade_date), trade_date).itertuples():
+            self.index.add(row.stock_code, row.publish_date)
+
+    def update(self, trade_date: str) -> int:
+        """
+        增量抓取到交易日为止的研报
+
+        从上次完整抓取的日期（含当天，当天可能有新发布的研报）开始抓取，最多回溯一个统计窗口；
+        新研报写入存储并加入滚动索引
+
+        Returns:
+            新增研报数
+        """
+        complete_through = self.store.get_state('complete_through')
+        begin = max(filter(None, [complete_through, self._window_start(trade_date)]))
+        begin = min(begin, trade_date)
+
+        if self.index.as_of is None or trade_date < self.index.as_of:
+            self._rebuild_index(trade_date)
+        else:
+            self.index.advance(trade_date)
+
+        new_reports = self.store.insert(self.crawler.crawl(begin, trade_date))
+        for report in new_reports:
+            self.index.add(report['stock_code'], report['publish_date'])
+        if complete_through is None or trade_date > complete_through:
+            self.store.set_state('complete_through', trade_date)
+        logger.info(f"研报增量更新: {begin} ~ {trade_date}, 新增 {len(new_reports)} 篇")
+        return len(new_reports)
+
+    def select_stocks(self,
+                      trade_date: str = None,
+                      max_stocks: int = 5,
+                      market_data: pd.DataFrame = None,
+                      refresh: bool = True) -> Tuple[pd.DataFrame, Dict]:
+        """
+        研报事件选股
+
+        Args:
+            trade_date: 交易日期，格式YYYYMMDD，默认为今天
+            max_stocks: 最大选股数量
+            market_data: 行情数据（含 代码、最新价 等列），提供时合并到结果
+            refresh: 是否先增量抓取研报
+
+        Returns:
+            Tuple[pd.DataFrame, Dict]: (选股结果, 统计信息)
+        """
+        trade_date = trade_date or datetime.now().strftime('%Y%m%d')
+        if refresh:
+            self.update(trade_date)
+        elif self.index.as_of != trade_date:
+            self._rebuild_index(trade_date)
+
+        reports = self.store.reports(trade_date, trade_date)
+        rated = reports[reports['rating'] == self.rating]
+        stats = {'trade_date': trade_date, 'total_reports': len(reports), 'rated_reports': len(rated)}
+        if rated.empty:
+            logger.warning(f"{trade_date} 没有评级为{self.rating}的研报")
+            return pd.DataFrame(), stats
+
+        selected = (rated.groupby('stock_code', sort=False)
+                    .agg(名称=('stock_name', 'first'), 行业=('industry', 'first'),
+                         机构=('org_name', lambda s: '、'.join(dict.fromkeys(s))),
+                         研报标题=('title', 'first'), 当日研报数=('info_code', 'size'),
+                         接口研报数=('month_count', 'max'))
+                    .reset_index().rename(columns={'stock_code': '代码'}))
+        selected.insert(2, '评级', self.rating)
+        selected.insert(3, '近一个月研报数', selected['代码'].map(self.index.count))
+        selected = (selected.sort_values(['近一个月研报数', '接口研报数'], ascending=False, kind='stable')
+                    .head(max_stocks).reset_index(drop=True))
+
+        if market_data is not None and not market_data.empty:
+            quote_columns = [c for c in ('最新价', '涨幅', '市盈率', '流通市值') if c in market_data.columns]
+            quotes = market_data.assign(代码=market_data['代码'].astype(str))[['代码'] + quote_columns]
+            selected = selected.merge(quotes.drop_duplicates('代码'), on='代码', how='left')
+
+        stats['selected_count'] = len(selected)
+        logger.info(f"研报事件选股完成: {len(rated)} 篇{self.rating}研报, 选出 {len(selected)} 只股票")
+        return selected, stats
+
+
+def main():
+    """主函数 - 执行研报事件选股"""
+    parser = argparse.ArgumentParser(description='个股研报事件选股')
+    parser.add_argument('--date', default=datetime.now().strftime('%Y%m%d'), help='交易日期 YYYYMMDD')
+    parser.add_argument('--max-stocks', type=int, default=5, help='最大选股数量')
+    args = parser.parse_args()
+
+    selected, stats = ResearchReportPicker().select_stocks(args.date, args.max_stocks)
+    if selected.empty:
+        print(f"❌ {args.date} 没有符合条件的研报")
+        return
+    print(f"📑 {args.date} 共 {stats['rated_reports']} 篇买入评级研报，按近一个月研报数选出:")
+    print(selected[['代码', '名称', '近一个月研报数', '当日研报数', '机构']].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+测试共用的 fixture：按规则生成的默认交易日历、本地历史快照存储
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtester import MARKET_DATA_DATASET, trading_days
+from utils import trading_calendar as calendar_module
+from utils.data_store import LocalDataStore
+from utils.trading_calendar import TradingCalendar, set_trading_calendar
+
+# 测试不读取 .env、不拉取 trade_cal，也不写入全局的 /tmp/itrading/store
+_RULE_CALENDAR = TradingCalendar.from_rules()
+
+
+@pytest.fixture(autouse=True)
+def rule_calendar():
+    """默认交易日历使用周末和 CHINESE_HOLIDAYS 规则生成的日历，测试结束后恢复"""
+    previous = calendar_module._CALENDAR
+    set_trading_calendar(_RULE_CALENDAR)
+    yield _RULE_CALENDAR
+    set_trading_calendar(previous)
+
+
+def random_days(num_stocks: int = 300, seed: int = 0):
+    """随机生成的历史快照，包含ST股票、亏损股、缺失量比和不同的市场环境；返回 make_day(index, day)"""
+    rng = np.random.default_rng(seed)
+    names = [f"{'ST' if i % 37 == 0 else ''}股票{i}" for i in range(num_stocks)]
+    price = rng.uniform(3, 60, num_stocks)
+
+    def make_day(index: int, day: str) -> pd.DataFrame:
+        nonlocal price
+        drift = 2.5 if index % 4 == 0 else 0.5  # 部分交易日为牛市
+        gain = rng.normal(drift, 2.5, num_stocks)
+        price = price * (1 + gain / 100)
+        volume_ratio = rng.uniform(0.5, 4, num_stocks)
+        volume_ratio[rng.random(num_stocks) < 0.05] = np.nan
+        return pd.DataFrame({
+            '代码': [f"{600000 + i}" for i in range(num_stocks)],
+            '名称': names,
+            '最新': price,
+            '涨幅': gain,
+            '换手率': rng.uniform(1, 20, num_stocks),
+            '量比': volume_ratio,
+            '市盈率': rng.uniform(-10, 60, num_stocks),
+            '流通市值': rng.uniform(1e9, 2e10, num_stocks),
+        })
+    return make_day
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    """
+    在 tmp_path/store 下生成历史快照存储：make_store(start, end, num_stocks=300, seed=0, make_day=None)
+
+    make_day(index, day) 返回第 index 个交易日的快照，默认为 random_days(num_stocks, seed)
+    """
+    def factory(start: str = '20250701', end: str = '20250725', num_stocks: int = 300, seed: int = 0,
+                make_day=None) -> LocalDataStore:
+        store = LocalDataStore(str(tmp_path / 'store'))
+        make_day = make_day or random_days(num_stocks, seed)
+        for index, day in enumerate(trading_days(start, end)):
+            store.save(MARKET_DATA_DATASET, day, make_day(index, day))
+        return store
+    return factory
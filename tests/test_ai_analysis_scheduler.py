@@ -0,0 +1,154 @@
+"""
+测试AI分析预算调度：跳过进不了前K的股票、按得分顺序在时间/token预算内分析
+"""
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+import unify_stock_pick_ai_analyzer as unify
+from ai_analysis_scheduler import AIAnalysisScheduler, unreachable_top_k
+
+
+def candidates(num=24, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '代码': [f"{600000 + i}" for i in range(num)],
+        '名称': [f'股票{i}' for i in range(num)],
+        '流通市值': rng.uniform(30, 300, num),
+        '综合得分': np.sort(rng.uniform(0, 1, num))[::-1],
+        '风险评分': rng.uniform(0, 1, num),
+        '风险调整得分': rng.uniform(0, 1, num),
+    })
+
+
+def recorder(delays=None, default=0.0, deadlines=None):
+    calls, lock = [], threading.Lock()
+
+    def analyze(code, deadline=None):
+        with lock:
+            calls.append(code)
+            if deadlines is not None:
+                deadlines[code] = deadline.remaining()
+        time.sleep((delays or {}).get(code, default))
+        return {'ai_score': float(int(code) % 97), 'ai_analysis': '持有'}
+    return calls, analyze
+
+
+def test_unreachable_matches_best_case_ranking():
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        scores = rng.uniform(0, 80, 30)
+        skip = unreachable_top_k(scores, top_k=8, ai_points=20)
+        for i in range(len(scores)):
+            best = scores.copy()
+            best[i] += 20  # 自己AI满分，其他股票AI为0
+            assert skip[i] == (np.sum(best > best[i]) >= 8)
+
+
+def test_skipped_stocks_never_reach_top_k():
+    picker = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    stocks = candidates()
+    codes = stocks['代码'].tolist()
+    pre_ai = picker._pre_ai_score(stocks)
+    _, skipped = AIAnalysisScheduler().plan(codes, pre_ai, top_k=6, ai_points=20)
+    assert skipped
+
+    rng = np.random.default_rng(5)
+    for _ in range(200):
+        stocks['ai_score'] = rng.uniform(0, 100, len(stocks))
+        stocks.loc[stocks['代码'].isin(skipped), 'ai_score'] = 100.0
+        top = picker._calculate_final_score(stocks).nlargest(6, 'final_score')['代码']
+        assert not set(top) & set(skipped)
+
+
+def test_order_and_token_budget():
+    calls, analyze = recorder()
+    scheduler = AIAnalysisScheduler(time_budget=None, token_budget=35, tokens_per_stock=10, max_workers=1)
+    to_analyze, _ = scheduler.plan(['a', 'b', 'c', 'd', 'e'], [10, 50, 30, 40, 20], top_k=5, ai_points=20)
+    assert to_analyze == ['b', 'd', 'c', 'e', 'a']
+
+    calls, analyze = recorder()
+    results, report = scheduler.run(['600003', '600001', '600002', '600004'], analyze)
+    assert calls == ['600003', '600001', '600002']
+    assert report['analyzed'] == calls and report['skipped_budget'] == ['600004']
+    assert set(results) == set(calls) and report['tokens'] == 30
+
+
+def test_time_budget_bounds_wall_clock():
+    calls, analyze = recorder(default=0.1)
+    scheduler = AIAnalysisScheduler(time_budget=0.25, token_budget=None, max_workers=1)
+    results, report = scheduler.run([f"60000{i}" for i in range(6)], analyze)
+    # 完成两只后剩余时间不够再分析一只
+    assert len(results) == 2 and len(report['skipped_budget']) == 4
+
+    calls, analyze = recorder(delays={'600000': 2.0}, default=0.05)
+    started = time.perf_counter()
+    results, report = AIAnalysisScheduler(time_budget=0.3, token_budget=None, max_workers=2).run(
+        [f"60000{i}" for i in range(4)], analyze)
+    assert time.perf_counter() - started < 1.0
+    assert report['timed_out'] == ['600000'] and '600000' not in results
+    assert set(results) == {'600001', '600002', '600003'}
+
+
+def test_requests_get_budget_deadline_and_in_flight_tokens_count():
+    deadlines = {}
+    calls, analyze = recorder(delays={'600000': 0.6}, default=0.05, deadlines=deadlines)
+    scheduler = AIAnalysisScheduler(time_budget=0.3, token_budget=25, tokens_per_stock=10, max_workers=2)
+    results, report = scheduler.run([f"60000{i}" for i in range(4)], analyze)
+    # 600000 进行中时只剩一只股票的token预算：600001 完成后才能提交 600002，之后预算用完
+    assert calls == ['600000', '600001'] and report['skipped_budget'] == ['600002', '600003']
+    assert report['timed_out'] == ['600000'] and report['tokens'] == 20
+    assert all(0 < remaining <= 0.3 for remaining in deadlines.values())  # 请求以预算剩余时间为超时
+
+
+def test_pick_and_analyze_with_budget(monkeypatch):
+    analyzer = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    stocks = candidates()
+    monkeypatch.setattr(analyzer.picker, 'select_stocks_advanced',
+                        lambda trade_date, max_stocks, auto_adjust_mode, market_data=None: (stocks.head(max_stocks), {}))
+    calls, analyze = recorder()
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice',
+                        lambda ai_analyzer, code, deadline=None: analyze(code, deadline))
+
+    result, stats = analyzer.pick_and_analyze_with_budget(
+        trade_date='20250708', max_stocks=6, candidates=24,
+        scheduler=AIAnalysisScheduler(time_budget=None, token_budget=None, max_workers=2))
+    schedule = stats['ai_schedule']
+    assert len(result) == 6 and result['final_score'].is_monotonic_decreasing
+    assert sorted(calls) == sorted(schedule['analyzed']) and len(calls) + len(schedule['skipped_rank']) == 24
+    assert (result['ai_status'] == 'done').all()
+
+
+def test_budget_pipeline_shares_deadline_and_bookkeeping(monkeypatch):
+    """预算内选股与其他入口共用行情/选股步骤，调度器的时间预算受运行截止时间限制"""
+    monkeypatch.setitem(unify.DEADLINE_CONFIG, 'reserve_seconds', 0.1)
+    analyzer = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    stocks = candidates()
+    monkeypatch.setattr(analyzer.picker, 'get_market_data', lambda trade_date: stocks)
+    monkeypatch.setattr(analyzer.picker, 'select_stocks_advanced',
+                        lambda trade_date, max_stocks, auto_adjust_mode, market_data=None: (stocks.head(max_stocks), {}))
+    deadlines = {}
+    calls, analyze = recorder(default=0.3, deadlines=deadlines)
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice',
+                        lambda ai_analyzer, code, deadline=None: analyze(code, deadline))
+
+    started = time.perf_counter()
+    result, stats = analyzer.pick_and_analyze_with_budget(
+        trade_date='20250708', max_stocks=6, candidates=24, deadline=unify.Deadline(1.0),
+        scheduler=AIAnalysisScheduler(time_budget=60, token_budget=None, max_workers=1))
+    assert time.perf_counter() - started < 1.5
+    assert max(deadlines.values()) < 1.0  # 调度器的预算不超过运行截止时间
+
+    schedule = stats['ai_schedule']
+    missing = schedule['timed_out'] + schedule['skipped_budget']
+    assert missing and stats['degraded_components']['ai_analysis'] == missing
+    assert {'pipeline.market_data', 'pipeline.selection', 'pipeline.ai_analysis'} <= set(stats['stage_metrics'])
+    assert 'upstream' in stats and 'deadline_remaining_seconds' in stats
+    assert len(result) == 6
@@ -0,0 +1,83 @@
+"""
+测试基于本地历史快照的向量化回测
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base_stock_picker import AUCTION_FACTORS_DATASET
+from backtester import Backtester, forward_returns, max_drawdown, trading_days
+
+DAYS = ['20250707', '20250708', '20250709', '20250710', '20250711', '20250714']
+
+
+def make_day(index: int, day: str = None, num_stocks: int = 20) -> pd.DataFrame:
+    """第index个交易日的收盘快照，所有股票每天上涨1%"""
+    price = 10.0 * 1.01 ** index
+    return pd.DataFrame({
+        '代码': [f"60{i:04d}" for i in range(num_stocks)],
+        '名称': [f"股票{i}" for i in range(num_stocks)],
+        '最新': [price + i * 0.1 * 1.01 ** index for i in range(num_stocks)],
+        '涨幅': [2.0 + i * 0.1 for i in range(num_stocks)],
+        '换手率': [5.0 + i * 0.2 for i in range(num_stocks)],
+        '量比': [2.0 + i * 0.1 for i in range(num_stocks)],
+        '市盈率': [20.0 + i for i in range(num_stocks)],
+        '流通市值': [5e9 + i * 1e8 for i in range(num_stocks)],
+    })
+
+
+def test_helpers():
+    assert trading_days('20250705', '20250709') == ['20250707', '20250708', '20250709']
+
+    closes = pd.DataFrame({'A': [10.0, 11.0, 12.1]}, index=['d1', 'd2', 'd3'])
+    returns = forward_returns(closes, [1, 2])
+    assert np.isclose(returns[1].loc['d1', 'A'], 0.1)
+    assert np.isclose(returns[2].loc['d1', 'A'], 0.21)
+    assert pd.isna(returns[1].loc['d3', 'A'])
+
+    assert np.isclose(max_drawdown(pd.Series([0.1, -0.5, 0.2])), -0.5)
+
+
+def test_backtest_forward_returns(make_store):
+    """每日选股的1日/3日远期收益按收盘价面板向量化计算"""
+    backtester = Backtester(max_stocks=5, horizons=[1, 3], auto_adjust_mode=False,
+                            workers=1, store=make_store(DAYS[0], DAYS[-1], make_day=make_day))
+    picks, summary = backtester.run('20250707', '20250709')
+
+    assert summary['trade_days'] == 3
+    assert summary['total_picks'] == 15
+    assert set(picks['交易日']) == {'20250707', '20250708', '20250709'}
+    assert np.allclose(picks['1日收益'], 0.01)
+    assert np.allclose(picks['3日收益'], 1.01 ** 3 - 1)
+    assert summary['horizons'][1]['hit_rate'] == 1.0
+    assert np.isclose(summary['cumulative_return'], 1.01 ** 3 - 1)
+    assert summary['max_drawdown'] == 0.0
+
+
+def test_parallel_matches_serial(make_store):
+    """进程池并行回测与串行结果一致"""
+    store = make_store(DAYS[0], DAYS[-1], make_day=make_day)
+    serial, _ = Backtester(max_stocks=5, horizons=[1], workers=1, store=store).run('20250707', '20250710')
+    parallel, _ = Backtester(max_stocks=5, horizons=[1], workers=2, store=store).run('20250707', '20250710')
+
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_auction_factors_come_from_backtest_store(make_store):
+    """选股器读取的竞价因子来自回测使用的存储"""
+    store = make_store(DAYS[0], DAYS[-1], make_day=make_day)
+    backtester = Backtester(max_stocks=5, horizons=[1], auto_adjust_mode=False, workers=1, store=store)
+    before, _ = backtester.run('20250707', '20250709')
+
+    codes = make_day(1)['代码']
+    store.save(AUCTION_FACTORS_DATASET, '20250708',
+               pd.DataFrame({'竞价涨幅': np.arange(len(codes), 0, -1.0)}, index=codes))
+    after, _ = backtester.run('20250707', '20250709')
+
+    changed = {day for day in DAYS[:3]
+               if set(before.loc[before['交易日'] == day, '代码']) != set(after.loc[after['交易日'] == day, '代码'])}
+    assert changed == {'20250708'}
@@ -0,0 +1,54 @@
+"""
+测试 backtrader 适配器：数组数据源、开盘买入、到期卖出和 pyfolio 兼容的收益序列
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtester import trading_days
+from backtrader_adapter import BacktraderAdapter, load_bars
+
+DAYS = trading_days('20250707', '20250718')
+
+
+def make_day(index: int, day: str) -> pd.DataFrame:
+    """两只股票：600001 每天开盘价=前收，收盘上涨1%；600002 第三天停牌"""
+    close = 10.0 * 1.01 ** index
+    df = pd.DataFrame({
+        '代码': ['600001', '600002'],
+        '名称': ['股票A', '股票B'],
+        '今开': [close / 1.01, 20.0],
+        '最高': [close, 20.0],
+        '最低': [close / 1.01, 20.0],
+        '最新': [close, 20.0],
+        '成交量': [1e6, 1e6],
+    })
+    return df[df['代码'] == '600001'] if index == 2 else df
+
+
+def test_load_bars_marks_suspended_days(make_store):
+    bars = load_bars(make_store(DAYS[0], DAYS[-1], make_day=make_day), DAYS, ['600001', '600002'])
+    assert bars['close'].shape == (len(DAYS), 2)
+    assert np.isnan(bars['close'][2, 1])
+    assert np.isclose(bars['open'][1, 0], 10.0)
+
+
+def test_buy_next_open_and_exit_after_holding_days(make_store):
+    """选股日的下一交易日开盘买入，持有到期后卖出，收益序列可直接用于 pyfolio"""
+    adapter = BacktraderAdapter(store=make_store(DAYS[0], DAYS[-1], make_day=make_day), cash=1e5, max_positions=1,
+                                holding_days=2, stop_loss=None, take_profit=None)
+    picks = pd.DataFrame({'交易日': ['20250707'], '代码': ['600001'], '排名': [1]})
+    returns, summary = adapter.run(picks, start='20250707', end='20250718')
+
+    assert summary['trades'] == 1
+    assert isinstance(returns.index, pd.DatetimeIndex)
+    assert str(returns.index.tz) == 'UTC'
+    assert len(returns) == len(DAYS)
+    # 7/8 开盘10.0买入，持有2根K线后于7/11开盘约10.303卖出，扣除费用后收益约3%
+    assert 0.025 < summary['total_return'] < 0.031
+    assert np.isclose((1 + returns).prod() - 1, summary['total_return'])
+    assert len(summary['transactions']) == 2
@@ -0,0 +1,71 @@
+"""
+测试合成行情生成器和性能基准：全市场快照、K线面板、结果表和回退比较
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+from ai_stock_analyzer import AIStockAnalyzer
+from base_stock_picker import BaseStockPicker
+from benchmark import BenchmarkResultStore, BenchmarkSuite, compare
+from utils.synthetic_market import CANONICAL_COLUMNS, generate_bar_panel, generate_news, generate_universe
+
+
+def test_universe_is_realistic_and_deterministic():
+    df = generate_universe(6000, seed=1)
+    assert list(df.columns) == CANONICAL_COLUMNS and len(df) == 6000
+    assert df['代码'].is_unique and df['代码'].str.fullmatch(r'\d{6}').all()
+    assert df['代码'].str.startswith(('300', '688')).mean() > 0.2
+    assert 0.02 < df['名称'].str.contains('ST').mean() < 0.07
+    assert df['名称'].str.startswith(('N', 'C')).any() and df['名称'].str.contains('退').any()
+    assert 0.005 < df['量比'].isna().mean() < 0.05 and df['代码'].notna().all()
+    assert (df['市盈率'] < 0).mean() > 0.1 and (df['最高'] >= df['最新']).all()
+    assert df['涨幅'].abs().max() <= 30.01
+    pd.testing.assert_frame_equal(df, generate_universe(6000, seed=1))
+
+    filtered = BaseStockPicker().filter_risk_stocks(df)
+    assert not filtered['名称'].str.contains('ST|退').any()
+    assert not filtered['代码'].str.startswith(('300', '688', '8')).any()
+
+
+def test_bar_panel_and_news_feed_analyzer():
+    panel = generate_bar_panel(['600001', '000002'], days=60)
+    assert len(panel) == 120 and panel.groupby('code')['date'].is_monotonic_increasing.all()
+    assert (panel['high'] >= panel[['open', 'close']].max(axis=1)).all()
+    assert (panel['low'] <= panel[['open', 'close']].min(axis=1)).all()
+
+    analyzer = AIStockAnalyzer()
+    technical = analyzer.calculate_technical_indicators(panel[panel['code'] == '600001'].reset_index(drop=True))
+    assert technical['ma_trend'] != '计算失败' and 0 <= technical['rsi'] <= 100
+    sentiment = analyzer.calculate_advanced_sentiment_analysis(generate_news(50))
+    assert sentiment['total_analyzed'] == 50
+
+
+def test_mock_data_codes_unique():
+    assert BaseStockPicker()._generate_mock_data()['代码'].is_unique
+
+
+def test_suite_results_stored_and_compared(tmp_path):
+    results = BenchmarkSuite(sizes=[500], repeat=2, bar_stocks=5, bar_days=30, news_items=20).run()
+    assert set(results['name']) == {'filter_risk_stocks', 'apply_selection_criteria',
+                                    'apply_selection_criteria.intraday', 'enhanced_ranking',
+                                    'calculate_technical_indicators', 'calculate_advanced_sentiment_analysis',
+                                    'util.next_trading_day'}
+    assert (results['best_ms'] <= results['median_ms']).all()
+    assert results.set_index('name').loc['filter_risk_stocks', 'rows_out'] < 500
+
+    store = BenchmarkResultStore(str(tmp_path / 'benchmark.db'))
+    slow = results.assign(median_ms=results['median_ms'] * 2 + 5)
+    store.insert(results, 'aaaaaaa')
+    store.insert(slow, 'bbbbbbb')
+    assert len(store.history(name='enhanced_ranking')) == 2
+
+    report = compare(slow, store.baseline(exclude_commit='bbbbbbb'))
+    assert report['regression'].all() and (report['baseline_commit'] == 'aaaaaaa').all()
+    report = compare(results, store.baseline(exclude_commit='aaaaaaa'))
+    assert not report['regression'].any() and (report['change'] < 0).all()
+    assert not compare(results, store.baseline(exclude_commit='none').iloc[0:0])['regression'].any()
@@ -0,0 +1,88 @@
+"""
+测试集合竞价快照采集和竞价因子计算
+"""
+import os
+import sys
+import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from base_stock_picker import AUCTION_FACTORS_DATASET
+from call_auction_capture import CallAuctionCapture
+from utils.data_store import LocalDataStore
+
+
+def make_auction_snapshot(prices, bid=None, ask=None, committee=None) -> pd.DataFrame:
+    df = pd.DataFrame({
+        '代码': ['600001', '600002', '600003'],
+        '名称': ['股票A', '股票B', '股票C'],
+        '最新': prices,
+        '昨收': [10.0, 20.0, 30.0],
+        '成交量': [1000.0, 500.0, 0.0],
+    })
+    if bid is not None:
+        df['买一量'] = bid
+        df['卖一量'] = ask
+    if committee is not None:
+        df['委比'] = committee
+    return df
+
+
+def test_auction_factors_vectorized():
+    """竞价涨幅、竞价量比、委托不平衡和竞价涨幅变化"""
+    capture = CallAuctionCapture(picker=AdvancedStockPicker(), capacity=10, drift_window_seconds=300)
+    capture.set_reference_volume(pd.Series([10000.0, 1000.0, 2000.0], index=['600001', '600002', '600003']))
+
+    start = datetime.datetime(2025, 7, 9, 9, 20)
+    capture.record(make_auction_snapshot([10.1, 20.0, 30.0], committee=[10.0, -20.0, 0.0]), start)
+    capture.record(make_auction_snapshot([10.3, 19.6, 30.0], bid=[300.0, 100.0, 0.0], ask=[100.0, 300.0, 0.0],
+                                         committee=[10.0, -20.0, 50.0]),
+                   start + datetime.timedelta(minutes=5))
+
+    factors = capture.compute_factors()
+    assert np.isclose(factors.loc['600001', '竞价涨幅'], 3.0, atol=1e-4)
+    assert np.isclose(factors.loc['600002', '竞价涨幅'], -2.0, atol=1e-4)
+    assert np.isclose(factors.loc['600001', '竞价量比'], 0.1)
+    assert np.isclose(factors.loc['600001', '委托不平衡'], 0.5)
+    assert np.isclose(factors.loc['600002', '委托不平衡'], -0.5)
+    assert np.isclose(factors.loc['600003', '委托不平衡'], 0.5)  # 买卖量为0时使用委比
+    assert np.isclose(factors.loc['600001', '竞价涨幅变化'], 2.0, atol=1e-4)
+
+
+def test_factors_attached_to_picker_data(tmp_path):
+    """竞价因子挂到选股器后按代码合并到行情数据"""
+    picker = AdvancedStockPicker()
+    picker.data_store = LocalDataStore(str(tmp_path / 'store'))
+    capture = CallAuctionCapture(picker=picker, capacity=5)
+    capture.record(make_auction_snapshot([10.5, 20.0, 30.0]))
+    capture.publish_factors()
+
+    market_data = make_auction_snapshot([10.6, 20.1, 30.2]).iloc[::-1].reset_index(drop=True)
+    attached = picker.attach_auction_factors(market_data).set_index('代码')
+
+    assert np.isclose(attached.loc['600001', '竞价涨幅'], 5.0, atol=1e-4)
+    assert pd.isna(attached.loc['600001', '竞价量比'])  # 未设置参考成交量
+
+
+def test_saved_factors_feed_ranking_in_another_picker(tmp_path):
+    """竞价因子按交易日保存，另一个选股器读取同日因子并计入排序，其他交易日不使用"""
+    store = LocalDataStore(str(tmp_path / 'store'))
+    capture = CallAuctionCapture(picker=AdvancedStockPicker(), capacity=5)
+    capture.picker.data_store = store
+    capture.record(make_auction_snapshot([10.0, 21.0, 30.0], bid=[100.0, 900.0, 100.0], ask=[900.0, 100.0, 100.0]))
+    capture.publish_factors('20250709')
+    assert store.keys(AUCTION_FACTORS_DATASET) == ['20250709']
+
+    picker = AdvancedStockPicker()
+    picker.data_store = store
+    market_data = pd.DataFrame({
+        '代码': ['600001', '600002', '600003'], '量比': [2.0, 2.0, 2.0], '换手率': [5.0, 5.0, 5.0],
+        '涨幅': [2.0, 2.0, 2.0], '市盈率': [20.0, 20.0, 20.0], '流通市值': [5e9, 6e9, 7e9],
+    })
+    assert '竞价涨幅' not in picker.attach_auction_factors(market_data, '20250710').columns
+    ranked = picker.enhanced_ranking(picker.attach_auction_factors(market_data, '20250709')).set_index('代码')
+    assert ranked['综合得分'].idxmax() == '600002' and ranked['竞价得分'].idxmin() == '600001'
@@ -0,0 +1,120 @@
+"""
+测试上游调用磁带：录制后离线回放（DataFrame、Gemini文本、异常）、匹配方式、未命中降级和耗时模拟
+"""
+import os
+import sys
+import time
+import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+import base_stock_picker
+from base_stock_picker import BaseStockPicker
+from utils.cassette import Cassette, CassetteMiss, RecordedResponse, use_cassette
+from utils.telemetry import TELEMETRY, call_upstream
+
+
+class GeminiResponse:
+    """不可序列化的响应，只录制 text"""
+
+    def __init__(self, text):
+        self.text = text
+        self.stream = (line for line in text.splitlines())
+
+
+def offline(*args, **kwargs):
+    raise AssertionError('回放时不应调用上游')
+
+
+def test_record_then_replay_offline(tmp_path):
+    path = str(tmp_path / 'run.cassette')
+    bars = pd.DataFrame({'close': [10.0, 10.5]})
+
+    def unavailable(symbol):
+        raise ConnectionError(f'{symbol} reset')
+
+    with use_cassette(path, 'record') as cassette:
+        recorded = call_upstream('akshare', 'stock_zh_a_hist', lambda symbol: bars, symbol='600519')
+        recorded['ma5'] = 0.0  # 调用方修改返回值不影响录制内容
+        assert call_upstream('gemini', 'generate_content', lambda **kw: GeminiResponse('建议买入'),
+                             model='m', contents='p1', config={'timeout': 30}).text == '建议买入'
+        with pytest.raises(ConnectionError):
+            call_upstream('akshare', 'stock_news_em', unavailable, symbol='600519')
+    described = cassette.describe()
+    assert os.path.exists(path) and len(Cassette.load(path)) == 3
+    assert (described['akshare.stock_news_em']['entries'], described['akshare.stock_news_em']['errors']) == (1, 1)
+
+    with TELEMETRY.collect() as run, use_cassette(path, 'replay'):
+        replayed = call_upstream('akshare', 'stock_zh_a_hist', offline, symbol='600519')
+        # 配置（含剩余超时）不参与匹配
+        response = call_upstream('gemini', 'generate_content', offline, model='m', contents='p1', config={'timeout': 3})
+        with pytest.raises(ConnectionError, match='600519 reset'):
+            call_upstream('akshare', 'stock_news_em', offline, symbol='600519')
+    pd.testing.assert_frame_equal(replayed, pd.DataFrame({'close': [10.0, 10.5]}))
+    assert isinstance(response, RecordedResponse) and response.text == '建议买入'
+    assert run.summary()['calls']['akshare.stock_news_em']['error_classes'] == {'ConnectionError': 1}
+
+
+def test_sequence_and_exact_matching(tmp_path):
+    path = str(tmp_path / 'news.cassette')
+    with use_cassette(path, 'record'):
+        for day in ('20250707', '20250708'):
+            call_upstream('tushare', 'daily', lambda trade_date: pd.DataFrame({'trade_date': [trade_date]}),
+                          trade_date=day)
+
+    with use_cassette(path, 'replay') as cassette:
+        # 参数相同取对应记录，再次调用重复使用
+        assert call_upstream('tushare', 'daily', offline, trade_date='20250708')['trade_date'][0] == '20250708'
+        assert call_upstream('tushare', 'daily', offline, trade_date='20250708')['trade_date'][0] == '20250708'
+        # 参数不同（如按当前日期计算的区间）按录制顺序取下一条未用记录，用完后未命中
+        assert call_upstream('tushare', 'daily', offline, trade_date='20251020')['trade_date'][0] == '20250707'
+        with pytest.raises(CassetteMiss):
+            call_upstream('tushare', 'daily', offline, trade_date='20251021')
+        with pytest.raises(CassetteMiss):
+            call_upstream('akshare', 'stock_zh_a_spot', offline)
+        assert cassette.mode == 'replay'
+
+    exact = Cassette(path, 'replay', match='exact')
+    with pytest.raises(CassetteMiss):
+        exact.call('tushare', 'daily', offline, trade_date='20251020')
+
+
+def test_latency_emulation(tmp_path):
+    path = str(tmp_path / 'slow.cassette')
+    with use_cassette(path, 'record'):
+        call_upstream('qstock', 'market_realtime', lambda: time.sleep(0.05) or pd.DataFrame())
+
+    with use_cassette(path, 'replay', emulate_latency=True, latency_scale=2.0):
+        started = time.perf_counter()
+        call_upstream('qstock', 'market_realtime', offline)
+        assert time.perf_counter() - started >= 0.09
+    with use_cassette(path, 'replay'):
+        started = time.perf_counter()
+        call_upstream('qstock', 'market_realtime', offline)
+        assert time.perf_counter() - started < 0.05
+
+
+def test_market_data_replays_fallback_chain(tmp_path, monkeypatch):
+    path = str(tmp_path / 'market.cassette')
+    picker = BaseStockPicker()
+    trade_date = datetime.datetime.now().strftime('%Y%m%d')
+
+    def unavailable():
+        raise ConnectionError('Remote end closed connection')
+    monkeypatch.setattr(base_stock_picker, 'qs', SimpleNamespace(market_realtime=unavailable))
+    monkeypatch.setattr(base_stock_picker, 'ak', SimpleNamespace(
+        stock_zh_a_spot=lambda: pd.DataFrame({'代码': ['600001', '000002'], '最新价': [10.0, 11.0]})))
+    with use_cassette(path, 'record'):
+        recorded = picker.get_market_data(trade_date)
+
+    monkeypatch.setattr(base_stock_picker, 'qs', SimpleNamespace(market_realtime=offline))
+    monkeypatch.setattr(base_stock_picker, 'ak', SimpleNamespace(stock_zh_a_spot=offline))
+    with TELEMETRY.collect() as run, use_cassette(path, 'replay'):
+        replayed = picker.get_market_data(trade_date)
+    pd.testing.assert_frame_equal(replayed, recorded)
+    assert run.summary()['fallbacks'] == {'qstock.market_realtime->akshare': 1}
@@ -0,0 +1,78 @@
+"""
+测试延迟导入和共享客户端：导入模块不加载数据源库、不需要凭证，客户端首次使用时创建
+"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import clients
+from utils.clients import LazyModule, tushare_pro
+
+HEAVY_MODULES = ('akshare', 'tushare', 'google.genai', 'qstock', 'dotenv')
+
+
+def test_import_without_network_or_credentials():
+    env = {k: v for k, v in os.environ.items() if k not in ('GEMINI_API_KEY', 'TUSHARE_TOKEN')}
+    code = ("import sys, json; import unify_stock_pick_ai_analyzer; "
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+def test_lazy_module_imports_on_first_use():
+    lazy = LazyModule('colorsys')
+    assert 'not loaded' in repr(lazy)
+    assert lazy.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert 'loaded' in repr(lazy) and lazy.ONE_THIRD == sys.modules['colorsys'].ONE_THIRD
+
+
+def test_lazy_module_refuses_patching_without_importing():
+    lazy = LazyModule('json.tool')
+    with pytest.raises(AttributeError):
+        lazy.main = None
+    with pytest.raises(AttributeError):
+        del lazy.main
+    assert 'not loaded' in repr(lazy)
+
+
+def test_tushare_not_imported_without_token():
+    env = {k: v for k, v in os.environ.items() if k != 'TUSHARE_TOKEN'}
+    code = ("import sys, json; from utils import clients; clients._env_loaded = True; "
+            "print(json.dumps([clients.tushare_pro() is None, 'tushare' in sys.modules]))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == [True, False]
+
+
+def test_tushare_client_created_once(monkeypatch):
+    monkeypatch.setattr(clients, '_env_loaded', True)
+    monkeypatch.delenv('TUSHARE_TOKEN', raising=False)
+    clients.reset_clients()
+    try:
+        assert tushare_pro() is None
+        with pytest.raises(ConnectionError):
+            tushare_pro(required=True)
+
+        # 回放磁带时使用占位客户端，不影响回放外的结果
+        monkeypatch.setattr(clients, 'replaying_cassette', lambda: True)
+        assert tushare_pro(required=True) is tushare_pro()
+        monkeypatch.setattr(clients, 'replaying_cassette', lambda: False)
+        assert tushare_pro() is None
+
+        import tushare
+        monkeypatch.setattr(tushare, 'set_token', lambda token: None)  # 不写入 ~/tk.csv
+        monkeypatch.setenv('TUSHARE_TOKEN', 'test-token')
+        clients.reset_clients()
+        assert tushare_pro() is tushare_pro() is not None
+    finally:
+        clients.reset_clients()
+        clients._replay_clients.clear()
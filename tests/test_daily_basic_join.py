@@ -0,0 +1,90 @@
+"""
+测试Tushare每日指标(daily_basic)批量合并与本地缓存
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base_stock_picker import BaseStockPicker
+from utils.data_store import LocalDataStore
+
+
+class FakeTusharePro:
+    """记录调用次数的Tushare Pro替身"""
+
+    def __init__(self):
+        self.calls = {'daily_basic': 0}
+
+    def stock_basic(self, **kwargs):
+        return pd.DataFrame({
+            'ts_code': ['600001.SH', '000002.SZ'],
+            'symbol': ['600001', '000002'],
+            'name': ['股票A', '股票B'],
+            'area': ['上海', '深圳'],
+            'industry': ['银行', '地产'],
+            'market': ['主板', '主板'],
+        })
+
+    def daily(self, trade_date, **kwargs):
+        return pd.DataFrame({
+            'ts_code': ['600001.SH', '000002.SZ'],
+            'trade_date': [trade_date, trade_date],
+            'close': [10.0, 20.0],
+            'open': [9.8, 19.5],
+            'high': [10.2, 20.5],
+            'low': [9.7, 19.4],
+            'pre_close': [9.9, 19.8],
+            'change': [0.1, 0.2],
+            'pct_chg': [1.01, 1.01],
+            'vol': [1000.0, 2000.0],
+            'amount': [10000.0, 40000.0],
+        })
+
+    def daily_basic(self, trade_date, **kwargs):
+        self.calls['daily_basic'] += 1
+        return pd.DataFrame({
+            'ts_code': ['000002.SZ', '600001.SH'],
+            'trade_date': [trade_date, trade_date],
+            'circ_mv': [500000.0, 1200000.0],   # 万元
+            'total_mv': [600000.0, 1500000.0],
+            'pe_ttm': [12.5, None],
+            'turnover_rate_f': [3.2, 1.1],
+            'volume_ratio': [1.8, 0.9],
+        })
+
+
+def _make_picker(tmp_path):
+    picker = BaseStockPicker()
+    picker.ts_pro = FakeTusharePro()
+    picker.data_store = LocalDataStore(str(tmp_path))
+    return picker
+
+
+def test_daily_basic_joined_by_code(tmp_path):
+    """历史日期行情应按代码合并真实流通市值、PE和量比"""
+    picker = _make_picker(tmp_path)
+
+    df = picker.get_market_date_tushare('20250708').set_index('代码')
+
+    assert df.loc['600001', '流通市值'] == 1.2e10
+    assert df.loc['000002', '流通市值'] == 5e9
+    assert df.loc['000002', '总市值'] == 6e9
+    assert df.loc['000002', '市盈率'] == 12.5
+    assert pd.isna(df.loc['600001', '市盈率'])  # 亏损企业不再被当作PE=15
+    assert df.loc['000002', '量比'] == 1.8
+    assert df.loc['600001', '换手率'] == 1.1
+
+
+def test_daily_basic_cached_per_trade_date(tmp_path):
+    """同一交易日只调用一次daily_basic批量接口"""
+    picker = _make_picker(tmp_path)
+
+    picker.get_market_date_tushare('20250708')
+    picker.get_market_date_tushare('20250708')
+    assert picker.ts_pro.calls['daily_basic'] == 1
+
+    picker.get_market_date_tushare('20250709')
+    assert picker.ts_pro.calls['daily_basic'] == 2
@@ -0,0 +1,179 @@
+"""
+测试截止时间传递和降级：行情超时改用缓存、AI分析超时改用规则分析或跳过
+"""
+import os
+import sys
+import math
+import time
+import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+import ai_stock_analyzer
+import unify_stock_pick_ai_analyzer as unify
+from config import DEADLINE_CONFIG
+from utils.data_store import LocalDataStore
+from utils.deadline import Deadline, DeadlineExceeded
+from tests.test_unified_streaming import CODES, ranked_stocks
+
+
+def test_deadline_budgets():
+    assert Deadline().remaining() == math.inf and Deadline().child(fraction=0.5).unlimited
+    assert Deadline().child(cap=5).remaining() == pytest.approx(5, abs=0.1)
+
+    deadline = Deadline(10)
+    assert deadline.child(fraction=0.5, reserve=2).remaining() == pytest.approx(4, abs=0.1)
+    assert deadline.child(cap=60).expires_at <= deadline.expires_at
+    assert deadline.child(reserve=20).expired()
+
+    now = datetime.datetime(2025, 7, 8, 9, 40)
+    assert Deadline.at('09:45', now=now).remaining() == pytest.approx(300, abs=1)
+    assert Deadline.at('09:30', now=now).expired()
+
+
+def test_run_abandons_slow_calls():
+    deadline = Deadline(0.3)
+    assert deadline.run(lambda x: x * 2, 21) == 42
+    with pytest.raises(ValueError):
+        deadline.run(int, 'x')
+
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        deadline.run(time.sleep, 5)
+    assert time.perf_counter() - started < 0.5
+    with pytest.raises(DeadlineExceeded):
+        deadline.run(lambda: 1)  # 已到截止时间，不再执行
+
+
+def stub_analyzer(monkeypatch, fundamental_delay=0.0):
+    analyzer = ai_stock_analyzer.AIStockAnalyzer()
+    gemini_calls = []
+    monkeypatch.setattr(analyzer, 'get_stock_name', lambda code: '测试股票')
+    monkeypatch.setattr(analyzer, 'get_stock_data', lambda code: pd.DataFrame({'close': [10.0, 10.5]}))
+    monkeypatch.setattr(analyzer, 'get_price_info', lambda data: {'current_price': 10.5, 'price_change': 5.0,
+                                                                  'volume_ratio': 1.0, 'volatility': 2.0})
+    monkeypatch.setattr(analyzer, 'calculate_technical_indicators', lambda data: {'rsi': 55})
+    monkeypatch.setattr(analyzer, 'get_comprehensive_fundamental_data',
+                        lambda code: time.sleep(fundamental_delay) or {'financial_indicators': {}})
+    monkeypatch.setattr(analyzer, 'get_comprehensive_news_data', lambda code, days: {'company_news': []})
+    monkeypatch.setattr(analyzer, '_call_gemini_api',
+                        lambda prompt, timeout=None: gemini_calls.append(timeout) or '深度分析')
+    return analyzer, gemini_calls
+
+
+def test_analyze_stock_degrades_under_deadline(monkeypatch):
+    analyzer, gemini_calls = stub_analyzer(monkeypatch, fundamental_delay=2.0)
+    started = time.perf_counter()
+    report = analyzer.analyze_stock('600519', deadline=Deadline(0.3))
+    assert time.perf_counter() - started < 1.0
+    assert report['degraded'] == ['fundamental_data', 'gemini']  # 新闻有自己的预算，不受财务指标超时影响
+    assert gemini_calls == [] and '综合评估' in report['ai_analysis']  # 规则分析
+
+    analyzer, gemini_calls = stub_analyzer(monkeypatch)
+    report = analyzer.analyze_stock('600519')
+    assert report['degraded'] == [] and report['ai_analysis'] == '深度分析' and gemini_calls == [None]
+
+    analyzer, gemini_calls = stub_analyzer(monkeypatch)
+    report = analyzer.analyze_stock('600519', deadline=Deadline(120))
+    assert report['degraded'] == [] and 100 < gemini_calls[0] <= 120  # 剩余时间作为请求超时
+
+
+def test_slow_stock_leaves_time_for_the_next(monkeypatch):
+    """一只股票财务指标卡住只用掉本只股票的预算，下一只股票仍能完整分析并调用Gemini"""
+    monkeypatch.setitem(DEADLINE_CONFIG, 'min_ai_seconds', 0.2)
+    analyzer, gemini_calls = stub_analyzer(monkeypatch)
+    monkeypatch.setattr(analyzer, 'get_comprehensive_fundamental_data',
+                        lambda code: time.sleep(10 if code == '600519' else 0) or {'financial_indicators': {}})
+    monkeypatch.setattr(ai_stock_analyzer, 'AIStockAnalyzer', lambda: analyzer)
+    advice = SimpleNamespace(generate_content=lambda **kwargs: SimpleNamespace(text='买入'))
+    monkeypatch.setattr(ai_stock_analyzer, 'gemini_client', lambda: SimpleNamespace(models=advice))
+
+    started = time.perf_counter()
+    slow, fast = ai_stock_analyzer.stock_analyzer(['600519', '000001'], deadline=Deadline(2.0))
+    assert time.perf_counter() - started < 2.0
+    assert slow['degraded'] == ['fundamental_data']
+    assert fast['stock_code'] == '000001' and fast['degraded'] == [] and fast['ai_analysis'] == '买入'
+    assert len(gemini_calls) == 2
+
+
+def test_pipeline_records_degraded_components(monkeypatch):
+    monkeypatch.setitem(DEADLINE_CONFIG, 'reserve_seconds', 0.1)
+    monkeypatch.setitem(DEADLINE_CONFIG, 'market_data_fraction', 0.2)
+    analyzer = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    cached = pd.DataFrame({'代码': CODES})
+    seen = {}
+    monkeypatch.setattr(analyzer.picker, 'get_market_data', lambda trade_date: time.sleep(5))
+    monkeypatch.setattr(analyzer.picker, 'get_cached_market_data', lambda trade_date: (cached, 'shared_snapshot'))
+
+    def select(trade_date, max_stocks, auto_adjust_mode, market_data):
+        seen['market_data'] = market_data
+        return ranked_stocks(), {}
+    monkeypatch.setattr(analyzer.picker, 'select_stocks_advanced', select)
+
+    def analyze(ai_analyzer, code, deadline=None):
+        time.sleep(0.3)
+        return {'stock_code': code, 'ai_score': 60.0, 'ai_analysis': '持有',
+                'degraded': ['news'] if code == CODES[0] else []}
+    monkeypatch.setattr(ai_stock_analyzer, 'analyze_stock_with_advice', analyze)
+
+    started = time.perf_counter()
+    result, stats = analyzer.pick_and_analyze_stocks(trade_date='20250708', deadline=Deadline(1.5))
+    assert time.perf_counter() - started < 2.0
+    assert seen['market_data'] is cached
+
+    degraded = stats['degraded_components']
+    assert degraded['market_data'] == 'shared_snapshot' and degraded['news'] == [CODES[0]]
+    skipped = degraded['ai_analysis']
+    assert 0 < len(skipped) < len(CODES) and skipped == CODES[-len(skipped):]
+    assert set(result.loc[result['ai_status'] == 'skipped', '代码']) == set(skipped)
+    assert result['final_score'].notna().all()
+
+
+def test_cached_market_data_is_bounded_and_never_mock(tmp_path):
+    picker = unify.AdvancedStockPicker()
+    picker.data_store = LocalDataStore(str(tmp_path / 'store'))
+    picker.data_store.save('market_data', '20250707', pd.DataFrame({'代码': CODES}))
+
+    df, source = picker.get_cached_market_data('20250708')
+    assert source == 'local_store:20250707' and list(df['代码']) == CODES
+    df, source = picker.get_cached_market_data('20250710')  # 早于 cached_market_max_age 个交易日
+    assert df.empty and source == 'none'
+    assert picker.get_cached_market_data('20250708', max_age=0)[1] == 'none'
+
+
+def test_stale_market_data_not_saved_to_run_history(monkeypatch):
+    recorded = []
+
+    class Store:
+        def record_run(self, stocks, stats, source, trade_date):
+            recorded.append(trade_date)
+            return len(recorded)
+    monkeypatch.setattr(unify, 'RunHistoryStore', Store)
+    analyzer = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    stocks = ranked_stocks()
+
+    stale = {'degraded_components': {'market_data': 'local_store:20250707'}}
+    assert analyzer.save_results(stocks, stale, trade_date='20250708') is None and recorded == []
+    same_day = {'degraded_components': {'market_data': 'local_store:20250708'}}
+    assert analyzer.save_results(stocks, same_day, trade_date='20250708') == 1
+    assert analyzer.save_results(stocks, {}, trade_date='20250708') == 2
+
+
+def test_mock_market_data_is_recorded_and_never_saved(monkeypatch):
+    """所有数据源都失败、退回模拟行情时记入 degraded_components，结果不保存"""
+    recorded = []
+    monkeypatch.setattr(unify, 'RunHistoryStore', lambda: SimpleNamespace(record_run=lambda *a, **k: recorded.append(1)))
+    analyzer = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    mock = analyzer.picker._generate_mock_data()
+    mock.attrs['source'] = 'mock'
+    monkeypatch.setattr(analyzer.picker, 'get_market_data', lambda trade_date: mock)
+    monkeypatch.setattr(unify, 'stock_analyzer', lambda codes, deadline=None: [])
+
+    result, stats = analyzer.pick_and_analyze_stocks(trade_date='20250708')
+    assert stats['market_data_source'] == 'mock' and stats['degraded_components']['market_data'] == 'mock'
+    assert analyzer.save_results(ranked_stocks(), stats, trade_date='20250708') is None and recorded == []
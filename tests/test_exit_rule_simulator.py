@@ -0,0 +1,129 @@
+"""
+测试向量化止损止盈规则模拟
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtester import Backtester, trading_days
+from exit_rule_simulator import ExitRuleSimulator, average_true_range, rule_grid
+
+
+def daily_bars(rows):
+    """单只股票的日线，rows 为 (开, 高, 低, 收)"""
+    days = trading_days('20250701', '20250731')[:len(rows)]
+    bars = {field: np.array([[row[i]] for row in rows], dtype=float)
+            for i, field in enumerate(('open', 'high', 'low', 'close'))}
+    return bars, days
+
+
+def run(rules, rows, entry_index=0):
+    bars, days = daily_bars(rows)
+    entries = pd.DataFrame({'代码': ['600000'], '买入时间': [days[entry_index]]})
+    simulator = ExitRuleSimulator(rules, atr_period=2, commission=0, stamp_duty=0)
+    trades, summary = simulator.simulate(bars, days, ['600000'], entries)
+    return trades.set_index('规则'), summary
+
+
+def test_fixed_trailing_and_time_exits():
+    rows = [
+        (10.0, 10.2, 9.0, 10.0),    # 买入日：最低价跌破止损，但T+1不能卖出
+        (10.1, 11.2, 10.0, 11.0),   # 最高价触及止盈10%
+        (11.0, 12.0, 10.8, 11.8),
+        (10.5, 10.6, 10.0, 10.2),   # 开盘跳空跌破移动止损
+        (10.2, 10.4, 10.0, 10.3),
+    ]
+    rules = [
+        {'name': 'fixed', 'stop': 0.05, 'target': 0.10},
+        {'name': 'trailing', 'trailing': 0.08},
+        {'name': 'time', 'max_holding': 2},
+        {'name': 'stop_only', 'stop': 0.05, 'max_holding': 4},
+    ]
+    trades, summary = run(rules, rows)
+
+    assert trades.loc['fixed', ['卖出原因', '持有K线数', '卖出价']].tolist() == ['target', 1, pytest.approx(11.0)]
+    # 截至前一日最高价12.0，回撤8%为11.04；第4日开盘10.5跳空，按开盘价成交
+    assert trades.loc['trailing', ['卖出原因', '持有K线数', '卖出价']].tolist() == ['trailing', 3, pytest.approx(10.5)]
+    assert trades.loc['time', ['卖出原因', '持有K线数', '卖出价']].tolist() == ['time', 2, pytest.approx(11.8)]
+    assert trades.loc['stop_only', ['卖出原因', '持有K线数']].tolist() == ['time', 4]
+    assert trades.loc['fixed', '收益率'] == pytest.approx(0.1)
+    assert len(summary) == 4 and summary['交易数'].eq(1).all()
+
+
+def test_stop_gap_and_same_bar_ambiguity():
+    rows = [
+        (10.0, 10.1, 9.9, 10.0),
+        (9.0, 9.2, 8.8, 9.1),       # 开盘跳空低于止损9.5，按开盘价9.0成交
+    ]
+    trades, _ = run([{'name': 'fixed', 'stop': 0.05, 'target': 0.1}], rows)
+    assert trades.loc['fixed', ['卖出原因', '卖出价']].tolist() == ['stop', pytest.approx(9.0)]
+
+    rows = [
+        (10.0, 10.1, 9.9, 10.0),
+        (10.0, 11.5, 9.0, 10.5),    # 同一根K线内止损和止盈都触及，按止损处理
+    ]
+    trades, _ = run([{'name': 'fixed', 'stop': 0.05, 'target': 0.1}], rows)
+    assert trades.loc['fixed', ['卖出原因', '卖出价']].tolist() == ['stop', pytest.approx(9.5)]
+
+
+def test_atr_rule():
+    rows = [
+        (10.0, 10.5, 9.5, 10.0),
+        (10.0, 10.5, 9.5, 10.0),
+        (10.0, 10.2, 9.8, 10.0),    # 买入日，之前2根K线ATR为1.0
+        (10.0, 10.4, 9.7, 10.1),
+        (10.1, 12.1, 10.0, 12.0),   # 触及 10 + 2×1.0
+    ]
+    trades, _ = run([{'name': 'atr', 'atr_stop': 1, 'atr_target': 2}], rows, entry_index=2)
+    assert trades.loc['atr', ['卖出原因', '持有K线数', '卖出价']].tolist() == ['target', 2, pytest.approx(12.0)]
+
+
+def test_average_true_range_matches_loop():
+    rng = np.random.default_rng(0)
+    close = rng.uniform(9, 11, (30, 3))
+    high, low = close + rng.uniform(0, 1, close.shape), close - rng.uniform(0, 1, close.shape)
+    close[5, 1] = high[5, 1] = low[5, 1] = np.nan
+    atr = average_true_range(high, low, close, 5)
+    assert np.isnan(atr[:5]).all()
+    for t in (5, 6, 12, 29):
+        for j in range(3):
+            ranges = []
+            for k in range(t - 5, t):
+                prev = close[k - 1, j] if k > 0 else np.nan
+                tr = np.fmax(high[k, j] - low[k, j], np.fmax(abs(high[k, j] - prev), abs(low[k, j] - prev)))
+                if not np.isnan(tr):
+                    ranges.append(tr)
+            expected = np.mean(ranges) if len(ranges) >= 5 else np.nan
+            assert atr[t, j] == pytest.approx(expected, nan_ok=True)
+
+
+def test_minute_bars_respect_t_plus_one():
+    times = list(pd.date_range('2025-07-01 09:31', periods=4, freq='min')) + \
+        list(pd.date_range('2025-07-02 09:31', periods=4, freq='min'))
+    close = np.array([[10.0], [9.0], [9.0], [9.2], [9.4], [9.6], [11.5], [11.0]])
+    bars = {'open': close, 'high': close + 0.05, 'low': close - 0.05, 'close': close}
+    entries = pd.DataFrame({'代码': ['600000'], '买入时间': [str(times[0])]})
+    trades, _ = ExitRuleSimulator([{'name': 'fixed', 'stop': 0.05, 'target': 0.1, 'max_holding': 7}],
+                                  commission=0, stamp_duty=0).simulate(bars, times, ['600000'], entries)
+    # 当天跌破止损不能卖出，次日第一根K线开盘9.4仍低于止损9.5，按开盘价卖出
+    assert trades[['卖出原因', '卖出时间', '卖出价']].iloc[0].tolist() == ['stop', str(times[4]), pytest.approx(9.4)]
+
+
+def test_simulate_daily_from_store(make_store):
+    store = make_store(end='20250815', num_stocks=120)
+    picks, _ = Backtester(max_stocks=5, horizons=[1], workers=1, store=store).run('20250701', '20250731')
+    rules = rule_grid({'stop': [None, 0.03, 0.05], 'target': [None, 0.05, 0.1], 'trailing': [None, 0.05]}, max_holding=5)
+    trades, summary = ExitRuleSimulator(rules, atr_period=5).simulate_daily(picks, store)
+
+    assert len(trades) == len(rules) * len(picks)
+    assert len(summary) == len(rules)
+    assert summary['平均收益'].is_monotonic_decreasing
+    assert (trades['持有K线数'] <= 5).all() and (trades['持有K线数'] >= 1).all()
+    assert (trades['卖出时间'] > trades['买入时间']).all()
+    no_exit_rule = trades[trades['规则'] == 'max_holding=5']
+    assert set(no_exit_rule['卖出原因']) == {'time'}
@@ -0,0 +1,96 @@
+"""
+测试阶段性能统计：耗时、CPU时间、内存、行数，以及选股流程的 stats['stage_metrics']
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from backtester import MARKET_DATA_DATASET, trading_days
+from utils.deadline import Deadline
+from utils.instrumentation import StageMetrics, format_stage_metrics
+
+
+def busy(seconds):
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+    return seconds
+
+
+def test_call_records_rows_and_aggregates():
+    metrics = StageMetrics()
+    df = pd.DataFrame({'a': range(10)})
+    assert len(metrics.call('filter', lambda d: d[d['a'] > 3], df)) == 6
+    metrics.call('filter', lambda d: d.head(2), df)
+    with pytest.raises(ZeroDivisionError):
+        metrics.call('broken', lambda: 1 / 0)
+    with metrics.stage('score', rows_in=10) as record:
+        record['rows_out'] = 4
+
+    stages = metrics.as_dict()
+    assert list(stages) == ['filter', 'broken', 'score']
+    assert stages['filter']['calls'] == 2 and stages['filter']['rows_in'] == 10 and stages['filter']['rows_out'] == 2
+    assert stages['broken']['errors'] == 1 and 'rows_out' not in stages['broken']
+    assert stages['score']['rows_out'] == 4
+    assert 'filter' in format_stage_metrics(stages)
+
+    merged = StageMetrics()
+    merged.merge(stages, prefix='picker.')
+    merged.merge(stages, prefix='picker.')
+    assert merged.as_dict()['picker.filter']['calls'] == 4
+
+
+def test_cpu_time_counted_in_worker_thread():
+    metrics = StageMetrics()
+    metrics.call('work', busy, 0.05, runner=Deadline(5).run)
+    metrics.call('sleep', time.sleep, 0.05)
+    stages = metrics.as_dict()
+    assert stages['work']['cpu_ms'] >= 40 and stages['work']['wall_ms'] >= 40
+    assert stages['sleep']['cpu_ms'] < 10 <= stages['sleep']['wall_ms']
+
+
+def test_overhead_and_disabled():
+    metrics = StageMetrics()
+    started = time.perf_counter()
+    for _ in range(5000):
+        metrics.call('noop', int)
+    per_call = (time.perf_counter() - started) / 5000
+    assert per_call < 50e-6
+    assert metrics.as_dict()['noop']['calls'] == 5000
+
+    disabled = StageMetrics(enabled=False)
+    assert disabled.call('noop', int, '3') == 3 and disabled.as_dict() == {}
+
+
+def test_tracemalloc_peak():
+    was_tracing = tracemalloc.is_tracing()
+    try:
+        metrics = StageMetrics(memory='tracemalloc')
+        metrics.call('allocate', lambda: np.ones(2_000_000).sum())
+        assert metrics.as_dict()['allocate']['peak_kb'] >= 15000
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def test_picker_stage_metrics(make_store):
+    store = make_store(num_stocks=300)
+    day = trading_days('20250701', '20250725')[0]
+    picker = AdvancedStockPicker()
+    selected, stats = picker.select_stocks_advanced(trade_date=day, max_stocks=5, auto_adjust_mode=False,
+                                                    market_data=store.load(MARKET_DATA_DATASET, day))
+    stages = stats['stage_metrics']
+    assert ['risk_filter', 'technical_filter', 'selection_criteria', 'industry_filter'] == \
+        [name for name in stages if name.endswith(('filter', 'criteria'))]
+    assert stages['risk_filter']['rows_in'] == stats['total_stocks']
+    assert stages['risk_filter']['rows_out'] == stats['after_risk_filter']
+    assert stages['industry_filter']['rows_out'] == stats['after_industry_filter']
+    assert all(stage['wall_ms'] >= 0 and stage['calls'] == 1 for stage in stages.values())
@@ -0,0 +1,74 @@
+"""
+测试盘中滚动选股守护进程的快照差分与选股变动事件
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from intraday_reselection_daemon import IntradayReselectionDaemon
+
+
+def make_snapshot(num_stocks: int = 20) -> pd.DataFrame:
+    """生成一个开盘后的行情快照，所有股票都满足选股条件"""
+    return pd.DataFrame({
+        '代码': [f"60{i:04d}" for i in range(num_stocks)],
+        '名称': [f"股票{i}" for i in range(num_stocks)],
+        '最新价': [10.0 + i * 0.1 for i in range(num_stocks)],
+        '昨收': [10.0] * num_stocks,
+        '涨幅': [2.0 + i * 0.1 for i in range(num_stocks)],
+        '换手率': [5.0 + i * 0.2 for i in range(num_stocks)],
+        '量比': [2.0 + i * 0.1 for i in range(num_stocks)],
+        '市盈率': [20.0 + i for i in range(num_stocks)],
+        '流通市值': [5e9 + i * 1e8 for i in range(num_stocks)],
+    })
+
+
+def test_only_changed_rows_recomputed():
+    """输入未变化时不重新过滤，也不产生事件"""
+    events = []
+    daemon = IntradayReselectionDaemon(
+        picker=AdvancedStockPicker(market_mode='normal'),
+        max_stocks=5,
+        auto_adjust_mode=False,
+        on_event=events.append,
+    )
+    snapshot = make_snapshot()
+
+    first = daemon.tick(snapshot)
+    assert first['changed_rows'] == len(snapshot)
+    assert len(first['selection']) == 5
+    assert [e['type'] for e in first['events']] == ['added'] * 5
+
+    second = daemon.tick(snapshot.copy())
+    assert second['changed_rows'] == 0
+    assert second['events'] == []
+    assert list(second['selection']['代码']) == list(first['selection']['代码'])
+    assert len(events) == 5
+
+
+def test_removal_and_addition_events():
+    """选中股票跌出条件时产生移除事件，并由下一名补位"""
+    daemon = IntradayReselectionDaemon(
+        picker=AdvancedStockPicker(market_mode='normal'),
+        max_stocks=5,
+        auto_adjust_mode=False,
+    )
+    snapshot = make_snapshot()
+    first = daemon.tick(snapshot)
+    top_code = first['selection']['代码'].iloc[0]
+
+    changed = snapshot.copy()
+    changed.loc[changed['代码'] == top_code, '涨幅'] = 9.0  # 超出涨幅上限
+    result = daemon.tick(changed)
+
+    assert result['changed_rows'] == 1
+    removed = [e['code'] for e in result['events'] if e['type'] == 'removed']
+    added = [e['code'] for e in result['events'] if e['type'] == 'added']
+    assert top_code in removed
+    assert len(added) == len(removed)  # 归一化得分会随候选集合变化，排名靠后的股票可能互换
+    assert top_code not in list(result['selection']['代码'])
+    assert len(result['selection']) == 5
@@ -0,0 +1,85 @@
+"""
+测试共享内存面板上的向量化参数扫描
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from base_stock_picker import AUCTION_FACTORS_DATASET
+from backtester import Backtester, trading_days
+from parameter_sweep import (
+    MODES, ParameterSweep, SweepResultStore, build_panel, expand_params, grid, random_sample, select_mask
+)
+from utils.data_store import LocalDataStore
+
+
+def test_param_helpers():
+    assert expand_params({'min_gain': 2, 'adjustments.bull_market.max_gain': 9}) == \
+        {'min_gain': 2, 'adjustments': {'bull_market': {'max_gain': 9}}}
+    assert len(grid({'a': [1, 2], 'b': [3, 4, 5]})) == 6
+    samples = random_sample({'a': (0.0, 1.0), 'b': [1, 2]}, 5, seed=1)
+    assert len(samples) == 5 and all(0 <= s['a'] <= 1 and s['b'] in (1, 2) for s in samples)
+
+
+def save_auction_factors(store: LocalDataStore, days, num_stocks=300, seed=1):
+    """部分交易日的集合竞价因子，部分股票和因子缺失"""
+    rng = np.random.default_rng(seed)
+    for day in days:
+        codes = [f"{600000 + i}" for i in range(num_stocks) if rng.random() < 0.8]
+        factors = pd.DataFrame({
+            '竞价涨幅': rng.normal(0, 2, len(codes)),
+            '竞价量比': rng.uniform(0, 3, len(codes)),
+            '委托不平衡': rng.uniform(-1, 1, len(codes)),
+        }, index=pd.Index(codes, name='代码'))
+        factors.loc[factors.sample(frac=0.1, random_state=seed).index, '竞价量比'] = np.nan
+        store.save(AUCTION_FACTORS_DATASET, day, factors)
+
+
+@pytest.mark.parametrize('with_auction', [False, True])
+def test_vectorized_selection_matches_picker(make_store, with_auction):
+    """向量化选股与逐日运行 select_stocks_advanced 的结果一致（包括计入竞价得分的交易日）"""
+    store = make_store()
+    days = trading_days('20250701', '20250718')
+    if with_auction:
+        save_auction_factors(store, days[::2])
+    params = {'min_gain': 0.5, 'min_turnover': 2, 'adjustments.bull_market.max_gain': 9}
+
+    picks, _ = Backtester(max_stocks=5, horizons=[1], workers=1, store=store).run(
+        '20250701', '20250718', overrides=expand_params(params))
+
+    arrays, meta = build_panel(store, days, [1])
+    picker = AdvancedStockPicker(config_overrides=expand_params(params))
+    mode_configs = {mode: picker._get_adjusted_config(mode) for mode in MODES}
+    selected = select_mask(arrays, mode_configs, max_stocks=5)
+    assert len(set(arrays['mode'])) > 1
+    if with_auction:
+        without = select_mask({**arrays, 'auction': np.full_like(arrays['auction'], np.nan)}, mode_configs, 5)
+        assert (selected != without).any()  # 竞价得分改变了部分交易日的选股
+
+    codes = np.array(meta['codes'])
+    for i, day in enumerate(days):
+        expected = set(picks.loc[picks['交易日'] == day, '代码'])
+        assert set(codes[selected[i]]) == expected, day
+
+
+def test_sweep_writes_queryable_results(tmp_path, make_store):
+    """并行扫描的结果写入SQLite并可按指标排序查询"""
+    store = make_store()
+    result_store = SweepResultStore(str(tmp_path / 'sweep.db'))
+    param_sets = grid({'min_gain': [0.5, 1, 2], 'min_volume_ratio': [1.2, 2]})
+
+    sweep = ParameterSweep(store=store, result_store=result_store, horizons=[1, 3],
+                           max_stocks=5, workers=2, batch_size=2)
+    results = sweep.run('20250701', '20250718', param_sets, run_id='test')
+
+    assert len(results) == 6
+    assert set(results['run_id']) == {'test'}
+    assert results['mean_return'].is_monotonic_decreasing
+    assert (results['max_drawdown'] <= 0).all()
+    assert len(result_store.query('test', order_by='hit_rate', limit=2)) == 2
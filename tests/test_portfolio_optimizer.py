@@ -0,0 +1,107 @@
+"""
+测试马科维茨组合权重：收缩协方差、带上限的最小方差/最大夏普求解和增量收益率窗口
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtester import trading_days
+from portfolio_optimizer import (
+    PortfolioOptimizer, ReturnWindow, ledoit_wolf, max_sharpe_weights, min_variance_weights, project_capped_simplex
+)
+
+
+def factor_returns(num_days=120, num_assets=60, seed=0):
+    """三因子模型生成的相关收益率"""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (num_days, 3))
+    loadings = rng.normal(1, 0.5, (3, num_assets))
+    return factors @ loadings + rng.normal(0.0005, 0.02, (num_days, num_assets))
+
+
+def test_ledoit_wolf_matches_reference():
+    returns = factor_returns(num_days=40, num_assets=8)
+    covariance, shrinkage = ledoit_wolf(returns)
+
+    # 逐日累加的参考实现
+    x = returns - returns.mean(axis=0)
+    n, p = x.shape
+    sample = sum(np.outer(row, row) for row in x) / n
+    mu = np.trace(sample) / p
+    delta = np.sum((sample - mu * np.eye(p)) ** 2)
+    beta = sum(np.sum((np.outer(row, row) - sample) ** 2) for row in x) / n ** 2
+    expected = min(beta, delta) / delta
+    assert shrinkage == pytest.approx(expected)
+    assert np.allclose(covariance, expected * mu * np.eye(p) + (1 - expected) * sample)
+
+
+def test_project_capped_simplex():
+    values = np.random.default_rng(1).normal(size=50)
+    weights, _ = project_capped_simplex(values, cap=0.05)
+    assert weights.sum() == pytest.approx(1) and weights.min() >= 0 and weights.max() <= 0.05 + 1e-12
+
+
+@pytest.mark.parametrize('num_assets, cap', [(50, 0.1), (200, 0.05)])
+def test_weights_match_scipy(num_assets, cap):
+    optimize = pytest.importorskip('scipy.optimize')
+    returns = factor_returns(num_assets=num_assets)
+    covariance, _ = ledoit_wolf(returns)
+    mean = returns.mean(axis=0)
+    constraints = [{'type': 'eq', 'fun': lambda w: w.sum() - 1}]
+    bounds = [(0, cap)] * num_assets
+    start = np.full(num_assets, 1 / num_assets)
+
+    weights = min_variance_weights(covariance, cap)
+    reference = optimize.minimize(lambda w: w @ covariance @ w, start, jac=lambda w: 2 * covariance @ w,
+                                  bounds=bounds, constraints=constraints, method='SLSQP',
+                                  options={'ftol': 1e-15, 'maxiter': 1000})
+    assert weights.sum() == pytest.approx(1) and weights.min() >= 0 and weights.max() <= cap + 1e-12
+    assert weights @ covariance @ weights <= reference.fun * (1 + 1e-6)
+
+    weights = max_sharpe_weights(covariance, mean, cap)
+    reference = optimize.minimize(lambda w: -(mean @ w) / np.sqrt(w @ covariance @ w), start, bounds=bounds,
+                                  constraints=constraints, method='SLSQP', options={'ftol': 1e-15, 'maxiter': 1000})
+    assert weights.sum() == pytest.approx(1) and weights.max() <= cap + 1e-12
+    assert mean @ weights / np.sqrt(weights @ covariance @ weights) >= -reference.fun * (1 - 1e-6)
+
+
+def test_return_window_rolls():
+    window = ReturnWindow(lookback=3)
+    closes = [10, 11, 12.1, 12.1, 13.31]
+    for i, close in enumerate(closes):
+        window.update(f"2025070{i + 1}", pd.Series({'600000': close, **({'600001': 5.0} if i >= 3 else {})}))
+    assert np.allclose(window.returns(['600000'])[:, 0], [0.1, 0.0, 0.1])
+    assert np.isnan(window.returns(['600001'])[:2]).all() and window.returns(['600001'])[2, 0] == 0
+    assert np.isnan(window.returns(['999999'])).all()
+    with pytest.raises(ValueError):
+        window.update('20250701', pd.Series({'600000': 1.0}))
+
+
+def test_optimizer_incremental_refresh(make_store):
+    store = make_store(end='20250815', num_stocks=40)
+    days = trading_days('20250701', '20250815')
+    codes = [f"{600000 + i}" for i in range(1, 30)]
+
+    optimizer = PortfolioOptimizer(store=store, lookback_days=20, max_weight=0.1, min_history=10)
+    optimizer.refresh(days[-2])
+    optimizer.optimize(codes)
+    optimizer.refresh(days[-1])  # 只加入一个新交易日
+    weights, stats = optimizer.optimize(codes)
+
+    fresh = PortfolioOptimizer(store=store, lookback_days=20, max_weight=0.1, min_history=10)
+    fresh.refresh(days[-1])
+    assert np.allclose(optimizer.covariance(codes)[0], fresh.covariance(codes)[0])
+    assert np.allclose(weights, fresh.optimize(codes)[0], atol=1e-9)
+    assert weights.sum() == pytest.approx(1) and weights.max() <= 0.1 + 1e-9
+    assert stats['candidates'] == len(codes) and 0 < stats['shrinkage'] < 1
+
+    stocks = pd.DataFrame({'代码': codes[:5] + ['300999'], '名称': list('ABCDEF')})
+    allocated, stats = optimizer.allocate(stocks, days[-1], method='max_sharpe')
+    assert allocated['权重'].sum() == pytest.approx(1, abs=1e-3)
+    assert allocated.loc[allocated['代码'] == '300999', '权重'].iloc[0] == 0
+    assert stats['excluded'] == ['300999']
@@ -0,0 +1,84 @@
+"""
+测试开盘前预热候选池的构建、内存映射加载和开盘选股
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from premarket_warm_start import PreMarketWarmStart
+
+
+def make_close_data() -> pd.DataFrame:
+    """上一交易日收盘数据：包含风险股票、超出市值范围和亏损股票"""
+    return pd.DataFrame({
+        '代码': ['600001', '600002', '600003', '600004', '300001', '600005'],
+        '名称': ['股票A', '股票B', '*ST股票', '股票D', '创业板', '亏损股'],
+        '最新价': [10.0, 12.0, 5.0, 15.0, 20.0, 8.0],
+        '涨幅': [1.0, 0.5, -1.0, 2.0, 3.0, 0.2],
+        '换手率': [3.0, 4.0, 2.0, 5.0, 6.0, 3.0],
+        '成交量': [1e5, 2e5, 1e4, 3e5, 4e5, 5e4],
+        '成交额': [1e6, 2.4e6, 5e4, 4.5e6, 8e6, 4e5],
+        '市盈率': [20.0, 25.0, 30.0, 18.0, 40.0, -5.0],
+        '流通市值': [5e9, 6e9, 4e9, 1e13, 5e9, 3e9],
+        '总市值': [6e9, 7e9, 5e9, 1.2e13, 6e9, 4e9],
+    })
+
+
+def make_open_snapshot() -> pd.DataFrame:
+    """开盘后的行情快照，不含市值和PE"""
+    return pd.DataFrame({
+        '代码': ['600001', '600002', '600003', '600004', '300001', '600005'],
+        '名称': ['股票A', '股票B', '*ST股票', '股票D', '创业板', '亏损股'],
+        '最新价': [10.3, 12.1, 5.1, 15.5, 21.0, 8.2],
+        '昨收': [10.0, 12.0, 5.0, 15.0, 20.0, 8.0],
+        '涨幅': [3.0, 0.8, 2.0, 3.3, 5.0, 2.5],
+        '换手率': [5.0, 4.0, 6.0, 5.0, 6.0, 5.0],
+        '量比': [2.0, 1.5, 2.0, 2.0, 2.0, 2.0],
+    })
+
+
+def test_build_prefilters_and_memory_maps(tmp_path):
+    """候选池只保留通过静态条件的股票，并以内存映射方式加载"""
+    warm_start = PreMarketWarmStart(AdvancedStockPicker(market_mode='normal'), output_dir=str(tmp_path))
+    data_path = warm_start.build('20250709', market_data=make_close_data())
+
+    assert os.path.exists(data_path)
+    assert warm_start.load('20250709')
+    assert isinstance(warm_start.universe, np.memmap)
+    assert list(warm_start.universe['code']) == ['600001', '600002']
+    assert warm_start.meta['ref_date'] == '20250708'
+    assert set(warm_start.meta['mode_configs']) >= {'normal', 'bull_market', 'bear_market'}
+    assert warm_start.meta['candidates'] == 2
+    assert sorted(os.listdir(tmp_path)) == ['warm_start_20250709.json', 'warm_start_20250709.npy']
+
+
+def test_margin_widens_price_bounds_only(tmp_path):
+    """价格边界按 price_margin 放宽，市值边界不放宽"""
+    close_data = make_close_data()
+    close_data.loc[0, '最新价'] = 52.0    # 超过最高股价50元，在放宽范围内
+    close_data.loc[1, '流通市值'] = 1.6e10  # 超过最大流通市值150亿
+    warm_start = PreMarketWarmStart(AdvancedStockPicker(market_mode='normal'), output_dir=str(tmp_path))
+    warm_start.build('20250709', market_data=close_data)
+    warm_start.load('20250709')
+    assert list(warm_start.universe['code']) == ['600001']
+
+
+def test_select_at_open_uses_warm_fields(tmp_path):
+    """开盘选股只在候选池上应用开盘条件，市值和PE取自预热文件"""
+    warm_start = PreMarketWarmStart(AdvancedStockPicker(market_mode='normal'), output_dir=str(tmp_path))
+    warm_start.build('20250709', market_data=make_close_data())
+    warm_start.load('20250709')
+
+    selected, stats = warm_start.select_at_open(make_open_snapshot(), max_stocks=5, auto_adjust_mode=False)
+
+    assert stats['warm_start'] is True
+    assert stats['after_risk_filter'] == 2
+    assert list(selected['代码']) == ['600001']  # 600002 涨幅不足
+    assert selected['流通市值'].iloc[0] == 5e9 * 1.03
+    assert selected['市盈率'].iloc[0] == 20.0
+    assert 'time_to_pick_ms' in stats
@@ -0,0 +1,117 @@
+"""
+测试按需性能剖析：未启用时直接执行，启用后写入 .prof/.txt 并把路径写入 stats，嵌套调用计入外层剖析
+"""
+import os
+import sys
+import time
+import pstats
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from backtester import MARKET_DATA_DATASET, trading_days
+from utils import profiling
+from utils.profiling import disable_profiling, enable_profiling, profiled
+
+
+@profiled('inner')
+def inner_step(size):
+    return {'total': float(np.ones(size).sum())}
+
+
+@profiled('outer')
+def outer_run(size):
+    workers = [threading.Thread(target=inner_step, args=(size,)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return None, inner_step(size)
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    enable_profiling(str(tmp_path / 'profiles'), top_n=10)
+    yield tmp_path / 'profiles'
+    disable_profiling()
+
+
+def test_disabled_is_plain_call(tmp_path):
+    assert not profiling.profiling_enabled()
+    assert inner_step(10) == {'total': 10.0}
+    started = time.perf_counter()
+    for _ in range(10000):
+        inner_step(1)
+    assert (time.perf_counter() - started) / 10000 < 50e-6
+
+
+def test_nested_calls_share_one_profile(profile_dir):
+    _, stats = outer_run(200_000)
+    profile = stats['profile']
+    assert len(os.listdir(profile_dir)) == 2  # 线程中的 inner_step 没有单独的剖析
+    assert profile['profile'].endswith('-outer.prof') and profile['peak_kb'] >= 1500
+
+    functions = {func[2] for func in pstats.Stats(profile['profile']).stats}
+    assert 'inner_step' in functions
+    summary = open(profile['summary'], encoding='utf-8').read()
+    assert summary.startswith('outer:') and '累计耗时' in summary and '内存分配增长' in summary
+    assert len(profile['hot_functions']) == 5 and {'function', 'calls', 'tottime_ms'} <= set(profile['hot_functions'][0])
+
+    # 外层剖析结束后，单独调用会生成自己的剖析
+    assert inner_step(10)['profile']['profile'].endswith('-inner.prof')
+
+
+def test_exception_still_writes_profile(profile_dir):
+    @profiled('broken')
+    def broken():
+        raise ValueError('slow and broken')
+
+    with pytest.raises(ValueError):
+        broken()
+    assert any(name.endswith('-broken.txt') for name in os.listdir(profile_dir))
+
+
+def test_picker_profile_in_stats(make_store, profile_dir):
+    store = make_store(num_stocks=200)
+    day = trading_days('20250701', '20250725')[0]
+    enable_profiling(str(profile_dir), top_n=10, allocations=False)
+    selected, stats = AdvancedStockPicker().select_stocks_advanced(
+        trade_date=day, max_stocks=5, auto_adjust_mode=False, market_data=store.load(MARKET_DATA_DATASET, day))
+    assert stats['profile']['peak_kb'] is None
+    assert 'select_stocks_advanced' in open(stats['profile']['summary'], encoding='utf-8').read()
+    assert 'stage_metrics' in stats
+
+
+def test_artifact_failure_keeps_call_result(profile_dir, monkeypatch):
+    def failing_stop(self):
+        self.profiler.disable()
+        raise OSError('disk full')
+    monkeypatch.setattr(profiling.ProfileRun, 'stop', failing_stop)
+
+    assert inner_step(10) == {'total': 10.0}
+
+    @profiled('broken')
+    def broken():
+        raise ValueError('original error')
+    with pytest.raises(ValueError, match='original error'):
+        broken()
+
+
+def test_env_and_flag_use_profiling_config(tmp_path, monkeypatch):
+    monkeypatch.setitem(profiling.PROFILING_CONFIG, 'top_n', 7)
+    monkeypatch.setitem(profiling.PROFILING_CONFIG, 'output_dir', str(tmp_path / 'configured'))
+    try:
+        enable_profiling()
+        assert (profiling._OPTIONS.output_dir, profiling._OPTIONS.top_n) == (str(tmp_path / 'configured'), 7)
+
+        monkeypatch.setenv('ITRADING_PROFILE', 'cpu')
+        monkeypatch.setenv('ITRADING_PROFILE_DIR', str(tmp_path / 'env'))
+        profiling._enable_from_env()
+        options = profiling._OPTIONS
+        assert (options.output_dir, options.top_n, options.allocations) == (str(tmp_path / 'env'), 7, False)
+    finally:
+        disable_profiling()
@@ -3,7 +3,7 @@
 """
 
 import reflex as rx
-from app import State, app
+from itrading.itrading import State, app, stock_card_data
 
 def test_reflex_app_import():
     """测试Reflex应用可以正常导入"""
@@ -25,6 +25,14 @@ def test_state_class_structure():
     assert hasattr(State, 'update_min_score')
     assert hasattr(State, 'update_max_stocks')
     assert hasattr(State, 'toggle_stock_selection')
+    assert hasattr(State, 'cancel_analysis')
+
+def test_stock_card_data():
+    """测试统一分析器结果到股票卡片的转换"""
+    card = stock_card_data({'代码': '600519', '名称': '贵州茅台', 'final_score': 81.234, '最新': 1500.0,
+                            '涨幅': 1.5, '成交量': float('nan'), 'ai_analysis': '', 'ai_status': 'pending'})
+    assert card == {'code': '600519', 'name': '贵州茅台', 'score': 81.2, 'price': 1500.0, 'change_pct': 1.5,
+                    'volume': 0.0, 'analysis': '', 'status': 'pending'}
 
 def test_reflex_config():
     """测试Reflex配置"""
@@ -0,0 +1,153 @@
+"""
+测试个股研报事件选股：离线回放东方财富研报接口的录制数据
+"""
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from research_report_picker import (
+    ReportCountIndex, ResearchReportCrawler, ResearchReportPicker, ResearchReportStore, parse_jsonp
+)
+from utils.telemetry import TELEMETRY
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'eastmoney_research_reports.json')
+
+
+class FixtureServer:
+    """按研报接口的分页和JSONP格式回放录制数据，记录请求数和最大并发数"""
+
+    def __init__(self, records, fail_once=()):
+        self.records = records
+        self.fail_once = set(fail_once)
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+                page_no, page_size = int(query['pageNo']), int(query['pageSize'])
+                with server.lock:
+                    server.requests += 1
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    fail = page_no in server.fail_once
+                    server.fail_once.discard(page_no)
+                time.sleep(0.05)
+                with server.lock:
+                    server.active -= 1
+                if fail:
+                    self.send_error(500)
+                    return
+                matched = [r for r in server.records
+                           if query['beginTime'] <= r['publishDate'][:10] <= query['endTime']]
+                body = {'hits': len(matched), 'size': page_size, 'TotalPage': -(-len(matched) // page_size),
+                        'pageNo': page_no, 'data': matched[(page_no - 1) * page_size:page_no * page_size]}
+                payload = f"{query['cb']}({json.dumps(body, ensure_ascii=False)})".encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/javascript; charset=utf-8')
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/report/list"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def records():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def server(records):
+    server = FixtureServer(records, fail_once=[3])
+    yield server
+    server.close()
+
+
+def test_parse_jsonp():
+    assert parse_jsonp('datatable123({"data": [1]})') == {'data': [1]}
+    assert parse_jsonp('{"data": []}') == {'data': []}
+
+
+def test_crawl_pages_concurrently(server, records):
+    crawler = ResearchReportCrawler(api_url=server.url, page_size=10, max_workers=3, retries=1)
+    run = TELEMETRY.attach()
+    try:
+        reports = crawler.crawl('20250701', '20250708')
+    finally:
+        TELEMETRY.detach(run)
+
+    expected = [r['infoCode'] for r in records if '2025-07-01' <= r['publishDate'][:10] <= '2025-07-08']
+    assert [r['info_code'] for r in reports] == expected
+    assert reports[0]['publish_date'] == '20250701' and isinstance(reports[0]['month_count'], int)
+    assert 1 < server.max_active <= 3
+    assert server.requests == -(-len(expected) // 10) + 1  # 第3页失败后重试一次
+    call = run.summary()['calls']['eastmoney.report_list']  # 经 call_upstream 统计
+    assert call['calls'] == server.requests and call['errors'] == 1
+
+
+def test_count_index_rolls():
+    index = ReportCountIndex(window_days=30)
+    index.advance('20250705')
+    for day in ('20250601', '20250606', '20250620', '20250705'):
+        index.add('600519', day)
+    assert index.count('600519') == 3  # 20250601 不在窗口内
+    index.advance('20250707')
+    assert index.count('600519') == 2  # 20250606 移出窗口
+    with pytest.raises(ValueError):
+        index.advance('20250701')
+
+
+def test_picker_ranks_by_rolling_count(server, records, tmp_path):
+    store = ResearchReportStore(str(tmp_path / 'reports.db'))
+    crawler = ResearchReportCrawler(api_url=server.url, page_size=10, max_workers=4, retries=1)
+    picker = ResearchReportPicker(store=store, crawler=crawler)
+
+    # 首次运行回溯一个统计窗口
+    assert picker.update('20250707') == sum(
+        '2025-06-08' <= r['publishDate'][:10] <= '2025-07-07' for r in records)
+
+    market_data = pd.DataFrame({'代码': ['600519', '000858'], '最新价': [1500.0, 130.0]})
+    selected, stats = picker.select_stocks('20250708', max_stocks=3, market_data=market_data)
+
+    window = [r for r in records if '2025-06-09' <= r['publishDate'][:10] <= '2025-07-08']
+    counts = Counter(r['stockCode'] for r in window)
+    api_counts = {}  # 滚动研报数相同时按接口返回的研报数排序
+    for r in window:
+        if r['publishDate'].startswith('2025-07-08') and r['emRatingName'] == '买入':
+            api_counts[r['stockCode']] = max(api_counts.get(r['stockCode'], 0), r['count'])
+    expected = sorted(api_counts, key=lambda code: (-counts[code], -api_counts[code]))[:3]
+
+    assert stats['rated_reports'] == sum(r['publishDate'].startswith('2025-07-08') and r['emRatingName'] == '买入'
+                                         for r in records)
+    assert list(selected['代码']) == expected
+    assert list(selected['近一个月研报数']) == [counts[code] for code in expected]
+    assert selected.loc[selected['代码'] == '600519', '最新价'].iloc[0] == 1500.0
+
+    # 增量：只从上次完整抓取的日期开始，已存储的研报不重复写入
+    requests = server.requests
+    assert picker.update('20250708') == 0
+    assert server.requests == requests + 1
+    assert store.get_state('complete_through') == '20250708'
@@ -0,0 +1,80 @@
+"""
+测试选股运行历史：追加写入、按股票/交易日索引查询
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.run_history import RunHistoryStore
+
+
+def run_picks(seed, codes):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '代码': codes,
+        '名称': [f'股票{c}' for c in codes],
+        '最新': rng.uniform(5, 50, len(codes)),
+        '综合得分': rng.uniform(0, 1, len(codes)),
+        '风险评分': rng.uniform(0, 1, len(codes)),
+        'ai_score': [np.nan] + list(rng.uniform(30, 90, len(codes) - 1)),
+        'final_score': np.sort(rng.uniform(20, 90, len(codes)))[::-1],
+        'ai_analysis': ['买入'] * len(codes),
+    })
+
+
+def test_record_and_read_back(tmp_path):
+    store = RunHistoryStore(str(tmp_path / 'history.db'))
+    picks = run_picks(0, ['600519', '000858', '300750'])
+    stats = {'total_stocks': np.int64(5000), 'up_ratio': np.float64(0.62), 'is_good_market': True,
+             'portfolio': {'excluded': ['300750']}}
+    run_id = store.record_run(picks, stats, source='unified_analyzer', trade_date='20250708',
+                              run_time='2025-07-08 09:35:00')
+
+    runs = store.runs()
+    assert runs['run_id'].tolist() == [run_id]
+    assert runs.loc[0, 'stats'] == {'total_stocks': 5000, 'up_ratio': 0.62, 'is_good_market': True,
+                                    'portfolio': {'excluded': ['300750']}}
+
+    restored = store.picks(run_id)
+    assert restored['代码'].tolist() == picks['代码'].tolist()
+    assert np.allclose(restored['final_score'], picks['final_score'])
+    assert restored['ai_score'].isna().iloc[0]
+
+    day = store.date_picks('20250708')
+    assert day['rank'].tolist() == [1, 2, 3] and day['ai_score'].isna().iloc[0]
+    assert day.loc[1, 'composite_score'] == picks.loc[1, '综合得分']
+
+
+def test_stock_history_over_many_runs(tmp_path):
+    store = RunHistoryStore(str(tmp_path / 'history.db'))
+    universe = [f"{600000 + i}" for i in range(60)]
+    rng = np.random.default_rng(1)
+    expected = []
+    for day in range(400):
+        codes = list(rng.choice(universe, 8, replace=False))
+        source = 'advanced_picker' if day % 2 else 'unified_analyzer'
+        run_time = f"2025-{1 + day // 60:02d}-{1 + day % 60 // 2:02d} {9 + day % 2:02d}:30:00"
+        picks = run_picks(day, codes)
+        store.record_run(picks, {'final_selection': 8}, source=source, trade_date=run_time[:10].replace('-', ''),
+                         run_time=run_time)
+        if '600007' in codes:
+            expected.append((run_time, source, float(picks.loc[codes.index('600007'), 'final_score'])))
+
+    started = time.perf_counter()
+    history = store.stock_history('600007', last_runs=30)
+    elapsed = time.perf_counter() - started
+
+    expected = sorted(expected, key=lambda x: x[0], reverse=True)[:30]
+    assert history['run_time'].tolist() == [x[0] for x in expected]
+    assert np.allclose(history['final_score'], [x[2] for x in expected])
+    assert (history['code'] == '600007').all() and history['rank'].between(1, 8).all()
+    assert elapsed < 0.5
+
+    unified = store.stock_history('600007', last_runs=5, source='unified_analyzer')
+    assert (unified['source'] == 'unified_analyzer').all() and len(unified) == 5
+    assert len(store.runs(source='advanced_picker', start='20250301', end='20250331')) == 30
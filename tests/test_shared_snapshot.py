@@ -0,0 +1,94 @@
+"""
+测试共享行情快照的发布、零拷贝读取和原子切换
+"""
+import os
+import sys
+import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base_stock_picker import BaseStockPicker
+from utils.shared_snapshot import SharedSnapshotReader, SharedSnapshotWriter
+
+
+def make_snapshot(price: float = 10.0) -> pd.DataFrame:
+    return pd.DataFrame({
+        '代码': ['600001', '000002', '600003'],
+        '名称': ['股票A', '股票B', None],
+        '最新价': [price, price * 2, price * 3],
+        '成交量': [100, 200, 300],
+        '涨幅': [1.5, np.nan, -0.5],
+    })
+
+
+def test_publish_and_zero_copy_read(tmp_path):
+    """读取方得到与发布内容一致的只读视图"""
+    path = str(tmp_path / 'snapshot.bin')
+    writer = SharedSnapshotWriter(path)
+    reader = SharedSnapshotReader(path)
+
+    assert reader.read() is None
+    assert writer.publish(make_snapshot(), trade_date='20250709') == 1
+
+    columns = reader.columns()
+    assert reader.sequence == 1
+    assert not columns['最新价'].flags.writeable
+    assert list(columns['代码']) == ['600001', '000002', '600003']
+    assert list(columns['名称']) == ['股票A', '股票B', '']
+    assert columns['成交量'].dtype == np.int64
+
+    frame = reader.read(trade_date='20250709')
+    pd.testing.assert_series_equal(frame['涨幅'], make_snapshot()['涨幅'])
+    assert reader.read(trade_date='20250710') is None
+    assert reader.read(max_age=-1) is None
+
+
+def test_atomic_swap_keeps_old_views_valid(tmp_path):
+    """发布新快照后读取方切换到新序号，旧视图仍指向旧数据"""
+    path = str(tmp_path / 'snapshot.bin')
+    writer = SharedSnapshotWriter(path)
+    reader = SharedSnapshotReader(path)
+
+    writer.publish(make_snapshot(10.0), trade_date='20250709')
+    old_prices = reader.columns()['最新价']
+
+    writer.publish(make_snapshot(11.0), trade_date='20250709')
+    assert reader.refresh()
+    assert reader.sequence == 2
+    assert reader.columns()['最新价'][0] == 11.0
+    assert old_prices[0] == 10.0
+    assert not reader.refresh()
+
+
+def test_writers_in_one_process_use_separate_temp_files(tmp_path, monkeypatch):
+    """同一进程的两个写入方各自使用临时文件，发布后不留临时文件"""
+    path = str(tmp_path / 'snapshot.bin')
+    first, second = SharedSnapshotWriter(path), SharedSnapshotWriter(path)
+    temp_files = []
+    replace = os.replace
+    monkeypatch.setattr(os, 'replace', lambda src, dst: (temp_files.append(src), replace(src, dst)))
+
+    first.publish(make_snapshot(10.0))
+    second.publish(make_snapshot(11.0))
+    assert len(set(temp_files)) == 2
+    assert os.listdir(tmp_path) == ['snapshot.bin']
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o644)
+    reader = SharedSnapshotReader(path)
+    assert reader.read()['最新价'][0] == 11.0 and reader.sequence == 2
+
+
+def test_picker_reuses_fresh_shared_snapshot(tmp_path):
+    """同一交易日的新鲜共享快照直接返回，不再请求行情API"""
+    path = str(tmp_path / 'snapshot.bin')
+    today = datetime.datetime.now().strftime('%Y%m%d')
+    SharedSnapshotWriter(path).publish(make_snapshot(), trade_date=today)
+
+    picker = BaseStockPicker()
+    picker.shared_snapshot_reader = SharedSnapshotReader(path)
+    picker.shared_snapshot_max_age = 60
+
+    df = picker.get_market_data(trade_date=today)
+    assert list(df['代码']) == ['600001', '000002', '600003']
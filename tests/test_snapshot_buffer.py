@@ -0,0 +1,87 @@
+"""
+测试盘中行情快照环形缓冲区
+"""
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from utils.snapshot_buffer import SnapshotRingBuffer
+
+
+def make_snapshot(price: float, gains) -> pd.DataFrame:
+    return pd.DataFrame({
+        '代码': ['600001', '600002', '000001'],
+        '最新价': [price, price * 2, price * 3],
+        '涨跌幅': gains,
+        '成交量': [100.0, 200.0, 300.0],
+    })
+
+
+def test_last_k_is_zero_copy_and_ordered():
+    """最近k个快照按时间顺序返回，且为不复制数据的视图"""
+    buffer = SnapshotRingBuffer(['600001', '600002', '000001'], capacity=3)
+    start = datetime.datetime(2025, 7, 8, 9, 30)
+    for i in range(5):  # 超过容量，发生回绕
+        buffer.append(make_snapshot(10.0 + i, [1, -1, 1]), start + datetime.timedelta(seconds=5 * i))
+
+    prices = buffer.last('最新', 3)
+    assert prices.shape == (3, 3)
+    assert list(prices[:, 0]) == [12.0, 13.0, 14.0]
+    assert np.shares_memory(prices, buffer._data)
+    assert not prices.flags.writeable
+    assert len(buffer) == 3
+
+
+def test_memory_fixed_and_unknown_codes_ignored():
+    """写入多少快照内存都不变，不在全集中的股票被忽略"""
+    buffer = SnapshotRingBuffer(['600001', '600002'], capacity=4)
+    nbytes = buffer.nbytes
+    for i in range(50):
+        buffer.append(make_snapshot(10.0, [1, 1, -1]))
+    assert buffer.nbytes == nbytes
+    assert list(buffer.latest('最新').index) == ['600001', '600002']
+
+
+def test_change_and_up_ratio_trend():
+    """时间窗口内价格变化和上涨占比趋势"""
+    buffer = SnapshotRingBuffer(['600001', '600002', '000001'], capacity=10)
+    start = datetime.datetime(2025, 7, 8, 9, 30)
+    buffer.append(make_snapshot(10.0, [-1, -1, 1]), start)
+    buffer.append(make_snapshot(11.0, [1, -1, 1]), start + datetime.timedelta(minutes=2))
+    buffer.append(make_snapshot(12.0, [1, 1, 1]), start + datetime.timedelta(minutes=4))
+
+    change = buffer.change('最新', seconds=300, pct=True)
+    assert round(change['600001'], 6) == 20.0
+
+    history = buffer.up_ratio_history()
+    assert list(np.round(history, 4)) == [round(1 / 3, 4), round(2 / 3, 4), 1.0]
+    assert round(buffer.up_ratio_trend(300), 4) == round(2 / 3, 4)
+    # 窗口只包含最近两个快照
+    assert round(buffer.up_ratio_trend(150), 4) == round(1 / 3, 4)
+
+
+def test_intraday_momentum_confirms_ranking():
+    """窗口内价格上涨、成交量加速的股票盘中动量得分更高；快照不足3个时不参与排序"""
+    picker = AdvancedStockPicker()
+    picker.enable_snapshot_buffer(capacity=10, trend_window_seconds=300, momentum_weight=0.5)
+    candidates = pd.DataFrame({
+        '代码': ['600001', '600002', '000001'], '量比': [2.0, 2.0, 2.0], '换手率': [5.0, 5.0, 5.0],
+        '涨幅': [2.0, 2.0, 2.0], '市盈率': [20.0, 20.0, 20.0], '流通市值': [5e9, 6e9, 7e9],
+    })
+    start = datetime.datetime(2025, 7, 8, 9, 30)
+    for i, (prices, volumes) in enumerate([([10.0, 20.0, 30.0], [100.0, 100.0, 100.0]),
+                                           ([10.0, 20.5, 29.0], [150.0, 150.0, 150.0]),
+                                           ([10.0, 22.0, 28.0], [200.0, 300.0, 180.0])]):
+        assert '盘中动量得分' not in picker.enhanced_ranking(candidates).columns
+        picker.record_snapshot(pd.DataFrame({'代码': candidates['代码'], '最新价': prices, '成交量': volumes}),
+                               start + datetime.timedelta(minutes=i))
+
+    ranked = picker.enhanced_ranking(candidates).set_index('代码')
+    assert ranked['盘中动量得分'].idxmax() == '600002' and ranked['盘中动量得分'].idxmin() == '000001'
+    assert ranked['综合得分'].idxmax() == '600002'
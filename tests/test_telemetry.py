@@ -0,0 +1,99 @@
+"""
+测试上游数据源监控：耗时/返回大小直方图、异常类型、降级事件、Prometheus文本和单次运行汇总
+"""
+import os
+import sys
+import datetime
+import urllib.request
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+import ai_stock_analyzer
+import base_stock_picker
+from base_stock_picker import BaseStockPicker
+from utils.telemetry import TELEMETRY, Telemetry, payload_size
+
+
+def test_call_records_outcomes_and_renders_prometheus(tmp_path):
+    telemetry = Telemetry()
+    assert telemetry.call('akshare', 'stock_news_em', lambda symbol: pd.DataFrame({'a': range(3)}), symbol='1') \
+        .shape == (3, 1)
+    telemetry.call('akshare', 'stock_news_em', pd.DataFrame)
+    with pytest.raises(ConnectionError):
+        telemetry.call('akshare', 'stock_news_em', lambda: (_ for _ in ()).throw(ConnectionError('reset')))
+    telemetry.record_fallback('qstock', 'market_realtime', 'akshare')
+
+    call = telemetry.summary()['calls']['akshare.stock_news_em']
+    assert (call['calls'], call['errors'], call['empty'], call['payload']) == (3, 1, 1, 3)
+    assert call['error_classes'] == {'ConnectionError': 1} and call['p95_ms'] <= call['max_ms'] + 0.1
+    assert telemetry.summary()['fallbacks'] == {'qstock.market_realtime->akshare': 1}
+
+    text = telemetry.render_prometheus()
+    labels = 'source="akshare",endpoint="stock_news_em"'
+    assert f'itrading_upstream_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f'itrading_upstream_requests_total{{{labels},outcome="empty"}} 1' in text
+    assert f'itrading_upstream_errors_total{{{labels},error="ConnectionError"}} 1' in text
+    assert 'itrading_upstream_fallbacks_total{source="qstock",endpoint="market_realtime",fallback="akshare"} 1' in text
+    assert '# TYPE itrading_upstream_payload_size histogram' in text
+
+    path = telemetry.write_textfile(str(tmp_path / 'metrics' / 'itrading.prom'))
+    assert open(path, encoding='utf-8').read() == text and os.listdir(tmp_path / 'metrics') == ['itrading.prom']
+
+    server = telemetry.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        assert urllib.request.urlopen(url, timeout=5).read().decode('utf-8') == telemetry.render_prometheus()
+    finally:
+        server.shutdown()
+
+    assert payload_size(SimpleNamespace(text='四个汉字')) == 4 and payload_size(object()) is None
+
+
+def test_collect_scopes_a_run():
+    telemetry = Telemetry()
+    telemetry.call('tushare', 'daily', list)
+    with telemetry.collect() as run:
+        telemetry.call('tushare', 'daily', lambda: [1, 2])
+    telemetry.call('tushare', 'daily', list)
+    assert run.summary()['calls']['tushare.daily']['calls'] == 1
+    assert telemetry.summary()['calls']['tushare.daily']['calls'] == 3
+
+
+def test_market_data_fallback_chain(monkeypatch):
+    picker = BaseStockPicker()
+
+    def unavailable():
+        raise ConnectionError('Remote end closed connection')
+    monkeypatch.setattr(base_stock_picker, 'qs', SimpleNamespace(market_realtime=unavailable))
+    monkeypatch.setattr(base_stock_picker, 'ak', SimpleNamespace(
+        stock_zh_a_spot=lambda: pd.DataFrame({'代码': ['600001', '000002'], '最新价': [10.0, 11.0]})))
+
+    with TELEMETRY.collect() as run:
+        df = picker.get_market_data(datetime.datetime.now().strftime('%Y%m%d'))
+    summary = run.summary()
+    assert list(df['最新']) == [10.0, 11.0]
+    assert summary['calls']['qstock.market_realtime']['error_classes'] == {'ConnectionError': 1}
+    assert summary['calls']['akshare.stock_zh_a_spot']['payload'] == 2
+    assert summary['fallbacks'] == {'qstock.market_realtime->akshare': 1}
+
+
+def test_gemini_failure_recorded_as_fallback(monkeypatch):
+    def rejected(**kwargs):
+        raise PermissionError('API key not valid')
+    monkeypatch.setattr(ai_stock_analyzer, 'gemini_client',
+                        lambda: SimpleNamespace(models=SimpleNamespace(generate_content=rejected)))
+
+    degraded = []
+    with TELEMETRY.collect() as run:
+        analysis = ai_stock_analyzer.AIStockAnalyzer().generate_ai_analysis(
+            {'stock_code': '600519', 'scores': {'technical': 60, 'fundamental': 60, 'sentiment': 50,
+                                                'comprehensive': 58}}, degraded=degraded)
+    summary = run.summary()
+    assert analysis and degraded == ['gemini']
+    assert summary['calls']['gemini.generate_content']['error_classes'] == {'PermissionError': 1}
+    assert summary['fallbacks'] == {'gemini.generate_content->rule_based': 1}
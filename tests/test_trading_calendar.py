@@ -0,0 +1,73 @@
+"""
+测试交易日历：trade_cal 缓存加载、二分查找前后交易日、区间、向量化判断，以及 utils.util 的交易日函数
+"""
+import os
+import sys
+import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import trading_calendar as calendar_module, util
+from utils.data_store import LocalDataStore
+from utils.trading_calendar import TRADE_CAL_DATASET, TRADE_CAL_KEY, TradingCalendar, set_trading_calendar
+
+
+def make_trade_cal(start='20250101', end='20250131', closed=('20250101', '20250128', '20250129')):
+    dates = pd.date_range(start, end).strftime('%Y%m%d')
+    is_open = [int(pd.Timestamp(d).weekday() < 5 and d not in closed) for d in dates]
+    return pd.DataFrame({'cal_date': dates, 'is_open': is_open})
+
+
+def test_lookups_and_ranges():
+    calendar = TradingCalendar.from_trade_cal(make_trade_cal())
+    assert calendar.is_trading_day('20250102') and '2025-01-27' in calendar
+    assert not calendar.is_trading_day('20250101') and not calendar.is_trading_day(datetime.date(2025, 1, 4))
+    assert calendar.next('20250127') == '20250130' and calendar.next('20250127', 2) == '20250131'
+    assert calendar.previous('20250130') == '20250127' and calendar.previous('20250130', 3) == '20250123'
+    assert calendar.previous('20250102') is None and calendar.next('20250131') is None
+    assert calendar.next('not a date') is None
+    assert calendar.range('20250125', '2025/01/31') == ['20250127', '20250130', '20250131']
+
+    dates = ['20250101', '2025-01-02', None, '20250128']
+    assert calendar.is_trading_days(dates).tolist() == [False, True, False, False]
+    stamps = pd.date_range('2024-12-30', '2025-02-03')
+    expected = [calendar.is_trading_day(d) for d in stamps]
+    assert calendar.is_trading_days(stamps.values).tolist() == expected
+    assert calendar.is_trading_days(np.array([20250102, 20250201])).tolist() == [True, False]
+
+
+def test_trade_cal_extended_by_rules():
+    calendar = TradingCalendar.from_trade_cal(make_trade_cal(), extend_to='20250210')
+    assert calendar.end == 20250210
+    # trade_cal 之后按周末和 CHINESE_HOLIDAYS（春节至 2月4日）补足
+    assert calendar.next('20250131') == '20250205'
+
+
+def test_load_caches_trade_cal(tmp_path, monkeypatch):
+    store = LocalDataStore(str(tmp_path / 'store'))
+    today = datetime.date.today()
+    pulls = []
+
+    def pull(start, end):
+        pulls.append((start, end))
+        return make_trade_cal('20250101', f'{today.year}1231', closed=())
+    monkeypatch.setattr(calendar_module, '_pull_trade_cal', pull)
+
+    calendar = TradingCalendar.load(store)
+    assert store.has(TRADE_CAL_DATASET, TRADE_CAL_KEY) and len(pulls) == 1
+    assert calendar.end == int(f'{today.year + 1}1231') and calendar.is_trading_day('20250101')
+    TradingCalendar.load(store)
+    assert len(pulls) == 1  # 缓存覆盖今天时不再拉取
+
+    monkeypatch.setattr(calendar_module, '_pull_trade_cal', lambda start, end: None)
+    assert TradingCalendar.load(LocalDataStore(str(tmp_path / 'empty'))).is_trading_day('20250101') is False
+
+
+def test_util_uses_calendar():
+    set_trading_calendar(TradingCalendar.from_trade_cal(make_trade_cal()))  # conftest 在测试结束后恢复
+    assert util.is_trading_day('2025-01-27') and not util.is_trading_day('20250128')
+    assert util.next_trading_day('20250127') == '20250130'
+    assert util.last_trading_day(datetime.datetime(2025, 1, 30, 9, 30)) == '20250127'
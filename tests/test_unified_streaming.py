@@ -0,0 +1,143 @@
+"""
+测试流式选股AI分析：按排名提交分析、逐只产出临时得分，全部完成后与批量模式一致
+"""
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+
+import unify_stock_pick_ai_analyzer as unify
+
+CODES = ['600001', '600002', '000003', '300004', '600005']
+AI_SCORES = {'600001': 55.0, '600002': 80.0, '000003': 40.0, '300004': 70.0, '600005': 65.0}
+
+
+def ranked_stocks():
+    return pd.DataFrame({
+        '代码': CODES,
+        '名称': list('ABCDE'),
+        '流通市值': [80.0, 120.0, 60.0, 200.0, 95.0],
+        '综合得分': [90.0, 85.0, 80.0, 75.0, 70.0],
+        '风险评分': [30.0, 45.0, 25.0, 60.0, 40.0],
+        '风险调整得分': [70.0, 60.0, 72.0, 45.0, 55.0],
+    })
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    analyzer = unify.UnifiedStockPickAIAnalyzer(portfolio=False)
+    monkeypatch.setattr(analyzer.picker, 'select_stocks_advanced',
+                        lambda **kwargs: (ranked_stocks(), {'selected_count': len(CODES)}))
+    return analyzer
+
+
+def fake_analysis(calls, delays=None, fail=()):
+    lock = threading.Lock()
+
+    def analyze(ai_analyzer, code, deadline=None):
+        with lock:
+            calls.append(code)
+        time.sleep((delays or {}).get(code, 0.01))
+        if code in fail:
+            raise RuntimeError('AI服务超时')
+        return {'stock_code': code, 'ai_score': AI_SCORES[code], 'ai_analysis': f'{code} 分析'}
+    return analyze
+
+
+def test_stream_yields_provisional_then_batch_scores(analyzer, monkeypatch):
+    calls = []
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice', fake_analysis(calls))
+    snapshots = list(analyzer.stream_pick_and_analyze(trade_date='20250708', max_workers=1))
+
+    assert calls == CODES  # 按排名顺序分析
+    assert len(snapshots) == len(CODES) + 1
+    first, first_stats = snapshots[0]
+    assert (first['ai_status'] == 'pending').all() and first['final_score'].notna().all()
+    assert first_stats['analyzed_count'] == 0 and not first_stats['ai_analysis_completed']
+    for analyzed, (result, stats) in enumerate(snapshots):
+        assert stats['analyzed_count'] == analyzed
+        assert (result['ai_status'] == 'done').sum() == analyzed
+        assert result['final_score'].is_monotonic_decreasing
+
+    final, stats = snapshots[-1]
+    monkeypatch.setattr(unify, 'stock_analyzer',
+                        lambda codes, deadline=None: [fake_analysis([])(None, code) for code in codes])
+    batch, _ = analyzer.pick_and_analyze_stocks(trade_date='20250708')
+    assert stats['ai_analysis_completed'] and stats['ai_failed'] == []
+    assert list(final['代码']) == list(batch['代码'])
+    assert np.allclose(final['final_score'], batch['final_score'])
+
+
+def test_provisional_score_renormalizes_without_ai(analyzer):
+    stocks = ranked_stocks()
+    stocks['ai_score'] = np.nan
+    provisional = analyzer._calculate_final_score(stocks)['final_score']
+    stocks['ai_score'] = 50.0  # AI得分相同时只贡献常数项
+    with_ai = analyzer._calculate_final_score(stocks)['final_score']
+    assert provisional.between(0, 100).all()
+    assert np.allclose(with_ai, provisional * 0.8 + 0.5 * 20)
+
+
+def test_failed_analysis_and_early_close(analyzer, monkeypatch):
+    calls = []
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice',
+                        fake_analysis(calls, delays={'600001': 0.2}, fail={'600002'}))
+    snapshots = list(analyzer.stream_pick_and_analyze(trade_date='20250708', max_workers=2))
+    final, stats = snapshots[-1]
+    assert stats['ai_failed'] == ['600002']
+    assert final.set_index('代码').loc['600002', 'ai_status'] == 'failed'
+    assert final['final_score'].notna().all() and stats['ai_analysis_completed']
+    # 慢的第一名不阻塞后面股票的结果
+    assert snapshots[-2][0].set_index('代码').loc['600001', 'ai_status'] == 'pending'
+
+    calls.clear()
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice', fake_analysis(calls, delays={c: 0.1 for c in CODES}))
+    stream = analyzer.stream_pick_and_analyze(trade_date='20250708', max_workers=1)
+    next(stream)
+    next(stream)
+    stream.close()  # 取消尚未开始的分析
+    time.sleep(0.3)
+    assert len(calls) < len(CODES)
+
+
+def test_stream_shares_deadline_and_bookkeeping(analyzer, monkeypatch):
+    """流式模式与批量模式共用行情/选股步骤：截止时间、降级记录、阶段统计和上游调用汇总"""
+    monkeypatch.setitem(unify.DEADLINE_CONFIG, 'reserve_seconds', 0.1)
+    calls = []
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice', fake_analysis(calls, delays={c: 0.4 for c in CODES}))
+    monkeypatch.setattr(analyzer.picker, 'get_market_data', lambda trade_date: ranked_stocks())
+
+    started = time.perf_counter()
+    snapshots = list(analyzer.stream_pick_and_analyze(trade_date='20250708', max_workers=1,
+                                                      deadline=unify.Deadline(1.0)))
+    assert time.perf_counter() - started < 1.5
+    final, stats = snapshots[-1]
+    skipped = stats['degraded_components']['ai_analysis']
+    assert 0 < len(skipped) < len(CODES) and skipped == CODES[-len(skipped):]
+    assert set(final.loc[final['ai_status'] == 'skipped', '代码']) == set(skipped)
+    assert {'pipeline.market_data', 'pipeline.selection'} <= set(stats['stage_metrics'])
+    assert 'upstream' in stats and 'deadline_remaining_seconds' in stats
+
+
+def test_cancel_event_stops_stream_while_waiting(analyzer, monkeypatch):
+    """取消事件由其他线程设置，不必等正在进行的AI分析返回"""
+    calls = []
+    monkeypatch.setattr(unify, 'analyze_stock_with_advice', fake_analysis(calls, delays={c: 0.6 for c in CODES}))
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    started = time.perf_counter()
+    snapshots = list(analyzer.stream_pick_and_analyze(trade_date='20250708', max_workers=1, cancel=cancel))
+    assert time.perf_counter() - started < 0.5
+    assert len(snapshots) == 1 and snapshots[0][1]['analyzed_count'] == 0
+    time.sleep(0.7)
+    assert calls == CODES[:1]  # 尚未开始的分析已取消
+
+    assert list(analyzer.stream_pick_and_analyze(trade_date='20250708', cancel=cancel)) == []
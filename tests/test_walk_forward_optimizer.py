@@ -0,0 +1,69 @@
+"""
+测试市场模式参数滚动优化和参数时间表加载
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_stock_picker import AdvancedStockPicker
+from backtester import trading_days
+from walk_forward_optimizer import WalkForwardOptimizer, make_windows
+
+
+def test_make_windows():
+    days = [str(i) for i in range(10)]
+    windows = make_windows(days, train_days=4, test_days=3)
+    assert [w['train'] for w in windows] == [(0, 4), (3, 7), (6, 10)]
+    assert [w['test'] for w in windows] == [(4, 7), (7, 10), None]
+
+
+def test_walk_forward_schedule(tmp_path, make_store):
+    """并行窗口与串行结果一致，时间表可被选股器按交易日加载"""
+    store = make_store(end='20250815')
+    days = trading_days('20250701', '20250815')
+    space = {'min_gain': [0.5, 2], 'min_volume_ratio': [1.2, 2]}
+    path = str(tmp_path / 'schedule.json')
+
+    def optimize(workers):
+        return WalkForwardOptimizer(store=store, train_days=15, test_days=5, param_space=space,
+                                    min_picks=3, max_stocks=5, workers=workers).run('20250701', '20250815', path)
+
+    schedule = optimize(workers=2)
+    assert schedule['entries'] == optimize(workers=1)['entries']
+
+    entries = schedule['entries']
+    assert entries[0]['effective_from'] == days[15]
+    assert entries[-1]['effective_to'] is None and entries[-1]['effective_from'] > days[-1]
+    assert all(e['out_of_sample'] for e in entries[:-1])
+    assert schedule['summary']['windows'] == len(entries) - 1
+    for entry in entries:
+        for mode, params in entry['adjustments'].items():
+            assert params in [{'min_gain': g, 'min_volume_ratio': v} for g in (0.5, 2) for v in (1.2, 2)]
+            assert entry['in_sample'][mode]['score'] > entry['in_sample'][mode]['baseline_score']
+
+    picker = AdvancedStockPicker()
+    assert picker.load_parameter_schedule(path, trade_date=days[0]) is None
+    entry = picker.load_parameter_schedule(path, trade_date=entries[1]['effective_from'])
+    assert entry == entries[1]
+    for mode, params in entry['adjustments'].items():
+        for key, value in params.items():
+            assert picker._get_adjusted_config(mode)[key] == value
+
+
+def test_concurrent_saves_use_separate_temp_files(tmp_path, monkeypatch):
+    """同时写出时间表的两次运行各用自己的临时文件"""
+    path = str(tmp_path / 'schedule.json')
+    temp_files = []
+    replace = os.replace
+
+    def recording_replace(src, dst):
+        temp_files.append(src)
+        if len(temp_files) == 1:  # 第一次写出替换前，另一次运行也写出
+            WalkForwardOptimizer.save({'run': 2}, path)
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', recording_replace)
+
+    WalkForwardOptimizer.save({'run': 1}, path)
+    assert len(set(temp_files)) == 2
+    assert os.listdir(tmp_path) == ['schedule.json']
@@ -7,16 +7,32 @@ Unified Stock Picker with AI Analyzer
 
 import os
 import sys
+import time
+import argparse
 import logging
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, Tuple
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from advanced_stock_picker import AdvancedStockPicker
-from ai_stock_analyzer import stock_analyzer
+from ai_stock_analyzer import AIStockAnalyzer, analyze_stock_with_advice, stock_analyzer
+from ai_analysis_scheduler import AIAnalysisScheduler
+from config import (
+    AI_SCHEDULER_CONFIG, ANALYSIS_STREAM_CONFIG, DEADLINE_CONFIG, INSTRUMENTATION_CONFIG, PORTFOLIO_CONFIG,
+    TELEMETRY_CONFIG
+)
+from portfolio_optimizer import PortfolioOptimizer
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.instrumentation import StageMetrics, format_stage_metrics
+from utils.profiling import enable_profiling, profiled
+from utils.run_history import RunHistoryStore
+from utils.telemetry import TELEMETRY, record_fallback
 
 # 设置日志
 logging.basicConfig(
@@ -30,25 +46,49 @@ logger = logging.getLogger(__name__)
 
 os.makedirs('/tmp/itrading', exist_ok=True)
 
+# 最终得分权重 (加权平均)
+FINAL_SCORE_WEIGHTS = {
+    'market_cap': 0.15,      # 流通市值权重
+    'composite': 0.25,       # 综合得分权重
+    'risk': 0.20,           # 风险评分权重
+    'risk_adjusted': 0.20,   # 风险调整得分权重
+    'ai_score': 0.20        # AI得分权重
+}
+
+
+def normalize_score(series: pd.Series, higher_is_better: bool = True) -> pd.Series:
+    """标准化得分到0-1范围"""
+    if series.nunique() <= 1:
+        return pd.Series([0.5] * len(series), index=series.index)
+    
+    normalized = (series - series.min()) / (series.max() - series.min())
+    if not higher_is_better:
+        normalized = 1 - normalized
+    return normalized
+
 
 class UnifiedStockPickAIAnalyzer:
     """统一股票选股AI分析器"""
     
-    def __init__(self, market_mode: str = 'normal'):
+    def __init__(self, market_mode: str = 'normal', portfolio: bool = PORTFOLIO_CONFIG['enabled']):
         """
         初始化统一分析器
         
         Args:
             market_mode: 市场模式 ('normal', 'bull_market', 'bear_market', 'volatile_market')
+            portfolio: 是否为最终选股分配组合权重（马科维茨组合优化）
         """
         self.market_mode = market_mode
         self.picker = AdvancedStockPicker(market_mode=market_mode)
+        self.portfolio_optimizer = PortfolioOptimizer() if portfolio else None
         logger.info(f"初始化统一股票选股AI分析器，市场模式: {market_mode}")
     
+    @profiled('pick_and_analyze_stocks')
     def pick_and_analyze_stocks(self, 
                                trade_date: str = None, 
                                max_stocks: int = 8,
-                               auto_adjust_mode: bool = True) -> Tuple[pd.DataFrame, Dict]:
+                               auto_adjust_mode: bool = True,
+                               deadline: Deadline = None) -> Tuple[pd.DataFrame, Dict]:
         """
         选股并进行AI分析
         
@@ -56,26 +96,33 @@ class UnifiedStockPickAIAnalyzer:
             trade_date: 交易日期，格式YYYYMMDD，默认为今天
             max_stocks: 最大选股数量
             auto_adjust_mode: 是否自动调整模式
+            deadline: 截止时间（utils/deadline.py），默认不限。获取行情最多用剩余时间的
+                DEADLINE_CONFIG['market_data_fraction']，超时改用缓存行情；AI分析在截止前预留
+                DEADLINE_CONFIG['reserve_seconds'] 秒，时间不足时降级为规则分析或跳过
             
         Returns:
-            Tuple[pd.DataFrame, Dict]: (增强后的股票数据, 统计信息)
+            Tuple[pd.DataFrame, Dict]: (增强后的股票数据, 统计信息)，
+            stats['degraded_components'] 记录降级的组件（组件 -> 数据来源或受影响的股票代码），
+            stats['upstream'] 为本次运行的上游数据源调用汇总（utils/telemetry.py）
         """
         if trade_date is None:
             trade_date = datetime.now().strftime('%Y%m%d')
+        deadline = deadline or Deadline()
+        degraded = {}
+        metrics = StageMetrics(**INSTRUMENTATION_CONFIG)
+        upstream = TELEMETRY.attach()
         
         logger.info(f"开始统一选股AI分析，日期: {trade_date}")
         
         try:
             # 1. 使用高级选股器选股
             logger.info("🔍 步骤1: 执行股票选股...")
-            selected_stocks, stats = self.picker.select_stocks_advanced(
-                trade_date=trade_date,
-                max_stocks=max_stocks,
-                auto_adjust_mode=auto_adjust_mode
-            )
+            selected_stocks, stats = self._select_stocks(trade_date, max_stocks, auto_adjust_mode, deadline,
+                                                         metrics, degraded)
             
             if selected_stocks.empty:
                 logger.warning("选股器未选出任何股票")
+                stats['upstream'] = upstream.summary()
                 return pd.DataFrame(), stats
             
             # 2. 提取股票代码进行AI分析
@@ -83,7 +130,8 @@ class UnifiedStockPickAIAnalyzer:
             logger.info(f"🤖 步骤2: 对 {len(stock_codes)} 只股票进行AI分析...")
             
             # 调用AI分析器
-            ai_results = stock_analyzer(stock_codes)
+            ai_results = metrics.call('pipeline.ai_analysis', stock_analyzer, stock_codes,
+                                      deadline=deadline.child(reserve=DEADLINE_CONFIG['reserve_seconds']))
             
             # 3. 创建AI分析结果字典
             ai_dict = {}
@@ -93,20 +141,37 @@ class UnifiedStockPickAIAnalyzer:
                     'ai_score': result['ai_score'],
                     'ai_analysis': result['ai_analysis']
                 }
+                for component in result.get('degraded', []):
+                    degraded.setdefault(component, []).append(stock_code)
+                metrics.merge(result.get('stage_metrics', {}), prefix='analyzer.')
+            missing = [code for code in stock_codes if code not in ai_dict]
+            if missing:
+                logger.warning(f"⚠️ {len(missing)} 只股票在截止时间前未完成AI分析: {missing}")
+                degraded['ai_analysis'] = missing
             
             # 4. 将AI分析结果添加到选股结果中
             logger.info("📊 步骤3: 合并AI分析结果...")
             enhanced_stocks = self._merge_ai_results(selected_stocks, ai_dict)
             
             # 5. 计算最终得分
-            enhanced_stocks = self._calculate_final_score(enhanced_stocks)
+            enhanced_stocks = metrics.call('pipeline.final_score', self._calculate_final_score, enhanced_stocks)
             
             # 6. 按最终得分重新排序
             enhanced_stocks = enhanced_stocks.sort_values('final_score', ascending=False).reset_index(drop=True)
             
+            # 7. 组合权重（可选）
+            if self.portfolio_optimizer is not None:
+                logger.info("⚖️ 步骤4: 计算组合权重...")
+                enhanced_stocks, stats['portfolio'] = metrics.call(
+                    'pipeline.portfolio', self.portfolio_optimizer.allocate, enhanced_stocks, trade_date)
+            
             # 更新统计信息
+            stats['stage_metrics'] = metrics.as_dict()
+            stats['upstream'] = upstream.summary()
             stats['ai_analysis_completed'] = True
             stats['final_stocks_count'] = len(enhanced_stocks)
+            if not deadline.unlimited:
+                stats['deadline_remaining_seconds'] = round(deadline.remaining(), 1)
             
             logger.info(f"✅ 统一选股AI分析完成，最终选出 {len(enhanced_stocks)} 只股票")
             
@@ -115,10 +180,267 @@ class UnifiedStockPickAIAnalyzer:
         except Exception as e:
             logger.error(f"统一选股AI分析失败: {e}")
             raise
+        finally:
+            TELEMETRY.detach(upstream)
+    
+    def _select_stocks(self, trade_date: str, max_stocks: int, auto_adjust_mode: bool, deadline: Deadline,
+                       metrics: StageMetrics, degraded: Dict) -> Tuple[pd.DataFrame, Dict]:
+        """
+        获取行情并选股（pick_and_analyze_stocks、stream_pick_and_analyze 和 pick_and_analyze_with_budget 共用）
+        
+        有截止时间时获取行情最多用剩余时间的 DEADLINE_CONFIG['market_data_fraction']，超时改用缓存行情，
+        并在 degraded 中记录行情来源；所有数据源都不可用、选股基于模拟数据时记为 'mock'。阶段耗时记入 metrics
+        
+        Returns:
+            Tuple[pd.DataFrame, Dict]: (选中的股票, 选股统计信息)
+        """
+        market_data = None
+        if not deadline.unlimited:
+            market_deadline = deadline.child(fraction=DEADLINE_CONFIG['market_data_fraction'],
+                                             reserve=DEADLINE_CONFIG['reserve_seconds'])
+            try:
+                market_data = metrics.call('pipeline.market_data', self.picker.get_market_data, trade_date,
+                                           runner=market_deadline.run)
+            except DeadlineExceeded as e:
+                market_data, source = self.picker.get_cached_market_data(trade_date)
+                logger.warning(f"⚠️ 获取行情超时（{e}），使用缓存行情: {source}")
+                degraded['market_data'] = source
+                record_fallback('market_data', 'get_market_data', source.split(':')[0])
+        selected_stocks, stats = metrics.call(
+            'pipeline.selection',
+            self.picker.select_stocks_advanced,
+            trade_date=trade_date,
+            max_stocks=max_stocks,
+            auto_adjust_mode=auto_adjust_mode,
+            market_data=market_data
+        )
+        if stats.get('market_data_source') == 'mock' and 'market_data' not in degraded:
+            logger.warning("⚠️ 所有行情数据源不可用，选股基于模拟数据")
+            degraded['market_data'] = 'mock'
+        stats['degraded_components'] = degraded
+        metrics.merge(stats.get('stage_metrics', {}), prefix='picker.')
+        stats['stage_metrics'] = metrics.as_dict()
+        return selected_stocks, stats
+    
+    def stream_pick_and_analyze(self,
+                                trade_date: str = None,
+                                max_stocks: int = 8,
+                                auto_adjust_mode: bool = True,
+                                max_workers: int = ANALYSIS_STREAM_CONFIG['max_workers'],
+                                deadline: Deadline = None,
+                                cancel: threading.Event = None) -> Iterator[Tuple[pd.DataFrame, Dict]]:
+        """
+        流式选股并进行AI分析
+        
+        选股排序完成后立即产出只按选股指标计算的临时结果，同时按排名顺序把股票提交到有界线程池做AI分析，
+        每完成一只股票就重新计算 final_score 并产出一次；全部完成后的结果与 pick_and_analyze_stocks 一致。
+        行情获取、截止时间、降级记录、阶段统计和上游调用汇总与 pick_and_analyze_stocks 相同；
+        截止时间前未完成的股票标记为 skipped。提前停止迭代（关闭生成器）会取消尚未开始的分析。
+        cancel 被设置后（可由其他线程设置），选股结束时或等待分析期间最多 cancel_poll_seconds 内停止产出，
+        并取消尚未开始的分析；正在进行的选股和单只股票分析会执行完，但结果不再产出。
+        
+        Args:
+            trade_date: 交易日期，格式YYYYMMDD，默认为今天
+            max_stocks: 最大选股数量
+            auto_adjust_mode: 是否自动调整模式
+            max_workers: 同时进行AI分析的股票数
+            deadline: 截止时间，默认不限（见 pick_and_analyze_stocks）
+            cancel: 取消事件，默认不可取消
+            
+        Yields:
+            Tuple[pd.DataFrame, Dict]: (按 final_score 排序的股票数据, 统计信息)，
+            ai_status 列为 pending（分析中）、done（已完成）、failed（分析失败）或 skipped（截止前未完成）
+        """
+        if trade_date is None:
+            trade_date = datetime.now().strftime('%Y%m%d')
+        deadline = deadline or Deadline()
+        degraded = {}
+        metrics = StageMetrics(**INSTRUMENTATION_CONFIG)
+        upstream = TELEMETRY.attach()
+        executor = None
+        
+        logger.info(f"开始流式选股AI分析，日期: {trade_date}")
+        started = time.perf_counter()
+        
+        try:
+            selected_stocks, stats = self._select_stocks(trade_date, max_stocks, auto_adjust_mode, deadline,
+                                                         metrics, degraded)
+            if selected_stocks.empty:
+                logger.warning("选股器未选出任何股票")
+                stats['upstream'] = upstream.summary()
+                yield pd.DataFrame(), stats
+                return
+            
+            enhanced_stocks = selected_stocks.reset_index(drop=True)
+            enhanced_stocks['ai_score'] = np.nan
+            enhanced_stocks['ai_analysis'] = ""
+            enhanced_stocks['ai_status'] = 'pending'
+            total = len(enhanced_stocks)
+            if cancel is not None and cancel.is_set():
+                logger.info("流式选股AI分析已取消（选股完成后）")
+                return
+            
+            def snapshot(analyzed: int) -> Tuple[pd.DataFrame, Dict]:
+                result = self._calculate_final_score(enhanced_stocks)
+                result = result.sort_values('final_score', ascending=False).reset_index(drop=True)
+                if analyzed == total and self.portfolio_optimizer is not None:
+                    result, stats['portfolio'] = self.portfolio_optimizer.allocate(result, trade_date)
+                stats.update({
+                    'analyzed_count': analyzed,
+                    'pending_count': total - analyzed,
+                    'ai_failed': enhanced_stocks.loc[enhanced_stocks['ai_status'] == 'failed', '代码'].tolist(),
+                    'ai_analysis_completed': analyzed == total,
+                    'final_stocks_count': len(result),
+                    'elapsed_seconds': round(time.perf_counter() - started, 2),
+                    'stage_metrics': metrics.as_dict(),
+                    'upstream': upstream.summary(),
+                })
+                if not deadline.unlimited:
+                    stats['deadline_remaining_seconds'] = round(deadline.remaining(), 1)
+                return result, dict(stats)
+            
+            yield snapshot(0)
+            
+            analyzer = AIStockAnalyzer()
+            ai_deadline = deadline.child(reserve=DEADLINE_CONFIG['reserve_seconds'])
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            # 按排名顺序提交，线程池按提交顺序开始分析；Gemini 请求以剩余时间为超时
+            futures = {executor.submit(analyze_stock_with_advice, analyzer, code, deadline=ai_deadline): i
+                       for i, code in enumerate(enhanced_stocks['代码'])}
+            analyzed = 0
+            pending = set(futures)
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    logger.info(f"流式选股AI分析已取消，已完成 {analyzed}/{total} 只股票")
+                    return
+                if not ai_deadline.unlimited and ai_deadline.expired():
+                    missing = enhanced_stocks['ai_status'] == 'pending'
+                    degraded['ai_analysis'] = enhanced_stocks.loc[missing, '代码'].tolist()
+                    logger.warning(f"⚠️ {int(missing.sum())} 只股票在截止时间前未完成AI分析: {degraded['ai_analysis']}")
+                    enhanced_stocks.loc[missing, 'ai_status'] = 'skipped'
+                    yield snapshot(total)
+                    break
+                timeout = None if ai_deadline.unlimited else ai_deadline.remaining()
+                if cancel is not None:  # 定期醒来检查取消事件
+                    poll = ANALYSIS_STREAM_CONFIG['cancel_poll_seconds']
+                    timeout = poll if timeout is None else min(timeout, poll)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = futures[future]
+                    analyzed += 1
+                    try:
+                        result = future.result()
+                        enhanced_stocks.at[i, 'ai_score'] = result['ai_score']
+                        enhanced_stocks.at[i, 'ai_analysis'] = result['ai_analysis']
+                        enhanced_stocks.at[i, 'ai_status'] = 'done'
+                        for component in result.get('degraded', []):
+                            degraded.setdefault(component, []).append(enhanced_stocks.at[i, '代码'])
+                        metrics.merge(result.get('stage_metrics', {}), prefix='analyzer.')
+                    except Exception as e:
+                        logger.error(f"股票 {enhanced_stocks.at[i, '代码']} AI分析失败: {e}")
+                        enhanced_stocks.at[i, 'ai_status'] = 'failed'
+                    yield snapshot(analyzed)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            TELEMETRY.detach(upstream)
+        
+        logger.info(f"✅ 流式选股AI分析完成，{total} 只股票，用时 {time.perf_counter() - started:.1f}s")
+    
+    def pick_and_analyze_with_budget(self,
+                                     trade_date: str = None,
+                                     max_stocks: int = 8,
+                                     candidates: int = None,
+                                     auto_adjust_mode: bool = True,
+                                     scheduler: AIAnalysisScheduler = None,
+                                     deadline: Deadline = None) -> Tuple[pd.DataFrame, Dict]:
+        """
+        在AI分析预算内选股并分析
+        
+        先选出 candidates 只候选股票，按不含AI的得分决定分析顺序：即使AI得分为满分也进不了前
+        max_stocks 的股票不做AI分析，其余按得分从高到低在时间/token预算内分析（见 ai_analysis_scheduler.py），
+        最后按 final_score 保留前 max_stocks 只。行情获取、截止时间、降级记录、阶段统计和上游调用汇总与
+        pick_and_analyze_stocks 相同；AI分析的时间预算不超过截止时间预留 DEADLINE_CONFIG['reserve_seconds'] 后的剩余时间。
+        
+        Args:
+            trade_date: 交易日期，格式YYYYMMDD，默认为今天
+            max_stocks: 最终保留的股票数
+            candidates: 候选股票数，默认为 max_stocks × AI_SCHEDULER_CONFIG['candidate_multiplier']
+            auto_adjust_mode: 是否自动调整模式
+            scheduler: AI分析调度器，默认按 AI_SCHEDULER_CONFIG 的预算
+            deadline: 截止时间，默认不限（见 pick_and_analyze_stocks）
+            
+        Returns:
+            Tuple[pd.DataFrame, Dict]: (增强后的股票数据, 统计信息)，stats['ai_schedule'] 为调度报告
+        """
+        if trade_date is None:
+            trade_date = datetime.now().strftime('%Y%m%d')
+        candidates = candidates or max_stocks * AI_SCHEDULER_CONFIG['candidate_multiplier']
+        scheduler = scheduler or AIAnalysisScheduler()
+        deadline = deadline or Deadline()
+        degraded = {}
+        metrics = StageMetrics(**INSTRUMENTATION_CONFIG)
+        upstream = TELEMETRY.attach()
+        
+        logger.info(f"开始预算内选股AI分析，日期: {trade_date}，候选 {candidates} 只，保留 {max_stocks} 只")
+        try:
+            selected_stocks, stats = self._select_stocks(trade_date, candidates, auto_adjust_mode, deadline,
+                                                         metrics, degraded)
+            if selected_stocks.empty:
+                logger.warning("选股器未选出任何股票")
+                stats['upstream'] = upstream.summary()
+                return pd.DataFrame(), stats
+            
+            enhanced_stocks = selected_stocks.reset_index(drop=True)
+            codes = enhanced_stocks['代码'].tolist()
+            to_analyze, skipped = scheduler.plan(codes, self._pre_ai_score(enhanced_stocks), max_stocks,
+                                                 ai_points=FINAL_SCORE_WEIGHTS['ai_score'] * 100)
+            logger.info(f"🤖 {len(skipped)} 只股票即使AI满分也进不了前 {max_stocks}，跳过AI分析")
+            
+            analyzer = AIStockAnalyzer()
+            ai_deadline = deadline.child(reserve=DEADLINE_CONFIG['reserve_seconds'], cap=scheduler.time_budget)
+            results, report = metrics.call(
+                'pipeline.ai_analysis', scheduler.run, to_analyze,
+                lambda code, stock_deadline: analyze_stock_with_advice(analyzer, code, deadline=stock_deadline),
+                deadline=ai_deadline)
+            report['skipped_rank'] = skipped
+            for code, result in results.items():
+                for component in result.get('degraded', []):
+                    degraded.setdefault(component, []).append(code)
+                metrics.merge(result.get('stage_metrics', {}), prefix='analyzer.')
+            missing = report['timed_out'] + report['skipped_budget']
+            if missing:
+                logger.warning(f"⚠️ {len(missing)} 只股票在预算内未完成AI分析: {missing}")
+                degraded['ai_analysis'] = missing
+            
+            enhanced_stocks['ai_score'] = [results[c]['ai_score'] if c in results else np.nan for c in codes]
+            enhanced_stocks['ai_analysis'] = [results[c]['ai_analysis'] if c in results else "" for c in codes]
+            enhanced_stocks['ai_status'] = ['done' if c in results else 'failed' if c in report['failed'] else 'skipped'
+                                            for c in codes]
+            
+            enhanced_stocks = metrics.call('pipeline.final_score', self._calculate_final_score, enhanced_stocks)
+            enhanced_stocks = enhanced_stocks.sort_values('final_score', ascending=False).head(max_stocks)
+            enhanced_stocks = enhanced_stocks.reset_index(drop=True)
+            
+            if self.portfolio_optimizer is not None:
+                enhanced_stocks, stats['portfolio'] = metrics.call(
+                    'pipeline.portfolio', self.portfolio_optimizer.allocate, enhanced_stocks, trade_date)
+            
+            stats['ai_schedule'] = report
+            stats['stage_metrics'] = metrics.as_dict()
+            stats['upstream'] = upstream.summary()
+            stats['ai_analysis_completed'] = True
+            stats['final_stocks_count'] = len(enhanced_stocks)
+            if not deadline.unlimited:
+                stats['deadline_remaining_seconds'] = round(deadline.remaining(), 1)
+            logger.info(f"✅ 预算内选股AI分析完成，AI分析 {len(results)}/{len(codes)} 只，最终选出 {len(enhanced_stocks)} 只股票")
+            return enhanced_stocks, stats
+        finally:
+            TELEMETRY.detach(upstream)
     
     def _merge_ai_results(self, selected_stocks: pd.DataFrame, ai_dict: Dict) -> pd.DataFrame:
         """
-        合并AI分析结果到选股数据中
+        合并AI分析结果到选股数据中，没有AI分析结果的股票标记为 skipped，不计AI得分
         
         Args:
             selected_stocks: 选股结果DataFrame
@@ -132,6 +454,7 @@ class UnifiedStockPickAIAnalyzer:
         # 添加AI分析字段
         enhanced_stocks['ai_score'] = 0.0
         enhanced_stocks['ai_analysis'] = ""
+        enhanced_stocks['ai_status'] = 'done'
         
         for idx, row in enhanced_stocks.iterrows():
             stock_code = row['代码']
@@ -139,14 +462,41 @@ class UnifiedStockPickAIAnalyzer:
                 enhanced_stocks.at[idx, 'ai_score'] = ai_dict[stock_code]['ai_score']
                 enhanced_stocks.at[idx, 'ai_analysis'] = ai_dict[stock_code]['ai_analysis']
             else:
+                enhanced_stocks.at[idx, 'ai_status'] = 'skipped'
                 logger.warning(f"股票 {stock_code} 未找到AI分析结果")
         
         return enhanced_stocks
     
+    def _pre_ai_score(self, stocks: pd.DataFrame) -> pd.Series:
+        """
+        最终得分中不依赖AI的部分（0-100分制，最高为 (1 - AI权重) × 100）
+        统一 '流通市值,综合得分,风险评分,风险调整得分'
+        """
+        # 标准化流通市值 (适中为好，过大过小都不好)
+        market_cap_score = stocks['流通市值'].copy()
+        market_cap_median = market_cap_score.median()
+        market_cap_score = 1 - abs(market_cap_score - market_cap_median) / market_cap_median
+        market_cap_score = market_cap_score.clip(0, 1)
+        
+        # 标准化其他得分
+        composite_score_norm = normalize_score(stocks['综合得分'])
+        risk_score_norm = normalize_score(stocks['风险评分'], higher_is_better=False)  # 风险评分越低越好
+        risk_adjusted_score_norm = normalize_score(stocks['风险调整得分'])
+        
+        weights = FINAL_SCORE_WEIGHTS
+        return (
+            market_cap_score * weights['market_cap'] +
+            composite_score_norm * weights['composite'] +
+            risk_score_norm * weights['risk'] +
+            risk_adjusted_score_norm * weights['risk_adjusted']
+        ) * 100
+    
     def _calculate_final_score(self, enhanced_stocks: pd.DataFrame) -> pd.DataFrame:
         """
         计算最终得分
         统一 '流通市值,综合得分,风险评分,风险调整得分' + 'ai_score'
+        ai_score 缺失（尚未完成AI分析）的股票按其余指标的权重重新归一化，得到临时得分；
+        AI分析失败或被调度器跳过的股票（ai_status 为 failed/skipped）不计AI得分
         
         Args:
             enhanced_stocks: 包含AI分析的股票数据
@@ -155,46 +505,21 @@ class UnifiedStockPickAIAnalyzer:
             包含最终得分的DataFrame
         """
         df = enhanced_stocks.copy()
-        
-        # 标准化各个得分指标到0-1范围
-        def normalize_score(series, higher_is_better=True):
-            """标准化得分到0-1范围"""
-            if series.std() == 0:
-                return pd.Series([0.5] * len(series), index=series.index)
-            
-            normalized = (series - series.min()) / (series.max() - series.min())
-            if not higher_is_better:
-                normalized = 1 - normalized
-            return normalized
-        
-        # 标准化流通市值 (适中为好，过大过小都不好)
-        market_cap_score = df['流通市值'].copy()
-        market_cap_median = market_cap_score.median()
-        market_cap_score = 1 - abs(market_cap_score - market_cap_median) / market_cap_median
-        market_cap_score = market_cap_score.clip(0, 1)
-        
-        # 标准化其他得分
-        composite_score_norm = normalize_score(df['综合得分'])
-        risk_score_norm = normalize_score(df['风险评分'], higher_is_better=False)  # 风险评分越低越好
-        risk_adjusted_score_norm = normalize_score(df['风险调整得分'])
-        ai_score_norm = normalize_score(df['ai_score'])
-        
-        # 计算最终得分 (加权平均)
-        weights = {
-            'market_cap': 0.15,      # 流通市值权重
-            'composite': 0.25,       # 综合得分权重  
-            'risk': 0.20,           # 风险评分权重
-            'risk_adjusted': 0.20,   # 风险调整得分权重
-            'ai_score': 0.20        # AI得分权重
-        }
-        
-        df['final_score'] = (
-            market_cap_score * weights['market_cap'] +
-            composite_score_norm * weights['composite'] +
-            risk_score_norm * weights['risk'] +
-            risk_adjusted_score_norm * weights['risk_adjusted'] +
-            ai_score_norm * weights['ai_score']
-        ) * 100  # 转换为0-100分制
+        ai_weight = FINAL_SCORE_WEIGHTS['ai_score']
+        
+        if 'ai_status' in df.columns:
+            no_ai = df['ai_status'].isin(['failed', 'skipped'])
+        else:
+            no_ai = pd.Series(False, index=df.index)
+        has_ai = df['ai_score'].notna() & ~no_ai
+        ai_score_norm = normalize_score(df['ai_score'].where(has_ai))
+        
+        base_score = self._pre_ai_score(df)
+        df['final_score'] = np.where(
+            has_ai,
+            base_score + ai_score_norm * ai_weight * 100,
+            np.where(no_ai, base_score, base_score / (1 - ai_weight))
+        )
         
         logger.info("✅ 最终得分计算完成")
         return df
@@ -217,6 +542,9 @@ class UnifiedStockPickAIAnalyzer:
         print(f"市场总股票数: {stats.get('total_stocks', 'N/A')}")
         print(f"最终选股数量: {stats.get('final_stocks_count', 'N/A')}")
         print(f"AI分析完成: {'✅' if stats.get('ai_analysis_completed', False) else '❌'}")
+        for component, detail in stats.get('degraded_components', {}).items():
+            detail = ', '.join(detail) if isinstance(detail, list) else detail
+            print(f"⚠️ 降级: {component} -> {detail}")
         
         if enhanced_stocks.empty:
             print("\n❌ 没有选出符合条件的股票")
@@ -228,7 +556,7 @@ class UnifiedStockPickAIAnalyzer:
         # 显示关键列
         display_columns = [
             '代码', '名称', '最新', '涨幅', '流通市值', 
-            '综合得分', '风险调整得分', 'ai_score', 'final_score'
+            '综合得分', '风险调整得分', 'ai_score', 'final_score', '权重'
         ]
         
         # 确保所有列都存在
@@ -245,9 +573,36 @@ class UnifiedStockPickAIAnalyzer:
             if col in display_df.columns:
                 display_df[col] = display_df[col].apply(lambda x: f"{x:.2f}" if pd.notna(x) else "N/A")
         
+        if '权重' in display_df.columns:
+            display_df['权重'] = display_df['权重'].apply(lambda x: f"{x:.1%}")
+        
         # 显示表格
         print(display_df.to_string(index=False, max_colwidth=15))
         
+        portfolio = stats.get('portfolio')
+        if portfolio:
+            print(f"\n⚖️ 组合权重 ({portfolio['method']}): 预期日波动 {portfolio['expected_daily_volatility']:.2%}, "
+                  f"协方差收缩强度 {portfolio['shrinkage']}")
+            if portfolio['excluded']:
+                print(f"   历史数据不足: {', '.join(portfolio['excluded'])}")
+        
+        if stats.get('stage_metrics'):
+            print("\n⏱️ 耗时最多的阶段:")
+            print(format_stage_metrics(stats['stage_metrics'], top=10))
+        if stats.get('profile'):
+            print(f"\n🔬 性能剖析: {stats['profile']['summary']}")
+            for item in stats['profile']['hot_functions']:
+                print(f"   {item['function']}: 自身 {item['tottime_ms']:.0f}ms, {item['calls']} 次")
+        
+        upstream = stats.get('upstream', {})
+        if upstream.get('calls'):
+            print("\n📡 上游数据源:")
+            for name, call in sorted(upstream['calls'].items(), key=lambda item: -item[1]['mean_ms'] * item[1]['calls']):
+                errors = f", 失败 {call['errors']} 次 {call['error_classes']}" if call['errors'] else ''
+                print(f"   {name}: {call['calls']} 次, 平均 {call['mean_ms']:.0f}ms, P95 {call['p95_ms']:.0f}ms{errors}")
+            for name, count in upstream.get('fallbacks', {}).items():
+                print(f"   ↪ 降级 {name}: {count} 次")
+        
         print("\n🎯 推荐关注前3名:")
         for i, (idx, row) in enumerate(enhanced_stocks.head(3).iterrows(), 1):
             print(f"{i}. {row['代码']} {row['名称']} - 最终得分: {row['final_score']:.2f}")
@@ -257,62 +612,78 @@ class UnifiedStockPickAIAnalyzer:
                 print(f"   AI分析: {ai_summary}")
             print()
     
-    def save_results(self, enhanced_stocks: pd.DataFrame, stats: Dict, save_path: str = None):
+    def save_results(self, enhanced_stocks: pd.DataFrame, stats: Dict, save_path: str = None,
+                     trade_date: str = None):
         """
-        保存分析结果
+        保存分析结果到运行历史（utils/run_history.py）
+        
+        行情降级为非当日数据（如前一交易日的本地快照）时不写入运行历史，避免把旧行情的选股记为当日结果；
+        基于模拟行情的结果不保存
         
         Args:
             enhanced_stocks: 增强后的股票数据
             stats: 统计信息
-            save_path: 保存路径，默认为时间戳命名
+            save_path: 可选，同时导出为CSV的路径
+            trade_date: 交易日期，默认为今天
+            
+        Returns:
+            运行记录的 run_id，未保存或保存失败时为 None
         """
         if enhanced_stocks.empty:
             logger.warning("没有数据可保存")
-            return
-        
-        if save_path is None:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            save_path = f"/tmp/itrading/unified_stock_analysis_{timestamp}.csv"
+            return None
+        trade_date = trade_date or datetime.now().strftime('%Y%m%d')
+        source = stats.get('degraded_components', {}).get('market_data')
+        if source == 'mock':
+            logger.error("❌ 选股基于模拟行情，不保存结果")
+            return None
         
         try:
-            # 创建保存用的数据副本
-            save_data = enhanced_stocks.copy()
-            
-            # 格式化得分列为2位小数
-            score_columns = ['综合得分', '风险评分', '风险调整得分', 'ai_score', 'final_score']
-            for col in score_columns:
-                if col in save_data.columns:
-                    save_data[col] = save_data[col].apply(lambda x: f"{x:.2f}" if pd.notna(x) else x)
-            
-            # 保存为CSV
-            save_data.to_csv(save_path, index=False, encoding='utf-8-sig')
-            
-            # 保存统计信息
-            stats_path = save_path.replace('.csv', '_stats.txt')
-            with open(stats_path, 'w', encoding='utf-8') as f:
-                f.write("统一股票选股AI分析统计信息\n")
-                f.write("="*50 + "\n")
-                for key, value in stats.items():
-                    f.write(f"{key}: {value}\n")
+            run_id = None
+            if source in (None, 'shared_snapshot', f"local_store:{trade_date}"):
+                run_id = RunHistoryStore().record_run(enhanced_stocks, stats, source='unified_analyzer',
+                                                      trade_date=trade_date)
+                logger.info(f"✅ 分析结果已保存至运行历史: run_id={run_id}")
+            else:
+                logger.warning(f"⚠️ 行情来自 {source}，不是 {trade_date} 当天的数据，不保存到运行历史")
             
-            logger.info(f"✅ 分析结果已保存至: {save_path}")
-            logger.info(f"✅ 统计信息已保存至: {stats_path}")
+            if save_path is not None:
+                enhanced_stocks.to_csv(save_path, index=False, encoding='utf-8-sig', float_format='%.2f')
+                logger.info(f"✅ 分析结果已导出至: {save_path}")
+            return run_id
             
         except Exception as e:
             logger.error(f"保存结果失败: {e}")
+            return None
 
 
 def main():
     """主函数 - 演示统一选股AI分析"""
+    parser = argparse.ArgumentParser(description='统一选股AI分析')
+    parser.add_argument('--profile', action='store_true', help='剖析本次运行，结果写入 PROFILING_CONFIG 的 output_dir')
+    parser.add_argument('--budget', action='store_true',
+                        help='从更多候选股票中按 AI_SCHEDULER_CONFIG 的时间/token预算做AI分析')
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
+
     try:
         # 创建统一分析器实例
         analyzer = UnifiedStockPickAIAnalyzer(market_mode='normal')
         
+        # 早盘运行必须在 DEADLINE_CONFIG['finish_by'] 前完成，其他时间不限时
+        deadline = Deadline.at(DEADLINE_CONFIG['finish_by'])
+        if deadline.expired():
+            deadline = None
+        
         # 执行统一选股AI分析
-        enhanced_stocks, stats = analyzer.pick_and_analyze_stocks(
-            trade_date=datetime.now().strftime('%Y%m%d'),
+        trade_date = datetime.now().strftime('%Y%m%d')
+        pick = analyzer.pick_and_analyze_with_budget if args.budget else analyzer.pick_and_analyze_stocks
+        enhanced_stocks, stats = pick(
+            trade_date=trade_date,
             max_stocks=6,  # 减少数量以加快AI分析速度
-            auto_adjust_mode=True
+            auto_adjust_mode=True,
+            deadline=deadline
         )
         
         # 显示结果
@@ -320,7 +691,9 @@ def main():
         
         # 保存结果
         if len(enhanced_stocks) > 0:
-            analyzer.save_results(enhanced_stocks, stats)
+            analyzer.save_results(enhanced_stocks, stats, trade_date=trade_date)
+        if TELEMETRY_CONFIG['textfile_path']:
+            TELEMETRY.write_textfile(TELEMETRY_CONFIG['textfile_path'])
         
     except Exception as e:
         logger.error(f"统一选股AI分析失败: {e}")
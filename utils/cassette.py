@@ -0,0 +1,263 @@
+"""
+  Record/replay cassettes for upstream APIs
+
+  call_upstream() (utils/telemetry.py) is the single choke point for
+  qstock, akshare, tushare and Gemini calls; when a cassette is active it
+  goes through Cassette.call():
+
+    record  the real call is made and its raw result (DataFrame, text,
+            Gemini response text) or exception is stored together with the
+            call's latency
+    replay  nothing touches the network: the stored result is returned, or
+            the stored exception raised, optionally after sleeping for the
+            recorded latency (times latency_scale)
+
+  A cassette is one gzip-compressed pickle file. Entries are matched by
+  (source, endpoint, arguments). Arguments that legitimately change between
+  runs (date windows derived from now(), Gemini request config with a
+  timeout, prompts embedding timestamps) would never match exactly, so with
+  match='sequence' (default) a call without an exact match gets the next
+  unused entry recorded for the same source/endpoint, in recording order.
+  match='exact' disables that. A call with nothing left to replay raises
+  CassetteMiss, a ConnectionError, so the callers' normal fallback paths run
+  as if the source were down.
+
+  Activation:
+
+    ITRADING_CASSETTE_MODE=record|replay  ITRADING_CASSETTE_PATH=...  (env,
+    read at import; ITRADING_CASSETTE_LATENCY=1 replays with recorded
+    latency), or in code:
+
+        with use_cassette('/tmp/morning.cassette', 'replay'):
+            analyzer.pick_and_analyze_stocks(trade_date='20250708')
+
+  Recording saves on exit of use_cassette() and at interpreter exit.
+"""
+import os
+import time
+import gzip
+import atexit
+import pickle
+import hashlib
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CASSETTE_PATH = '/tmp/itrading/cassettes/default.cassette'
+CASSETTE_VERSION = 1
+
+# 不参与匹配的关键字参数（Gemini 请求配置里含有随剩余时间变化的超时）
+IGNORED_KWARGS = frozenset({'config'})
+
+
+class CassetteMiss(ConnectionError):
+    """回放时没有可用的录制结果"""
+
+
+class RecordedResponse:
+    """无法直接序列化的响应（如 Gemini 的 GenerateContentResponse）只保存 text"""
+
+    def __init__(self, text: Optional[str]):
+        self.text = text
+
+    def __repr__(self):
+        return f"RecordedResponse({self.text[:30] if self.text else self.text!r}...)"
+
+
+def call_key(source: str, endpoint: str, args: tuple, kwargs: Dict) -> str:
+    """调用的匹配键：数据源、接口和参数（忽略 IGNORED_KWARGS）"""
+    kwargs = {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS}
+    text = f"{source}.{endpoint}|{args!r}|{sorted(kwargs.items())!r}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _dumps(value) -> bytes:
+    """录制时立即序列化（调用方之后修改返回的DataFrame不影响磁带），不能序列化时退回只保存 text"""
+    try:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return pickle.dumps(RecordedResponse(getattr(value, 'text', None)), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class Cassette:
+    """上游调用的录制/回放"""
+
+    def __init__(self, path: str = DEFAULT_CASSETTE_PATH, mode: str = 'replay', match: str = 'sequence',
+                 emulate_latency: bool = False, latency_scale: float = 1.0):
+        """
+        Args:
+            path: 磁带文件路径
+            mode: 'record'（真实调用并录制）或 'replay'（只回放）
+            match: 'sequence'（参数不一致时按录制顺序回放同一接口的下一条）或 'exact'
+            emulate_latency: 回放时按录制的耗时等待
+            latency_scale: 回放耗时的倍数
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"不支持的磁带模式: {mode}")
+        if match not in ('sequence', 'exact'):
+            raise ValueError(f"不支持的匹配方式: {match}")
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self.emulate_latency = emulate_latency
+        self.latency_scale = latency_scale
+        self.entries: List[Dict] = []
+        self._used: set = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if mode == 'replay':
+            self.entries = self.load(path)
+            logger.info(f"回放磁带 {path}: {len(self.entries)} 条记录")
+
+    @staticmethod
+    def load(path: str) -> List[Dict]:
+        with gzip.open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"不支持的磁带版本: {data.get('version')}")
+        return data['entries']
+
+    def save(self) -> Optional[str]:
+        """原子写入磁带文件（只在录制模式且有新记录时）"""
+        with self._lock:
+            if self.mode != 'record' or not self._dirty:
+                return None
+            entries = list(self.entries)
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wb') as f:
+            pickle.dump({'version': CASSETTE_VERSION, 'entries': entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        logger.info(f"磁带已保存: {self.path} ({len(entries)} 条记录)")
+        return self.path
+
+    def call(self, source: str, endpoint: str, fn: Callable, *args, **kwargs):
+        """录制或回放一次上游调用"""
+        key = call_key(source, endpoint, args, kwargs)
+        if self.mode == 'record':
+            return self._record(source, endpoint, key, fn, args, kwargs)
+        return self._replay(source, endpoint, key)
+
+    def _record(self, source, endpoint, key, fn, args, kwargs):
+        entry = {'source': source, 'endpoint': endpoint, 'key': key}
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            entry['result'] = _dumps(result)
+            return result
+        except Exception as e:
+            try:
+                entry['error'] = pickle.dumps(e)
+            except Exception:
+                entry['error'] = pickle.dumps(ConnectionError(f"{type(e).__name__}: {e}"))
+            raise
+        finally:
+            entry['elapsed'] = time.perf_counter() - started
+            if 'result' in entry or 'error' in entry:
+                with self._lock:
+                    self.entries.append(entry)
+                    self._dirty = True
+
+    def _replay(self, source, endpoint, key):
+        with self._lock:
+            index = self._find(source, endpoint, key)
+            if index is None:
+                raise CassetteMiss(f"磁带 {self.path} 中没有 {source}.{endpoint} 的可用记录")
+            self._used.add(index)
+            entry = self.entries[index]
+        if self.emulate_latency:
+            time.sleep(entry['elapsed'] * self.latency_scale)
+        if 'error' in entry:
+            raise pickle.loads(entry['error'])
+        return pickle.loads(entry['result'])  # 每次回放都是新对象
+
+    def _find(self, source, endpoint, key) -> Optional[int]:
+        """优先未用过的同参数记录，其次重复使用同参数记录，最后（sequence）同接口下一条未用记录"""
+        exact = [i for i, e in enumerate(self.entries) if e['key'] == key]
+        unused = [i for i in exact if i not in self._used]
+        if unused:
+            return unused[0]
+        if exact:
+            return exact[-1]
+        if self.match == 'sequence':
+            for i, e in enumerate(self.entries):
+                if i not in self._used and e['source'] == source and e['endpoint'] == endpoint:
+                    return i
+        return None
+
+    def describe(self) -> Dict[str, Dict]:
+        """各接口的记录数、失败数和录制耗时"""
+        summary = {}
+        for entry in self.entries:
+            item = summary.setdefault(f"{entry['source']}.{entry['endpoint']}",
+                                      {'entries': 0, 'errors': 0, 'elapsed_seconds': 0.0})
+            item['entries'] += 1
+            item['errors'] += int('error' in entry)
+            item['elapsed_seconds'] = round(item['elapsed_seconds'] + entry['elapsed'], 3)
+        return summary
+
+
+# 当前生效的磁带，None 表示直接调用上游
+_ACTIVE: Optional[Cassette] = None
+
+
+def active_cassette() -> Optional[Cassette]:
+    return _ACTIVE
+
+
+def replaying_cassette() -> bool:
+    """是否正在回放（不需要真实的API凭证）"""
+    return _ACTIVE is not None and _ACTIVE.mode == 'replay'
+
+
+@contextmanager
+def use_cassette(path: str = DEFAULT_CASSETTE_PATH, mode: str = 'replay', **options):
+    """在 with 块内录制或回放上游调用，退出时保存录制结果"""
+    global _ACTIVE
+    previous = _ACTIVE
+    cassette = Cassette(path, mode, **options)
+    _ACTIVE = cassette
+    try:
+        yield cassette
+    finally:
+        _ACTIVE = previous
+        cassette.save()
+
+
+def _activate_from_env():
+    """按环境变量 ITRADING_CASSETTE_MODE/ITRADING_CASSETTE_PATH/ITRADING_CASSETTE_LATENCY 启用磁带"""
+    global _ACTIVE
+    mode = os.getenv('ITRADING_CASSETTE_MODE', '').strip().lower()
+    if mode in ('', 'off', 'none'):
+        return
+    path = os.getenv('ITRADING_CASSETTE_PATH', DEFAULT_CASSETTE_PATH)
+    latency = os.getenv('ITRADING_CASSETTE_LATENCY', '')
+    _ACTIVE = Cassette(path, mode, match=os.getenv('ITRADING_CASSETTE_MATCH', 'sequence'),
+                       emulate_latency=bool(latency) and latency != '0',
+                       latency_scale=float(latency) if latency not in ('', '0') else 1.0)
+    if mode == 'record':
+        atexit.register(_ACTIVE.save)
+    logger.info(f"上游调用磁带已启用: {mode} {path}")
+
+
+_activate_from_env()
+
+
+def main():
+    """查看磁带内容"""
+    parser = argparse.ArgumentParser(description='查看上游调用磁带')
+    parser.add_argument('path', nargs='?', default=DEFAULT_CASSETTE_PATH, help='磁带文件路径')
+    args = parser.parse_args()
+    cassette = Cassette(args.path, 'replay')
+    print(f"{args.path}: {len(cassette.entries)} 条记录, {os.path.getsize(args.path) / 1024:.1f}KB")
+    for name, item in sorted(cassette.describe().items()):
+        print(f"  {name}: {item['entries']} 条, 失败 {item['errors']} 条, 录制耗时 {item['elapsed_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
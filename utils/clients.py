@@ -0,0 +1,148 @@
+"""
+  Lazy third-party imports and shared API clients
+
+  akshare, tushare, qstock and google.genai each take most of a second to
+  import, and most runs need only one of them (or none, on the mock path
+  and in tests). Modules bind them with LazyModule instead of `import`:
+
+      ak = LazyModule('akshare')      # imported on the first ak.<attr>
+
+  Setting or deleting an attribute on the proxy raises AttributeError
+  rather than importing the module (qstock's import already contacts
+  eastmoney). To patch, replace the module-level name itself:
+
+      monkeypatch.setattr(base_stock_picker, 'ak', SimpleNamespace(...))
+
+  The .env file is loaded once, on the first client request, and the
+  clients are created once per process and shared:
+
+      gemini_client()   google.genai Client (GEMINI_API_KEY)
+      tushare_pro()     tushare pro_api DataApi (TUSHARE_TOKEN), None
+                        without a token (tushare is then never imported)
+
+  While a replay cassette is active (utils/cassette.py) no request leaves
+  the process, so placeholder credentials are used when none are set.
+"""
+import os
+import logging
+import importlib
+import threading
+
+from utils.cassette import replaying_cassette
+
+logger = logging.getLogger(__name__)
+
+ENV_PATH = os.path.expanduser('~/apps/iagent/.env')
+REPLAY_CREDENTIAL = 'cassette-replay'
+
+
+class LazyModule:
+    """首次访问属性时才导入的模块"""
+
+    def __init__(self, name: str):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError(f"不能在延迟导入的 '{self._name}' 上设置属性 {attr}，请替换引用该模块的模块级变量")
+
+    def __delattr__(self, attr):
+        raise AttributeError(f"不能在延迟导入的 '{self._name}' 上删除属性 {attr}，请替换引用该模块的模块级变量")
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+_lock = threading.Lock()
+_env_loaded = False
+_gemini_client = None
+_tushare_pro = None
+_tushare_checked = False
+_replay_clients = {}
+
+
+def load_env():
+    """加载 ~/apps/iagent/.env（每个进程一次）"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv(ENV_PATH, verbose=True)
+            os.environ.pop('GOOGLE_API_KEY', None)  # genai 优先使用 GOOGLE_API_KEY，统一使用 GEMINI_API_KEY
+            _env_loaded = True
+
+
+def gemini_client():
+    """共享的 Gemini 客户端，首次调用时创建；没有 GEMINI_API_KEY（且未回放磁带）时抛出 ValueError"""
+    global _gemini_client
+    if _gemini_client is None:
+        load_env()
+        if not os.getenv('GEMINI_API_KEY') and replaying_cassette():
+            return _replay_client('gemini')
+        with _lock:
+            if _gemini_client is None:
+                from google import genai
+                _gemini_client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    return _gemini_client
+
+
+def tushare_pro(required: bool = False):
+    """
+    共享的 Tushare Pro 客户端，首次调用时创建
+
+    Args:
+        required: 没有 TUSHARE_TOKEN 时抛出 ConnectionError，默认返回 None
+    """
+    global _tushare_pro, _tushare_checked
+    if not _tushare_checked:
+        load_env()
+        with _lock:
+            if not _tushare_checked:
+                token = os.getenv('TUSHARE_TOKEN')
+                if token:
+                    import tushare as ts  # 没有 token 时不导入
+                    ts.set_token(token)
+                    _tushare_pro = ts.pro_api(token)
+                    logger.info("Tushare API initialized successfully")
+                else:
+                    logger.warning("TUSHARE_TOKEN not found, using alternative data sources")
+                _tushare_checked = True
+    if _tushare_pro is None and replaying_cassette():
+        return _replay_client('tushare')
+    if _tushare_pro is None and required:
+        raise ConnectionError("TUSHARE_TOKEN未配置，无法使用Tushare Pro")
+    return _tushare_pro
+
+
+def _replay_client(source: str):
+    """回放磁带时使用的占位凭证客户端（请求由磁带应答，不会发出），不与真实客户端共用"""
+    with _lock:
+        if source not in _replay_clients:
+            if source == 'gemini':
+                from google import genai
+                _replay_clients[source] = genai.Client(api_key=REPLAY_CREDENTIAL)
+            else:
+                import tushare as ts
+                _replay_clients[source] = ts.pro_api(REPLAY_CREDENTIAL)
+        return _replay_clients[source]
+
+
+def reset_clients():
+    """丢弃已创建的客户端，下次使用时按当前环境变量重新创建（测试、切换凭证）"""
+    global _gemini_client, _tushare_pro, _tushare_checked
+    with _lock:
+        _gemini_client = _tushare_pro = None
+        _tushare_checked = False
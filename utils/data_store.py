@@ -0,0 +1,88 @@
+"""
+  Local data store for market data pulled from upstream APIs
+
+  Every dataset is saved as one pickled DataFrame per key (usually a trade
+  date), e.g. /tmp/itrading/store/daily_basic/20250708.pkl, so a bulk
+  cross-sectional pull is paid once per date and re-read locally afterwards.
+"""
+import os
+import logging
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = '/tmp/itrading/store'
+
+
+class LocalDataStore:
+    """按数据集和键（通常为交易日期）缓存DataFrame的本地存储"""
+
+    def __init__(self, root_dir: str = DEFAULT_STORE_DIR):
+        """
+        初始化本地数据存储
+
+        Args:
+            root_dir: 存储根目录
+        """
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def path(self, dataset: str, key: str) -> str:
+        """返回数据集某个键对应的文件路径"""
+        return os.path.join(self.root_dir, dataset, f"{key}.pkl")
+
+    def has(self, dataset: str, key: str) -> bool:
+        """检查数据是否已缓存"""
+        return os.path.exists(self.path(dataset, key))
+
+    def keys(self, dataset: str) -> List[str]:
+        """列出数据集中已缓存的全部键（升序）"""
+        dataset_dir = os.path.join(self.root_dir, dataset)
+        if not os.path.isdir(dataset_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(dataset_dir) if name.endswith('.pkl'))
+
+    def load(self, dataset: str, key: str) -> Optional[pd.DataFrame]:
+        """读取缓存数据，不存在或损坏时返回None"""
+        path = self.path(dataset, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"读取本地缓存失败 {path}: {e}")
+            return None
+
+    def save(self, dataset: str, key: str, df: pd.DataFrame) -> str:
+        """原子写入缓存数据（先写临时文件再替换）"""
+        path = self.path(dataset, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def get_or_fetch(self, dataset: str, key: str, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """
+        优先读取本地缓存，未命中时调用fetch拉取并缓存非空结果
+
+        Args:
+            dataset: 数据集名称，如 'daily_basic'
+            key: 缓存键，如交易日期 '20250708'
+            fetch: 无参拉取函数
+
+        Returns:
+            数据DataFrame
+        """
+        cached = self.load(dataset, key)
+        if cached is not None:
+            logger.debug(f"命中本地缓存 {dataset}/{key}: {len(cached)} 行")
+            return cached
+
+        df = fetch()
+        if df is not None and not df.empty:
+            self.save(dataset, key, df)
+            logger.info(f"已缓存 {dataset}/{key}: {len(df)} 行")
+        return df if df is not None else pd.DataFrame()
@@ -0,0 +1,113 @@
+"""
+  Deadline propagation for the morning pipeline
+
+  A Deadline is created once per run (e.g. "finish by 09:45") and handed
+  down through every stage. Each stage carves its own budget out of what is
+  left with child(), so a slow data source eats into its own share and not
+  the AI stage's. Blocking calls that have no timeout of their own (akshare,
+  tushare, qstock) go through run(): the call runs in a daemon thread and
+  the caller stops waiting when the budget is used up and falls back to a
+  degraded path. Python cannot kill the thread; the abandoned call finishes
+  (or fails) in the background and its result is dropped. Calls that accept a
+  timeout (Gemini's HttpOptions) should be given remaining() directly so the
+  request itself is cancelled.
+
+  Deadline(None) is unlimited: run() calls straight through and remaining()
+  is math.inf, so code paths are the same with or without a deadline.
+"""
+import math
+import time
+import datetime
+import logging
+import threading
+from typing import Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """截止时间前未完成"""
+
+
+class Deadline:
+    """流水线截止时间，各阶段从剩余时间中划分自己的时间预算"""
+
+    def __init__(self, seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            seconds: 从现在起的时间预算（秒），None 表示不限
+            clock: 单调时钟
+        """
+        self.clock = clock
+        self.expires_at = None if seconds is None else clock() + max(seconds, 0.0)
+
+    @classmethod
+    def at(cls, when: Union[str, datetime.time, datetime.datetime], now: datetime.datetime = None) -> 'Deadline':
+        """今天的某个时刻（如 '09:45'）作为截止时间"""
+        now = now or datetime.datetime.now()
+        if isinstance(when, str):
+            when = datetime.datetime.strptime(when, '%H:%M').time()
+        if isinstance(when, datetime.time):
+            when = datetime.datetime.combine(now.date(), when)
+        return cls((when - now).total_seconds())
+
+    @property
+    def unlimited(self) -> bool:
+        return self.expires_at is None
+
+    def remaining(self) -> float:
+        """剩余秒数，不限时为 math.inf"""
+        if self.expires_at is None:
+            return math.inf
+        return max(self.expires_at - self.clock(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def child(self, fraction: float = 1.0, reserve: float = 0.0, cap: float = None) -> 'Deadline':
+        """
+        某个阶段的截止时间：剩余时间先留出 reserve 秒给后续阶段，再取 fraction，最多 cap 秒
+
+        子截止时间不会晚于父截止时间。
+        """
+        budget = (self.remaining() - reserve) * fraction
+        if cap is not None:
+            budget = min(budget, cap)
+        child = Deadline(None, clock=self.clock)
+        if budget != math.inf:
+            child.expires_at = self.clock() + max(budget, 0.0)
+            if self.expires_at is not None:
+                child.expires_at = min(child.expires_at, self.expires_at)
+        return child
+
+    def run(self, fn: Callable, *args, name: str = None, **kwargs):
+        """
+        在剩余时间内执行阻塞调用，超时抛出 DeadlineExceeded
+
+        不限时直接调用；否则在守护线程中执行，超时后不再等待（调用本身在后台结束）。
+        """
+        name = name or getattr(fn, '__name__', 'call')
+        timeout = self.remaining()
+        if timeout == math.inf:
+            return fn(*args, **kwargs)
+        if timeout <= 0:
+            raise DeadlineExceeded(f"{name} 未执行：已到截止时间")
+
+        outcome = {}
+        done = threading.Event()
+
+        def target():
+            try:
+                outcome['value'] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=target, name=f"deadline-{name}", daemon=True).start()
+        if not done.wait(timeout):
+            logger.warning(f"{name} 超过时间预算 {timeout:.1f}s，放弃等待")
+            raise DeadlineExceeded(f"{name} 超时（{timeout:.1f}s）")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['value']
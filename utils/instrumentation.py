@@ -0,0 +1,201 @@
+"""
+  Per-stage latency, CPU, memory and row-count instrumentation
+
+  StageMetrics records one entry per named stage: wall time, CPU time of the
+  thread that ran the stage, memory growth and DataFrame rows in/out. It is
+  meant to stay on in production, so the default cost per stage is a handful
+  of clock reads and one getrusage() call (a few microseconds):
+
+    memory='rss'          peak_kb is how much the process's peak RSS grew
+                          during the stage (ru_maxrss). Cheap but coarse: it
+                          is process-wide and only moves when a new high-water
+                          mark is set.
+    memory='tracemalloc'  peak_kb is the traced allocation peak above the
+                          stage's starting point. Precise, but tracemalloc
+                          slows allocation-heavy pandas code noticeably and
+                          the peak is process-global, so use it for one-off
+                          diagnosis of single-threaded runs.
+    memory=None           no memory figure.
+
+  Calls that are handed to another thread (Deadline.run) still get the CPU
+  time of the thread that did the work: call() wraps the function itself and
+  passes the wrapper to the runner.
+
+  Stages called more than once (e.g. get_stock_data for every analyzed
+  stock) are aggregated: wall/CPU times add up, peak is the maximum and
+  calls counts the invocations.
+"""
+import time
+import logging
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = ('calls', 'wall_ms', 'cpu_ms', 'peak_kb', 'rows_in', 'rows_out', 'errors')
+_SUMMED = ('calls', 'wall_ms', 'cpu_ms', 'errors')  # 同名阶段多次执行时累加的字段
+
+
+def _rows(value) -> Optional[int]:
+    """DataFrame（或以DataFrame开头的元组）的行数"""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+def _max_rss_kb() -> float:
+    if resource is None:
+        return 0.0
+    return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)  # Linux 单位为KB
+
+
+class StageMetrics:
+    """按阶段记录耗时、CPU时间、内存增长和行数"""
+
+    def __init__(self, enabled: bool = True, memory: Optional[str] = 'rss'):
+        """
+        Args:
+            enabled: 关闭时 call/stage 直接执行，不做任何记录
+            memory: 内存统计方式，'rss'、'tracemalloc' 或 None
+        """
+        self.enabled = enabled
+        self.memory = memory if enabled else None
+        self._stages: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if self.memory == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _memory_start(self) -> float:
+        if self.memory == 'rss':
+            return _max_rss_kb()
+        if self.memory == 'tracemalloc':
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            return current / 1024
+        return 0.0
+
+    def _memory_peak(self, start: float) -> Optional[float]:
+        if self.memory == 'rss':
+            return _max_rss_kb() - start
+        if self.memory == 'tracemalloc':
+            return max(tracemalloc.get_traced_memory()[1] / 1024 - start, 0.0)
+        return None
+
+    def record(self, name: str, wall_ms: float, cpu_ms: Optional[float] = None, peak_kb: Optional[float] = None,
+               rows_in: Optional[int] = None, rows_out: Optional[int] = None, error: bool = False):
+        """记录一次阶段执行，同名阶段累加"""
+        with self._lock:
+            entry = self._stages.setdefault(name, {field: 0 for field in _SUMMED})
+            entry['calls'] += 1
+            entry['wall_ms'] += wall_ms
+            entry['cpu_ms'] += cpu_ms or 0.0
+            entry['errors'] += int(error)
+            if peak_kb is not None:
+                entry['peak_kb'] = max(entry.get('peak_kb', 0.0), peak_kb)
+            if rows_in is not None:
+                entry['rows_in'] = rows_in
+            if rows_out is not None:
+                entry['rows_out'] = rows_out
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """
+        记录 with 块为一个阶段；块内可设置 record['rows_out']
+
+            with metrics.stage('final_score', rows_in=len(df)) as record:
+                df = ...
+                record['rows_out'] = len(df)
+        """
+        record = {'rows_out': None}
+        if not self.enabled:
+            yield record
+            return
+        memory = self._memory_start()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        error = False
+        try:
+            yield record
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - wall) * 1000, (time.thread_time() - cpu) * 1000,
+                        self._memory_peak(memory), rows_in, record['rows_out'], error)
+
+    def call(self, name: str, fn: Callable, *args, runner: Callable = None, **kwargs):
+        """
+        以阶段 name 执行 fn(*args, **kwargs)，返回其结果
+
+        rows_in 取第一个DataFrame参数的行数，rows_out 取返回值的行数。
+        runner（如 Deadline.run）负责实际执行，CPU时间在执行 fn 的线程中统计。
+        """
+        if not self.enabled:
+            return runner(fn, *args, **kwargs) if runner else fn(*args, **kwargs)
+
+        cpu = {}
+
+        @functools.wraps(fn)
+        def measured(*a, **kw):
+            start = time.thread_time()
+            try:
+                return fn(*a, **kw)
+            finally:
+                cpu['ms'] = (time.thread_time() - start) * 1000
+
+        rows_in = next((_rows(arg) for arg in args if _rows(arg) is not None), None)
+        memory = self._memory_start()
+        wall = time.perf_counter()
+        result, error = None, False
+        try:
+            result = runner(measured, *args, **kwargs) if runner else measured(*args, **kwargs)
+            return result
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - wall) * 1000, cpu.get('ms'), self._memory_peak(memory),
+                        rows_in, _rows(result), error)
+
+    def merge(self, stages: Dict[str, Dict], prefix: str = ''):
+        """合并其他 StageMetrics.as_dict() 的结果（如每只股票的分析步骤），同名阶段累加"""
+        with self._lock:
+            for name, other in stages.items():
+                entry = self._stages.setdefault(prefix + name, {field: 0 for field in _SUMMED})
+                for field in _SUMMED:
+                    entry[field] += other.get(field, 0)
+                if 'peak_kb' in other:
+                    entry['peak_kb'] = max(entry.get('peak_kb', 0.0), other['peak_kb'])
+                for field in ('rows_in', 'rows_out'):
+                    if field in other:
+                        entry[field] = other[field]
+
+    def as_dict(self) -> Dict[str, Dict]:
+        """各阶段的统计（按首次执行顺序），时间保留0.1毫秒"""
+        with self._lock:
+            return {name: {field: round(entry[field], 1) if isinstance(entry[field], float) else entry[field]
+                           for field in METRIC_FIELDS if field in entry}
+                    for name, entry in self._stages.items()}
+
+
+def format_stage_metrics(stages: Dict[str, Dict], top: int = None) -> str:
+    """把阶段统计格式化为表格，按耗时从高到低"""
+    if not stages:
+        return ''
+    df = pd.DataFrame.from_dict(stages, orient='index')
+    df = df.sort_values('wall_ms', ascending=False)
+    if top:
+        df = df.head(top)
+    df.index.name = 'stage'
+    return df.fillna('').to_string()
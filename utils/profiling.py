@@ -0,0 +1,234 @@
+"""
+  On-demand profiling of the picker and analyzer entry points
+
+  Functions decorated with @profiled(name) (select_stocks_advanced,
+  analyze_stock, pick_and_analyze_stocks) run under cProfile and, unless
+  turned off, tracemalloc when profiling is enabled:
+
+    ITRADING_PROFILE=1      (env, read at import) or enable_profiling(), e.g.
+                            from a --profile command-line flag
+    ITRADING_PROFILE=cpu    cProfile only, no allocation tracking
+                            (tracemalloc slows allocation-heavy pandas code)
+    ITRADING_PROFILE_DIR    artifact directory, overrides PROFILING_CONFIG
+
+  Options not given to enable_profiling() (the --profile flags pass none)
+  and the environment activation both come from config.PROFILING_CONFIG
+  (output_dir, top_n, allocations).
+
+  Each profiled call writes two artifacts, named <time>-<name>:
+
+    .prof   pstats dump: `python -m pstats`, snakeviz, gprof2dot ...
+    .txt    top-N functions by cumulative and own time, and the top-N
+            allocation sites still held at the end of the call
+
+  and adds {'profile': path, 'summary': path, 'wall_ms', 'peak_kb',
+  'hot_functions'} to the returned stats/report dict, so the run history
+  row points at its profile.
+
+  Only one call is profiled at a time: a decorated function called inside a
+  profiled one (select_stocks_advanced inside pick_and_analyze_stocks, or
+  analyze_stock on the worker threads) is part of the outer profile. From
+  Python 3.12 cProfile sees every thread; on older versions only the thread
+  that started the profile is measured.
+
+  Writing the artifacts never affects the profiled call: a failure there is
+  logged and the call's own result or exception is passed through.
+
+  When profiling is disabled the decorator costs one global lookup per call.
+"""
+import os
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import functools
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from config import PROFILING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileOptions:
+    """性能剖析选项"""
+
+    def __init__(self, output_dir: str, top_n: int, allocations: bool):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.allocations = allocations
+
+
+# 当前的剖析选项，None 表示未启用
+_OPTIONS: Optional[ProfileOptions] = None
+# 同一时间只剖析一个调用
+_RUNNING = threading.Lock()
+
+
+def enable_profiling(output_dir: str = None, top_n: int = None, allocations: bool = None):
+    """启用剖析，之后调用的 @profiled 函数写入剖析文件；未指定的选项取 PROFILING_CONFIG"""
+    global _OPTIONS
+    _OPTIONS = ProfileOptions(
+        output_dir if output_dir is not None else PROFILING_CONFIG['output_dir'],
+        top_n if top_n is not None else PROFILING_CONFIG['top_n'],
+        allocations if allocations is not None else PROFILING_CONFIG['allocations'],
+    )
+    logger.info(f"性能剖析已启用，结果目录: {_OPTIONS.output_dir}")
+
+
+def disable_profiling():
+    global _OPTIONS
+    _OPTIONS = None
+
+
+def profiling_enabled() -> bool:
+    return _OPTIONS is not None
+
+
+def _function_label(func: tuple) -> str:
+    filename, lineno, name = func
+    if filename == '~':  # 内置函数
+        return name
+    parts = filename.replace('\\', '/').split('/')
+    return f"{'/'.join(parts[-2:])}:{lineno}({name})"
+
+
+def hot_functions(profiler: cProfile.Profile, top_n: int, sort: str = 'cumulative') -> List[Dict]:
+    """按累计耗时（cumulative）或自身耗时（tottime）排序的前 top_n 个函数"""
+    stats = pstats.Stats(profiler).stats
+    index = 3 if sort == 'cumulative' else 2
+    ranked = sorted(stats.items(), key=lambda item: item[1][index], reverse=True)[:top_n]
+    return [{'function': _function_label(func), 'calls': nc, 'tottime_ms': round(tt * 1000, 1),
+             'cumtime_ms': round(ct * 1000, 1)}
+            for func, (cc, nc, tt, ct, callers) in ranked]
+
+
+def _format_table(rows: List[Dict]) -> str:
+    lines = [f"{'calls':>9} {'tottime_ms':>11} {'cumtime_ms':>11}  function"]
+    lines.extend(f"{r['calls']:>9} {r['tottime_ms']:>11.1f} {r['cumtime_ms']:>11.1f}  {r['function']}" for r in rows)
+    return '\n'.join(lines)
+
+
+def _own_traces(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    """去掉 tracemalloc 和剖析本身的内存分配"""
+    return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+
+
+class ProfileRun:
+    """一次剖析：cProfile + 可选的 tracemalloc，结束时写入 .prof 和 .txt"""
+
+    def __init__(self, name: str, options: ProfileOptions):
+        self.name = name
+        self.options = options
+        self.profiler = cProfile.Profile()
+        self.artifacts: Dict = {}
+        self._started_tracing = False
+        self._snapshot = None
+
+    def start(self):
+        if self.options.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._wall = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self) -> Dict:
+        self.profiler.disable()
+        wall_ms = (time.perf_counter() - self._wall) * 1000
+        allocations, peak_kb = [], None
+        if self._snapshot is not None:
+            peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            allocations = _own_traces(tracemalloc.take_snapshot()).compare_to(
+                _own_traces(self._snapshot), 'lineno')[:self.options.top_n]
+            if self._started_tracing:
+                tracemalloc.stop()
+
+        os.makedirs(self.options.output_dir, exist_ok=True)
+        stem = os.path.join(self.options.output_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}-{self.name}")
+        self.profiler.dump_stats(f"{stem}.prof")
+
+        cumulative = hot_functions(self.profiler, self.options.top_n, 'cumulative')
+        own = hot_functions(self.profiler, self.options.top_n, 'tottime')
+        summary = io.StringIO()
+        summary.write(f"{self.name}: {wall_ms:.1f}ms" + (f", 内存峰值 {peak_kb:.1f}KB" if peak_kb is not None else '')
+                      + '\n\n')
+        summary.write(f"== 累计耗时前 {len(cumulative)} ==\n{_format_table(cumulative)}\n\n")
+        summary.write(f"== 自身耗时前 {len(own)} ==\n{_format_table(own)}\n")
+        if allocations:
+            summary.write(f"\n== 内存分配增长前 {len(allocations)} ==\n")
+            summary.write('\n'.join(str(stat) for stat in allocations) + '\n')
+        with open(f"{stem}.txt", 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+
+        self.artifacts = {'profile': f"{stem}.prof", 'summary': f"{stem}.txt", 'wall_ms': round(wall_ms, 1),
+                          'peak_kb': peak_kb, 'hot_functions': own[:5]}
+        logger.info(f"性能剖析已保存: {stem}.txt")
+        return self.artifacts
+
+
+def _attach(result, artifacts: Dict):
+    """把剖析文件路径写入返回的统计（(DataFrame, stats) 元组的 stats 或报告字典）"""
+    target = result[-1] if isinstance(result, tuple) and result else result
+    if isinstance(target, dict):
+        target['profile'] = artifacts
+
+
+def _finish(run: ProfileRun) -> Optional[Dict]:
+    """结束剖析并写入文件；失败时记录日志并返回 None，不影响被剖析函数的返回值或异常"""
+    try:
+        return run.stop()
+    except Exception as e:
+        logger.warning(f"写入性能剖析结果失败 {run.name}: {e}")
+        if run._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return None
+
+
+def profiled(name: str) -> Callable:
+    """启用剖析时以 name 剖析被装饰的函数，已有剖析在进行时直接执行（计入外层剖析）"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            options = _OPTIONS
+            if options is None or not _RUNNING.acquire(blocking=False):
+                return fn(*args, **kwargs)
+            try:
+                run = ProfileRun(name, options)
+                try:
+                    run.start()
+                except ValueError as e:  # 其他剖析工具已在运行
+                    if run._started_tracing:
+                        tracemalloc.stop()
+                    logger.warning(f"无法启动性能剖析 {name}: {e}")
+                    return fn(*args, **kwargs)
+                try:
+                    result = fn(*args, **kwargs)
+                finally:
+                    artifacts = _finish(run)
+                if artifacts is not None:
+                    try:
+                        _attach(result, artifacts)
+                    except Exception as e:
+                        logger.warning(f"剖析结果写入返回值失败 {name}: {e}")
+                return result
+            finally:
+                _RUNNING.release()
+        return wrapper
+    return decorator
+
+
+def _enable_from_env():
+    """按环境变量 ITRADING_PROFILE/ITRADING_PROFILE_DIR 启用剖析，其余选项同 --profile 取 PROFILING_CONFIG"""
+    mode = os.getenv('ITRADING_PROFILE', '').strip().lower()
+    if mode in ('', '0', 'off', 'false'):
+        return
+    enable_profiling(os.getenv('ITRADING_PROFILE_DIR') or None, allocations=False if mode == 'cpu' else None)
+
+
+_enable_from_env()
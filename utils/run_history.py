@@ -0,0 +1,209 @@
+"""
+  Append-only run history for stock picks
+
+  Every picker / unified analyzer run is recorded in one SQLite file instead
+  of a timestamped CSV plus _stats.txt per run:
+
+    runs  (run_id, run_time, trade_date, source, stats)
+          one row per run, stats is the selection funnel as JSON
+    picks (run_id, rank, code, run_time, trade_date, source, scores...,
+          ai_analysis, data)
+          one row per picked stock, data keeps the full result row as JSON
+
+  run_time, trade_date and source are repeated on picks so "how did stock X
+  score over the last N runs" is a single index range scan on
+  (code, run_time) with no join. Rows are only ever inserted; a run and its
+  picks are written in one transaction, so readers never see half a run.
+"""
+import os
+import json
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = '/tmp/itrading/run_history.db'
+
+# 结果列 -> picks 表的得分列
+SCORE_COLUMNS = {
+    '综合得分': 'composite_score',
+    '风险评分': 'risk_score',
+    '风险调整得分': 'risk_adjusted_score',
+    'ai_score': 'ai_score',
+    'final_score': 'final_score',
+    '权重': 'weight',
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_time TEXT NOT NULL,
+    trade_date TEXT NOT NULL,
+    source TEXT NOT NULL,
+    stats TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_time ON runs (run_time);
+CREATE INDEX IF NOT EXISTS idx_runs_date ON runs (trade_date, source);
+CREATE TABLE IF NOT EXISTS picks (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    rank INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    name TEXT,
+    run_time TEXT NOT NULL,
+    trade_date TEXT NOT NULL,
+    source TEXT NOT NULL,
+    {', '.join(f'{c} REAL' for c in SCORE_COLUMNS.values())},
+    ai_analysis TEXT,
+    data TEXT,
+    PRIMARY KEY (run_id, rank)
+);
+CREATE INDEX IF NOT EXISTS idx_picks_code ON picks (code, run_time);
+CREATE INDEX IF NOT EXISTS idx_picks_date ON picks (trade_date, source);
+"""
+
+
+def _json_default(value):
+    """numpy标量、DataFrame等转换为可序列化的值"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.to_dict()
+    return str(value)
+
+
+def _score(value) -> Optional[float]:
+    value = pd.to_numeric(value, errors='coerce')
+    return None if pd.isna(value) else float(value)
+
+
+class RunHistoryStore:
+    """选股运行历史（SQLite，只追加）"""
+
+    def __init__(self, db_path: str = DEFAULT_HISTORY_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # 守护进程写入时其他进程可同时查询
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def record_run(self, picks: pd.DataFrame, stats: Dict, source: str,
+                   trade_date: str = None, run_time: str = None) -> int:
+        """
+        记录一次运行的选股结果和统计信息
+
+        Args:
+            picks: 选股结果（按排名排序），至少包含 代码 列
+            stats: 选股漏斗等统计信息
+            source: 结果来源，如 'advanced_picker'、'unified_analyzer'
+            trade_date: 交易日期，默认取 stats['trade_date'] 或今天
+            run_time: 运行时间，默认为当前时间
+
+        Returns:
+            int: run_id
+        """
+        run_time = run_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        trade_date = str(trade_date or stats.get('trade_date') or datetime.now().strftime('%Y%m%d'))
+        records = json.loads(picks.to_json(orient='records', force_ascii=False, double_precision=15))
+        scores = [[_score(picks[column].iloc[i]) if column in picks.columns else None for column in SCORE_COLUMNS]
+                  for i in range(len(picks))]
+
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (run_time, trade_date, source, stats) VALUES (?, ?, ?, ?)",
+                (run_time, trade_date, source, json.dumps(stats, ensure_ascii=False, default=_json_default)))
+            run_id = cursor.lastrowid
+            conn.executemany(
+                f"INSERT INTO picks (run_id, rank, code, name, run_time, trade_date, source, "
+                f"{', '.join(SCORE_COLUMNS.values())}, ai_analysis, data) "
+                f"VALUES ({', '.join('?' * (len(SCORE_COLUMNS) + 9))})",
+                [(run_id, rank, str(row.get('代码', '')), row.get('名称'), run_time, trade_date, source,
+                  *row_scores, row.get('ai_analysis'), json.dumps(row, ensure_ascii=False))
+                 for rank, (row, row_scores) in enumerate(zip(records, scores), 1)])
+        logger.info(f"运行记录已保存: run_id={run_id}, {source}, {trade_date}, {len(records)} 只股票")
+        return run_id
+
+    def runs(self, source: str = None, start: str = None, end: str = None, limit: int = None) -> pd.DataFrame:
+        """运行列表（按运行时间倒序），start/end 为交易日期范围，stats 列为字典"""
+        conditions, params = [], []
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        if start:
+            conditions.append("trade_date >= ?")
+            params.append(start)
+        if end:
+            conditions.append("trade_date <= ?")
+            params.append(end)
+        sql = "SELECT * FROM runs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY run_time DESC, run_id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        df['stats'] = df['stats'].map(lambda s: json.loads(s) if s else {})
+        return df
+
+    def picks(self, run_id: int) -> pd.DataFrame:
+        """某次运行的完整选股结果（按排名），还原为保存时的列"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT data FROM picks WHERE run_id = ? ORDER BY rank", (run_id,)).fetchall()
+        return pd.DataFrame([json.loads(row[0]) for row in rows])
+
+    def stock_history(self, code: str, last_runs: int = 30, source: str = None) -> pd.DataFrame:
+        """某只股票最近 last_runs 次入选的排名、得分和AI结论（按运行时间倒序）"""
+        columns = f"run_id, run_time, trade_date, source, rank, code, name, " \
+                  f"{', '.join(SCORE_COLUMNS.values())}, ai_analysis"
+        sql = f"SELECT {columns} FROM picks WHERE code = ?"
+        params = [code]
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        sql += " ORDER BY run_time DESC, run_id DESC LIMIT ?"
+        params.append(int(last_runs))
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def date_picks(self, trade_date: str, source: str = None) -> pd.DataFrame:
+        """某个交易日所有运行的选股（不含完整数据列）"""
+        sql = "SELECT * FROM picks WHERE trade_date = ?"
+        params = [trade_date]
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        sql += " ORDER BY run_time, rank"
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params).drop(columns=['data'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查询选股运行历史')
+    parser.add_argument('--db', default=DEFAULT_HISTORY_PATH, help='运行历史数据库')
+    parser.add_argument('--code', help='股票代码，查询该股票最近的入选记录')
+    parser.add_argument('--date', help='交易日期YYYYMMDD，查询当日所有运行的选股')
+    parser.add_argument('--runs', type=int, default=30, help='最近运行次数')
+    parser.add_argument('--source', help='结果来源')
+    args = parser.parse_args()
+
+    store = RunHistoryStore(args.db)
+    if args.code:
+        result = store.stock_history(args.code, last_runs=args.runs, source=args.source)
+    elif args.date:
+        result = store.date_picks(args.date, source=args.source)
+    else:
+        result = store.runs(source=args.source, limit=args.runs).drop(columns=['stats'])
+    print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+  Memory-mapped shared market snapshot
+
+  One process publishes the latest full-market snapshot to a columnar file;
+  every other process on the box (CLI picker, unified analyzer, Reflex app)
+  maps the file read-only and gets numpy views without copying.
+
+  File layout:
+    MAGIC (8 bytes) | format version (uint32) | header length (uint32)
+    | JSON header | padding | column 0 | padding | column 1 | ...
+  Columns are aligned to ALIGNMENT bytes. The JSON header records the
+  publish sequence number, trade date, publish time, row count and each
+  column's name, dtype and offset.
+
+  Publishing writes a temporary file and swaps it in with os.replace, so a
+  reader sees either the old or the new snapshot, never a partial one. A
+  reader that still holds views of the old snapshot keeps the old inode
+  mapped until those views are released.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ITSNAP\x00\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+DEFAULT_SNAPSHOT_PATH = '/tmp/itrading/shared/market_snapshot.bin'
+
+_PREFIX = struct.Struct('<8sII')
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _to_array(series: pd.Series) -> np.ndarray:
+    """把一列转换为可直接映射的定长numpy数组（数值保持原类型，其他转为定长字符串）"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return np.ascontiguousarray(series.to_numpy())
+    return series.fillna('').astype(str).to_numpy().astype('U')
+
+
+class SharedSnapshotWriter:
+    """把全市场行情快照发布到共享的内存映射文件"""
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _current_sequence(self) -> int:
+        try:
+            with open(self.path, 'rb') as f:
+                magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    return 0
+                return int(json.loads(f.read(header_len))['sequence'])
+        except (OSError, ValueError, KeyError, struct.error):
+            return 0
+
+    def publish(self, df: pd.DataFrame, trade_date: str = None) -> int:
+        """
+        发布一个行情快照
+
+        Args:
+            df: 全市场行情DataFrame
+            trade_date: 快照所属交易日 YYYYMMDD
+
+        Returns:
+            本次发布的序号
+        """
+        arrays = {str(col): _to_array(df[col]) for col in df.columns}
+        sequence = self._current_sequence() + 1
+
+        # 列偏移依赖于头部长度，先按占位偏移生成一次头部来确定长度
+        columns = [{'name': name, 'dtype': arr.dtype.str, 'offset': 0} for name, arr in arrays.items()]
+        header = {
+            'sequence': sequence,
+            'trade_date': trade_date,
+            'published_at': time.time(),
+            'rows': len(df),
+            'columns': columns,
+        }
+        while True:
+            header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            offset = _align(_PREFIX.size + len(header_bytes))
+            changed = False
+            for column, arr in zip(columns, arrays.values()):
+                if column['offset'] != offset:
+                    column['offset'] = offset
+                    changed = True
+                offset = _align(offset + arr.nbytes)
+            if not changed:
+                break
+
+        # 临时文件与快照在同一目录（os.replace 要求同一文件系统），每次发布唯一，同进程多个写入方互不覆盖
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp',
+                                        dir=os.path.dirname(self.path) or '.')
+        try:
+            os.fchmod(fd, 0o644)  # mkstemp 创建的文件只有属主可读
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+                f.write(header_bytes)
+                for column, arr in zip(columns, arrays.values()):
+                    f.seek(column['offset'])
+                    f.write(arr.tobytes())
+                f.truncate(max(offset, _PREFIX.size + len(header_bytes)))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        logger.debug(f"发布共享行情快照 #{sequence}: {len(df)} 行 {len(columns)} 列")
+        return sequence
+
+
+class SharedSnapshotReader:
+    """以只读内存映射方式读取共享行情快照，发布新快照后自动切换"""
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self.header: Dict = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._file_id = None
+
+    @property
+    def sequence(self) -> int:
+        return self.header.get('sequence', 0)
+
+    @property
+    def trade_date(self) -> Optional[str]:
+        return self.header.get('trade_date')
+
+    def age(self) -> float:
+        """当前快照距发布的秒数，没有快照时为无穷大"""
+        if not self.header:
+            return float('inf')
+        return time.time() - self.header['published_at']
+
+    def refresh(self) -> bool:
+        """
+        检查是否有新快照并重新映射
+
+        Returns:
+            是否切换到了新的快照
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id == self._file_id:
+            return False
+
+        try:
+            with open(self.path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, header_len = _PREFIX.unpack_from(buffer, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                logger.warning(f"共享快照文件格式不兼容: {self.path}")
+                return False
+            header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_len]))
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"读取共享快照失败: {e}")
+            return False
+
+        # 旧映射由仍在使用的视图持有，不主动关闭
+        rows = header['rows']
+        self._arrays = {
+            column['name']: np.frombuffer(buffer, dtype=np.dtype(column['dtype']), count=rows, offset=column['offset'])
+            for column in header['columns']
+        }
+        self.header = header
+        self._file_id = file_id
+        return True
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """当前快照的各列（零拷贝只读视图）"""
+        self.refresh()
+        return self._arrays
+
+    def to_frame(self, copy: bool = False) -> pd.DataFrame:
+        """
+        当前快照转换为DataFrame
+
+        Args:
+            copy: 是否复制数据；默认直接引用映射内存（只读）
+        """
+        arrays = self.columns()
+        if not arrays:
+            return pd.DataFrame()
+        return pd.DataFrame(arrays, copy=copy)
+
+    def read(self, trade_date: str = None, max_age: float = None) -> Optional[pd.DataFrame]:
+        """
+        读取满足条件的快照
+
+        Args:
+            trade_date: 只接受该交易日的快照
+            max_age: 只接受发布后不超过该秒数的快照
+
+        Returns:
+            快照DataFrame（复制），不满足条件时返回None
+        """
+        self.refresh()
+        if not self.header:
+            return None
+        if trade_date is not None and self.trade_date != trade_date:
+            return None
+        if max_age is not None and self.age() > max_age:
+            return None
+        return self.to_frame(copy=True)
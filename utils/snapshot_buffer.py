@@ -0,0 +1,190 @@
+"""
+  Fixed-capacity ring buffer of intraday full-market snapshots
+
+  Snapshots are stored in a preallocated float array of shape
+  (2 * capacity, codes, fields). Each snapshot is written twice, at slot i
+  and i + capacity, so the last k snapshots are always one contiguous
+  slice and can be returned as zero-copy views. Memory use is fixed at
+  construction time regardless of how long the session runs.
+"""
+import datetime
+import logging
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELDS = ('最新', '涨幅', '换手率', '量比', '成交量', '成交额')
+
+# 不同数据源的同义列，写入时统一为标准字段名
+FIELD_ALIASES = {
+    '最新': ('最新', '最新价'),
+    '涨幅': ('涨幅', '涨跌幅'),
+}
+
+
+class SnapshotRingBuffer:
+    """保存最近N个全市场行情快照（时间 × 股票 × 字段）的环形缓冲区"""
+
+    def __init__(self, codes: Iterable[str], fields: Sequence[str] = DEFAULT_FIELDS, capacity: int = 120,
+                 dtype=np.float64):
+        """
+        初始化环形缓冲区
+
+        Args:
+            codes: 股票代码全集，决定数组的股票维度
+            fields: 保存的字段
+            capacity: 最多保存的快照个数
+            dtype: 数据类型，float32 可将内存减半
+        """
+        if capacity <= 0:
+            raise ValueError("capacity必须为正整数")
+
+        self.codes = pd.Index([str(code) for code in codes]).drop_duplicates()
+        self.fields = list(fields)
+        self.capacity = capacity
+        self._field_index = {field: i for i, field in enumerate(self.fields)}
+
+        self._data = np.full((2 * capacity, len(self.codes), len(self.fields)), np.nan, dtype=dtype)
+        self._times = np.full(2 * capacity, np.datetime64('NaT', 'ms'), dtype='datetime64[ms]')
+        self._slot = -1
+        self._count = 0
+
+    @classmethod
+    def from_snapshot(cls, df: pd.DataFrame, fields: Sequence[str] = DEFAULT_FIELDS,
+                      capacity: int = 120, dtype=np.float64) -> 'SnapshotRingBuffer':
+        """以某个快照的股票代码为全集创建缓冲区并写入该快照"""
+        buffer = cls(df['代码'].astype(str), fields=fields, capacity=capacity, dtype=dtype)
+        buffer.append(df)
+        return buffer
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲区占用的内存（字节），创建后固定不变"""
+        return self._data.nbytes + self._times.nbytes
+
+    def _column(self, df: pd.DataFrame, field: str) -> Optional[pd.Series]:
+        for col in FIELD_ALIASES.get(field, (field,)):
+            if col in df.columns:
+                return pd.to_numeric(df[col], errors='coerce')
+        return None
+
+    def append(self, df: pd.DataFrame, timestamp: datetime.datetime = None):
+        """
+        写入一个全市场快照，覆盖最旧的快照
+
+        Args:
+            df: 含代码列的行情DataFrame，不在全集中的股票会被忽略
+            timestamp: 快照时间，默认当前时间
+        """
+        if df.empty or '代码' not in df.columns:
+            logger.warning("快照为空或缺少代码列，忽略")
+            return
+
+        rows = self.codes.get_indexer(df['代码'].astype(str))
+        known = rows >= 0
+        if not known.all():
+            logger.debug(f"忽略 {int((~known).sum())} 只不在缓冲区全集中的股票")
+
+        values = np.full((len(self.codes), len(self.fields)), np.nan, dtype=self._data.dtype)
+        for j, field in enumerate(self.fields):
+            column = self._column(df, field)
+            if column is not None:
+                values[rows[known], j] = column.to_numpy(dtype=np.float64, na_value=np.nan)[known]
+
+        self._slot = (self._slot + 1) % self.capacity
+        stamp = np.datetime64(timestamp or datetime.datetime.now(), 'ms')
+        for slot in (self._slot, self._slot + self.capacity):
+            self._data[slot] = values
+            self._times[slot] = stamp
+        self._count = min(self._count + 1, self.capacity)
+
+    def _window(self, k: int) -> slice:
+        if self._count == 0:
+            raise ValueError("缓冲区为空")
+        k = min(k, self._count)
+        end = self._slot + self.capacity + 1
+        return slice(end - k, end)
+
+    def last(self, field: str, k: int = 1) -> np.ndarray:
+        """
+        最近k个快照中某字段的数据（零拷贝视图，只读）
+
+        Returns:
+            形状为 (k, 股票数) 的数组，按时间从旧到新排列
+        """
+        view = self._data[self._window(k), :, self._field_index[field]]
+        view.flags.writeable = False
+        return view
+
+    def last_all(self, k: int = 1) -> np.ndarray:
+        """最近k个快照的全部字段（零拷贝视图，形状为 (k, 股票数, 字段数)）"""
+        view = self._data[self._window(k)]
+        view.flags.writeable = False
+        return view
+
+    def times(self, k: int = None) -> np.ndarray:
+        """最近k个快照的时间戳"""
+        return self._times[self._window(k or self._count)]
+
+    def latest(self, field: str) -> pd.Series:
+        """最新快照中某字段的数据（按代码索引）"""
+        return pd.Series(self.last(field, 1)[0], index=self.codes)
+
+    def snapshots_within(self, seconds: float) -> int:
+        """最近 seconds 秒内（含最新快照）的快照个数"""
+        if self._count == 0:
+            return 0
+        times = self.times()
+        cutoff = times[-1] - np.timedelta64(int(seconds * 1000), 'ms')
+        return int((times >= cutoff).sum())
+
+    def change(self, field: str, seconds: float = 300, pct: bool = False) -> pd.Series:
+        """
+        最近一段时间内某字段的变化量，例如5分钟价格变化或成交量加速
+
+        Args:
+            field: 字段名
+            seconds: 时间窗口（秒）
+            pct: 是否返回百分比变化
+
+        Returns:
+            按代码索引的变化量
+        """
+        window = self.last(field, max(self.snapshots_within(seconds), 1))
+        first, last = window[0], window[-1]
+        if pct:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.where(first != 0, (last - first) / first * 100, np.nan)
+        else:
+            values = last - first
+        return pd.Series(values, index=self.codes)
+
+    def acceleration(self, field: str, seconds: float = 300) -> pd.Series:
+        """窗口后半段与前半段变化量之差，衡量价格/成交量的加速"""
+        window = self.last(field, max(self.snapshots_within(seconds), 1))
+        if len(window) < 3:
+            return pd.Series(np.zeros(len(self.codes)), index=self.codes)
+        mid = len(window) // 2
+        values = (window[-1] - window[mid]) - (window[mid] - window[0])
+        return pd.Series(values, index=self.codes)
+
+    def up_ratio_history(self, k: int = None) -> np.ndarray:
+        """最近k个快照的上涨家数占比序列"""
+        gains = self.last('涨幅', k or self._count)
+        valid = ~np.isnan(gains)
+        counts = valid.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, (gains > 0).sum(axis=1) / counts, np.nan)
+
+    def up_ratio_trend(self, seconds: float = 300) -> float:
+        """时间窗口内上涨家数占比的变化（最新减最早）"""
+        history = self.up_ratio_history(max(self.snapshots_within(seconds), 1))
+        if len(history) < 2 or np.isnan(history[0]) or np.isnan(history[-1]):
+            return 0.0
+        return float(history[-1] - history[0])
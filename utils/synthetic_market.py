@@ -0,0 +1,184 @@
+"""
+  Synthetic A-share market data for benchmarks and tests
+
+  generate_universe() builds a full-market snapshot with the same canonical
+  columns get_market_data() returns after standardisation (代码, 名称, 最新,
+  涨幅, 换手率, 量比, 市盈率, 流通市值 ...), at any size from a few stocks to
+  the whole market and beyond. Distributions are chosen to look like a real
+  trading day rather than uniform noise:
+
+    codes        unique, split across SH/SZ main board, ChiNext (300),
+                 STAR (688) and BSE (83) in roughly market proportions
+    names        a few percent ST / *ST, new listings (N, C) and 退市 names
+    price        log-normal around 12 元 with a long tail
+    涨幅         fat-tailed (Student t), clipped at each board's price limit
+    换手率/量比  log-normal
+    市盈率       log-normal with ~15% loss-making (negative) companies
+    市值         log-normal around 50亿 流通市值
+    missing      a configurable share of 涨幅/换手率/量比/市盈率 is NaN
+
+  generate_bar_panel() builds multi-day daily bars (geometric random walk)
+  in the column layout AIStockAnalyzer.get_stock_data() produces, and
+  generate_news() builds news items for the sentiment scorer.
+
+  Everything is driven by a numpy Generator seed, so a given (size, seed)
+  is identical across runs and machines.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# 板块：代码前缀、市场占比、涨跌幅限制（%），每个板块最多 10^(6-前缀长度) 个代码
+BOARDS = (
+    ('60', 0.30, 10.0),
+    ('00', 0.30, 10.0),
+    ('300', 0.25, 20.0),
+    ('688', 0.10, 20.0),
+    ('83', 0.05, 30.0),
+)
+
+# 特殊名称及其占比
+NAME_PREFIXES = (('ST', 0.03), ('*ST', 0.01), ('N', 0.005), ('C', 0.005))
+DELISTING_RATIO = 0.003
+
+CANONICAL_COLUMNS = ['代码', '名称', '昨收', '最新', '最高', '最低', '今开', '涨幅', '换手率', '市盈率',
+                     '成交量', '成交额', '量比', '总市值', '流通市值']
+
+POSITIVE_WORDS = ['上涨', '利好', '突破', '增长', '盈利', '超预期', '中标', '签约', '回升', '看好']
+NEGATIVE_WORDS = ['下跌', '利空', '亏损', '风险', '减持', '处罚', '调查', '违约', '下滑', '担忧']
+NEUTRAL_WORDS = ['公司', '发布', '公告', '董事会', '股东', '会议', '披露', '年度', '报告', '行业']
+
+
+def _unique_codes(rng: np.random.Generator, num_stocks: int) -> np.ndarray:
+    """按板块占比生成不重复的6位代码，超过板块容量的部分分配给其他板块"""
+    capacity = np.array([10 ** (6 - len(prefix)) for prefix, _, _ in BOARDS])
+    if num_stocks > capacity.sum():
+        raise ValueError(f"最多生成 {capacity.sum()} 只股票")
+    counts = np.minimum(rng.multinomial(num_stocks, [share for _, share, _ in BOARDS]), capacity)
+    for i in range(len(BOARDS)):
+        counts[i] += min(num_stocks - counts.sum(), capacity[i] - counts[i])
+
+    codes = []
+    for (prefix, _, _), count, cap in zip(BOARDS, counts, capacity):
+        numbers = rng.choice(cap, size=count, replace=False)
+        codes.extend(f"{prefix}{number:0{6 - len(prefix)}d}" for number in numbers)
+    codes = np.array(codes, dtype=object)
+    rng.shuffle(codes)
+    return codes
+
+
+def _price_limits(codes: np.ndarray, names: np.ndarray) -> np.ndarray:
+    limits = np.full(len(codes), 10.0)
+    for prefix, _, limit in BOARDS:
+        limits[np.array([code.startswith(prefix) for code in codes], dtype=bool)] = limit
+    limits[np.array(['ST' in name for name in names], dtype=bool)] = 5.0
+    return limits
+
+
+def generate_universe(num_stocks: int = 5000, seed: int = 0, missing_ratio: float = 0.02) -> pd.DataFrame:
+    """
+    生成全市场行情快照
+
+    Args:
+        num_stocks: 股票数量
+        seed: 随机种子
+        missing_ratio: 涨幅/换手率/量比/市盈率 各自为NaN的比例
+
+    Returns:
+        包含 CANONICAL_COLUMNS 的DataFrame，代码唯一
+    """
+    rng = np.random.default_rng(seed)
+    codes = _unique_codes(rng, num_stocks)
+
+    names = np.array([f'股票{i}' for i in range(num_stocks)], dtype=object)
+    draw = rng.random(num_stocks)
+    lower = 0.0
+    for prefix, share in NAME_PREFIXES:
+        hit = (draw >= lower) & (draw < lower + share)
+        names[hit] = [prefix + name for name in names[hit]]
+        lower += share
+    delisting = rng.random(num_stocks) < DELISTING_RATIO
+    names[delisting] = [name + '退' for name in names[delisting]]
+
+    pre_close = np.clip(rng.lognormal(np.log(12), 0.8, num_stocks), 1.0, 2000.0).round(2)
+    limits = _price_limits(codes, names)
+    gain = np.clip(rng.standard_t(3, num_stocks) * 1.8 + 0.2, -limits, limits)
+    latest = (pre_close * (1 + gain / 100)).round(2)
+    gain = ((latest - pre_close) / pre_close * 100).round(2)
+    open_price = (pre_close * (1 + np.clip(rng.normal(0, 0.8, num_stocks), -limits, limits) / 100)).round(2)
+    high = np.maximum.reduce([latest, open_price, latest * (1 + rng.exponential(0.008, num_stocks))]).round(2)
+    low = np.minimum.reduce([latest, open_price, latest * (1 - rng.exponential(0.008, num_stocks))]).round(2)
+
+    float_cap = rng.lognormal(np.log(5e9), 1.0, num_stocks)
+    total_cap = float_cap / rng.uniform(0.4, 1.0, num_stocks)
+    turnover = np.clip(rng.lognormal(np.log(2.5), 0.9, num_stocks), 0.01, 60).round(2)
+    volume_ratio = np.clip(rng.lognormal(0, 0.45, num_stocks), 0.05, 20).round(2)
+    pe = rng.lognormal(np.log(30), 0.8, num_stocks)
+    loss_making = rng.random(num_stocks) < 0.15
+    pe[loss_making] = -rng.lognormal(np.log(40), 0.8, loss_making.sum())
+    amount = float_cap * turnover / 100
+    volume = np.round(amount / latest / 100)  # 手
+
+    df = pd.DataFrame({
+        '代码': codes, '名称': names, '昨收': pre_close, '最新': latest, '最高': high, '最低': low,
+        '今开': open_price, '涨幅': gain, '换手率': turnover, '市盈率': pe.round(2), '成交量': volume,
+        '成交额': amount.round(0), '量比': volume_ratio, '总市值': total_cap.round(0), '流通市值': float_cap.round(0),
+    }, columns=CANONICAL_COLUMNS)
+    for col in ('涨幅', '换手率', '量比', '市盈率'):
+        df.loc[rng.random(num_stocks) < missing_ratio, col] = np.nan
+    return df
+
+
+def generate_bar_panel(codes: Sequence[str], days: int = 120, end_date: str = '20250708',
+                       seed: int = 0) -> pd.DataFrame:
+    """
+    生成多只股票的日线数据（几何随机游走）
+
+    Returns:
+        长表，列为 code/date/open/close/high/low/volume/turnover/change_pct，
+        与 AIStockAnalyzer.get_stock_data() 的列名一致，按 code、date 排序
+    """
+    rng = np.random.default_rng(seed)
+    num_stocks = len(codes)
+    dates = pd.bdate_range(end=pd.Timestamp(end_date), periods=days)
+
+    returns = rng.standard_t(4, (num_stocks, days)) * 0.015 + rng.normal(0, 0.0005, (num_stocks, 1))
+    returns = np.clip(returns, -0.1, 0.1)
+    close = rng.lognormal(np.log(12), 0.8, (num_stocks, 1)) * np.cumprod(1 + returns, axis=1)
+    prev_close = np.concatenate([close[:, :1] / (1 + returns[:, :1]), close[:, :-1]], axis=1)
+    open_price = prev_close * (1 + rng.normal(0, 0.005, (num_stocks, days)))
+    high = np.maximum(open_price, close) * (1 + rng.exponential(0.006, (num_stocks, days)))
+    low = np.minimum(open_price, close) * (1 - rng.exponential(0.006, (num_stocks, days)))
+    volume = rng.lognormal(np.log(1e5), 0.6, (num_stocks, 1)) * rng.lognormal(0, 0.4, (num_stocks, days))
+
+    return pd.DataFrame({
+        'code': np.repeat(np.asarray(codes, dtype=str), days),
+        'date': np.tile(dates.strftime('%Y-%m-%d'), num_stocks),
+        'open': open_price.ravel().round(2),
+        'close': close.ravel().round(2),
+        'high': high.ravel().round(2),
+        'low': low.ravel().round(2),
+        'volume': volume.ravel().round(0),
+        'turnover': (volume * close * 100).ravel().round(0),
+        'change_pct': (returns * 100).ravel().round(2),
+    })
+
+
+def generate_news(num_items: int = 200, seed: int = 0) -> Dict[str, List[Dict]]:
+    """生成 calculate_advanced_sentiment_analysis 使用的新闻数据（公司新闻、公告、研报、行业新闻）"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(POSITIVE_WORDS + NEGATIVE_WORDS + NEUTRAL_WORDS * 3)
+
+    def text(words):
+        return ''.join(rng.choice(vocabulary, size=words))
+
+    kinds = rng.choice(['company_news', 'announcements', 'research_reports', 'industry_news'], size=num_items,
+                       p=[0.5, 0.2, 0.1, 0.2])
+    news = {'company_news': [], 'announcements': [], 'research_reports': [], 'industry_news': []}
+    for kind in kinds:
+        if kind == 'research_reports':
+            news[kind].append({'title': text(8), 'rating': rng.choice(['买入', '增持', '中性', '减持'])})
+        else:
+            news[kind].append({'title': text(8), 'content': text(int(rng.integers(20, 80)))})
+    return news
@@ -0,0 +1,297 @@
+"""
+  Upstream data-source telemetry
+
+  Every call to an upstream API (qstock, akshare, tushare, gemini) goes
+  through call_upstream(source, endpoint, fn, *args, **kwargs), which
+  records per (source, endpoint):
+
+    latency      histogram in seconds (Prometheus cumulative buckets)
+    payload      histogram of the returned size: rows for DataFrames and
+                 lists, characters for text / Gemini responses
+    outcome      ok / empty (empty DataFrame or text) / error
+    error class  exception class name, e.g. ConnectionError, ReadTimeout
+
+  record_fallback(source, endpoint, fallback) counts fallback events
+  (qstock -> akshare, gemini -> rule_based, market_data -> shared_snapshot).
+
+  Nothing needs an external collector. The process-wide TELEMETRY registry
+  renders the Prometheus text exposition format, which can be:
+
+    written to a file   write_textfile(path), atomically; works with the
+                        node_exporter textfile collector or plain `cat`
+    served over HTTP    serve(port), GET /metrics from a daemon thread
+    summarised per run  `with TELEMETRY.collect() as run: ...` (or attach()/
+                        detach()) collects the calls made meanwhile;
+                        run.summary() is a plain dict for the run's stats
+
+  Recording costs a lock and a few dict updates per call, negligible next to
+  a network request. When a cassette is active (utils/cassette.py) the call
+  is recorded or replayed here as well, so replayed runs report replay
+  latencies through the same metrics.
+"""
+import os
+import time
+import bisect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.cassette import active_cassette
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PAYLOAD_BUCKETS = (0, 10, 100, 1000, 5000, 10000, 50000)
+
+METRIC_PREFIX = 'itrading_upstream'
+
+
+def payload_size(value) -> Optional[int]:
+    """返回值的大小：DataFrame/列表为行数，文本为字符数，无法判断时为None"""
+    if value is None:
+        return None
+    if hasattr(value, 'shape') and hasattr(value, '__len__'):  # DataFrame / Series / ndarray
+        return len(value)
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return len(value)
+    text = getattr(value, 'text', None)  # Gemini 响应
+    if isinstance(text, str):
+        return len(text)
+    return None
+
+
+class _Histogram:
+    """累积分桶直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估计分位数（落在最后一个桶时取观测最大值）"""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def lines(self, name: str, labels: str) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class _Series:
+    """单个 (source, endpoint) 的统计"""
+
+    def __init__(self):
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.payload = _Histogram(PAYLOAD_BUCKETS)
+        self.outcomes = {'ok': 0, 'empty': 0, 'error': 0}
+        self.errors: Dict[str, int] = {}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Telemetry:
+    """上游数据源调用统计"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._fallbacks: Dict[Tuple[str, str, str], int] = {}
+        self._collectors: List['Telemetry'] = []
+        self._lock = threading.Lock()
+
+    def _observe(self, source: str, endpoint: str, seconds: float, outcome: str, size: Optional[int],
+                 error: Optional[str]):
+        with self._lock:
+            series = self._series.setdefault((source, endpoint), _Series())
+            series.latency.observe(seconds)
+            series.outcomes[outcome] += 1
+            if size is not None:
+                series.payload.observe(size)
+            if error:
+                series.errors[error] = series.errors.get(error, 0) + 1
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector._observe(source, endpoint, seconds, outcome, size, error)
+
+    def call(self, source: str, endpoint: str, fn: Callable, *args, **kwargs):
+        """调用上游接口 fn(*args, **kwargs) 并记录耗时、返回大小和异常类型，异常原样抛出"""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._observe(source, endpoint, time.perf_counter() - started, 'error', None, type(e).__name__)
+            raise
+        size = payload_size(result)
+        self._observe(source, endpoint, time.perf_counter() - started, 'empty' if size == 0 else 'ok', size, None)
+        return result
+
+    def record_fallback(self, source: str, endpoint: str, fallback: str):
+        """记录一次降级：source/endpoint 不可用，改用 fallback"""
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (source, endpoint, fallback)
+            self._fallbacks[key] = self._fallbacks.get(key, 0) + 1
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector.record_fallback(source, endpoint, fallback)
+
+    def attach(self) -> 'Telemetry':
+        """开始收集之后的调用（同一进程内其他线程的调用也会计入），返回只含这些调用的 Telemetry"""
+        run = Telemetry(enabled=self.enabled)
+        with self._lock:
+            self._collectors.append(run)
+        return run
+
+    def detach(self, run: 'Telemetry'):
+        """停止向 attach() 返回的 run 收集"""
+        with self._lock:
+            if run in self._collectors:
+                self._collectors.remove(run)
+
+    @contextmanager
+    def collect(self):
+        """收集 with 块内的调用，用于单次运行的汇总"""
+        run = self.attach()
+        try:
+            yield run
+        finally:
+            self.detach(run)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._fallbacks.clear()
+
+    def summary(self) -> Dict:
+        """
+        按数据源汇总，可直接写入 stats：
+
+            {'calls': {'akshare.stock_news_em': {'calls', 'errors', 'empty', 'mean_ms', 'p95_ms', 'max_ms',
+                                                 'payload', 'error_classes'}},
+             'fallbacks': {'qstock.market_realtime->akshare': 1}}
+        """
+        with self._lock:
+            calls = {}
+            for (source, endpoint), series in sorted(self._series.items()):
+                latency = series.latency
+                calls[f"{source}.{endpoint}"] = {
+                    'calls': latency.count,
+                    'errors': series.outcomes['error'],
+                    'empty': series.outcomes['empty'],
+                    'mean_ms': round(latency.sum / latency.count * 1000, 1) if latency.count else 0.0,
+                    'p95_ms': round(latency.quantile(0.95) * 1000, 1),
+                    'max_ms': round(latency.max * 1000, 1),
+                    'payload': int(series.payload.sum),
+                    'error_classes': dict(series.errors),
+                }
+            fallbacks = {f"{source}.{endpoint}->{fallback}": count
+                         for (source, endpoint, fallback), count in sorted(self._fallbacks.items())}
+        return {'calls': calls, 'fallbacks': fallbacks}
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        latency, payload, requests, errors = [], [], [], []
+        with self._lock:
+            for (source, endpoint), series in sorted(self._series.items()):
+                labels = f'source="{_escape(source)}",endpoint="{_escape(endpoint)}"'
+                latency.extend(series.latency.lines(f'{METRIC_PREFIX}_request_duration_seconds', labels))
+                payload.extend(series.payload.lines(f'{METRIC_PREFIX}_payload_size', labels))
+                for outcome, count in series.outcomes.items():
+                    requests.append(f'{METRIC_PREFIX}_requests_total{{{labels},outcome="{outcome}"}} {count}')
+                for error, count in sorted(series.errors.items()):
+                    errors.append(f'{METRIC_PREFIX}_errors_total{{{labels},error="{_escape(error)}"}} {count}')
+            fallbacks = [f'{METRIC_PREFIX}_fallbacks_total{{source="{_escape(source)}",endpoint="{_escape(endpoint)}",'
+                         f'fallback="{_escape(fallback)}"}} {count}'
+                         for (source, endpoint, fallback), count in sorted(self._fallbacks.items())]
+
+        blocks = [
+            ('request_duration_seconds', 'histogram', '上游接口调用耗时（秒）', latency),
+            ('payload_size', 'histogram', '上游接口返回大小（行数或字符数）', payload),
+            ('requests_total', 'counter', '上游接口调用次数（按结果）', requests),
+            ('errors_total', 'counter', '上游接口异常次数（按异常类型）', errors),
+            ('fallbacks_total', 'counter', '数据源降级次数', fallbacks),
+        ]
+        lines = []
+        for name, kind, help_text, samples in blocks:
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str) -> str:
+        """原子写入Prometheus文本文件（可供 node_exporter textfile collector 读取），返回路径"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """在守护线程中提供 GET /metrics，返回server（server.shutdown() 停止）"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='telemetry-http', daemon=True).start()
+        logger.info(f"数据源监控指标: http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+# 进程级注册表
+TELEMETRY = Telemetry()
+
+
+def call_upstream(source: str, endpoint: str, fn: Callable, *args, **kwargs):
+    """经 TELEMETRY 调用上游接口，见 Telemetry.call；启用磁带（utils/cassette.py）时录制或回放"""
+    cassette = active_cassette()
+    if cassette is not None:
+        fn = functools.partial(cassette.call, source, endpoint, fn)
+    return TELEMETRY.call(source, endpoint, fn, *args, **kwargs)
+
+
+def record_fallback(source: str, endpoint: str, fallback: str):
+    """在 TELEMETRY 中记录一次降级，见 Telemetry.record_fallback"""
+    TELEMETRY.record_fallback(source, endpoint, fallback)
@@ -0,0 +1,228 @@
+"""
+  Trading-calendar index for the A-share market
+
+  TradingCalendar keeps every trading day as a sorted array of YYYYMMDD
+  integers, plus a set of the same integers:
+
+    is_trading_day      set membership
+    next / previous     bisect on the sorted list, n trading days at a time
+                        ("5 trading days back" is previous(date, 5))
+    range               bisect both ends and slice
+    is_trading_days     np.searchsorted over a whole array of dates
+
+  Parsing a date string is cached, so repeated lookups of the same dates (a
+  backtest asks about the same few thousand days millions of times) cost a
+  dict hit, a bisect and a list index.
+
+  The default calendar (trading_calendar()) comes from tushare's trade_cal,
+  pulled once and cached in the local data store (dataset 'trade_cal'). It
+  is pulled again only when the cached copy no longer reaches today. Days
+  past the end of the pulled calendar, and the whole calendar when there is
+  no Tushare token and no cached pull, follow the weekday rule minus
+  util.CHINESE_HOLIDAYS. Dates outside the calendar's coverage are not
+  trading days, and next/previous return None past either end.
+"""
+import bisect
+import logging
+import datetime
+import threading
+import functools
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import util
+from utils.clients import tushare_pro
+from utils.data_store import LocalDataStore
+from utils.telemetry import call_upstream
+
+logger = logging.getLogger(__name__)
+
+TRADE_CAL_DATASET = 'trade_cal'
+TRADE_CAL_KEY = 'SSE'
+CALENDAR_START = '20000101'
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_key(date: str) -> Optional[int]:
+    trade_date = util.convert_trade_date(date)
+    return int(trade_date) if trade_date else None
+
+
+def date_key(date) -> Optional[int]:
+    """日期转换为 YYYYMMDD 整数，无法识别时为 None"""
+    if isinstance(date, str):
+        return _parse_key(date)
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        return date.year * 10000 + date.month * 100 + date.day
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    if isinstance(date, np.datetime64):
+        return date_key(pd.Timestamp(date))
+    return None
+
+
+def date_keys(dates) -> np.ndarray:
+    """日期数组转换为 YYYYMMDD 整数数组，无法识别的为0"""
+    values = dates if isinstance(dates, (pd.Series, pd.Index, np.ndarray)) else np.asarray(list(dates))
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return np.asarray(values, dtype=np.int64)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        stamps = pd.DatetimeIndex(values)
+        return np.asarray(stamps.year * 10000 + stamps.month * 100 + stamps.day, dtype=np.int64)
+    return np.fromiter(((date_key(d) or 0) for d in values), dtype=np.int64, count=len(values))
+
+
+def _rule_days(start: int, end: int) -> np.ndarray:
+    """start 到 end（含）之间的工作日，去掉 util.CHINESE_HOLIDAYS"""
+    if start > end:
+        return np.empty(0, dtype=np.int64)
+    days = pd.bdate_range(str(start), str(end))
+    keys = np.asarray(days.year * 10000 + days.month * 100 + days.day, dtype=np.int64)
+    holidays = np.fromiter((int(day) for day in util.CHINESE_HOLIDAYS), dtype=np.int64)
+    return keys[~np.isin(keys, holidays)]
+
+
+class TradingCalendar:
+    """交易日历：排序的交易日数组，二分查找前后交易日"""
+
+    def __init__(self, days: Iterable, start=None, end=None):
+        """
+        Args:
+            days: 交易日（YYYYMMDD 字符串、整数或日期）
+            start: 日历覆盖的首日，默认为第一个交易日
+            end: 日历覆盖的末日，默认为最后一个交易日
+        """
+        self.days = np.unique(date_keys(days))
+        self.days = self.days[self.days > 0]
+        self._days: List[int] = self.days.tolist()
+        self._open = set(self._days)
+        self.start = date_key(start) if start is not None else (self._days[0] if self._days else 0)
+        self.end = date_key(end) if end is not None else (self._days[-1] if self._days else 0)
+
+    @classmethod
+    def from_rules(cls, start: str = CALENDAR_START, end: str = None) -> 'TradingCalendar':
+        """按周末和 util.CHINESE_HOLIDAYS 生成，默认到明年年底"""
+        end = end or f"{datetime.date.today().year + 1}1231"
+        return cls(_rule_days(date_key(start), date_key(end)), start, end)
+
+    @classmethod
+    def from_trade_cal(cls, trade_cal: pd.DataFrame, extend_to: str = None) -> 'TradingCalendar':
+        """
+        由 tushare trade_cal（cal_date, is_open）生成
+
+        Args:
+            trade_cal: trade_cal 接口返回的数据
+            extend_to: trade_cal 未覆盖到该日期时，之后的日期按周末和节假日规则补足
+        """
+        cal_dates = trade_cal['cal_date'].astype(str)
+        days = date_keys(cal_dates[trade_cal['is_open'].astype(int) == 1])
+        start, end = date_key(cal_dates.min()), date_key(cal_dates.max())
+        if extend_to and date_key(extend_to) > end:
+            day_after = date_key(pd.Timestamp(str(end)) + pd.Timedelta(days=1))
+            days = np.concatenate([days, _rule_days(day_after, date_key(extend_to))])
+            end = date_key(extend_to)
+        return cls(days, start, end)
+
+    @classmethod
+    def load(cls, store: LocalDataStore = None, start: str = CALENDAR_START,
+             refresh: bool = False) -> 'TradingCalendar':
+        """
+        读取本地缓存的 trade_cal，缓存不存在或未覆盖今天时重新拉取；都不可用时按规则生成
+
+        Args:
+            store: 本地数据存储，默认 LocalDataStore()
+            start: 拉取的起始日期
+            refresh: 强制重新拉取
+        """
+        store = store or LocalDataStore()
+        today = datetime.date.today()
+        horizon = f"{today.year + 1}1231"
+        trade_cal = store.load(TRADE_CAL_DATASET, TRADE_CAL_KEY)
+        if refresh or trade_cal is None or trade_cal.empty or \
+                date_key(str(trade_cal['cal_date'].max())) < date_key(today):
+            pulled = _pull_trade_cal(start, horizon)
+            if pulled is not None and not pulled.empty:
+                store.save(TRADE_CAL_DATASET, TRADE_CAL_KEY, pulled)
+                trade_cal = pulled
+        if trade_cal is None or trade_cal.empty:
+            logger.warning("没有可用的 trade_cal，交易日按周末和 CHINESE_HOLIDAYS 判断")
+            return cls.from_rules(start, horizon)
+        return cls.from_trade_cal(trade_cal, extend_to=horizon)
+
+    def __len__(self):
+        return len(self._days)
+
+    def __contains__(self, date) -> bool:
+        return self.is_trading_day(date)
+
+    def is_trading_day(self, date) -> bool:
+        return date_key(date) in self._open
+
+    def is_trading_days(self, dates) -> np.ndarray:
+        """向量化判断，返回与 dates 等长的布尔数组"""
+        keys = date_keys(dates)
+        if not self._days:
+            return np.zeros(len(keys), dtype=bool)
+        index = np.minimum(np.searchsorted(self.days, keys), len(self.days) - 1)
+        return self.days[index] == keys
+
+    def next(self, date, n: int = 1) -> Optional[str]:
+        """date 之后第 n 个交易日，超出日历范围或日期无效时为 None"""
+        key = date_key(date)
+        if key is None:
+            return None
+        index = bisect.bisect_right(self._days, key) + n - 1
+        return str(self._days[index]) if 0 <= index < len(self._days) else None
+
+    def previous(self, date, n: int = 1) -> Optional[str]:
+        """date 之前第 n 个交易日（n 个交易日前），超出日历范围或日期无效时为 None"""
+        key = date_key(date)
+        if key is None:
+            return None
+        index = bisect.bisect_left(self._days, key) - n
+        return str(self._days[index]) if 0 <= index < len(self._days) else None
+
+    def range(self, start, end) -> List[str]:
+        """start 到 end（含首尾）的全部交易日"""
+        start, end = date_key(start), date_key(end)
+        if start is None or end is None:
+            return []
+        days = self._days[bisect.bisect_left(self._days, start):bisect.bisect_right(self._days, end)]
+        return [str(day) for day in days]
+
+
+def _pull_trade_cal(start: str, end: str) -> Optional[pd.DataFrame]:
+    """从 Tushare 拉取上交所交易日历，不可用时返回 None"""
+    try:
+        pro = tushare_pro()
+        if pro is None:
+            return None
+        return call_upstream('tushare', 'trade_cal', pro.trade_cal, exchange='SSE', start_date=start,
+                             end_date=end, fields='cal_date,is_open')
+    except Exception as e:
+        logger.warning(f"拉取交易日历失败: {e}")
+        return None
+
+
+# 进程内共享的默认日历
+_CALENDAR: Optional[TradingCalendar] = None
+_lock = threading.Lock()
+
+
+def trading_calendar() -> TradingCalendar:
+    """默认交易日历（首次使用时加载）"""
+    global _CALENDAR
+    if _CALENDAR is None:
+        with _lock:
+            if _CALENDAR is None:
+                _CALENDAR = TradingCalendar.load()
+    return _CALENDAR
+
+
+def set_trading_calendar(calendar: Optional[TradingCalendar]):
+    """替换默认交易日历（None 表示下次使用时重新加载）"""
+    global _CALENDAR
+    with _lock:
+        _CALENDAR = calendar
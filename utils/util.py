@@ -8,6 +8,7 @@ import re
 DATE_PATTERN = re.compile(r"^([0-9]{4})[-/]?([0-9]{2})[-/]?([0-9]{2})")
 
 # Chinese holidays (static list for major holidays, can be extended)
+# Only used when the tushare trade_cal calendar is unavailable, see utils/trading_calendar.py
 # Format: 'YYYYMMDD'
 CHINESE_HOLIDAYS = {
     # 2024 holidays
@@ -65,34 +66,8 @@ def last_trading_day(date: str | datetime.date | datetime.datetime) -> str:
         datetime.date or datetime.datetime
     :return: 'last_trade_date' or None
     """
-    trade_date = convert_trade_date(date)
-    if not trade_date:
-        return None
-
-    # Parse the date
-    try:
-        year = int(trade_date[:4])
-        month = int(trade_date[4:6])
-        day = int(trade_date[6:8])
-        current_date = datetime.date(year, month, day)
-    except ValueError:
-        return None
-    
-    # If current date is a trading day, go back one day
-    if is_trading_day(current_date):
-        current_date -= datetime.timedelta(days=1)
-    
-    # Find the last trading day by going backwards
-    max_days_back = 30  # Prevent infinite loop, max go back 30 days
-    days_back = 0
-    
-    while days_back < max_days_back:
-        if is_trading_day(current_date):
-            return current_date.strftime("%Y%m%d")
-        current_date -= datetime.timedelta(days=1)
-        days_back += 1
-    
-    return None
+    from utils.trading_calendar import trading_calendar  # trading_calendar imports this module
+    return trading_calendar().previous(date)
 
 
 def next_trading_day(date: str | datetime.date | datetime.datetime) -> str:
@@ -104,33 +79,8 @@ def next_trading_day(date: str | datetime.date | datetime.datetime) -> str:
         datetime.date or datetime.datetime
     :return: 'next_trade_date' or None
     """
-    trade_date = convert_trade_date(date)
-    if not trade_date:
-        return None
-
-    # Parse the date
-    try:
-        year = int(trade_date[:4])
-        month = int(trade_date[4:6])
-        day = int(trade_date[6:8])
-        current_date = datetime.date(year, month, day)
-    except ValueError:
-        return None
-    
-    # Start from the next day
-    current_date += datetime.timedelta(days=1)
-    
-    # Find the next trading day by going forwards
-    max_days_forward = 30  # Prevent infinite loop, max go forward 30 days
-    days_forward = 0
-    
-    while days_forward < max_days_forward:
-        if is_trading_day(current_date):
-            return current_date.strftime("%Y%m%d")
-        current_date += datetime.timedelta(days=1)
-        days_forward += 1
-    
-    return None
+    from utils.trading_calendar import trading_calendar  # trading_calendar imports this module
+    return trading_calendar().next(date)
 
 def is_trading_day(date: str | datetime.date | datetime.datetime) -> bool:
     """
@@ -141,33 +91,16 @@ def is_trading_day(date: str | datetime.date | datetime.datetime) -> bool:
     - Market hours: 9:30-11:30, 13:00-15:00
     - Closed on weekends and Chinese public holidays
 
+    Trading days come from the cached trade_cal calendar (utils/trading_calendar.py);
+    CHINESE_HOLIDAYS is only the fallback when trade_cal is unavailable.
+
     :param date: 
         string e.g. 2016-01-01, 20160101 or 2016/01/01
         datetime.date or datetime.datetime
     :return: True if trading day, False otherwise
     """
-    trade_date = convert_trade_date(date)
-    if not trade_date:
-        return False
-
-    # Parse the date
-    try:
-        year = int(trade_date[:4])
-        month = int(trade_date[4:6])
-        day = int(trade_date[6:8])
-        date_obj = datetime.date(year, month, day)
-    except ValueError:
-        return False
-    
-    # Check if it's a weekend (Saturday=5, Sunday=6)
-    if date_obj.weekday() >= 5:
-        return False
-    
-    # Check if it's a Chinese holiday
-    if trade_date in CHINESE_HOLIDAYS:
-        return False
-    
-    return True
+    from utils.trading_calendar import trading_calendar  # trading_calendar imports this module
+    return trading_calendar().is_trading_day(date)
 
 
 if __name__ == "__main__":
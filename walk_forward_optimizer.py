@@ -0,0 +1,290 @@
+"""
+市场模式参数滚动优化
+Walk-Forward Optimizer
+
+按滚动窗口在样本内交易日上为每个市场模式（normal、bull_market、bear_market、volatile_market）
+重新拟合选股阈值，并在紧随其后的样本外交易日上评估，输出带生效日期的参数时间表，
+AdvancedStockPicker.load_parameter_schedule 按交易日加载。
+
+整个区间的历史快照只加载和计算一次（风险过滤、市场环境判断、远期收益），放入共享内存面板；
+相互重叠的窗口只是面板上不同交易日的切片，各窗口在工作进程中并行拟合。
+某个市场模式的参数调整只影响该模式的交易日，因此每个模式只在样本内属于该模式的交易日上单独拟合。
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backtester import trading_days
+from config import BACKTEST_CONFIG, WALK_FORWARD_CONFIG
+from parameter_sweep import (
+    MODES, SharedPanel, attach_panel, attached_panel, build_panel, detach_panel, evaluate, grid, mode_configs_for
+)
+from utils import util
+from utils.data_store import LocalDataStore, DEFAULT_STORE_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OBJECTIVES = ('mean_return', 'hit_rate', 'cumulative_return')
+
+
+def make_windows(days: Sequence[str], train_days: int, test_days: int) -> List[Dict]:
+    """
+    划分滚动窗口
+
+    Args:
+        days: 全部交易日
+        train_days: 样本内交易日数
+        test_days: 样本外交易日数（滚动步长）
+
+    Returns:
+        窗口列表，train/test 为面板上的 (起, 止) 下标；最后一个窗口用最近的样本内数据拟合，
+        没有样本外区间，从区间结束后的下一个交易日起生效
+    """
+    if len(days) < train_days:
+        raise ValueError(f"交易日数 {len(days)} 少于样本内窗口 {train_days}")
+    windows = []
+    start = 0
+    while start + train_days < len(days):
+        test_end = min(start + train_days + test_days, len(days))
+        windows.append({'train': (start, start + train_days), 'test': (start + train_days, test_end)})
+        start += test_days
+    windows.append({'train': (len(days) - train_days, len(days)), 'test': None})
+    return windows
+
+
+def take_days(panel: Dict[str, np.ndarray], index) -> Dict[str, np.ndarray]:
+    """按交易日（第0维）切片面板，连续区间为视图"""
+    return {name: array[index] for name, array in panel.items()}
+
+
+def objective_value(metrics: Dict, objective: str) -> float:
+    """从评估结果中取优化目标，持有期取首个"""
+    if objective == 'cumulative_return':
+        return metrics['cumulative_return']
+    return metrics['horizons'][min(metrics['horizons'])][objective]
+
+
+def _score(panel: Dict[str, np.ndarray], overrides: Dict, task: Dict) -> Tuple[float, Dict]:
+    """评估一组参数覆盖，返回 (目标值, 评估结果)"""
+    metrics = evaluate(panel, mode_configs_for(overrides), attached_panel()[1]['horizons'], task['max_stocks'])
+    return objective_value(metrics, task['objective']), metrics
+
+
+def _fit_window(task: Dict) -> Dict:
+    """工作进程中拟合一个窗口：逐个市场模式选出样本内最优阈值，再在样本外评估"""
+    panel, meta = attached_panel()
+    days = meta['days']
+    train_start, train_end = task['window']['train']
+
+    adjustments, in_sample = {}, {}
+    for m, mode in enumerate(MODES):
+        mode_days = train_start + np.flatnonzero(panel['mode'][train_start:train_end] == m)
+        if not len(mode_days):
+            continue
+        sub_panel = take_days(panel, mode_days)
+        baseline, _ = _score(sub_panel, {}, task)
+        best_score, best_params, best_picks = baseline, {}, None
+        for params in task['candidates']:
+            score, metrics = _score(sub_panel, {'adjustments': {mode: params}}, task)
+            if metrics['total_picks'] >= task['min_picks'] and score > best_score:
+                best_score, best_params, best_picks = score, params, metrics['total_picks']
+        if best_params:
+            adjustments[mode] = best_params
+        in_sample[mode] = {'days': int(len(mode_days)), 'score': best_score,
+                           'baseline_score': baseline, 'total_picks': best_picks}
+
+    entry = {
+        'train_start': days[train_start],
+        'train_end': days[train_end - 1],
+        'adjustments': adjustments,
+        'in_sample': in_sample,
+        'out_of_sample': None,
+    }
+    if task['window']['test'] is None:
+        return entry
+
+    test_start, test_end = task['window']['test']
+    test_panel = take_days(panel, slice(test_start, test_end))
+    score, metrics = _score(test_panel, {'adjustments': adjustments}, task)
+    baseline, baseline_metrics = _score(test_panel, {}, task)
+    entry.update({
+        'effective_from': days[test_start],
+        'effective_to': days[test_end - 1],
+        'out_of_sample': {
+            'days': test_end - test_start,
+            'score': score,
+            'baseline_score': baseline,
+            'total_picks': metrics['total_picks'],
+            'cumulative_return': metrics['cumulative_return'],
+            'baseline_cumulative_return': baseline_metrics['cumulative_return'],
+            'max_drawdown': metrics['max_drawdown'],
+        },
+    })
+    return entry
+
+
+class WalkForwardOptimizer:
+    """市场模式参数的滚动样本内拟合、样本外评估"""
+
+    def __init__(self,
+                 store: LocalDataStore = None,
+                 train_days: int = WALK_FORWARD_CONFIG['train_days'],
+                 test_days: int = WALK_FORWARD_CONFIG['test_days'],
+                 param_space: Dict[str, Sequence] = None,
+                 objective: str = WALK_FORWARD_CONFIG['objective'],
+                 min_picks: int = WALK_FORWARD_CONFIG['min_picks'],
+                 horizon: int = BACKTEST_CONFIG['horizons'][0],
+                 max_stocks: int = BACKTEST_CONFIG['max_stocks'],
+                 workers: int = BACKTEST_CONFIG['workers']):
+        """
+        初始化滚动优化
+
+        Args:
+            store: 本地历史快照存储
+            train_days: 样本内交易日数
+            test_days: 样本外交易日数（滚动步长）
+            param_space: 每个市场模式的候选阈值，默认 WALK_FORWARD_CONFIG['param_space']
+            objective: 优化目标 (mean_return / hit_rate / cumulative_return)
+            min_picks: 样本内选股数少于该值的候选参数不参与比较
+            horizon: 远期收益持有期
+            max_stocks: 每日最多选股数量
+            workers: 并行进程数，None为CPU核数，1为在当前进程内串行执行
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"不支持的优化目标: {objective}")
+        self.store = store or LocalDataStore(DEFAULT_STORE_DIR)
+        self.train_days = train_days
+        self.test_days = test_days
+        self.candidates = grid(param_space or WALK_FORWARD_CONFIG['param_space'])
+        self.objective = objective
+        self.min_picks = min_picks
+        self.horizon = horizon
+        self.max_stocks = max_stocks
+        self.workers = workers
+
+    def run(self, start: str, end: str, output_path: str = WALK_FORWARD_CONFIG['schedule_path']) -> Dict:
+        """
+        执行滚动优化并写出参数时间表
+
+        Args:
+            start: 开始日期
+            end: 结束日期
+            output_path: 参数时间表JSON路径，None则不写文件
+
+        Returns:
+            参数时间表
+        """
+        started = time.perf_counter()
+        days = trading_days(start, end)
+        windows = make_windows(days, self.train_days, self.test_days)
+
+        # 整个区间只构建一次面板，重叠窗口共享每个交易日的计算结果
+        arrays, meta = build_panel(self.store, days, [self.horizon])
+        logger.info(f"面板已构建: {len(days)} 个交易日 × {len(meta['codes'])} 只股票, {len(windows)} 个窗口")
+
+        tasks = [{'window': window, 'candidates': self.candidates, 'objective': self.objective,
+                  'min_picks': self.min_picks, 'max_stocks': self.max_stocks} for window in windows]
+        shared = SharedPanel(arrays)
+        try:
+            if self.workers == 1:
+                attach_panel(shared.spec, meta)
+                entries = [_fit_window(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=attach_panel,
+                                         initargs=(shared.spec, meta)) as executor:
+                    entries = list(executor.map(_fit_window, tasks))
+        finally:
+            detach_panel()
+            shared.close()
+
+        # 最后一个窗口从区间结束后的下一个交易日起生效
+        entries[-1].update({'effective_from': util.next_trading_day(days[-1]), 'effective_to': None})
+
+        schedule = {
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'start': days[0],
+            'end': days[-1],
+            'objective': self.objective,
+            'horizon': self.horizon,
+            'train_days': self.train_days,
+            'test_days': self.test_days,
+            'summary': self.summarize(entries),
+            'entries': entries,
+        }
+        if output_path:
+            self.save(schedule, output_path)
+        logger.info(f"滚动优化完成: {len(windows)} 个窗口 × {len(self.candidates)} 组候选参数, "
+                    f"用时 {time.perf_counter() - started:.1f}s")
+        return schedule
+
+    @staticmethod
+    def summarize(entries: List[Dict]) -> Dict:
+        """汇总样本外表现：拟合参数与默认参数的窗口平均目标值和连乘累计收益"""
+        tested = [entry['out_of_sample'] for entry in entries if entry['out_of_sample']]
+        if not tested:
+            return {}
+        return {
+            'windows': len(tested),
+            'mean_score': float(np.mean([t['score'] for t in tested])),
+            'baseline_mean_score': float(np.mean([t['baseline_score'] for t in tested])),
+            'cumulative_return': float(np.prod([1 + t['cumulative_return'] for t in tested]) - 1),
+            'baseline_cumulative_return': float(np.prod([1 + t['baseline_cumulative_return'] for t in tested]) - 1),
+        }
+
+    @staticmethod
+    def save(schedule: Dict, path: str):
+        """原子写出参数时间表（同一目录下的唯一临时文件，同时运行的优化不会互相覆盖）"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+        try:
+            os.fchmod(fd, 0o644)  # mkstemp 创建的文件只有属主可读
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(schedule, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def main():
+    """主函数 - 执行滚动参数优化"""
+    parser = argparse.ArgumentParser(description='市场模式参数滚动优化')
+    parser.add_argument('--start', required=True, help='开始日期 YYYYMMDD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYYMMDD')
+    parser.add_argument('--train-days', type=int, default=WALK_FORWARD_CONFIG['train_days'], help='样本内交易日数')
+    parser.add_argument('--test-days', type=int, default=WALK_FORWARD_CONFIG['test_days'], help='样本外交易日数')
+    parser.add_argument('--objective', default=WALK_FORWARD_CONFIG['objective'], choices=OBJECTIVES, help='优化目标')
+    parser.add_argument('--workers', type=int, default=BACKTEST_CONFIG['workers'], help='并行进程数')
+    parser.add_argument('--output', default=WALK_FORWARD_CONFIG['schedule_path'], help='参数时间表路径')
+    args = parser.parse_args()
+
+    optimizer = WalkForwardOptimizer(train_days=args.train_days, test_days=args.test_days,
+                                     objective=args.objective, workers=args.workers)
+    schedule = optimizer.run(args.start, args.end, args.output)
+
+    print(f"📅 共 {len(schedule['entries'])} 个时段:")
+    for entry in schedule['entries']:
+        oos = entry['out_of_sample']
+        oos_text = f"样本外 {oos['score']:.4f} (默认 {oos['baseline_score']:.4f})" if oos else "实盘生效"
+        print(f"  {entry['effective_from']} 起: {entry['adjustments'] or '默认参数'} | {oos_text}")
+    print(f"📊 样本外汇总: {schedule['summary']}")
+    print(f"💾 参数时间表已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()